@@ -500,14 +500,25 @@ def create_app():
 
     process_workers = _configured_process_workers()
     if process_workers > 1:
-        app.logger.critical(
-            'File-ledger deployment configured with %s worker processes; use one process to prevent lost updates',
-            process_workers,
-            extra={
-                'event_type': 'unsafe_worker_configuration',
-                'configured_process_workers': process_workers,
-            }
-        )
+        from app.utils.ledger_coordinator import cross_process_supported
+        if cross_process_supported():
+            # Ledger writes are serialized by an flock and readers follow a
+            # shared commit sequence (app.utils.ledger_coordinator).
+            app.logger.info(
+                'File-ledger deployment coordinating %s worker processes via flock',
+                process_workers,
+                extra={'configured_process_workers': process_workers},
+            )
+        else:
+            app.logger.critical(
+                'File-ledger deployment configured with %s worker processes, but this platform has no flock; '
+                'use one process to prevent lost updates',
+                process_workers,
+                extra={
+                    'event_type': 'unsafe_worker_configuration',
+                    'configured_process_workers': process_workers,
+                }
+            )
     
     # Add request/response logging middleware — but skip noisy paths (static
     # assets, favicon, health checks). Each structured-log entry involves a
@@ -19,6 +19,11 @@ VETO_QUOTAS = {
     'DEFAULT': 0
 }
 
+# Individual (non-role) VETO allocations, keyed by current roll number.
+# Read by the scoreboard VETO reconcile as the base individual allocation;
+# star conversions and manual admin grants are added on top of it.
+VETO_INDIVIDUAL_ALLOCATIONS = {}
+
 # The minimum power a party must have to exercise a veto.
 VETO_POWER_THRESHOLD = 5
 
@@ -4,9 +4,9 @@ from app import db, limiter, make_ephemeral_user, csrf
 from app.models import User, JoinCode, DeviceSession, AccountAction
 from app.models.user import ActivityLog
 from app.utils.secrets_manager import get_credential_provider
+from app.utils.data_paths import load_json_data_cached
 from app.utils.logger import get_security_logger, get_audit_logger
 from datetime import datetime, timedelta
-import json
 import os
 import secrets
 from sqlalchemy.exc import SQLAlchemyError
@@ -434,19 +434,14 @@ def _check_password_for_login(user, password):
     return user.check_password(text)
 
 
-def _offline_scoreboard_data_path():
-    return os.path.join(current_app.instance_path, 'offline_scoreboard_data.json')
-
-
 def _student_roll_exists_in_offline_roster(roll_value):
     """Best-effort check that a roll exists in the offline scoreboard roster."""
     roll = str(roll_value or '').strip().upper()
     if not roll or not roll.startswith('EA'):
         return False
-    path = _offline_scoreboard_data_path()
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            payload = json.load(f)
+        # The shared, journal-aware ledger: the snapshot file can lag it.
+        payload = load_json_data_cached() or {}
         students = payload.get('students') or []
         if not isinstance(students, list):
             return False
@@ -1,4 +1,3 @@
-import copy
 import json
 import os
 import tempfile
@@ -15,6 +14,7 @@ from app.models.notebook import (
 )
 from app.models.student_profile import StudentProfile
 from app.models.points import StudentPoints
+from app.utils.ledger_view import LedgerView
 
 notebook_bp = Blueprint('notebook', __name__, url_prefix='/notebooks')
 
@@ -42,23 +42,10 @@ def _load_json_data():
 
 
 def _save_json_data(data: dict):
-    from app.utils.data_paths import (
-        get_data_path, prime_data_cache, invalidate_data_cache,
-    )
-    from app.utils.file_operations import SafeFileWriter
-    from pathlib import Path
-    path = get_data_path()
-    success = SafeFileWriter.write_json(Path(path), data, backup=True)
-    if not success:
-        raise IOError(f"Failed to safely write JSON data to {path} via SafeFileWriter.")
-    # Refresh shared cache so subsequent reads don't re-parse from disk.
-    try:
-        if isinstance(data, dict):
-            prime_data_cache(data)
-        else:
-            invalidate_data_cache()
-    except Exception:
-        invalidate_data_cache()
+    # Goes through the scoreboard save path so the write is versioned,
+    # journaled and serialized with every other ledger mutation.
+    from app.utils.data_paths import save_ledger_data
+    save_ledger_data(data)
 
 
 def _get_active_students():
@@ -77,29 +64,31 @@ def _student_by_roll(roll: str):
 
 def _add_score_to_json(student_json_id: int, check_date: date,
                         total_points: int, notes: str):
-    # Deep-copy because _load_json_data() now returns a shared cached dict;
-    # mutating it would corrupt the cache. Writes are rare, so the copy cost
-    # is acceptable here.
-    data = copy.deepcopy(_load_json_data())
-    scores = data.get('scores', [])
+    # Copy-on-write view over the shared cached ledger: only the scores list is
+    # copied (one level), and the matched row is replaced rather than edited.
+    data = LedgerView(_load_json_data())
+    scores = data.mutable('scores')
     date_str = check_date.isoformat()
     month_str = date_str[:7]
     now_iso = datetime.utcnow().isoformat()
 
     note_prefix = notes.split(']')[0] + ']' if ']' in notes else notes[:20]
 
-    existing = None
-    for score in scores:
+    existing_index = None
+    for index, score in enumerate(scores):
         if (score.get('studentId') == student_json_id
                 and str(score.get('date', '')) == date_str
                 and str(score.get('notes', '')).startswith(note_prefix)):
-            existing = score
+            existing_index = index
             break
 
-    if existing:
-        existing['points'] = total_points
-        existing['notes'] = notes
-        existing['updated_at'] = now_iso
+    if existing_index is not None:
+        scores[existing_index] = dict(
+            scores[existing_index],
+            points=total_points,
+            notes=notes,
+            updated_at=now_iso,
+        )
     else:
         max_id = max((s.get('id', 0) for s in scores), default=0)
         scores.append({
@@ -117,15 +106,14 @@ def _add_score_to_json(student_json_id: int, check_date: date,
             'updated_at': now_iso,
         })
 
-    data['scores'] = scores
     data['updated_at'] = now_iso
     data['server_updated_at'] = now_iso
     _save_json_data(data)
 
 
 def _remove_score_from_json(student_json_id: int, check_date: date, note_prefix: str):
-    # Deep-copy: see note in _add_score_to_json.
-    data = copy.deepcopy(_load_json_data())
+    # Copy-on-write: see note in _add_score_to_json.
+    data = LedgerView(_load_json_data())
     date_str = check_date.isoformat()
     data['scores'] = [
         s for s in data.get('scores', [])
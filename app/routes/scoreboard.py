@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, request, jsonify, current_app, send_file, after_this_request, Response, stream_with_context, g, has_request_context
+from flask import Blueprint, render_template, request, jsonify, current_app, send_file, after_this_request, Response, stream_with_context, g, has_request_context, has_app_context
 from flask_login import login_required, current_user
 from app import db, csrf, limiter
 from app.models import (
@@ -15,6 +15,7 @@ from app.models import (
     PublicSiteCredential,
 )
 from app.utils.syllabus_helpers import merge_syllabus_catalog_superset, merge_syllabus_tracking_superset
+from app.utils.helpers import parse_stamp as _helper_parse_stamp
 from app.utils.file_operations import (
     atomic_write_json as _shared_atomic_write_json,
     ensure_ledger_payload as _ensure_ledger_payload,
@@ -26,7 +27,28 @@ from app.utils.sync_config import (
     normalize_peer_urls,
     resolve_sync_shared_key,
 )
-from app.utils.sync_payloads import payload_for_external_replication
+from app.utils.sync_payloads import payload_for_external_replication, patch_for_external_replication
+from app.utils.ledger_view import LedgerView
+from app.utils.ledger_writer import GroupCommitWriter, LedgerWriteError
+from app.utils.ledger_coordinator import (
+    LedgerLock,
+    hold_role as _hold_process_role,
+    publish_write as _publish_ledger_write,
+    register_resync_listener as _register_ledger_resync,
+)
+from app.utils.ledger_repository import resync_state as _resync_journal_state
+from app.utils import ledger_archive as _ledger_archive
+from app.utils.ledger_sqlite import row_month as _score_row_month
+from app.utils import snapshot_codec as _snapshot_codec
+from app.utils import backup_store as _backup_store
+from app.utils import backup_catalog as _backup_catalog
+from app.utils import month_totals as _month_totals
+from app.utils import veto_markers as _veto_markers
+from app.utils import change_feed as _change_feed
+from app.utils import ledger_digest as _ledger_digest
+from app.utils import hlc as _hlc
+from app.utils.replication_outbox import ReplicationOutbox
+from app.utils import replication_http as _replication_http
 from app.config.constants import SCOREBOARD_DEFAULT_LEADERSHIP, SCOREBOARD_DEFAULT_PARTIES, VETO_QUOTAS, VETO_INDIVIDUAL_ALLOCATIONS
 import app.utils.score_balance as _score_balance
 from app.utils.data_paths import (
@@ -36,8 +58,15 @@ from app.utils.data_paths import (
     load_json_data_cached as _cached_load_json_data,
     invalidate_data_cache as _invalidate_data_cache,
     prime_data_cache as _prime_data_cache,
+    ledger_index_for as _ledger_index_for,
+    month_totals_for as _month_totals_for,
+    roll_resolver_for as _roll_resolver_for,
+    get_month_totals_path as _month_totals_path,
     get_serialized_response as _get_serialized_response,
     store_serialized_response as _store_serialized_response,
+    register_ledger_writer as _register_ledger_writer,
+    ledger_backend as _ledger_backend,
+    get_ledger_store as _get_ledger_store,
 )
 from datetime import datetime, date, timedelta, timezone
 from dateutil.relativedelta import relativedelta
@@ -51,6 +80,7 @@ import secrets
 import tempfile
 import shutil
 import glob
+import socket
 import subprocess
 import urllib.request
 import urllib.error
@@ -61,6 +91,7 @@ from queue import Queue, Empty
 import threading
 import time
 import math
+import atexit
 import functools
 import logging
 
@@ -70,23 +101,45 @@ points_bp = Blueprint('points', __name__, url_prefix='/scoreboard')
 _sync_subscribers = []
 _sync_lock = threading.Lock()
 
-# Serializes read-merge-write cycles on the offline JSON ledger within this
-# process. Waitress serves with multiple threads; without this lock, two
-# concurrent mutating requests could each load the ledger, merge independently,
-# and the last writer would silently discard the other's merge (lost update).
-# RLock so a request already holding the lock can call _save_offline_data
-# (which also acquires it) without deadlocking.
-_LEDGER_WRITE_LOCK = threading.RLock()
+# Serializes read-merge-write cycles on the offline JSON ledger across threads
+# and worker processes. Without it, two concurrent mutating requests could each
+# load the ledger, merge independently, and the last writer would silently
+# discard the other's merge (lost update). Reentrant so a request already
+# holding the lock can call _save_offline_data (which also acquires it); the
+# flock part lets several Gunicorn/Waitress workers share one ledger.
+_LEDGER_WRITE_LOCK = LedgerLock()
+_register_ledger_resync(_resync_journal_state)
 
 
 def _ledger_write_guard(view):
-    """Route decorator: serialize ledger-mutating requests. Plain GETs skip the lock."""
+    """
+    Route decorator: serialize ledger-mutating requests. Plain GETs skip the lock.
+
+    Saves made by the view are group-committed; the durability barrier is
+    waited on once, after the lock is released, so the writer can batch this
+    request with the ones queued behind it.
+    """
     @functools.wraps(view)
     def _wrapped(*args, **kwargs):
-        if request.method == 'GET':
-            return view(*args, **kwargs)
-        with _LEDGER_WRITE_LOCK:
+        if request.method == 'GET' or getattr(g, 'ea_ledger_guarded', False):
             return view(*args, **kwargs)
+        g.ea_ledger_guarded = True
+        try:
+            with _LEDGER_WRITE_LOCK:
+                response = view(*args, **kwargs)
+        finally:
+            g.ea_ledger_guarded = False
+        ticket = g.pop('ea_ledger_durable_ticket', None)
+        writer = _ledger_group_writer_state['writer']
+        if ticket and writer is not None:
+            try:
+                durable = writer.wait_durable(ticket, timeout=_ledger_durable_timeout())
+            except LedgerWriteError:
+                durable = False
+            if not durable:
+                _ledger_log.error('Staged ledger write %s was not persisted', ticket)
+                return jsonify({'success': False, 'error': 'Ledger write could not be persisted. Please retry.'}), 503
+        return response
     return _wrapped
 
 # NOTE: DEFAULT_PARTIES also defined in app/config/constants.py (without 'name' field).
@@ -162,6 +215,11 @@ def _server_now_iso():
         return datetime.utcnow().isoformat()
 
 
+def _server_now_hlc():
+    """HLC stamp for a change made on this node now (see app/utils/hlc.py)."""
+    return _ledger_clock().now()
+
+
 def _roll_key(value):
     return str(value or '').strip().upper()
 
@@ -192,13 +250,7 @@ def _safe_float(value, default=0.0):
 
 
 def _parse_stamp(value):
-    raw = str(value or '').strip()
-    if not raw:
-        return 0.0
-    try:
-        return datetime.fromisoformat(raw.replace('Z', '+00:00')).timestamp()
-    except Exception:
-        return 0.0
+    return _helper_parse_stamp(value)
 
 
 def _norm_attendance_status(value):
@@ -690,6 +742,28 @@ def _public_snapshot_has_useful_rows(snapshot):
     return False
 
 
+def _month_score_rows(payload, month):
+    """
+    Score rows for ``month`` (a row's ``month``, else its date's month). When
+    ``payload`` is the live cached ledger and the SQLite row store has applied
+    exactly its server_version this is an index lookup instead of a full scan;
+    group commit primes the cache before the store catches up.
+    """
+    if _ledger_backend() == 'sqlite' and payload is _cached_load_json_data():
+        try:
+            from app.utils.ledger_sqlite import query_rows
+            rows = query_rows('scores', month=month,
+                              revision=_parse_int_safe(payload.get('server_version'), 0))
+            if rows is not None:
+                return [row for row in rows if isinstance(row, dict)]
+        except Exception:
+            _ledger_log.exception('Ledger store month lookup failed; scanning scores')
+    return [
+        score for score in payload.get('scores', []) or []
+        if isinstance(score, dict) and _score_row_month(score) == month
+    ]
+
+
 def _public_month_keys(payload):
     months = set()
     for month in payload.get('months', []) or []:
@@ -794,13 +868,7 @@ def _build_public_month_rows(payload, month):
             by_id[sid] = row_student
             totals[sid] = 0
 
-    month_scores = []
-    for score in payload.get('scores', []) or []:
-        if not isinstance(score, dict):
-            continue
-        if str(score.get('month') or '').strip() != month:
-            continue
-        month_scores.append(score)
+    month_scores = _month_score_rows(payload, month)
 
     # Historical imports can contain canonical total-column rows. When present,
     # use those totals directly to avoid day-wise re-summing mismatches.
@@ -1023,11 +1091,7 @@ def _build_public_parties_payload(payload, months):
     for month in months:
         # Pre-compute per-student month totals from scores for this month.
         month_totals = {}
-        for score in payload.get('scores', []) or []:
-            if not isinstance(score, dict):
-                continue
-            if str(score.get('month') or '').strip() != month:
-                continue
+        for score in _month_score_rows(payload, month):
             sid = _safe_int(score.get('studentId'))
             if sid > 0:
                 month_totals[sid] = month_totals.get(sid, 0) + _safe_float(score.get('points'))
@@ -1769,6 +1833,7 @@ def _resync_students_from_veto_tracking(payload):
         for s in (payload.get('students') or [])
         if s.get('roll') and _parse_int_safe(s.get('id'), 0) > 0
     }
+    usage = _veto_usage_from_scores(payload)
     for student in payload.get('students') or []:
         if not isinstance(student, dict):
             continue
@@ -1786,7 +1851,7 @@ def _resync_students_from_veto_tracking(payload):
         # Individual VETOs are PERMANENT (total usage deducted);
         # Role VETOs are MONTHLY (only current-month usage deducted).
         ind_rem, role_rem, total_used = _compute_veto_remaining_counters(
-            payload, sid, ind, role, current_month
+            payload, sid, ind, role, current_month, usage=usage
         )
 
         student['veto_count'] = ind_rem
@@ -1915,11 +1980,169 @@ def _normalize_peer_list(raw_values):
     return normalize_peer_urls(raw_values)
 
 
-def _forward_offline_data_to_peers(payload, extra_peers=None):
+def _replication_patches_enabled():
+    flag = str(os.getenv('EA_REPLICATION_PATCHES', '1') or '').strip().lower()
+    return flag not in {'0', 'false', 'no', 'off'}
+
+
+def _replication_gzip_enabled():
+    """Compress replication POST bodies; turn off while a peer still runs a build that cannot inflate them."""
+    flag = str(os.getenv('EA_REPLICATION_GZIP', '1') or '').strip().lower()
+    return flag not in {'0', 'false', 'no', 'off'}
+
+
+def _replication_node_id():
+    """Origin id sent with pushes; receivers only accept patches chained from this node's versions."""
+    return str(os.getenv('EA_NODE_ID', '') or '').strip() or socket.gethostname()
+
+
+_replication_outbox_state = {'outbox': None}
+_replication_outbox_lock = threading.Lock()
+
+
+def _replication_outbox():
+    """
+    The process-wide per-peer outbox (see replication_outbox.py), persisted
+    next to the ledger. It also holds the server_version each peer last
+    acknowledged, which the next push diffs its change-feed patch from.
+    Only the worker process holding the 'replication_outbox' role pushes and
+    writes the file; the others hand their saves to it.
+    """
+    path = os.path.join(get_storage_root(), 'replication_outbox.json')
+    outbox = _replication_outbox_state['outbox']
+    if outbox is not None and outbox.path == path:
+        return outbox
+    with _replication_outbox_lock:
+        outbox = _replication_outbox_state['outbox']
+        if outbox is None or outbox.path != path:
+            if outbox is not None:
+                outbox.close(timeout=0)
+            try:
+                max_delay = max(1.0, float(os.getenv('EA_REPLICATION_MAX_BACKOFF_SECONDS', '300') or 300))
+            except (TypeError, ValueError):
+                max_delay = 300.0
+            outbox = ReplicationOutbox(
+                path,
+                _push_ledger_to_peer,
+                load=_cached_load_json_data,
+                max_delay=max_delay,
+                owner=lambda: _hold_process_role('replication_outbox'),
+            )
+            _replication_outbox_state['outbox'] = outbox
+        return outbox
+
+
+def _close_replication_outbox():
+    outbox = _replication_outbox_state['outbox']
+    if outbox is not None:
+        outbox.close()
+
+
+atexit.register(_close_replication_outbox)
+
+
+def resume_replication_outbox(app=None):
+    """Restart pushes still owed to peers and mirrors from before this process started."""
+    if os.path.exists(os.path.join(get_storage_root(), 'replication_outbox.json')):
+        _replication_outbox().resume()
+    if app is not None:
+        # The elected mirror owner may never queue a public-site push itself.
+        _mirror_outbox_state['app'] = app
+    if os.path.exists(os.path.join(get_storage_root(), 'mirror_outbox.json')):
+        _mirror_outbox().resume()
+
+
+def _post_replication_body(peer, body, shared_key):
+    """POST a replication body to ``peer``; returns (status or None, parsed JSON reply)."""
+    try:
+        # WAN peers (Render) cold-start can take 30-50 s on free tier.
+        # This function always runs in a background daemon thread so blocking is fine.
+        resp = _replication_http.post(
+            f'{peer}/scoreboard/offline-data',
+            body=body,
+            headers={
+                'Content-Type': 'application/json',
+                'X-EA-Replicated': '1',
+                'X-EA-Sync-Key': shared_key
+            },
+            timeout=45,
+            compress=_replication_gzip_enabled(),
+        )
+    except OSError:
+        return None, {}
+    reply = resp.json({})
+    return resp.status, reply if isinstance(reply, dict) else {}
+
+
+def _replication_base_flags():
+    if str(os.getenv('EA_MASTER_MODE', '')).strip() == '1':
+        # Master publishes authoritative snapshots to peers (Render/backup),
+        # so receivers can accept them even when peer timestamps drift ahead.
+        return {
+            'authoritative_master_push': True,
+            'force_replace': True,
+        }
+    return {}
+
+
+def _is_replicable_ledger(payload):
+    # Narrow replication payloads (teacher patches) are not ledger revisions.
+    return (
+        isinstance(payload, dict)
+        and not payload.get('replica_purpose')
+        and is_full_ledger_snapshot(payload)
+    )
+
+
+def _push_ledger_to_peer(peer, payload):
+    """
+    Deliver a full ledger revision to ``peer``: a change-feed patch from the
+    peer's acknowledged version when possible, else the whole snapshot.
+    Returns (ok, error). Runs on the outbox worker, outside any request.
+    """
+    base_flags = _replication_base_flags()
+    shared_key = resolve_sync_shared_key()
+    private = is_private_peer_url(peer)
+    version = _parse_int_safe(payload.get('server_version'), 0)
+    origin = {'node': _replication_node_id(), 'version': version} if version > 0 else None
+    if origin is not None and _replication_patches_enabled():
+        acked = _replication_outbox().acked_version(peer)
+        if acked == version:
+            return True, ''
+        feed_patch = _change_feed.patch_since(acked, payload) if acked is not None else None
+        if feed_patch is not None:
+            changes = feed_patch['changes'] if private else patch_for_external_replication(feed_patch['changes'])
+            body = json.dumps({
+                'replication_patch': {
+                    'since_version': feed_patch['since_version'],
+                    'server_version': feed_patch['server_version'],
+                    'changes': changes,
+                },
+                'origin': origin,
+                **base_flags,
+            }).encode('utf-8')
+            status, reply = _post_replication_body(peer, body, shared_key)
+            if status is not None and 200 <= status < 300:
+                return True, ''
+            if reply.get('code') != 'patch_base_mismatch':
+                # Peer down or refusing this revision: retried from the same
+                # acknowledged version.
+                return False, f'patch push failed ({status or "unreachable"})'
+    # Preserve the fees module on LAN peers so offline/backup nodes stay
+    # consistent; only strip it for non-private WAN/cloud mirrors.
+    peer_payload = payload if private else payload_for_external_replication(payload)
+    envelope = {'data': peer_payload, **base_flags}
+    if origin is not None:
+        envelope['origin'] = origin
+    status, _ = _post_replication_body(peer, json.dumps(envelope).encode('utf-8'), shared_key)
+    if status is not None and 200 <= status < 300:
+        return True, ''
+    return False, f'snapshot push failed ({status or "unreachable"})'
+
+
+def _replication_targets(extra_peers=None):
     peers = get_sync_peers() + _normalize_peer_list(extra_peers or [])
     peers = list(dict.fromkeys(peers))
-    if not peers:
-        return
     # request.host_url is only available inside a Flask request context.
     # This function is also called from background daemon threads (spawned
     # during route handlers) where the request proxy is no longer valid.
@@ -1929,45 +2152,44 @@ def _forward_offline_data_to_peers(payload, extra_peers=None):
         current_origin = (request.host_url or '').rstrip('/')
     except RuntimeError:
         current_origin = ''
-    is_master = str(os.getenv('EA_MASTER_MODE', '')).strip() == '1'
-    if is_master:
-        # Master publishes authoritative snapshots to peers (Render/backup),
-        # so receivers can accept them even when peer timestamps drift ahead.
-        base_flags = {
-            'authoritative_master_push': True,
-            'force_replace': True,
-        }
-    else:
-        base_flags = {}
+    return [peer for peer in peers if peer.rstrip('/') != current_origin]
+
+
+def _forward_offline_data_to_peers(payload, extra_peers=None):
+    """Push ``payload`` to every peer now, on the calling thread."""
+    peers = _replication_targets(extra_peers)
+    if not peers:
+        return
+    if _is_replicable_ledger(payload):
+        outbox = _replication_outbox()
+        version = _parse_int_safe(payload.get('server_version'), 0)
+        for peer in peers:
+            ok, _ = _push_ledger_to_peer(peer, payload)
+            if ok and version > 0:
+                outbox.mark_acked(peer, version)
+        return
+    base_flags = _replication_base_flags()
     shared_key = resolve_sync_shared_key()
     for peer in peers:
-        if peer.rstrip('/') == current_origin:
-            continue
-        # Preserve the fees module on LAN peers so offline/backup nodes stay
-        # consistent; only strip it for non-private WAN/cloud mirrors.
         peer_payload = payload if is_private_peer_url(peer) else payload_for_external_replication(payload)
-        body = json.dumps({'data': peer_payload, **base_flags}).encode('utf-8')
-        target_url = f'{peer}/scoreboard/offline-data'
-        req = urllib.request.Request(
-            target_url,
-            data=body,
-            method='POST',
-            headers={
-                'Content-Type': 'application/json',
-                'X-EA-Replicated': '1',
-                'X-EA-Sync-Key': shared_key
-            }
-        )
-        try:
-            # WAN peers (Render) cold-start can take 30-50 s on free tier.
-            # This function always runs in a background daemon thread so blocking is fine.
-            with urllib.request.urlopen(req, timeout=45):
-                pass
-        except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError, OSError):
-            continue
+        _post_replication_body(peer, json.dumps({'data': peer_payload, **base_flags}).encode('utf-8'), shared_key)
 
 
 def _forward_offline_data_to_peers_async(payload, extra_peers=None):
+    """
+    Replicate a saved ledger without blocking the request: full revisions go
+    through the per-peer outbox (one worker per peer, coalesced to the newest
+    revision, retried with backoff); narrow payloads such as teacher patches
+    are not ledger revisions and keep a one-off thread.
+    """
+    peers = _replication_targets(extra_peers)
+    if not peers:
+        return
+    if _is_replicable_ledger(payload):
+        outbox = _replication_outbox()
+        for peer in peers:
+            outbox.enqueue(peer, payload)
+        return
     threading.Thread(
         target=_forward_offline_data_to_peers,
         args=(payload, extra_peers),
@@ -2052,14 +2274,12 @@ def _supabase_fetch_snapshot(timeout_sec=12):
             'id': f"eq.{cfg['row_id']}",
             'limit': 1
         })
-        req = urllib.request.Request(
+        resp = _replication_http.get(
             f"{endpoint}?{params}",
             headers=_supabase_headers(cfg, key_name='read_key', for_write=False),
-            method='GET'
-        )
-        with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-            raw = resp.read()
-        rows = json.loads(raw.decode('utf-8', errors='replace')) if raw else []
+            timeout=timeout_sec,
+        ).raise_for_status()
+        rows = json.loads(resp.content.decode('utf-8', errors='replace')) if resp.content else []
         if not isinstance(rows, list) or not rows:
             return None, 'empty'
         row = rows[0] if isinstance(rows[0], dict) else {}
@@ -2096,20 +2316,19 @@ def _supabase_push_snapshot(payload, reason='snapshot_save', timeout_sec=15):
     }]
     try:
         params = urllib.parse.urlencode({'on_conflict': 'id'})
-        req = urllib.request.Request(
+        _replication_http.post(
             f"{endpoint}?{params}",
-            data=json.dumps(body).encode('utf-8'),
+            body=json.dumps(body).encode('utf-8'),
             headers=_supabase_headers(cfg, key_name='write_key', for_write=True),
-            method='POST'
-        )
-        with urllib.request.urlopen(req, timeout=timeout_sec):
-            pass
+            timeout=timeout_sec,
+        ).raise_for_status()
         if stamp:
             with _supabase_push_lock:
                 _supabase_last_pushed_stamp = stamp
         return True
     except Exception as exc:
-        current_app.logger.warning('Supabase push snapshot exception: %s', exc)
+        # Usually runs on a daemon thread with no app context.
+        _ledger_log.warning('Supabase push snapshot exception: %s', exc)
         return False
 
 
@@ -2156,20 +2375,18 @@ def _gist_fetch_snapshot(timeout_sec=15):
     if cfg['token']:
         headers['Authorization'] = f"token {cfg['token']}"
     try:
-        req = urllib.request.Request(
+        resp = _replication_http.get(
             f"https://api.github.com/gists/{cfg['gist_id']}",
-            headers=headers, method='GET'
-        )
-        with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-            meta = json.loads(resp.read().decode('utf-8', errors='replace'))
+            headers=headers, timeout=timeout_sec,
+        ).raise_for_status()
+        meta = json.loads(resp.content.decode('utf-8', errors='replace'))
         file_info = (meta.get('files') or {}).get(cfg['filename'], {})
         # Large files are truncated in the API response; follow raw_url instead.
         raw_url = file_info.get('raw_url', '')
         content = None
         if raw_url:
-            req2 = urllib.request.Request(raw_url, headers=headers, method='GET')
-            with urllib.request.urlopen(req2, timeout=timeout_sec) as r2:
-                content = r2.read().decode('utf-8', errors='replace')
+            r2 = _replication_http.get(raw_url, headers=headers, timeout=timeout_sec).raise_for_status()
+            content = r2.content.decode('utf-8', errors='replace')
         else:
             content = file_info.get('content') or ''
         if content:
@@ -2202,19 +2419,19 @@ def _gist_push_snapshot(payload, reason='snapshot_save', timeout_sec=20):
         'User-Agent': 'EA-Scoreboard/1.0',
     }
     try:
-        req = urllib.request.Request(
+        _replication_http.request(
+            'PATCH',
             f"https://api.github.com/gists/{cfg['gist_id']}",
-            data=body, headers=headers, method='PATCH'
-        )
-        with urllib.request.urlopen(req, timeout=timeout_sec):
-            pass
+            body=body, headers=headers, timeout=timeout_sec,
+        ).raise_for_status()
         if stamp:
             with _gist_push_lock:
                 _gist_last_pushed_stamp = stamp
-        current_app.logger.info('Gist snapshot pushed (%s)', reason)
+        # Usually runs on a daemon thread with no app context.
+        _ledger_log.info('Gist snapshot pushed (%s)', reason)
         return True
     except Exception as exc:
-        current_app.logger.warning('Gist push snapshot exception: %s', exc)
+        _ledger_log.warning('Gist push snapshot exception: %s', exc)
         return False
 
 
@@ -2222,11 +2439,252 @@ def _gist_push_snapshot_async(payload, reason='snapshot_save'):
     cfg = _gist_config()
     if not cfg.get('enabled_write'):
         return
-    threading.Thread(
-        target=_gist_push_snapshot,
-        args=(payload, reason),
-        daemon=True
-    ).start()
+    _mirror_outbox().enqueue(_MIRROR_GIST, payload)
+
+
+# ── Mirror outbox ────────────────────────────────────────────────────────────
+# The Gist backup and the public-site git push are mirrors, not peers, but
+# they had the same problem: one thread per save, each holding a ledger and
+# racing the others. They get their own ReplicationOutbox, keyed by mirror
+# name instead of peer URL, so a burst of saves collapses into one push of
+# the newest ledger and a failing mirror backs off instead of being lost.
+_MIRROR_GIST = 'gist'
+_MIRROR_PUBLIC_SITE = 'public-site'
+_mirror_outbox_state = {'outbox': None, 'app': None}
+_mirror_outbox_lock = threading.Lock()
+
+
+def _push_ledger_mirror(mirror, payload):
+    """Outbox sender for mirrors: (ok, error)."""
+    if mirror == _MIRROR_GIST:
+        if _gist_push_snapshot(payload, reason='mirror_outbox'):
+            return True, ''
+        return False, 'gist push failed'
+    if mirror == _MIRROR_PUBLIC_SITE:
+        app_obj = _mirror_outbox_state['app']
+        if app_obj is None:
+            return False, 'no application to publish with'
+        # Publishing reads credentials from the database and logs through current_app.
+        with app_obj.app_context():
+            result = _publish_public_site_snapshot(dict(payload), push=True)
+        if result.get('status') in {'pushed', 'up_to_date'}:
+            return True, ''
+        return False, result.get('error') or result.get('status') or 'publish failed'
+    return False, f'unknown mirror {mirror}'
+
+
+def _mirror_outbox():
+    """
+    The process-wide outbox for Gist and public-site pushes, persisted next
+    to the ledger; like the replication outbox, one elected worker pushes.
+    """
+    path = os.path.join(get_storage_root(), 'mirror_outbox.json')
+    outbox = _mirror_outbox_state['outbox']
+    if outbox is not None and outbox.path == path:
+        return outbox
+    with _mirror_outbox_lock:
+        outbox = _mirror_outbox_state['outbox']
+        if outbox is None or outbox.path != path:
+            if outbox is not None:
+                outbox.close(timeout=0)
+            try:
+                max_delay = max(1.0, float(os.getenv('EA_REPLICATION_MAX_BACKOFF_SECONDS', '300') or 300))
+            except (TypeError, ValueError):
+                max_delay = 300.0
+            outbox = ReplicationOutbox(
+                path,
+                _push_ledger_mirror,
+                load=_cached_load_json_data,
+                max_delay=max_delay,
+                name='ea-mirror',
+                owner=lambda: _hold_process_role('mirror_outbox'),
+            )
+            _mirror_outbox_state['outbox'] = outbox
+        return outbox
+
+
+def _queue_public_site_push(payload):
+    """Queue a git push of the public site; False when this checkout cannot push."""
+    if not os.path.isdir(os.path.join(_project_root_path(), '.git')):
+        return False
+    if has_app_context():
+        _mirror_outbox_state['app'] = current_app._get_current_object()
+    _mirror_outbox().enqueue(_MIRROR_PUBLIC_SITE, payload)
+    return True
+
+
+def _close_mirror_outbox():
+    outbox = _mirror_outbox_state['outbox']
+    if outbox is not None:
+        outbox.close()
+
+
+atexit.register(_close_mirror_outbox)
+
+
+_ledger_digest_cache = {}
+_ledger_digest_cache_lock = threading.Lock()
+
+
+def _ledger_digest_shape():
+    return dict(_MONTH_CLIPPED_COLLECTIONS), _MONTH_KEYED_COLLECTIONS, _month_key_from_date_like
+
+
+def _ledger_digest_for(payload, external=False):
+    """Merkle digest of ``payload`` (see ledger_digest.py), memoized per saved revision."""
+    # The data cache hands out one shared dict per revision (see _load_offline_data).
+    key = (id(payload), payload.get('server_version'), payload.get('server_updated_at'))
+    with _ledger_digest_cache_lock:
+        cached = _ledger_digest_cache.get(bool(external))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    tree = _ledger_digest.build(payload, *_ledger_digest_shape(), external=external)
+    with _ledger_digest_cache_lock:
+        _ledger_digest_cache[bool(external)] = (key, tree)
+    return tree
+
+
+def _peer_sync_headers(shared_key):
+    return {
+        'X-EA-Replicated': '1',
+        'X-EA-Sync-Key': shared_key,
+    }
+
+
+def _fetch_peer_digest(peer, shared_key, external, root):
+    """The peer's /sync/digest reply, or None when the peer predates that endpoint."""
+    query = urllib.parse.urlencode({'scope': 'external' if external else 'full', 'root': root})
+    resp = _replication_http.get(
+        f'{peer}/scoreboard/sync/digest?{query}',
+        headers=_peer_sync_headers(shared_key),
+        timeout=55,
+    )
+    if resp.status == 404:
+        return None
+    reply = resp.raise_for_status().json({})
+    if not isinstance(reply, dict) or not reply.get('root'):
+        raise ValueError(f'Malformed digest reply from {peer}')
+    return reply
+
+
+def _fetch_peer_buckets(peer, shared_key, external, wanted, server_version=None):
+    """
+    Contents of the ``wanted`` buckets of ``peer``'s ledger at the
+    ``server_version`` its digest reported; None when the peer has saved
+    since (409), as those buckets would no longer match the digest.
+    """
+    want = ','.join(f'{key}:{bucket}' for key, buckets in sorted(wanted.items()) for bucket in buckets)
+    params = {'scope': 'external' if external else 'full', 'want': want}
+    if server_version:
+        params['server_version'] = server_version
+    resp = _replication_http.get(
+        f'{peer}/scoreboard/sync/buckets?{urllib.parse.urlencode(params)}',
+        headers=_peer_sync_headers(shared_key),
+        timeout=55,
+    )
+    if resp.status == 409:
+        return None
+    reply = resp.raise_for_status().json({})
+    buckets = reply.get('buckets') if isinstance(reply, dict) else None
+    if not isinstance(buckets, dict):
+        raise ValueError(f'Malformed bucket reply from {peer}')
+    return buckets
+
+
+# Validators from each peer's last full-ledger pull, keyed (purpose, peer).
+# The sync cycle also keeps the parsed ledger, so a since_version patch can
+# be applied to it and a 304/204 reuses it; stale-snapshot recovery keeps
+# only the validators, since "unchanged" already means nothing to recover.
+_peer_pull_state = {}
+_peer_pull_state_lock = threading.Lock()
+
+
+def _pull_peer_ledger(peer, timeout_sec, purpose, keep_data=False, conditional=True):
+    """
+    GET ``peer``'s full ledger as a replication client, revalidating the last
+    pull: If-None-Match with its ETag and, when the ledger itself was kept,
+    ?since_version= so the peer can answer 204 or a change-feed patch.
+    Returns (ledger, changed); ledger is the kept copy (or None) when the
+    peer reports no change. Raises OSError/ValueError on failure.
+    """
+    key = (purpose, peer)
+    with _peer_pull_state_lock:
+        state = dict(_peer_pull_state.get(key) or {}) if conditional else {}
+    headers = {'X-EA-Replicated': '1'}
+    shared_key = resolve_sync_shared_key()
+    if shared_key:
+        headers['X-EA-Sync-Key'] = shared_key
+    url = f'{peer}/scoreboard/offline-data'
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    base = state.get('data') if keep_data else None
+    if base is not None:
+        url += '?' + urllib.parse.urlencode({'since_version': state.get('version', 0)})
+    resp = _replication_http.get(url, headers=headers, timeout=timeout_sec)
+    if resp.status in (204, 304) and state:
+        return base, False
+    parsed = resp.raise_for_status().json({})
+    data = parsed.get('data') if isinstance(parsed, dict) else None
+    if not isinstance(data, dict):
+        raise ValueError(f'Peer {peer} returned no ledger')
+    etag = resp.headers.get('ETag') or None
+    if data.get('patch'):
+        if base is None or _parse_int_safe(data.get('since_version'), -1) != state.get('version') \
+                or data.get('sync_scope') or data.get('allowed_months'):
+            if not conditional:
+                raise ValueError(f'Peer {peer} returned a patch to an unconditional pull')
+            # Not a patch against the kept copy: fall back to a full pull.
+            return _pull_peer_ledger(peer, timeout_sec, purpose, keep_data, conditional=False)
+        ledger = _change_feed.apply_patch(base, data.get('changes') or {})
+        for field in ('server_version', 'server_updated_at', 'updated_at'):
+            if field in data:
+                ledger[field] = data[field]
+        etag = None
+    else:
+        # Hard safety: never accept a sanitized/month-clipped view (served to
+        # unauthenticated callers) as a peer's ledger — merging or persisting
+        # it would drop historical months and private collections.
+        if not is_full_ledger_snapshot(data):
+            raise ValueError(f'Peer {peer} returned a sanitized snapshot (key mismatch?)')
+        ledger = data
+    with _peer_pull_state_lock:
+        _peer_pull_state[key] = {
+            'etag': etag,
+            'version': _parse_int_safe(ledger.get('server_version'), 0),
+            'data': ledger if keep_data else None,
+        }
+    return ledger, True
+
+
+def _push_digest_buckets(peer, local_data, differing, remote_digest, external, shared_key):
+    """
+    Push only the buckets the digests disagree on, as a replication patch
+    chained from the origin version the peer reports. Returns False when the
+    peer's ledger is not on this node's chain (or the push fails), so the
+    caller falls back to a full snapshot.
+    """
+    applied = remote_digest.get('replica_origin') if isinstance(remote_digest.get('replica_origin'), dict) else {}
+    node = _replication_node_id()
+    since = _parse_int_safe(applied.get('version'), 0)
+    version = _parse_int_safe(local_data.get('server_version'), 0)
+    if not _replication_patches_enabled() or applied.get('node') != node or since <= 0 or version <= 0:
+        return False
+    shape = _ledger_digest_shape()
+    contents = _ledger_digest.extract(local_data, differing, *shape, external=external)
+    changes = _ledger_digest.patch_changes(local_data, contents, *shape)
+    for key in ('server_updated_at', 'updated_at'):
+        if key in local_data:
+            changes[key] = {'op': 'set', 'value': local_data[key]}
+    body = json.dumps({
+        'replication_patch': {'since_version': since, 'server_version': version, 'changes': changes},
+        'origin': {'node': node, 'version': version},
+        **_replication_base_flags(),
+    }).encode('utf-8')
+    status, _ = _post_replication_body(peer, body, shared_key)
+    if status is None or not 200 <= status < 300:
+        return False
+    _replication_outbox().mark_acked(peer, version)
+    return True
 
 
 def _do_peer_sync_cycle(app):
@@ -2243,67 +2701,92 @@ def _do_peer_sync_cycle(app):
 
         for peer in peers:
             try:
-                # ── Pull: fetch peer's current snapshot ─────────────────────
-                get_req = urllib.request.Request(
-                    f'{peer}/scoreboard/offline-data',
-                    method='GET',
-                    headers={
-                        'Cache-Control': 'no-store',
-                        'X-EA-Replicated': '1',
-                        'X-EA-Sync-Key': shared_key,
-                    }
-                )
-                with urllib.request.urlopen(get_req, timeout=55) as resp:
-                    peer_body = resp.read()
-                peer_parsed = json.loads(peer_body.decode('utf-8', errors='replace'))
-                peer_data = peer_parsed.get('data') if isinstance(peer_parsed, dict) else None
-                if not isinstance(peer_data, dict):
-                    continue
-                # Hard safety: never merge a sanitized/month-clipped view (served to
-                # unauthenticated callers) into a full local ledger — it would drop
-                # historical months and private collections.
-                if not is_full_ledger_snapshot(peer_data):
-                    app.logger.warning('[BgSync] Peer %s returned a sanitized snapshot (key mismatch?) — skipping.', peer)
-                    continue
+                is_master = str(os.getenv('EA_MASTER_MODE', '')).strip() == '1'
+                min_students = _min_safe_student_roster()
+
+                # ── Compare digests first; fetch only the differing buckets ──
+                external = not is_private_peer_url(peer)
+                local_digest = _ledger_digest_for(local_data, external)
+                remote_digest = _fetch_peer_digest(peer, shared_key, external, local_digest['root'])
+                differing = None
+                if remote_digest is None:
+                    try:
+                        peer_data, _ = _pull_peer_ledger(peer, 55, 'sync-cycle', keep_data=True)
+                    except ValueError as exc:
+                        _ledger_log.warning('[BgSync] %s — skipping.', exc)
+                        continue
+                    if peer_data is None:
+                        continue
+                else:
+                    if remote_digest.get('match'):
+                        continue
+                    differing = _ledger_digest.diff(local_digest, remote_digest)
+                    # Master never pulls; it only needs the peer's roster for the shrink guard.
+                    wanted = {k: v for k, v in differing.items() if k == 'students'} if is_master else differing
+                    contents = _fetch_peer_buckets(
+                        peer, shared_key, external, wanted, remote_digest.get('server_version')
+                    ) if wanted else {}
+                    if contents is None:
+                        _ledger_log.info('[BgSync] %s saved during the digest exchange — retrying next cycle.', peer)
+                        continue
+                    # Equal buckets are identical on both sides, so local data
+                    # with the peer's differing buckets swapped in stands in for
+                    # the peer's snapshot in the checks and merges below.
+                    peer_data = _ledger_digest.replace_buckets(local_data, contents, *_ledger_digest_shape())
+                    for key in ('server_updated_at', 'updated_at', 'server_hlc'):
+                        peer_data[key] = remote_digest.get(key) or ''
 
                 peer_stamp = _payload_sync_stamp(peer_data) or 0.0
                 peer_count = _student_count(peer_data)
 
-                is_master = str(os.getenv('EA_MASTER_MODE', '')).strip() == '1'
-                min_students = _min_safe_student_roster()
-
                 # Master is authoritative: never pull peer snapshots into master.
                 # This prevents stale/inflated peer data from overriding local canonical data.
                 if is_master:
                     if local_count >= min_students and not _is_suspicious_student_shrink(peer_data, local_data):
-                        # Push whenever snapshots differ by stamp/count.
-                        if (abs(local_stamp - peer_stamp) > 1) or (local_count != peer_count):
+                        if differing is None:
+                            # Peer without digests: push whenever snapshots differ by stamp/count.
+                            should_push = (abs(local_stamp - peer_stamp) > 1) or (local_count != peer_count)
+                        else:
+                            # Roots already differ (a match skipped the peer above).
+                            should_push = bool(differing)
+                        if should_push and differing and _push_digest_buckets(
+                            peer, local_data, differing, remote_digest, external, shared_key
+                        ):
+                            app.logger.info(
+                                "[BgSync] Master pushed %s differing collection(s) to %s (stamp=%s)",
+                                len(differing), peer, local_data.get('server_updated_at', '')
+                            )
+                        elif should_push:
                             body = json.dumps({
                                 'data': payload_for_external_replication(local_data),
                                 'authoritative_master_push': True,
                                 'force_replace': True
                             }).encode('utf-8')
-                            post_req = urllib.request.Request(
+                            _replication_http.post(
                                 f'{peer}/scoreboard/offline-data',
-                                data=body,
-                                method='POST',
+                                body=body,
                                 headers={
                                     'Content-Type': 'application/json',
                                     'X-EA-Replicated': '1',
                                     'X-EA-Sync-Key': shared_key,
-                                }
-                            )
-                            with urllib.request.urlopen(post_req, timeout=55):
-                                pass
+                                },
+                                timeout=55,
+                                compress=_replication_gzip_enabled(),
+                            ).raise_for_status()
                             app.logger.info(
                                 "[BgSync] Master pushed authoritative snapshot to %s (%s students, stamp=%s)",
                                 peer, local_count, local_data.get('server_updated_at', '')
                             )
                     continue
 
-                # ── Backup/slave mode: bidirectional with skew margin ───────
-                # Margin of 30 s avoids flip-flopping on tiny clock skew.
-                if peer_stamp > local_stamp + 30 and peer_count >= min_students:
+                # ── Backup/slave mode: bidirectional, newest ledger clock wins ──
+                peer_clock, local_clock = _payload_clock(peer_data), _payload_clock(local_data)
+                if peer_clock is not None and local_clock is not None:
+                    peer_newer, local_newer = peer_clock > local_clock, local_clock > peer_clock
+                else:
+                    # A peer without HLC stamps: a 30 s margin avoids flip-flopping on clock skew.
+                    peer_newer, local_newer = peer_stamp > local_stamp + 30, local_stamp > peer_stamp + 30
+                if peer_newer and peer_count >= min_students:
                     if not _is_suspicious_student_shrink(local_data, peer_data):
                         # CRITICAL FIX: Merge instead of overwrite to preserve locally-added students
                         merged = dict(local_data)
@@ -2338,9 +2821,10 @@ def _do_peer_sync_cycle(app):
                         # Update timestamp only if peer is genuinely newer
                         if peer_stamp > local_stamp:
                             merged['server_updated_at'] = peer_data.get('server_updated_at', local_data.get('server_updated_at'))
+                        merged['server_hlc'] = _hlc.latest(local_data.get('server_hlc'), peer_data.get('server_hlc'))
 
                         merged_count = _student_count(merged)
-                        _save_offline_data(merged)
+                        _save_offline_data(merged, durable=False)
                         _broadcast_sync_event(
                             merged.get('server_updated_at', ''),
                             source='bg-peer-pull'
@@ -2361,21 +2845,20 @@ def _do_peer_sync_cycle(app):
                             peer, local_count, peer_count, merged_count, merged.get('server_updated_at', '')
                         )
 
-                elif local_stamp > peer_stamp + 30 and local_count >= min_students:
+                elif local_newer and local_count >= min_students:
                     # Local is newer -> push to peer
                     body = json.dumps({'data': payload_for_external_replication(local_data)}).encode('utf-8')
-                    post_req = urllib.request.Request(
+                    _replication_http.post(
                         f'{peer}/scoreboard/offline-data',
-                        data=body,
-                        method='POST',
+                        body=body,
                         headers={
                             'Content-Type': 'application/json',
                             'X-EA-Replicated': '1',
                             'X-EA-Sync-Key': shared_key,
-                        }
-                    )
-                    with urllib.request.urlopen(post_req, timeout=55):
-                        pass
+                        },
+                        timeout=55,
+                        compress=_replication_gzip_enabled(),
+                    ).raise_for_status()
                     app.logger.info(
                         "[BgSync] Pushed local snapshot to %s (%s students, stamp=%s)",
                         peer, local_count, local_data.get('server_updated_at', '')
@@ -2420,24 +2903,231 @@ def start_peer_sync_background(app):
     app.logger.info("[BgSync] Background peer-sync thread started (interval=30s)")
 
 
-def _atomic_write_json(path, payload):
+def _atomic_write_json(path, payload, codec=None):
     # Use dir=target_dir so the temp file is on the same filesystem as the
     # target.  Without this, tempfile.mkstemp() uses /tmp which is a separate
     # mount on Render/Docker, causing os.replace() to raise:
     #   [Errno 18] Invalid cross-device link
     kwargs = {'separators': (',', ':')}
-    if os.path.abspath(os.fspath(path)) == os.path.abspath(_shared_data_path()):
-        kwargs['validator'] = _ensure_ledger_payload
-    _shared_atomic_write_json(path, payload, **kwargs)
+    is_ledger = os.path.abspath(os.fspath(path)) == os.path.abspath(_shared_data_path())
+    if not is_ledger:
+        _shared_atomic_write_json(path, payload, codec=codec, **kwargs)
+        return
+    kwargs['codec'] = _ledger_snapshot_codec()
+    with _LEDGER_WRITE_LOCK:
+        # A staged write-behind revision must land first, or it would overwrite this file.
+        _flush_staged_ledger()
+        _shared_atomic_write_json(path, _archive_locked_months(payload), validator=_ensure_ledger_payload, **kwargs)
+        # Recovery/seed/restore rewrites bypass _save_offline_data; tell the
+        # journal so it never replays older revisions on top of this file.
+        _note_ledger_snapshot_written(path, payload)
+        _note_live_snapshot_counts(path, payload)
+        try:
+            _ledger_store_write(payload, None)
+        except Exception:
+            # The next cache miss re-imports the file (its signature is unknown to the store).
+            _ledger_log.exception('Ledger store rewrite failed after snapshot write')
+        else:
+            _note_ledger_store_snapshot(path)
+        _publish_ledger_write()
+
+
+def _ledger_snapshot_codec():
+    """Format of the live snapshot file (EA_LEDGER_SNAPSHOT_CODEC=json|zlib, default json)."""
+    return _snapshot_codec.codec_from_env('EA_LEDGER_SNAPSHOT_CODEC', 'json')
+
+
+def _ledger_backup_codec():
+    """
+    Format of backups and restore points (EA_LEDGER_BACKUP_CODEC=json|zlib,
+    default json). Backups keep their *.json names, which scripts and the
+    restore steps in BACKUP_POLICY.md open as plain JSON.
+    """
+    return _snapshot_codec.codec_from_env('EA_LEDGER_BACKUP_CODEC', 'json')
+
+
+def _read_ledger_file(path):
+    """
+    Parse a ledger snapshot/backup in any snapshot_codec format, with archived
+    months attached; a backup-store manifest is reassembled from its chunks.
+    """
+    data = _snapshot_codec.read_file(path)
+    if _backup_store.is_manifest(data):
+        return _backup_store.materialize(data)
+    return _ledger_archive.attach(data)
+
+
+def _archive_locked_months_enabled():
+    # Opt-in: backups that copy only the live file (daily_backup.ps1,
+    # backup_offsite_sync.ps1) would otherwise lose the locked months.
+    flag = str(os.getenv('EA_LEDGER_ARCHIVE_LOCKED', '0') or '').strip().lower()
+    return flag in {'1', 'true', 'yes', 'on'}
+
+
+def _archive_locked_months(payload):
+    """On-disk form of a ledger: locked months' score rows moved to immutable archives."""
+    if not isinstance(payload, dict) or not _archive_locked_months_enabled():
+        return payload
+    try:
+        return _ledger_archive.split_locked_months(payload, _locked_month_keys(payload))
+    except Exception:
+        _ledger_log.exception('Locked-month archive failed; writing the full snapshot')
+        return payload
+
+
+# Archive pruning: per-file references are memoized by (mtime, size) since
+# backups are immutable, so only new files are parsed on later passes.
+_archive_prune_state = {'last': 0.0, 'running': False, 'refs': {}}
+_archive_prune_lock = threading.Lock()
+
+
+def _archive_prune_interval_seconds():
+    try:
+        return max(0.0, float(os.getenv('EA_LEDGER_ARCHIVE_PRUNE_HOURS', '24') or 24)) * 3600
+    except (TypeError, ValueError):
+        return 24 * 3600.0
+
+
+def _archive_reference_paths():
+    paths = [_offline_data_path()]
+    for directory in (_offline_backup_dir(), _offline_hourly_backup_dir(), _offline_startup_restore_dir()):
+        if not os.path.isdir(directory):
+            continue
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and not name.startswith('.'):
+                paths.append(path)
+    return paths
+
+
+def _collect_archive_references():
+    """Archive files named by the live snapshot, file backups, restore points and backup-store manifests."""
+    cache = _archive_prune_state['refs']
+    referenced, seen = set(), set()
+    for path in _archive_reference_paths():
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        sig = (st.st_mtime_ns, st.st_size)
+        seen.add(path)
+        cached = cache.get(path)
+        if cached is None or cached[0] != sig:
+            # Unreadable files raise: pruning must never run on partial knowledge.
+            cached = (sig, _ledger_archive.referenced_files(_snapshot_codec.read_file(path)))
+            cache[path] = cached
+        referenced |= cached[1]
+    for path in set(cache) - seen:
+        cache.pop(path, None)
+    if _backup_store.enabled():
+        for index in _backup_store.manifest_values(_ledger_archive.INDEX_KEY):
+            referenced |= _ledger_archive.referenced_files({_ledger_archive.INDEX_KEY: index})
+    return referenced
+
+
+def _prune_ledger_archives():
+    try:
+        removed = _ledger_archive.prune(_collect_archive_references())
+        if removed:
+            _ledger_log.info('Pruned %d unreferenced ledger archive file(s)', removed)
+    except Exception:
+        _ledger_log.exception('Ledger archive pruning skipped')
+    finally:
+        with _archive_prune_lock:
+            _archive_prune_state['running'] = False
+
+
+def _maybe_prune_ledger_archives():
+    """
+    Prune archives in the background at most once per
+    EA_LEDGER_ARCHIVE_PRUNE_HOURS (default 24). Only while archiving is on:
+    copies taken before it was switched off may still refer to the files.
+    """
+    if not _archive_locked_months_enabled():
+        return
+    now = time.monotonic()
+    with _archive_prune_lock:
+        state = _archive_prune_state
+        if state['running'] or (state['last'] and now - state['last'] < _archive_prune_interval_seconds()):
+            return
+        if not os.path.isdir(_ledger_archive.archive_dir()):
+            return
+        state['running'] = True
+        state['last'] = now
+    threading.Thread(target=_prune_ledger_archives, name='ledger-archive-prune', daemon=True).start()
+
+
+def _write_ledger_snapshot(path, payload):
+    """Full snapshot write used by the save path (journal bookkeeping is done by the caller)."""
+    _shared_atomic_write_json(path, _archive_locked_months(payload), separators=(',', ':'),
+                              validator=_ensure_ledger_payload, codec=_ledger_snapshot_codec())
+    _note_ledger_store_snapshot(path)
+    _note_live_snapshot_counts(path, payload)
+
+
+def _ledger_store_write(payload, journal_state):
+    """
+    Persist a revision into the backend store selected by EA_LEDGER_BACKEND
+    (SQLite rows or per-collection shards). With a journal diff only the
+    touched rows/shards are written; otherwise the whole payload is. Raises
+    on failure so the caller can fail the save.
+    """
+    store = _get_ledger_store()
+    if store is None or not isinstance(payload, dict):
+        return None
+    state = journal_state or {}
+    return store.apply_revision(
+        revision=_parse_int_safe(payload.get('server_version'), 0),
+        base_revision=state.get('base_revision'),
+        changes=state.get('changes'),
+        payload=payload,
+    )
+
+
+def _note_ledger_store_snapshot(path):
+    store = _get_ledger_store()
+    if store is None:
+        return
+    try:
+        store.note_snapshot_file(path)
+    except Exception:
+        _ledger_log.exception('Failed to record ledger snapshot in the backend store')
+
+
+def _note_live_snapshot_counts(path, payload):
+    """Let the backup catalog label copies of this snapshot with its counts."""
+    try:
+        _backup_catalog.note_live(path, payload)
+    except Exception:
+        _ledger_log.exception('Failed to record live snapshot counts in the backup catalog')
+
+
+def _note_ledger_snapshot_written(path, payload):
+    if _ledger_journal_mode() == 'off':
+        return
+    try:
+        from app.utils.ledger_repository import note_snapshot_written
+        revision = _parse_int_safe(payload.get('server_version'), 0) if isinstance(payload, dict) else 0
+        note_snapshot_written(path, revision)
+    except Exception:
+        _ledger_log.exception('Failed to register ledger snapshot with the journal')
 
 
 def _verify_backup_copy(source_path, backup_path):
-    """Verify a freshly copied backup has the same size as its source."""
+    """
+    Verify a freshly written backup against its source: same size for a plain
+    copy, same decoded length and a valid checksum for a compressed one.
+    """
     try:
-        if os.path.getsize(backup_path) == os.path.getsize(source_path):
+        source_size = os.path.getsize(source_path)
+        if os.path.getsize(backup_path) == source_size:
+            return True
+        with open(source_path, 'rb') as f:
+            source_framed = _snapshot_codec.is_framed(f.read(len(_snapshot_codec.MAGIC)))
+        if not source_framed and _snapshot_codec.verify_file(backup_path, source_size):
             return True
         _ledger_log.error(
-            'Backup verification failed (size mismatch): %s — removing bad copy', backup_path
+            'Backup verification failed (size/checksum mismatch): %s — removing bad copy', backup_path
         )
     except OSError:
         _ledger_log.exception('Backup verification failed for %s', backup_path)
@@ -2448,79 +3138,159 @@ def _verify_backup_copy(source_path, backup_path):
     return False
 
 
+_SHARD_SET_SUFFIX = '.shards'
+
+
+def _backup_entry_size(path):
+    if os.path.isdir(path):
+        from app.utils.ledger_shards import shard_set_size
+        return shard_set_size(path)
+    return os.path.getsize(path)
+
+
+def _remove_backup_entry(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+
+
+def _is_shard_set_dir(path):
+    return path.endswith(_SHARD_SET_SUFFIX) and os.path.isdir(path)
+
+
+def _link_shard_backup(backup_path):
+    """Hard-link the live shard set into ``backup_path`` (EA_LEDGER_BACKEND=sharded only)."""
+    if _ledger_backend() != 'sharded':
+        return False
+    from app.utils.ledger_shards import link_shard_set
+    return link_shard_set(backup_path) is not None
+
+
+def _copy_backup(source_path, backup_path):
+    """Copy a snapshot into the backup tree, compressed when EA_LEDGER_BACKUP_CODEC=zlib."""
+    if _ledger_backup_codec() == 'zlib':
+        _snapshot_codec.frame_file(source_path, backup_path)
+    else:
+        shutil.copy2(source_path, backup_path)
+    return _verify_backup_copy(source_path, backup_path)
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _catalog_backup(kind, backup_path, keep, payload=None, source=None):
+    """Record a new backup in the catalog and prune ``kind`` to ``keep`` (locked ones are kept)."""
+    if not os.path.exists(backup_path):
+        return  # failed verification removed it
+    counts = {}
+    if isinstance(payload, dict):
+        counts = {
+            'students': _student_count(payload),
+            'scores': len(payload.get('scores') or []),
+            'server_version': _parse_int_safe(payload.get('server_version'), 0),
+        }
+    sha256 = None if os.path.isdir(backup_path) else _file_sha256(backup_path)
+    _backup_catalog.record(kind, backup_path, sha256=sha256, source=source, **counts)
+    _backup_catalog.prune(kind, keep, _remove_backup_entry)
+
+
+def _sync_backup_catalog(kind):
+    directory = _offline_backup_dir() if kind == 'rolling' else _offline_hourly_backup_dir()
+    _backup_catalog.sync_directory(kind, directory, _locked_restore_ids())
+    return directory
+
+
 def _backup_offline_file(path, keep=50):
-    if not os.path.exists(path):
-        return
     # Skip per-save backup when an hourly backup for the current hour already
     # exists — the hourly backup provides the same safety net without the
     # overhead of shutil.copy2 + directory listing on every save.
     hour_key = datetime.now().strftime('%Y%m%d_%H')
     hourly_path = os.path.join(_offline_hourly_backup_dir(), f'offline_scoreboard_hourly_{hour_key}.json')
-    if os.path.exists(hourly_path):
+    if os.path.exists(hourly_path) or os.path.exists(hourly_path[:-5] + _SHARD_SET_SUFFIX):
+        return
+    if _backup_store.enabled() and _backup_store.has_backup('hourly', hour_key):
         return
     os.makedirs(_offline_backup_dir(), exist_ok=True)
+    backup_dir = _sync_backup_catalog('rolling')
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     backup_name = f'offline_scoreboard_{timestamp}.json'
-    backup_path = os.path.join(_offline_backup_dir(), backup_name)
-    shutil.copy2(path, backup_path)
-    _verify_backup_copy(path, backup_path)
-
-    backups = sorted(
-        [os.path.join(_offline_backup_dir(), f) for f in os.listdir(_offline_backup_dir()) if f.endswith('.json')],
-        key=os.path.getmtime,
-        reverse=True
-    )
-    for old in backups[keep:]:
-        try:
-            os.remove(old)
-        except Exception:
-            pass
+    backup_path = os.path.join(backup_dir, backup_name)
+    # Sharded ledger: the backup hard-links the live shard set instead.
+    shard_path = backup_path[:-5] + _SHARD_SET_SUFFIX
+    if _link_shard_backup(shard_path):
+        backup_path = shard_path
+    else:
+        if not os.path.exists(path):
+            return
+        _copy_backup(path, backup_path)
+    _catalog_backup('rolling', backup_path, keep, source=path)
 
 
-def _backup_offline_hourly_immutable(payload, keep=24 * 30):
+def _backup_offline_hourly_immutable(payload, keep=24 * 30, snapshot_current=True):
     """
     Create one immutable snapshot per hour (local server time).
     This is append-only per hour and protects against rapid accidental overwrites.
-    Uses shutil.copy2 from the just-written main file (22ms) instead of
-    _atomic_write_json (1.1s) since the main file is already atomically written.
+    Copies the just-written main file (compressing it, see _copy_backup)
+    instead of re-serializing the payload, since the main file is already
+    atomically written.
+    When the save was journal-only (snapshot_current=False) the main file lags
+    the payload, so the payload is serialized instead. With the sharded
+    backend the live shard set is always current and is hard-linked.
+
+    Otherwise, with the incremental backup store (EA_BACKUP_STORE, default
+    on), the payload is chunked into the store: only changed months are
+    written and restore points locked by an admin are never pruned.
     """
-    os.makedirs(_offline_hourly_backup_dir(), exist_ok=True)
     hour_key = datetime.now().strftime('%Y%m%d_%H')
+    if _ledger_backend() != 'sharded' and _backup_store.enabled() and isinstance(payload, dict):
+        if _backup_store.has_backup('hourly', hour_key):
+            return
+        _backup_store.write_backup('hourly', hour_key, payload, keep=keep, protected=_locked_restore_ids())
+        return
     backup_name = f'offline_scoreboard_hourly_{hour_key}.json'
     backup_path = os.path.join(_offline_hourly_backup_dir(), backup_name)
-    if not os.path.exists(backup_path):
-        main_path = _offline_data_path()
-        if os.path.exists(main_path):
-            shutil.copy2(main_path, backup_path)
-            _verify_backup_copy(main_path, backup_path)
-        else:
-            _atomic_write_json(backup_path, payload)
+    shard_path = backup_path[:-5] + _SHARD_SET_SUFFIX
+    if os.path.exists(backup_path) or os.path.exists(shard_path):
+        return
+    os.makedirs(_offline_hourly_backup_dir(), exist_ok=True)
+    _sync_backup_catalog('hourly')
+    main_path = _offline_data_path()
+    if _link_shard_backup(shard_path):
+        backup_path = shard_path  # unchanged shards are shared with earlier backups
+    elif snapshot_current and os.path.exists(main_path):
+        _copy_backup(main_path, backup_path)
+    else:
+        _atomic_write_json(backup_path, _archive_locked_months(payload), codec=_ledger_backup_codec())
+    _catalog_backup('hourly', backup_path, keep, payload=payload)
 
-    backups = sorted(
-        [os.path.join(_offline_hourly_backup_dir(), f) for f in os.listdir(_offline_hourly_backup_dir()) if f.endswith('.json')],
-        key=os.path.getmtime,
-        reverse=True
-    )
-    for old in backups[keep:]:
-        try:
-            os.remove(old)
-        except Exception:
-            pass
+
+def _locked_restore_ids():
+    meta = _load_restore_points_meta()
+    return {key for key, entry in meta.items() if isinstance(entry, dict) and entry.get('locked')}
 
 
 def _load_latest_offline_backup():
-    backup_dir = _offline_backup_dir()
-    if not os.path.isdir(backup_dir):
-        return None
-    backup_files = sorted(
-        [os.path.join(backup_dir, f) for f in os.listdir(backup_dir) if f.endswith('.json')],
-        key=os.path.getmtime,
-        reverse=True
-    )
-    for backup_path in backup_files:
+    entries = []
+    if os.path.isdir(_offline_backup_dir()):
+        _sync_backup_catalog('rolling')
+        entries = [entry['path'] for entry in _backup_catalog.entries('rolling')]
+    store_latest = _backup_store.latest_backup_path() if _backup_store.enabled() else None
+    if store_latest:
+        entries.append(store_latest)
+    for backup_path in entries:
         try:
-            with open(backup_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            if os.path.isdir(backup_path):
+                data = _load_json_file(backup_path)
+                if data is None:
+                    raise ValueError('incomplete shard set')
+                return data
+            return _read_ledger_file(backup_path)
         except Exception as exc:
             _ledger_log.warning('Skipping unreadable backup %s: %s', backup_path, exc)
             continue
@@ -2560,6 +3330,7 @@ def _load_offline_data():
     if os.path.exists(path):
         cached = _cached_load_json_data()
         if cached is not None and _student_count(cached) > 0:
+            _seed_ledger_clocks(cached)
             return cached
         # Cache returned None (read/parse failure) or snapshot is empty.
         # Fall through to recovery logic below.
@@ -2595,11 +3366,10 @@ def _load_offline_data():
         except Exception:
             return None
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            if _student_count(data) == 0:
-                raise ValueError('Empty offline snapshot')
-            return data
+        data = _read_ledger_file(path)
+        if _student_count(data) == 0:
+            raise ValueError('Empty offline snapshot')
+        return data
     except Exception:
         _ledger_log.exception('Offline ledger at %s is corrupted/empty — attempting recovery', path)
         data = _load_latest_offline_backup()
@@ -2672,10 +3442,14 @@ def _ledger_journal_context(next_version):
     source = 'server'
     if has_request_context():
         source = str(request.endpoint or 'request').strip()[:80] or 'request'
-        try:
-            body = request.get_json(silent=True) or {}
-        except Exception:
-            body = {}
+        # A compressed replication body was already inflated by
+        # _request_json_payload; get_json() cannot decode it.
+        body = getattr(g, 'ea_request_json', None)
+        if body is None:
+            try:
+                body = request.get_json(silent=True) or {}
+            except Exception:
+                body = {}
         if isinstance(body, dict):
             op_id = str(body.get('op_id') or '').strip()
             base_version = _parse_int_safe(body.get('base_version'), 0)
@@ -2696,38 +3470,185 @@ def _ledger_journal_context(next_version):
     }
 
 
-def _save_offline_data(payload):
+def _ledger_group_commit_enabled():
+    flag = str(os.getenv('EA_LEDGER_GROUP_COMMIT', '1') or '').strip().lower()
+    return flag not in {'0', 'false', 'no', 'off'}
+
+
+def _ledger_durable_timeout():
+    try:
+        return max(1.0, float(os.getenv('EA_LEDGER_DURABLE_TIMEOUT_SECONDS', '30') or 30))
+    except (TypeError, ValueError):
+        return 30.0
+
+
+_ledger_group_writer_state = {'writer': None}
+_ledger_group_writer_lock = threading.Lock()
+
+
+def _ledger_group_writer():
+    """The process-wide write-behind writer, or None when group commit is off."""
+    if not _ledger_group_commit_enabled():
+        return None
+    writer = _ledger_group_writer_state['writer']
+    if writer is not None:
+        return writer
+    with _ledger_group_writer_lock:
+        writer = _ledger_group_writer_state['writer']
+        if writer is None:
+            try:
+                window_ms = float(os.getenv('EA_LEDGER_GROUP_COMMIT_WINDOW_MS', '0') or 0)
+            except (TypeError, ValueError):
+                window_ms = 0.0
+            writer = GroupCommitWriter(
+                _persist_staged_batch,
+                lock=_LEDGER_WRITE_LOCK,
+                window_seconds=window_ms / 1000.0,
+            )
+            atexit.register(writer.close)
+            _ledger_group_writer_state['writer'] = writer
+        return writer
+
+
+def _staged_ledger_payload():
+    writer = _ledger_group_writer_state['writer']
+    return writer.pending_payload() if writer is not None else None
+
+
+def _flush_staged_ledger():
+    """Persist any write-behind revision now (before a direct snapshot rewrite)."""
+    writer = _ledger_group_writer_state['writer']
+    if writer is not None:
+        writer.flush()
+
+
+def _save_offline_data(payload, durable=True):
+    """
+    Save a full ledger as the next revision.
+
+    With group commit (EA_LEDGER_GROUP_COMMIT, on by default) the revision is
+    staged and published through the shared cache here, and the durable write
+    is left to the write-behind writer, which folds concurrent saves into one
+    batch. ``durable`` waits for that batch: guarded routes wait once after
+    releasing the ledger lock, callers already holding the lock persist
+    inline, and background callers that tolerate write-behind pass False.
+    """
+    writer = _ledger_group_writer()
+    held = _LEDGER_WRITE_LOCK._is_owned()
+    guarded = has_request_context() and bool(getattr(g, 'ea_ledger_guarded', False))
     with _LEDGER_WRITE_LOCK:
-        return _save_offline_data_locked(payload)
+        if writer is None or not isinstance(payload, dict) or not os.path.exists(_offline_data_path()):
+            if writer is not None:
+                writer.flush()
+            return _save_offline_data_locked(payload)
+        context = _stage_offline_revision(payload)
+        _prime_data_cache(payload)
+        ticket = writer.submit(payload, context)
+        if not durable:
+            return payload
+        if guarded:
+            g.ea_ledger_durable_ticket = ticket
+            return payload
+        if held:
+            writer.flush()
+            return payload
+    if not writer.wait_durable(ticket, timeout=_ledger_durable_timeout()):
+        raise LedgerWriteError(f'Timed out persisting ledger version {payload.get("server_version")}')
+    return payload
+
+
+_register_ledger_writer(_save_offline_data, staged=_staged_ledger_payload)
+
+
+def _stage_offline_revision(payload):
+    """
+    Bump the version and normalize ``payload`` in the caller's thread, and
+    capture what the journal needs from the request (op_id, actor) while it
+    is still available. Returns the context handed to the persist step.
+    """
+    if not isinstance(payload, dict):
+        return {}
+    # Never persist client-view markers into the canonical ledger. These mark
+    # sanitized/clipped GET responses; if a client merged one into its local
+    # data and pushed it back, replication peers would refuse the server
+    # snapshot forever (they treat these keys as "not a full ledger").
+    payload.pop('sync_scope', None)
+    payload.pop('allowed_months', None)
+    # Monotonic server-side version for optimistic sync checks.
+    # Read server_version from the shared cache directly instead of calling
+    # _load_offline_data() (which has recovery/seed fallback logic that's
+    # unnecessary here and adds overhead).
+    current = _cached_load_json_data() or {}
+    prev_ver = _parse_int_safe(current.get('server_version'), 0)
+    next_ver = max(prev_ver + 1, _parse_int_safe(payload.get('server_version'), 0) or 0)
+    payload['server_version'] = next_ver if next_ver > 0 else 1
+    if not payload.get('updated_at'):
+        payload['updated_at'] = payload.get('server_updated_at') or _server_now_iso()
+    _ensure_ledger_payload(payload)
+
+    # A copy-on-write view knows exactly which collections it touched.
+    is_view = isinstance(payload, LedgerView)
+    _stamp_ledger_clocks(payload, set(payload.changed_keys()) if is_view else None)
+    try:
+        app_obj = current_app._get_current_object() if has_app_context() else None
+    except Exception:
+        app_obj = None
+    return {
+        'version': payload['server_version'],
+        'journal': _ledger_journal_context(payload['server_version']) if _ledger_journal_mode() != 'off' else None,
+        'changed_keys': set(payload.changed_keys()) if is_view else None,
+        'changed_since': _parse_int_safe(payload.base_version, 0) if is_view else None,
+        'app': app_obj,
+    }
+
+
+def _combine_staged_contexts(contexts):
+    """
+    Merge the contexts of the revisions coalesced into one batch: the newest
+    journal context leads, earlier op_ids are recorded as coalesced, and the
+    change sets are unioned as long as each view was taken from the revision
+    staged right before it.
+    """
+    contexts = [c for c in contexts if c]
+    journals = [c['journal'] for c in contexts if c.get('journal')]
+    journal = dict(journals[-1]) if journals else None
+    if journal is not None:
+        journal['coalesced_op_ids'] = [j['op_id'] for j in journals[:-1]]
+    changed_keys, changed_since = None, None
+    if contexts and all(c.get('changed_keys') is not None for c in contexts):
+        changed_keys, changed_since = set(), contexts[0]['changed_since']
+        previous = changed_since
+        for c in contexts:
+            if c['changed_since'] != previous:
+                changed_keys = changed_since = None
+                break
+            changed_keys |= c['changed_keys']
+            previous = c['version']
+    return journal, changed_keys, changed_since
+
+
+def _persist_staged_batch(payload, contexts):
+    """GroupCommitWriter callback: persist one coalesced batch, inside an app context."""
+    app_obj = next((c.get('app') for c in reversed(contexts) if c and c.get('app') is not None), None)
+    if app_obj is None or has_app_context():
+        return _persist_offline_revision(payload, contexts)
+    with app_obj.app_context():
+        return _persist_offline_revision(payload, contexts)
 
 
 def _save_offline_data_locked(payload):
-    path = _offline_data_path()
-    if isinstance(payload, dict):
-        # Never persist client-view markers into the canonical ledger. These mark
-        # sanitized/clipped GET responses; if a client merged one into its local
-        # data and pushed it back, replication peers would refuse the server
-        # snapshot forever (they treat these keys as "not a full ledger").
-        payload.pop('sync_scope', None)
-        payload.pop('allowed_months', None)
-        # Monotonic server-side version for optimistic sync checks.
-        # Read server_version from the shared cache directly instead of calling
-        # _load_offline_data() (which has recovery/seed fallback logic that's
-        # unnecessary here and adds overhead).
-        current = _cached_load_json_data() or {}
-        prev_ver = _parse_int_safe(current.get('server_version'), 0)
-        next_ver = max(prev_ver + 1, _parse_int_safe(payload.get('server_version'), 0) or 0)
-        payload['server_version'] = next_ver if next_ver > 0 else 1
-        if not payload.get('updated_at'):
-            payload['updated_at'] = payload.get('server_updated_at') or _server_now_iso()
+    return _persist_offline_revision(payload, [_stage_offline_revision(payload)])
+
 
+def _persist_offline_revision(payload, contexts):
+    path = _offline_data_path()
     journal_mode = _ledger_journal_mode()
     journal_state = None
     journal_context = None
+    changed_keys = changed_since = None
     if isinstance(payload, dict):
-        _ensure_ledger_payload(payload)
-        if journal_mode != 'off':
-            journal_context = _ledger_journal_context(payload.get('server_version', 0))
+        journal_context, changed_keys, changed_since = _combine_staged_contexts(contexts)
+        if journal_context is not None:
             try:
                 from app.utils.ledger_repository import prepare_revision
                 journal_state = prepare_revision(
@@ -2738,6 +3659,9 @@ def _save_offline_data_locked(payload):
                     actor_login_id=journal_context['actor_login_id'],
                     actor_role=journal_context['actor_role'],
                     base_version=journal_context['base_version'],
+                    changed_keys=changed_keys,
+                    changed_since=changed_since,
+                    coalesced_op_ids=journal_context['coalesced_op_ids'],
                 )
                 if journal_state.get('duplicate'):
                     payload['server_version'] = journal_state['revision']
@@ -2747,24 +3671,43 @@ def _save_offline_data_locked(payload):
                     raise
                 _ledger_log.exception('Ledger journal prepare failed; continuing in shadow mode: %s', journal_error)
 
+    # With a prepared journal revision the full snapshot is only rewritten on
+    # compaction; in between, the appended revision record is the durable copy.
+    write_snapshot = journal_state is None or bool(journal_state.get('snapshot_due', True))
+    if write_snapshot:
+        try:
+            _backup_offline_file(path)
+        except Exception:
+            _ledger_log.exception('Pre-save backup failed for %s', path)
     try:
-        _backup_offline_file(path)
-    except Exception:
-        _ledger_log.exception('Pre-save backup failed for %s', path)
-    try:
-        _atomic_write_json(path, payload)
-    except Exception as save_error:
+        _ledger_store_write(payload, journal_state)
+    except Exception as store_error:
         if journal_state and journal_context:
             try:
                 from app.utils.ledger_repository import mark_revision_failed
                 mark_revision_failed(
                     revision=journal_state['revision'],
                     op_id=journal_context['op_id'],
-                    error=str(save_error),
+                    error=str(store_error),
                 )
             except Exception:
                 _ledger_log.exception('Failed to mark ledger journal revision as failed')
         raise
+    if write_snapshot:
+        try:
+            _write_ledger_snapshot(path, payload)
+        except Exception as save_error:
+            if journal_state and journal_context:
+                try:
+                    from app.utils.ledger_repository import mark_revision_failed
+                    mark_revision_failed(
+                        revision=journal_state['revision'],
+                        op_id=journal_context['op_id'],
+                        error=str(save_error),
+                    )
+                except Exception:
+                    _ledger_log.exception('Failed to mark ledger journal revision as failed')
+            raise
     if journal_state and journal_context:
         try:
             from app.utils.ledger_repository import mark_revision_committed
@@ -2772,25 +3715,67 @@ def _save_offline_data_locked(payload):
                 revision=journal_state['revision'],
                 op_id=journal_context['op_id'],
                 payload_sha256=journal_state['payload_sha256'],
+                snapshot_written=write_snapshot,
+                snapshot_path=path,
             )
         except Exception as journal_error:
             if journal_mode == 'strict':
                 raise
             _ledger_log.exception('Ledger journal commit failed in shadow mode: %s', journal_error)
+            if not write_snapshot:
+                # The revision is not durable anywhere yet — fall back to a full write.
+                _write_ledger_snapshot(path, payload)
+                write_snapshot = True
+                _note_ledger_snapshot_written(path, payload)
+    elif write_snapshot and isinstance(payload, dict):
+        _note_ledger_snapshot_written(path, payload)
+    _publish_ledger_write()
     # Prime the shared cache with the just-saved payload so the next read
     # (immediate refetch from frontend after save) is a cache hit.
     if isinstance(payload, dict):
         _prime_data_cache(payload)
+        _persist_month_totals(payload)
+        _record_change_feed(payload, journal_state, changed_keys, changed_since)
     else:
         _invalidate_data_cache()
     try:
-        _backup_offline_hourly_immutable(payload)
+        _backup_offline_hourly_immutable(payload, snapshot_current=write_snapshot)
     except Exception:
         _ledger_log.exception('Hourly immutable backup failed for %s', path)
+    _maybe_prune_ledger_archives()
     _gist_push_snapshot_async(payload, reason='save_offline_data')
     return payload
 
 
+_month_totals_saved = {'version': None}
+
+
+def _persist_month_totals(data):
+    """Write the month totals of ``data`` next to the ledger unless that version is already saved."""
+    table = _month_totals_for(data, build=False)
+    if table is None or table.version == _month_totals_saved['version']:
+        return
+    try:
+        _month_totals.save(_month_totals_path(), table)
+        _month_totals_saved['version'] = table.version
+    except Exception:
+        _ledger_log.exception('Failed to persist month totals')
+
+
+def _record_change_feed(payload, journal_state, changed_keys, changed_since):
+    """Add the saved revision to the change feed behind GET /offline-data?since_version=."""
+    try:
+        _change_feed.record(
+            payload,
+            fingerprints=(journal_state or {}).get('fingerprints'),
+            changed_keys=changed_keys,
+            changed_since=changed_since,
+        )
+    except Exception:
+        _ledger_log.exception('Change feed record failed; resetting the feed')
+        _change_feed.reset()
+
+
 def _is_duplicate_sync_op(payload, op_id):
     if not isinstance(payload, dict):
         return False
@@ -2826,13 +3811,8 @@ def _record_sync_op(payload, op_id, actor=''):
 
 
 def _parse_sync_stamp(value):
-    if not value:
-        return 0.0
-    try:
-        text = str(value).strip().replace('Z', '+00:00')
-        return datetime.fromisoformat(text).timestamp()
-    except Exception:
-        return 0.0
+    # Memoized per stamp string (app.utils.helpers.parse_stamp).
+    return _helper_parse_stamp(value)
 
 
 def _get_last_history_stamp(row):
@@ -2851,6 +3831,217 @@ def _get_last_history_stamp(row):
     return max_stamp
 
 
+# ── Hybrid logical clocks ─────────────────────────────────────────────────
+# Rows of these collections carry an ``hlc`` stamp and the ledger a
+# ``server_hlc``; superset merges and the peer cycle order by them instead
+# of wall-clock updated_at. Stamps are assigned when a revision is staged,
+# by comparing each row with what the previous save recorded for it, so no
+# individual write route has to remember to mint one. Rows that are still
+# the object (and updated_at) the previous save staged are skipped without
+# being keyed, and rows nobody touched are never stamped: a missing stamp
+# orders by the row's wall-clock edit time (see _row_clock).
+_HLC_COLLECTIONS = ('scores', 'students', 'attendance')
+
+_hlc_state = {
+    'clock': None,
+    'rows': None,    # collection -> {'rows', 'marks', 'by_key'} as last staged
+    'ledger': None,  # (server_updated_at, server_hlc) as last staged
+}
+_hlc_lock = threading.Lock()
+
+
+def _ledger_clock():
+    clock = _hlc_state['clock']
+    if clock is None:
+        with _hlc_lock:
+            clock = _hlc_state['clock']
+            if clock is None:
+                clock = _hlc.HybridClock(_replication_node_id())
+                _hlc_state['clock'] = clock
+    return clock
+
+
+def _hlc_row_key(collection, row):
+    if not isinstance(row, dict):
+        return None
+    if collection == 'scores':
+        date_key = str(row.get('date') or '').strip()
+        if row.get('studentId') is None or not date_key:
+            return None
+        return str(row.get('studentId')), date_key, str(row.get('month') or '').strip() or date_key[:7]
+    if collection == 'students':
+        sid = _parse_int_safe(row.get('id'), 0)
+        return f'id:{sid}' if sid > 0 else (_normalize_roll_value(row.get('roll')) or None)
+    date_key = str(row.get('date') or '').strip()
+    identity = _normalize_roll_value(row.get('roll')) or str(row.get('studentId') or '').strip()
+    return (date_key, identity) if date_key and identity else None
+
+
+def _legacy_row_hlc(row):
+    """Stand-in stamp for a row written before HLCs: its last recorded edit time."""
+    if not isinstance(row, dict):
+        return ''
+    stamp = _get_last_history_stamp(row) or _parse_sync_stamp(row.get('updated_at') or row.get('created_at') or '')
+    return _hlc.legacy(stamp)
+
+
+def _row_clock(row):
+    """
+    Merge order of a row: its HLC stamp, or the legacy stand-in when it has
+    none or carries one too far ahead of this node's clock to be trusted.
+    """
+    if not isinstance(row, dict):
+        return 0, ''
+    stamp = row.get('hlc')
+    if stamp and _ledger_clock().admits(stamp):
+        return _hlc.key(stamp)
+    return _hlc.key(_legacy_row_hlc(row))
+
+
+def _payload_clock(payload):
+    """HLC sort key of a whole ledger, or None for a ledger without a (trustworthy) stamp."""
+    stamp = payload.get('server_hlc') if isinstance(payload, dict) else None
+    return _hlc.key(stamp) if stamp and _ledger_clock().admits(stamp) else None
+
+
+def _strip_row_clocks(payload):
+    """
+    Drop row stamps from a client push. Browsers edit rows without minting a
+    stamp, so a stale ``hlc`` would make their edit lose every merge; rows
+    without one are ordered by updated_at and stamped when the save stages.
+    """
+    if not isinstance(payload, dict):
+        return
+    payload.pop('server_hlc', None)
+    for collection in _HLC_COLLECTIONS:
+        rows = payload.get(collection)
+        if isinstance(rows, list):
+            for row in rows:
+                if isinstance(row, dict):
+                    row.pop('hlc', None)
+
+
+def _row_clock_marks(collection, rows):
+    """Memo entry for a staged collection: its rows, their (updated_at, hlc), and stamps by row key."""
+    marks, by_key = [], {}
+    for row in rows:
+        if not isinstance(row, dict):
+            marks.append(None)
+            continue
+        marks.append((row.get('updated_at'), row.get('hlc')))
+        row_key = _hlc_row_key(collection, row)
+        if row_key is not None:
+            by_key[row_key] = (str(row.get('updated_at') or ''), row.get('hlc') or '')
+    return {'rows': list(rows), 'marks': marks, 'by_key': by_key}
+
+
+def _stamp_ledger_clocks(payload, changed_keys=None):
+    """
+    Assign HLC stamps to the rows of a revision being staged. Only
+    collections a copy-on-write view changed are looked at, and in them only
+    rows that are not the object the previous save staged at that position.
+    Such a row is compared with what was recorded for its key: a stamp not
+    recorded here came from a peer and is observed (one the clock rejects
+    is replaced, so it cannot outrank local edits); a moved updated_at or a
+    new row means the row changed here and gets a fresh stamp. Untouched
+    rows without a stamp keep none. ``server_hlc`` is renewed when
+    server_updated_at moves or a row was restamped, and kept when a newer
+    one arrived with merged peer data.
+    """
+    clock = _ledger_clock()
+    memo = _hlc_state['rows']
+    seeded = memo is not None
+    rows_memo = dict(memo or {})
+    restamped = False
+    for collection in _HLC_COLLECTIONS:
+        rows = payload.get(collection)
+        # A copy-on-write view only owns the collections it changed.
+        if not isinstance(rows, list) or (changed_keys is not None and collection not in changed_keys):
+            continue
+        previous = rows_memo.get(collection)
+        if previous is None:
+            prev_rows, prev_marks, by_key = (), (), {}
+        else:
+            # Staging is serialized by the write lock; the key map is updated in place.
+            prev_rows, prev_marks, by_key = previous['rows'], previous['marks'], previous['by_key']
+        marks = []
+        owned = changed_keys is not None
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                marks.append(None)
+                continue
+            mark = (row.get('updated_at'), row.get('hlc'))
+            if index < len(prev_rows) and row is prev_rows[index] and mark == prev_marks[index]:
+                marks.append(mark)
+                continue
+            row_key = _hlc_row_key(collection, row)
+            if row_key is None:
+                marks.append(mark)
+                continue
+            stamp = mark[1] or ''
+            updated_at = str(mark[0] or '')
+            known = by_key.get(row_key)
+            new_stamp = ''
+            if stamp and (known is None or stamp != known[1]):
+                # Not the stamp recorded here: the row arrived from a peer.
+                changed_here = not clock.observe(stamp)
+            elif known is not None:
+                changed_here = updated_at != known[0]
+                if not changed_here and not stamp and known[1]:
+                    new_stamp = known[1]  # a client push dropped it; the row itself is unchanged
+            else:
+                # A new row; before the loaded ledger was seeded nothing is known to be new.
+                changed_here = seeded
+            if changed_here:
+                new_stamp = _server_now_hlc()
+                restamped = True
+            if new_stamp:
+                if not owned:
+                    # A plain dict may share this list with the committed revision,
+                    # whose objects the journal treats as unchanged: copy it first.
+                    rows = payload[collection] = list(rows)
+                    owned = True
+                # Rows may be shared with the cached revision: replace, don't edit.
+                rows[index] = row = dict(row, hlc=new_stamp)
+                stamp = new_stamp
+                mark = (row.get('updated_at'), new_stamp)
+            by_key[row_key] = (updated_at, stamp)
+            marks.append(mark)
+        rows_memo[collection] = {'rows': list(rows), 'marks': marks, 'by_key': by_key}
+
+    prev_updated, prev_stamp = _hlc_state['ledger'] or ('', '')
+    incoming = payload.get('server_hlc') or ''
+    updated = str(payload.get('server_updated_at') or '')
+    if restamped:
+        payload['server_hlc'] = _server_now_hlc()
+    elif incoming and _hlc.key(incoming) > _hlc.key(prev_stamp) and clock.observe(incoming):
+        pass  # Carried in with data merged from a peer.
+    elif prev_stamp and updated == prev_updated:
+        payload['server_hlc'] = prev_stamp
+    else:
+        payload['server_hlc'] = _server_now_hlc()
+    with _hlc_lock:
+        _hlc_state['rows'] = rows_memo
+        _hlc_state['ledger'] = (updated, payload['server_hlc'])
+
+
+def _seed_ledger_clocks(payload):
+    """Record the loaded ledger's stamps so the first save of a process can tell what it changed."""
+    if _hlc_state['rows'] is not None or not isinstance(payload, dict):
+        return
+    rows_memo = {}
+    for collection in _HLC_COLLECTIONS:
+        rows = payload.get(collection)
+        rows_memo[collection] = _row_clock_marks(collection, rows if isinstance(rows, list) else [])
+    stamp = payload.get('server_hlc') or ''
+    if stamp:
+        _ledger_clock().observe(stamp)
+    with _hlc_lock:
+        if _hlc_state['rows'] is None:
+            _hlc_state['rows'] = rows_memo
+            _hlc_state['ledger'] = (str(payload.get('server_updated_at') or ''), stamp)
+
+
 def _payload_sync_stamp(payload):
     if not isinstance(payload, dict):
         return 0.0
@@ -2916,9 +4107,12 @@ def _is_tiny_roster(payload, min_count=25):
 def _load_json_file(path):
     if not path or not os.path.exists(path):
         return None
+    if os.path.isdir(path):
+        # Shard-set backup directory (EA_LEDGER_BACKEND=sharded).
+        from app.utils.ledger_shards import read_shard_set
+        return read_shard_set(path)
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = _read_ledger_file(path)
         return data if isinstance(data, dict) else None
     except Exception:
         return None
@@ -2985,7 +4179,10 @@ def _iter_offline_recovery_candidate_paths():
         os.path.join(storage_dir, 'offline_scoreboard_data.pre_*.json'),
         os.path.join(_offline_backup_dir(), '*.json'),
         os.path.join(_offline_hourly_backup_dir(), '*.json'),
+        os.path.join(_offline_backup_dir(), '*' + _SHARD_SET_SUFFIX),
+        os.path.join(_offline_hourly_backup_dir(), '*' + _SHARD_SET_SUFFIX),
         os.path.join(_offline_startup_restore_dir(), '*.json'),
+        os.path.join(_backup_store.store_dir(), 'manifests', '*', '*.json'),
         # Legacy instance-path snapshots (for migration/recovery only)
         os.path.join(legacy_instance_dir, 'offline_scoreboard_data.STABLE_BACKUP*.json'),
         os.path.join(legacy_instance_dir, 'offline_scoreboard_data.pre_*.json'),
@@ -2993,7 +4190,7 @@ def _iter_offline_recovery_candidate_paths():
     for pattern in patterns:
         try:
             for match in glob.glob(pattern):
-                if match and os.path.isfile(match):
+                if match and (os.path.isfile(match) or match.endswith(_SHARD_SET_SUFFIX)):
                     paths.add(match)
         except Exception:
             continue
@@ -3040,50 +4237,33 @@ def _best_local_snapshot(min_students=25, candidate_limit=80):
     return best, best_src
 
 
-def _fetch_peer_offline_payload(base_url, timeout_sec=2.5):
+def _fetch_peer_offline_payload(base_url, timeout_sec=2.5, revalidate=True):
+    """
+    Full ledger of a peer for recovery, or None. With ``revalidate`` a peer
+    whose ledger is unchanged since the last recovery pull answers 304 and
+    this returns None: that snapshot was already weighed against ours.
+    """
     if not base_url:
         return None
     peer = str(base_url).rstrip('/')
-    url = f'{peer}/scoreboard/offline-data'
     # Authenticate as a replication peer so the remote serves the FULL snapshot
     # (unauthenticated GETs now receive a sanitized public view — see
     # _sanitize_anonymous_snapshot — which must never be persisted as a backup).
-    headers = {'Cache-Control': 'no-store', 'X-EA-Replicated': '1'}
-    shared_key = resolve_sync_shared_key()
-    if shared_key:
-        headers['X-EA-Sync-Key'] = shared_key
-    req = urllib.request.Request(url, method='GET', headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-            body = resp.read()
-    except Exception:
-        return None
-    try:
-        if not body:
-            return None
-        parsed = json.loads(body.decode('utf-8', errors='replace'))
-    except Exception:
-        return None
-    if not isinstance(parsed, dict):
-        return None
-    data = parsed.get('data')
-    if not isinstance(data, dict):
-        return None
-    # Never accept sanitized/clipped payloads as recovery snapshots — they are
-    # month-filtered views, not the full ledger. Persisting one would destroy data.
-    if not is_full_ledger_snapshot(data):
+        data, changed = _pull_peer_ledger(peer, timeout_sec, 'recovery', conditional=revalidate)
+    except (OSError, ValueError):
         return None
-    return data
+    return data if changed else None
 
 
-def _best_peer_snapshot(min_students=25, timeout_sec=2.5):
+def _best_peer_snapshot(min_students=25, timeout_sec=2.5, revalidate=True):
     peers = get_sync_peers()
     best = None
     best_stamp = 0.0
     best_count = 0
     best_src = ''
     for peer in peers:
-        payload = _fetch_peer_offline_payload(peer, timeout_sec=timeout_sec)
+        payload = _fetch_peer_offline_payload(peer, timeout_sec=timeout_sec, revalidate=revalidate)
         if not payload:
             continue
         count = _student_count(payload)
@@ -3108,7 +4288,8 @@ def _recover_tiny_roster_if_needed(payload, min_students=25):
 
     # Use a longer timeout during startup/tiny-roster recovery so Render has enough
     # time to reach the local master before falling back to the seed.
-    recovered, src = _best_peer_snapshot(min_students=min_students, timeout_sec=20)
+    # No revalidation: a peer snapshot seen before may be the only healthy copy.
+    recovered, src = _best_peer_snapshot(min_students=min_students, timeout_sec=20, revalidate=False)
     if not recovered:
         recovered, src = _best_local_snapshot(min_students=min_students)
 
@@ -3245,18 +4426,22 @@ def _ensure_score_timestamps(payload):
 
     changed = False
     fallback = str(payload.get('server_updated_at') or payload.get('updated_at') or _server_now_iso()).strip() or _server_now_iso()
-    for row in scores:
+    for index, row in enumerate(scores):
         if not isinstance(row, dict):
             continue
         updated_at = str(row.get('updated_at') or '').strip()
         created_at = str(row.get('created_at') or '').strip()
+        if updated_at and created_at:
+            continue
+        # Rows may be shared with the cached ledger (locked-month window);
+        # backfill a copy instead of editing the shared row.
+        row = scores[index] = dict(row)
         if not updated_at:
             row['updated_at'] = created_at or fallback
             updated_at = str(row.get('updated_at') or '').strip()
-            changed = True
         if not created_at:
             row['created_at'] = updated_at or fallback
-            changed = True
+        changed = True
     return changed
 
 
@@ -3469,6 +4654,27 @@ def _reconcile_role_veto_monthly(data, month_key=None, date_key=None):
         student['role_veto_count'] = grant
 
 
+_VETO_SELECT_NOTE_RE = re.compile(r'^1V used to select (.+?) post for (.+)$', re.IGNORECASE)
+
+
+def _score_row_consumed_vetos(score):
+    """VETOs one score row consumes: its negative vetos delta, else display-only usage notes."""
+    v_val = _parse_int_safe(score.get('vetos'), 0)
+    if v_val < 0:
+        return abs(v_val)
+    notes = str(score.get('notes', '') or '')
+    if not notes:
+        return 0
+    display_only = 0
+    for part in notes.split('|'):
+        part = part.strip()
+        if part and _VETO_SELECT_NOTE_RE.match(part):
+            display_only += 1
+    if '[veto shield]' in notes.lower():
+        display_only += 1
+    return display_only
+
+
 def _get_student_month_consumed_vetos(data, student_id, month):
     sid = _parse_int_safe(student_id, 0)
     if sid <= 0 or not isinstance(data, dict):
@@ -3482,26 +4688,7 @@ def _get_student_month_consumed_vetos(data, student_id, month):
             continue
         if score.get('month') != month:
             continue
-        
-        # 1. Negative vetos delta in scores
-        v_val = _parse_int_safe(score.get('vetos'), 0)
-        if v_val < 0:
-            consumed += abs(v_val)
-            
-        # 2. Check notes for display-only veto usage
-        notes = str(score.get('notes', '') or '')
-        parts = [p.strip() for p in notes.split('|') if p.strip()]
-        display_only = 0
-        for part in parts:
-            if re.match(r'^1V used to select (.+?) post for (.+)$', part, re.IGNORECASE):
-                display_only += 1
-        if '[veto shield]' in notes.lower():
-            display_only += 1
-            
-        # Add display-only if it was not already accounted for by negative vetos field
-        if v_val >= 0:
-            consumed += display_only
-            
+        consumed += _score_row_consumed_vetos(score)
     return consumed
 
 
@@ -3509,37 +4696,64 @@ def _get_student_total_used_vetos_from_scores(data, student_id):
     sid = _parse_int_safe(student_id, 0)
     if sid <= 0 or not isinstance(data, dict):
         return 0
-    scores = data.get('scores', []) or []
+    index = _ledger_index_for(data)
+    scores = index.scores_for(sid) if index is not None else (data.get('scores', []) or [])
     consumed = 0
     for score in scores:
         if not isinstance(score, dict):
             continue
         if _parse_int_safe(score.get('studentId'), 0) != sid:
             continue
-        
-        # 1. Negative vetos delta in scores
-        v_val = _parse_int_safe(score.get('vetos'), 0)
-        if v_val < 0:
-            consumed += abs(v_val)
-            
-        # 2. Check notes for display-only veto usage
-        notes = str(score.get('notes', '') or '')
-        parts = [p.strip() for p in notes.split('|') if p.strip()]
-        display_only = 0
-        for part in parts:
-            if re.match(r'^1V used to select (.+?) post for (.+)$', part, re.IGNORECASE):
-                display_only += 1
-        if '[veto shield]' in notes.lower():
-            display_only += 1
-            
-        # Add display-only if it was not already accounted for by negative vetos field
-        if v_val >= 0:
-            consumed += display_only
-            
+        consumed += _score_row_consumed_vetos(score)
     return consumed
 
 
-def _compute_veto_remaining_counters(data, sid, ind_alloc, role_alloc, month_key):
+# One-pass VETO usage for the reconcile loops, which used to rescan every
+# score row once per tracked roll. Keyed like LedgerIndex.matches: ledger
+# version plus identity, length and end rows of the scores list.
+_veto_usage_cache = {'key': None, 'scores': None, 'usage': None}
+_veto_usage_lock = threading.Lock()
+
+
+def _veto_usage_cache_key(data, scores):
+    ends = (id(scores[0]), id(scores[-1])) if scores else None
+    return data.get('server_version'), id(scores), len(scores), ends
+
+
+def _veto_usage_from_scores(data):
+    """
+    (used_by_student, used_by_student_month) from a single pass over data['scores'].
+    Per-month usage is keyed (studentId, row month) exactly as
+    _get_student_month_consumed_vetos matches it. Callers must not mutate the dicts.
+    """
+    scores = data.get('scores') if isinstance(data, dict) else None
+    if not isinstance(scores, list):
+        return {}, {}
+    key = _veto_usage_cache_key(data, scores)
+    with _veto_usage_lock:
+        if _veto_usage_cache['scores'] is scores and _veto_usage_cache['key'] == key:
+            return _veto_usage_cache['usage']
+    total, by_month = {}, {}
+    for score in scores:
+        if not isinstance(score, dict):
+            continue
+        sid = _parse_int_safe(score.get('studentId'), 0)
+        if sid <= 0:
+            continue
+        consumed = _score_row_consumed_vetos(score)
+        if not consumed:
+            continue
+        total[sid] = total.get(sid, 0) + consumed
+        month = score.get('month')
+        if isinstance(month, str):
+            by_month[(sid, month)] = by_month.get((sid, month), 0) + consumed
+    usage = (total, by_month)
+    with _veto_usage_lock:
+        _veto_usage_cache.update(key=key, scores=scores, usage=usage)
+    return usage
+
+
+def _compute_veto_remaining_counters(data, sid, ind_alloc, role_alloc, month_key, usage=None):
     """Compute live remaining counters for veto_count and role_veto_count.
 
     Individual VETOs are PERMANENT — usage from any month permanently reduces
@@ -3549,10 +4763,17 @@ def _compute_veto_remaining_counters(data, sid, ind_alloc, role_alloc, month_key
     Spend priority: individual first, then role (matches spendStudentVetoPower
     in the JS and adjustStudentVetoCount).
 
+    ``usage`` is a _veto_usage_from_scores result; without it this student's
+    rows are scanned.
+
     Returns (ind_remaining, role_remaining, total_used).
     """
-    total_used = _get_student_total_used_vetos_from_scores(data, sid) if sid else 0
-    month_used = _get_student_month_consumed_vetos(data, sid, month_key) if sid else 0
+    if usage is not None:
+        total_used = usage[0].get(sid, 0) if sid else 0
+        month_used = usage[1].get((sid, month_key), 0) if sid else 0
+    else:
+        total_used = _get_student_total_used_vetos_from_scores(data, sid) if sid else 0
+        month_used = _get_student_month_consumed_vetos(data, sid, month_key) if sid else 0
 
     # Individual VETOs: permanently deduct total usage (all months)
     ind_used_total = min(ind_alloc, total_used)
@@ -3678,9 +4899,10 @@ def _reconcile_veto_tracking_from_data(data):
 
     # 3. Update used_vetos and remaining_vetos from actual score entries
     roll_to_sid = {s.get('roll'): s.get('id') for s in data.get('students', []) if s.get('roll') and s.get('id')}
+    used_by_student = _veto_usage_from_scores(data)[0]
     for roll, s_data in students_map.items():
         sid = roll_to_sid.get(roll)
-        used_from_scores = _get_student_total_used_vetos_from_scores(data, sid) if sid else 0
+        used_from_scores = used_by_student.get(_parse_int_safe(sid, 0), 0) if sid else 0
         used_from_ledger = _parse_int_safe(s_data.get('used_vetos'), 0)
         
         total_used = max(used_from_ledger, used_from_scores)
@@ -3769,6 +4991,7 @@ def _reconcile_veto_counters_from_scores(data, month_key=None):
         s.get('roll'): _parse_int_safe(s.get('id'), 0)
         for s in students if s.get('roll') and _parse_int_safe(s.get('id'), 0) > 0
     }
+    usage = _veto_usage_from_scores(data)
     for student in students:
         roll = student.get('roll')
         if not roll or roll not in tracked:
@@ -3779,7 +5002,7 @@ def _reconcile_veto_counters_from_scores(data, month_key=None):
         ind_alloc = _parse_int_safe(entry.get('individual_vetos'), 0)
         role_alloc = _parse_int_safe(entry.get('role_vetos'), 0)
         ind_rem, role_rem, total_used = _compute_veto_remaining_counters(
-            data, sid, ind_alloc, role_alloc, month
+            data, sid, ind_alloc, role_alloc, month, usage=usage
         )
 
         old_vc = _parse_int_safe(student.get('veto_count'), 0)
@@ -3807,6 +5030,7 @@ def _compute_student_veto_balance(data, student_id, month_key):
 def _merge_teacher_scores(existing_data, incoming_data):
     """Merge teacher score payload safely across devices with different local IDs."""
     existing_scores = list(existing_data.get('scores', []) or [])
+    _month_totals.track(existing_scores)
     incoming_scores = incoming_data.get('scores', []) or []
     if not incoming_scores:
         return existing_scores
@@ -3909,13 +5133,16 @@ def _merge_teacher_scores(existing_data, incoming_data):
             existing_created = str(existing_score.get('created_at') or '').strip() if isinstance(existing_score, dict) else ''
             incoming_created = str(incoming.get('created_at') or '').strip()
             normalized_score['created_at'] = existing_created or incoming_created or normalized_score['updated_at']
+            previous_score = dict(existing_score)
             existing_score.update(normalized_score)
+            _month_totals.record(existing_scores, previous_score, existing_score)
         else:
             max_score_id += 1
             normalized_score['id'] = max_score_id
             normalized_score['created_at'] = str(incoming.get('created_at') or normalized_score['updated_at']).strip() or normalized_score['updated_at']
             score_index[index_key] = len(existing_scores)
             existing_scores.append(normalized_score)
+            _month_totals.record(existing_scores, None, normalized_score)
 
     return existing_scores
 
@@ -4181,10 +5408,6 @@ def _merge_month_roster_profiles_superset(existing_rp, incoming_rp):
     return merged
 
 
-def _clone_jsonish(value):
-    return json.loads(json.dumps(value))
-
-
 def _locked_month_keys(payload):
     if not isinstance(payload, dict):
         return set()
@@ -4224,10 +5447,13 @@ def _preserve_locked_historical_window(existing_payload, incoming_payload):
 
     existing_frozen = existing.get('frozen_months', {}) if isinstance(existing.get('frozen_months'), dict) else {}
     incoming_frozen = incoming.get('frozen_months', {}) if isinstance(incoming.get('frozen_months'), dict) else {}
+    # Values taken from ``existing`` (the shared cached ledger) are referenced,
+    # not cloned: the merged payload only ever replaces them, and the save
+    # primes the cache with it. Callers that must edit one in place copy first.
     merged_frozen = dict(incoming_frozen)
     for month in locked_months:
         if month in existing_frozen:
-            merged_frozen[month] = _clone_jsonish(existing_frozen[month])
+            merged_frozen[month] = existing_frozen[month]
     incoming['frozen_months'] = merged_frozen
 
     month_scoped_keys = [
@@ -4243,7 +5469,7 @@ def _preserve_locked_historical_window(existing_payload, incoming_payload):
         merged_map = dict(incoming_map)
         for month in locked_months:
             if month in existing_map:
-                merged_map[month] = _clone_jsonish(existing_map[month])
+                merged_map[month] = existing_map[month]
         incoming[key] = merged_map
 
     existing_scores = existing.get('scores', []) if isinstance(existing.get('scores'), list) else []
@@ -4252,7 +5478,7 @@ def _preserve_locked_historical_window(existing_payload, incoming_payload):
     for row in existing_scores:
         month_key = str(row.get('month') or str(row.get('date') or '')[:7]).strip()
         if month_key in locked_months:
-            preserved_scores.append(_clone_jsonish(row))
+            preserved_scores.append(row)
     live_scores = []
     for row in incoming_scores:
         month_key = str(row.get('month') or str(row.get('date') or '')[:7]).strip()
@@ -4404,8 +5630,8 @@ def _merge_students_preserve_active(existing_students, incoming_students):
         return normalized
 
     def _merge_pair(existing, incoming):
-        existing_stamp = _parse_sync_stamp(existing.get('updated_at') or existing.get('created_at') or '')
-        incoming_stamp = _parse_sync_stamp(incoming.get('updated_at') or incoming.get('created_at') or '')
+        existing_stamp = _row_clock(existing)
+        incoming_stamp = _row_clock(incoming)
         if incoming_stamp > existing_stamp:
             merged_s = {**existing, **incoming}
         elif incoming_stamp < existing_stamp:
@@ -4613,10 +5839,16 @@ def _merge_scores_superset(existing_scores, incoming_scores):
         key = (str(sid), date_key, month_key)
         return key, normalized
 
+    base_rows = {}
+    dropped = []
     for score in existing_scores or []:
         key, normalized = _normalize_score(score)
         if key is None:
+            dropped.append(score)
             continue
+        if key in base_rows:
+            dropped.append(base_rows[key])
+        base_rows[key] = score
         merged[key] = normalized
         max_score_id = max(max_score_id, _parse_int_safe(normalized.get('id')))
 
@@ -4626,28 +5858,16 @@ def _merge_scores_superset(existing_scores, incoming_scores):
             continue
         if key in merged:
             prev = merged[key]
-            prev_points = _parse_float_safe(prev.get('points'))
-            prev_stars = _parse_int_safe(prev.get('stars'))
-            prev_vetos = _parse_int_safe(prev.get('vetos'))
-            
-            # History-aware merge: updated_at can be bumped by sync operations,
-            # but history entries record actual user edits. If prev has a more
-            # recent history entry than incoming, prev is more authoritative.
-            prev_hist_stamp = _get_last_history_stamp(prev)
-            next_hist_stamp = _get_last_history_stamp(normalized)
-            
-            # Perform standard timestamp and ID tiebreaker updates
-            prev_stamp = _parse_sync_stamp(prev.get('updated_at', ''))
-            next_stamp = _parse_sync_stamp(normalized.get('updated_at', ''))
-            if next_stamp > prev_stamp:
-                if prev_hist_stamp > next_hist_stamp:
-                    pass  # Local has a more recent user edit — keep prev
-                else:
-                    merged[key] = normalized
-            elif next_stamp == prev_stamp and _parse_int_safe(normalized.get('id')) > _parse_int_safe(prev.get('id')):
-                # Same age (or both missing updated_at): keep the higher-id record as tiebreaker.
+            # HLC order: a sync that merely re-saves a row keeps its stamp, so
+            # only genuine edits move it (see _stamp_ledger_clocks).
+            prev_clock = _row_clock(prev)
+            next_clock = _row_clock(normalized)
+            if next_clock > prev_clock:
                 merged[key] = normalized
-            # else prev is same age or newer — keep it
+            elif next_clock == prev_clock and _parse_int_safe(normalized.get('id')) > _parse_int_safe(prev.get('id')):
+                # Same stamp (or both unstamped and undated): keep the higher-id record as tiebreaker.
+                merged[key] = normalized
+            # else prev is newer — keep it
         else:
             merged[key] = normalized
         max_score_id = max(max_score_id, _parse_int_safe(normalized.get('id')))
@@ -4658,9 +5878,23 @@ def _merge_scores_superset(existing_scores, incoming_scores):
             max_score_id += 1
             record['id'] = max_score_id
         result.append(record)
+    _track_superset_month_totals(result, existing_scores, base_rows, dropped, merged)
     return result
 
 
+def _track_superset_month_totals(result, existing_scores, base_rows, dropped, merged):
+    """Record the month-total delta from the existing score rows to a merged list."""
+    try:
+        _month_totals.track(result, existing_scores or [])
+        for raw in dropped:
+            _month_totals.record(result, raw, None)
+        for key, row in merged.items():
+            # Unchanged rows net to zero; only replaced and new rows move a total.
+            _month_totals.record(result, base_rows.get(key), row)
+    except Exception:
+        _ledger_log.exception('Month totals tracking failed; totals will be rebuilt on next read')
+
+
 def _merge_notification_history(existing_history, incoming_history):
     """Keep all notification history entries across sync peers."""
     merged = {}
@@ -4937,6 +6171,26 @@ def _is_month_allowed_for_user(data, user, month_key):
     return mk in allowed
 
 
+# Month-scoped collections clipped for teacher/student/anonymous views, with
+# the row fields (first non-empty wins) their month is read from.
+_MONTH_CLIPPED_COLLECTIONS = (
+    ('scores', ('month', 'date')),
+    ('attendance', ('month', 'date')),
+    ('appeals', ('score_month', 'score_date', 'created_at')),
+    ('resource_requests', ('month', 'request_date', 'created_at')),
+    ('resource_transactions', ('month', 'date', 'created_at')),
+)
+_MONTH_KEYED_COLLECTIONS = ('month_students', 'month_roster_profiles')
+
+
+def _row_month_allowed(row, fields, allowed):
+    if not isinstance(row, dict):
+        return False
+    value = next((row.get(f) for f in fields if row.get(f)), None)
+    mk = _month_key_from_date_like(value)
+    return bool(mk and mk in allowed)
+
+
 def _clip_payload_to_allowed_months(payload, allowed_months):
     if allowed_months is None or not isinstance(payload, dict):
         return payload
@@ -4944,53 +6198,68 @@ def _clip_payload_to_allowed_months(payload, allowed_months):
     allowed = {m for m in (allowed_months or set()) if _month_key_from_date_like(m)}
     data = dict(payload)
 
-    def _in_allowed(mk):
-        return bool(mk and mk in allowed)
-
-    data['scores'] = [
-        row for row in (payload.get('scores') or [])
-        if isinstance(row, dict) and _in_allowed(_month_key_from_date_like(row.get('month') or row.get('date')))
-    ]
-    data['attendance'] = [
-        row for row in (payload.get('attendance') or [])
-        if isinstance(row, dict) and _in_allowed(_month_key_from_date_like(row.get('month') or row.get('date')))
-    ]
-    data['appeals'] = [
-        row for row in (payload.get('appeals') or [])
-        if isinstance(row, dict) and _in_allowed(
-            _month_key_from_date_like(row.get('score_month') or row.get('score_date') or row.get('created_at'))
-        )
-    ]
-    data['resource_requests'] = [
-        row for row in (payload.get('resource_requests') or [])
-        if isinstance(row, dict) and _in_allowed(
-            _month_key_from_date_like(row.get('month') or row.get('request_date') or row.get('created_at'))
-        )
-    ]
-    data['resource_transactions'] = [
-        row for row in (payload.get('resource_transactions') or [])
-        if isinstance(row, dict) and _in_allowed(
-            _month_key_from_date_like(row.get('month') or row.get('date') or row.get('created_at'))
-        )
-    ]
+    for key, fields in _MONTH_CLIPPED_COLLECTIONS:
+        data[key] = [row for row in (payload.get(key) or []) if _row_month_allowed(row, fields, allowed)]
     # fee_records are per-student (not per-month), pass through unfiltered.
     data['fee_records'] = list(payload.get('fee_records') or [])
 
-    month_students = payload.get('month_students', {}) if isinstance(payload.get('month_students'), dict) else {}
-    month_profiles = payload.get('month_roster_profiles', {}) if isinstance(payload.get('month_roster_profiles'), dict) else {}
-    data['month_students'] = {
-        mk: rows for mk, rows in month_students.items()
-        if _month_key_from_date_like(mk) in allowed
-    }
-    data['month_roster_profiles'] = {
-        mk: rows for mk, rows in month_profiles.items()
-        if _month_key_from_date_like(mk) in allowed
-    }
-    data['allowed_months'] = sorted(list(allowed))
-    return data
+    for key in _MONTH_KEYED_COLLECTIONS:
+        by_month = payload.get(key) if isinstance(payload.get(key), dict) else {}
+        data[key] = {
+            mk: rows for mk, rows in by_month.items()
+            if _month_key_from_date_like(mk) in allowed
+        }
+    data['allowed_months'] = sorted(list(allowed))
+    return data
+
+
+def _offline_view_cache_key(version, size, scope, months, omit_archived):
+    """
+    Response-cache view key and ETag for a GET /offline-data caller.
+    The full view keeps the historical ``W/"<version>-<size>"`` tag that
+    peers and admin clients already send back; narrower views add a short
+    digest of their scope and month set so they never validate each other.
+    """
+    month_set = frozenset(months) if months is not None else None
+    view = (scope, month_set, bool(omit_archived))
+    if scope == 'full' and not omit_archived:
+        return view, f'W/"{version}-{size}"'
+    digest = hashlib.sha1(
+        '|'.join([scope, 'omit' if omit_archived else ''] + sorted(month_set or ())).encode('utf-8')
+    ).hexdigest()[:12]
+    return view, f'W/"{version}-{size}-{digest}"'
+
+
+_COMPRESSED_ETAG_SUFFIXES = (':gzip', ':br', ':deflate')
+
+
+def _etag_matches(if_none_match, etag):
+    """
+    Weak If-None-Match comparison (RFC 9110 §13.1.2) against ``etag``.
+    flask-compress rewrites a compressed response's tag to W/"...:gzip", and
+    clients echo that back, so the encoding suffix is ignored here.
+    """
+    if not if_none_match or not etag:
+        return False
+
+    def _opaque(tag):
+        tag = tag.strip()
+        if tag[:2] in ('W/', 'w/'):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        for suffix in _COMPRESSED_ETAG_SUFFIXES:
+            if tag.endswith(suffix):
+                return tag[:-len(suffix)]
+        return tag
+
+    target = _opaque(etag)
+    for candidate in if_none_match.split(','):
+        if candidate.strip() == '*' or _opaque(candidate) == target:
+            return True
+    return False
 
 
-def _sanitize_anonymous_snapshot(payload):
+def _sanitize_anonymous_snapshot(payload, months=None):
     """
     Public/display-safe view of the ledger for UNAUTHENTICATED GET /offline-data.
     Keeps the recent scoreboard months renderable (students, scores, parties,
@@ -4999,40 +6268,84 @@ def _sanitize_anonymous_snapshot(payload):
     fields. The payload is marked with sync_scope='anonymous-public' so peers
     and backup bootstraps refuse to persist it as a full snapshot.
     """
-    months = set(_recent_public_month_window())
+    months = set(months) if months is not None else set(_recent_public_month_window())
     data = _clip_payload_to_allowed_months(payload, months)
-    data['fee_records'] = []
-    data['appeals'] = []
-    data['resource_requests'] = []
-    data['resource_transactions'] = []
-    data['resource_advantage_deductions'] = []
+    for key in _ANONYMOUS_EMPTIED_KEYS:
+        data[key] = []
     data.pop('activity_log', None)
-    data['notification_history'] = []
-    data['proposals'] = []
-    data['proposal_votes'] = []
-    data['proposal_messages'] = []
-    data['score_adjustment_actions'] = []
-    data['_sync_ops'] = []
-    safe_students = []
-    for s in (data.get('students') or []):
-        if not isinstance(s, dict):
-            continue
-        s = dict(s)
-        s.pop('profile_data', None)
-        s.pop('remarks', None)
-        safe_students.append(s)
-    data['students'] = safe_students
+    data['students'] = [_public_student_row(s) for s in (data.get('students') or []) if isinstance(s, dict)]
     data['sync_scope'] = 'anonymous-public'
     return data
 
 
+_ANONYMOUS_EMPTIED_KEYS = (
+    'fee_records', 'appeals', 'resource_requests', 'resource_transactions',
+    'resource_advantage_deductions', 'notification_history', 'proposals',
+    'proposal_votes', 'proposal_messages', 'score_adjustment_actions', '_sync_ops',
+)
+
+
+def _public_student_row(student):
+    student = dict(student)
+    student.pop('profile_data', None)
+    student.pop('remarks', None)
+    return student
+
+
+def _scope_change_patch(changes, scope, months):
+    """
+    Narrow change-feed ops to what a caller of GET /offline-data may see,
+    mirroring the full-sync trimming and _clip_payload_to_allowed_months /
+    _sanitize_anonymous_snapshot. Upserted rows that fall outside the
+    caller's months become tombstones, so a row moved to another month
+    disappears from the client too.
+    """
+    allowed = {m for m in (months or ()) if _month_key_from_date_like(m)}
+    clipped = dict(_MONTH_CLIPPED_COLLECTIONS) if scope != 'full' else {}
+    out = {}
+    for key, op in changes.items():
+        if key in ('activity_log', '_sync_ops'):
+            continue
+        if scope == 'anon' and key in _ANONYMOUS_EMPTIED_KEYS:
+            continue
+        kind = op.get('op')
+        if key in clipped:
+            fields = clipped[key]
+            if kind == 'rows':
+                upsert, delete = [], list(op['delete'])
+                for row in op['upsert']:
+                    if _row_month_allowed(row, fields, allowed):
+                        upsert.append(row)
+                    else:
+                        delete.append(str(row.get('id')))
+                op = {'op': 'rows', 'upsert': upsert, 'delete': delete}
+            elif kind == 'set' and isinstance(op.get('value'), list):
+                op = {'op': 'set', 'value': [r for r in op['value'] if _row_month_allowed(r, fields, allowed)]}
+        elif scope != 'full' and key in _MONTH_KEYED_COLLECTIONS:
+            if kind in ('keys', 'set') and isinstance(op.get('set', op.get('value')), dict):
+                body = op.get('set', op.get('value'))
+                body = {mk: v for mk, v in body.items() if _month_key_from_date_like(mk) in allowed}
+                op = dict(op, set=body) if kind == 'keys' else {'op': 'set', 'value': body}
+        elif key in ('notification_history', 'proposal_messages') and kind == 'set' and isinstance(op.get('value'), list):
+            op = {'op': 'set', 'value': op['value'][-50:] if key == 'notification_history' else op['value'][-30:]}
+        if scope == 'anon' and key == 'students':
+            if kind == 'rows':
+                op = dict(op, upsert=[_public_student_row(r) for r in op['upsert']])
+            elif kind == 'set' and isinstance(op.get('value'), list):
+                op = {'op': 'set', 'value': [_public_student_row(r) for r in op['value'] if isinstance(r, dict)]}
+        out[key] = op
+    return out
+
+
 def _sum_points_for_student_month(snapshot, student_id, month_key):
     sid = _parse_int_safe(student_id, 0)
     if sid <= 0:
         return 0
     month = _month_key_from_date_like(month_key)
     total = 0
-    for row in snapshot.get('scores', []) or []:
+    index = _ledger_index_for(snapshot)
+    rows = index.scores_for(sid, month) if index is not None else (snapshot.get('scores', []) or [])
+    for row in rows:
         if not isinstance(row, dict):
             continue
         if _parse_int_safe(row.get('studentId'), 0) != sid:
@@ -5057,6 +6370,7 @@ def _upsert_score_delta(snapshot, student_id, date_key, month_key, delta_points=
     if not isinstance(scores, list):
         scores = []
         snapshot['scores'] = scores
+    _month_totals.track(scores)
 
     target = None
     best_stamp = 0.0
@@ -5077,6 +6391,7 @@ def _upsert_score_delta(snapshot, student_id, date_key, month_key, delta_points=
             best_stamp = stamp
 
     now_iso = _server_now_iso()
+    previous = dict(target) if target is not None else None
     if target is None:
         target = {
             'id': max_id + 1,
@@ -5098,6 +6413,7 @@ def _upsert_score_delta(snapshot, student_id, date_key, month_key, delta_points=
     if note:
         target['notes'] = f"{existing_note} | {note}" if existing_note else note
     target['updated_at'] = now_iso
+    _month_totals.record(scores, previous, target)
     # Propagate star-specific timestamp to the student ledger so the merge
     # strategy can distinguish a genuine star mutation from a sync-bumped
     # updated_at on a stale snapshot. Only touch the student record when stars
@@ -5434,9 +6750,7 @@ def _merge_attendance_superset(existing_data, incoming_data):
             if not prev:
                 merged[key] = normalized
                 continue
-            prev_stamp = _parse_sync_stamp(prev.get('updated_at') or prev.get('created_at'))
-            next_stamp = _parse_sync_stamp(normalized.get('updated_at') or normalized.get('created_at'))
-            if next_stamp >= prev_stamp:
+            if _row_clock(normalized) >= _row_clock(prev):
                 merged[key] = normalized
 
     # SAFEGUARD: Ensure all merged attendance records have timestamps for proper sync ordering
@@ -6704,6 +8018,50 @@ def get_student_balances():
     return resp
 
 
+@points_bp.route('/api/month-totals', methods=['GET'])
+@login_required
+def get_month_totals():
+    """Return per-student score totals for a month from the materialized month totals.
+
+    Each row carries points, stars awarded/used, VETOs awarded/used and the
+    number of score rows, for every student with rows in the month, sorted by
+    points (highest first) — a ranking in O(students).
+
+    Query params:
+        month  YYYY-MM (defaults to current month)
+    """
+    month_key = str(request.args.get('month') or '').strip()
+    if not re.match(r'^\d{4}-\d{2}$', month_key):
+        month_key = _server_now_iso()[:7]
+
+    data = _load_offline_data() or {}
+    if not _is_month_allowed_for_user(data, current_user, month_key):
+        return jsonify({'success': False, 'error': 'Month not allowed'}), 403
+    table = _month_totals_for(data)
+    if table is None:
+        table = _month_totals.MonthTotals.build(data)
+
+    students_by_id = {}
+    for student in data.get('students', []) or []:
+        if isinstance(student, dict):
+            students_by_id.setdefault(_parse_int_safe(student.get('id'), 0), student)
+
+    totals = []
+    for sid, row in table.month(month_key).items():
+        student = students_by_id.get(sid) or {}
+        totals.append(dict(row, studentId=sid, roll=student.get('roll', ''), name=student.get('name', '')))
+    totals.sort(key=lambda item: (-item['points'], str(item['roll'])))
+
+    resp = jsonify({
+        'success': True,
+        'month': month_key,
+        'server_version': data.get('server_version'),
+        'totals': totals,
+    })
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
 @points_bp.route('/validate-action', methods=['POST'])
 @csrf.exempt  # JSON API endpoint — secured by @login_required
 @login_required
@@ -6812,6 +8170,10 @@ def record_roll_change():
     if old_roll == new_roll:
         return jsonify({'success': False, 'error': 'new_roll is the same as current roll'}), 400
 
+    # Compiled month→roll intervals of this ledger, refreshed below for the
+    # students this change touches instead of being recompiled on next read.
+    roll_resolver = _roll_resolver_for(data, build=False)
+
     # 1. Record in roll_history
     if not isinstance(data.get('roll_history'), list):
         data['roll_history'] = []
@@ -6842,6 +8204,7 @@ def record_roll_change():
     # previous syncs/imports and should not stay visible once the roll has
     # been reassigned.
     retired_duplicate_ids = []
+    touched_ids = {student_id}
     for other in students:
         if not isinstance(other, dict):
             continue
@@ -6857,6 +8220,9 @@ def record_roll_change():
         if other_id == student_id:
             other['roll'] = new_roll
         retired_duplicate_ids.append(other_id or other_roll)
+        touched_ids.add(other_id)
+    if roll_resolver is not None:
+        roll_resolver.refresh(data, touched_ids)
 
     # 3. Update month_roster_profiles for months >= effective_month:
     #    rename the old_roll entry to new_roll so carry-forward still works.
@@ -7165,11 +8531,24 @@ def _get_student_group_jurisdiction(student_id, data):
     return jurisdiction
 
 
-def _validate_veto_jurisdictions(data):
-    # Retrieve students roster
+def _veto_jurisdiction_report(data):
+    """
+    Check postholder VETO markers in score notes against the acting student's
+    jurisdiction and active shields against a recorded shield activation.
+
+    Note formats (X is the group letter A, B, C, D or H):
+      "[VETO-Postholder] Removed penalty for Group X on current day"
+      "[VETO-Shield-Group X] Activated VETO shield for Group X postholders"
+      "[VETO-Postholder-Penalty-Group X] Penalty removed"  (on the target's row)
+
+    Marker rows come from app.utils.veto_markers, which only re-parses notes
+    that changed since the last validated score list. Returns
+    {'valid', 'violations', 'marker_rows', 'parsed_rows'}; each violation names
+    the rule, the row or post-holder record, the date and the group.
+    """
     students = data.get('students', [])
     scores = data.get('scores', [])
-    
+
     # Map student ID to student dict for convenience
     student_map = {}
     for s in students:
@@ -7178,27 +8557,21 @@ def _validate_veto_jurisdictions(data):
                 student_map[int(s['id'])] = s
             except (ValueError, TypeError):
                 pass
-    
-    # We will search for all postholder veto usages.
-    # A postholder veto usage is a score entry where notes indicate a postholder veto action.
-    # Note formats:
-    # 1) "[VETO-Postholder] Removed penalty for Group X on current day"
-    # 2) "[VETO-Shield-Group X] Activated VETO shield for Group X postholders"
-    # Where X is the group letter (A, B, C, D, H)
-    
-    import re
-    penalty_regex = re.compile(r'\[VETO-Postholder\] Removed penalty for Group ([A-Z])', re.IGNORECASE)
-    shield_regex = re.compile(r'\[VETO-Shield-Group ([A-Z])\]', re.IGNORECASE)
-    
+
+    index = _veto_markers.index_for(scores)
+    violations = []
+    jurisdictions = {}
+
+    def _jurisdiction(sid):
+        if sid not in jurisdictions:
+            jurisdictions[sid] = _get_student_group_jurisdiction(sid, data)
+        return jurisdictions[sid]
+
     # Keep track of valid postholder actions by (date, group) to validate targets
-    valid_penalty_removals = set() # elements: (date, group)
-    valid_shields = set() # elements: (date, group)
-    
-    for score in scores:
-        notes = score.get('notes', '')
-        if not notes:
-            continue
-        
+    valid_penalty_removals = set()  # elements: (date, group)
+    valid_shields = set()  # elements: (date, group)
+
+    for score, markers in index.rows:
         sid = score.get('studentId')
         if sid is None:
             continue
@@ -7206,134 +8579,110 @@ def _validate_veto_jurisdictions(data):
             sid = int(sid)
         except (ValueError, TypeError):
             continue
-            
         date = score.get('date', '')
-        
-        # Check for postholder penalty removal
-        penalty_match = penalty_regex.search(notes)
-        if penalty_match:
-            group = penalty_match.group(1).upper()
-            jurisdiction = _get_student_group_jurisdiction(sid, data)
-            if group not in jurisdiction:
-                current_app.logger.warning(
-                    f"Validation failed: Student {sid} saved postholder veto for Group {group} "
-                    f"but jurisdiction is {jurisdiction}."
-                )
-                return False
-            valid_penalty_removals.add((date, group))
-            
-        # Check for postholder shield activation
-        shield_match = shield_regex.search(notes)
-        if shield_match:
-            group = shield_match.group(1).upper()
-            jurisdiction = _get_student_group_jurisdiction(sid, data)
+        for kind, group in markers:
+            if kind not in ('penalty', 'shield'):
+                continue
+            jurisdiction = _jurisdiction(sid)
             if group not in jurisdiction:
+                action = 'saved postholder veto' if kind == 'penalty' else 'activated veto shield'
                 current_app.logger.warning(
-                    f"Validation failed: Student {sid} activated veto shield for Group {group} "
+                    f"Validation failed: Student {sid} {action} for Group {group} "
                     f"but jurisdiction is {jurisdiction}."
                 )
-                return False
-            valid_shields.add((date, group))
+                violations.append({
+                    'rule': 'postholder_penalty' if kind == 'penalty' else 'postholder_shield',
+                    'score_id': score.get('id'),
+                    'student_id': sid,
+                    'date': date,
+                    'group': group,
+                    'jurisdiction': sorted(jurisdiction),
+                })
+                continue
+            (valid_penalty_removals if kind == 'penalty' else valid_shields).add((date, group))
 
     # Validate that no student has an unauthorized penalty removal
-    # A penalty removal note: "[VETO-Postholder-Penalty-Group G] Penalty removed"
-    # on date D.
-    target_penalty_regex = re.compile(r'\[VETO-Postholder-Penalty-Group ([A-Z])\] Penalty removed', re.IGNORECASE)
-    for score in scores:
-        notes = score.get('notes', '')
-        if not notes:
-            continue
-        target_match = target_penalty_regex.search(notes)
-        if target_match:
-            group = target_match.group(1).upper()
+    # ("[VETO-Postholder-Penalty-Group G] Penalty removed" on date D).
+    for score, markers in index.rows:
+        for kind, group in markers:
+            if kind != 'target':
+                continue
             date = score.get('date', '')
             if (date, group) not in valid_penalty_removals:
                 current_app.logger.warning(
                     f"Validation failed: Unauthorized penalty removal for Group {group} on {date} "
                     f"without a valid postholder veto usage."
                 )
-                return False
+                violations.append({
+                    'rule': 'unauthorized_penalty_removal',
+                    'score_id': score.get('id'),
+                    'student_id': score.get('studentId'),
+                    'date': date,
+                    'group': group,
+                })
+
+    # Validate that no active shield in leadership/group_crs/class_reps/parties
+    # is active without a valid shield record.
+    def _check_shield(source, label, entry, student):
+        if not student:
+            return
+        date = entry.get('veto_shield_used_on', '')
+        group = str(student.get('group', '')).strip().upper()
+        if group and (date, group) not in valid_shields:
+            current_app.logger.warning(
+                f"Validation failed: Active {label} shield for Group {group} on {date} "
+                f"without a valid postholder veto shield activation."
+            )
+            violations.append({
+                'rule': 'shield_without_activation',
+                'source': source,
+                'student_id': student.get('id'),
+                'date': date,
+                'group': group,
+            })
+
+    def _student_for(entry):
+        sid = entry.get('studentId')
+        if sid is None:
+            return None
+        try:
+            return student_map.get(int(sid))
+        except (ValueError, TypeError):
+            return None
 
-    # Validate that no active shield in leadership/group_crs/class_reps/parties is active without a valid shield record
-    # Let's check leadership
     for entry in data.get('leadership', []):
         if entry.get('status') == 'active' and entry.get('veto_shield_active'):
-            date = entry.get('veto_shield_used_on', '')
-            resolved = _resolve_leadership_student(entry, students)
-            if resolved:
-                group = str(resolved.get('group', '')).strip().upper()
-                if group and (date, group) not in valid_shields:
-                    current_app.logger.warning(
-                        f"Validation failed: Active leadership shield for Group {group} on {date} "
-                        f"without a valid postholder veto shield activation."
-                    )
-                    return False
-                    
-    # Let's check group_crs
+            _check_shield('leadership', 'leadership', entry, _resolve_leadership_student(entry, students))
+
     for entry in data.get('group_crs', []):
         if entry.get('status') == 'active' and entry.get('veto_shield_active'):
-            date = entry.get('veto_shield_used_on', '')
-            sid = entry.get('studentId')
-            if sid is not None:
-                try:
-                    sid = int(sid)
-                    if sid in student_map:
-                        student = student_map[sid]
-                        group = str(student.get('group', '')).strip().upper()
-                        if group and (date, group) not in valid_shields:
-                            current_app.logger.warning(
-                                f"Validation failed: Active group CR shield for Group {group} on {date} "
-                                f"without a valid postholder veto shield activation."
-                            )
-                            return False
-                except (ValueError, TypeError):
-                    pass
-                    
-    # Let's check class_reps
+            _check_shield('group_crs', 'group CR', entry, _student_for(entry))
+
     for entry in data.get('class_reps', []):
         if entry.get('status') == 'active' and entry.get('veto_shield_active'):
-            date = entry.get('veto_shield_used_on', '')
-            sid = entry.get('studentId')
-            if sid is not None:
-                try:
-                    sid = int(sid)
-                    if sid in student_map:
-                        student = student_map[sid]
-                        group = str(student.get('group', '')).strip().upper()
-                        if group and (date, group) not in valid_shields:
-                            current_app.logger.warning(
-                                f"Validation failed: Active class rep shield for Group {group} on {date} "
-                                f"without a valid postholder veto shield activation."
-                            )
-                            return False
-                except (ValueError, TypeError):
-                    pass
+            _check_shield('class_reps', 'class rep', entry, _student_for(entry))
 
-    # Let's check parties president
     for party in data.get('parties', []):
         for member in party.get('members', []):
             if member.get('status') == 'active' and member.get('veto_shield_active'):
-                # Check designation is party president
                 designation = str(member.get('designation', '')).lower()
                 if _is_party_president_designation(designation):
-                    date = member.get('veto_shield_used_on', '')
-                    sid = member.get('studentId')
-                    if sid is not None:
-                        try:
-                            sid = int(sid)
-                            if sid in student_map:
-                                student = student_map[sid]
-                                group = str(student.get('group', '')).strip().upper()
-                                if group and (date, group) not in valid_shields:
-                                    current_app.logger.warning(
-                                        f"Validation failed: Active party president shield for Group {group} on {date} "
-                                        f"without a valid postholder veto shield activation."
-                                    )
-                                    return False
-                        except (ValueError, TypeError):
-                            pass
+                    _check_shield('parties', 'party president', member, _student_for(member))
 
-    return True
+    return {
+        'valid': not violations,
+        'violations': violations,
+        'marker_rows': len(index.rows),
+        'parsed_rows': index.parsed,
+    }
+
+
+def _veto_jurisdiction_error(report):
+    return jsonify({
+        'success': False,
+        'error': 'Veto jurisdiction validation failed',
+        'violations': report['violations'],
+    }), 400
 
 
 def _is_valid_replication_request():
@@ -7367,6 +8716,86 @@ def _is_valid_replication_request():
     return hmac.compare_digest(expected_key, provided_key)
 
 
+def _decoded_body_limit():
+    try:
+        return max(1, int(os.getenv('EA_MAX_DECODED_BODY_BYTES', '') or 256 * 1024 * 1024))
+    except (TypeError, ValueError):
+        return 256 * 1024 * 1024
+
+
+def _request_json_payload():
+    """
+    JSON body of the current request as (payload, error_response). Bodies
+    sent with Content-Encoding gzip/deflate (replication pushes) are inflated
+    from the request stream, capped at EA_MAX_DECODED_BODY_BYTES.
+    """
+    encoding = str(request.headers.get('Content-Encoding') or '').strip().lower()
+    if encoding in ('', 'identity'):
+        return request.get_json(silent=True) or {}, None
+    if encoding not in ('gzip', 'x-gzip', 'deflate'):
+        return None, (jsonify({'success': False, 'error': f'Unsupported Content-Encoding {encoding}'}), 415)
+    try:
+        raw = _replication_http.read_decoded_body(request.stream, encoding, _decoded_body_limit())
+    except _replication_http.BodyTooLarge:
+        return None, (jsonify({'success': False, 'error': 'Decoded payload too large'}), 413)
+    except ValueError as exc:
+        return None, (jsonify({'success': False, 'error': str(exc)}), 400)
+    try:
+        payload = json.loads(raw.decode('utf-8')) if raw else None
+    except ValueError:
+        payload = None
+    # Later readers of the body (the journal context) cannot use get_json().
+    g.ea_request_json = payload or {}
+    return g.ea_request_json, None
+
+
+def _omit_archived_months(data_out):
+    """Drop archived locked months' score rows from a GET response and list them instead."""
+    locked = _locked_month_keys(data_out)
+    allowed = data_out.get('allowed_months')
+    index = {
+        month: entry for month, entry in _ledger_archive.current_index(data_out).items()
+        if month in locked and (not allowed or month in allowed)
+    }
+    if not index:
+        return data_out
+    data_out['scores'] = [
+        row for row in (data_out.get('scores') or [])
+        if not (isinstance(row, dict) and str(row.get('month') or str(row.get('date') or '')[:7]).strip() in index)
+    ]
+    data_out[_ledger_archive.INDEX_KEY] = {m: {'sha256': e['sha256'], 'rows': e['rows']} for m, e in index.items()}
+    return data_out
+
+
+@points_bp.route('/archive/<month>', methods=['GET'])
+@limiter.limit("600 per hour")
+def archived_month_scores(month):
+    """Score rows of one locked month, served from its immutable archive."""
+    user, _, _ = _get_request_user()
+    if not user and not _is_valid_replication_request():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    month = str(month or '').strip()
+    data = _load_offline_data() or {}
+    if month not in _locked_month_keys(data):
+        return jsonify({'success': False, 'error': 'Month is not archived'}), 404
+    if user and not _is_month_allowed_for_user(data, user, month):
+        return jsonify({'success': False, 'error': 'Month not allowed'}), 403
+    entry, rows = _ledger_archive.read_month(data, month)
+    if entry is None:
+        # Edited since the last snapshot (or not archived yet): serve the live rows.
+        resp = jsonify({'month': month, 'sha256': '', 'scores': _month_score_rows(data, month)})
+        resp.headers['Cache-Control'] = 'no-store'
+        return resp
+    etag = f'"{entry["sha256"]}"'
+    if (request.headers.get('If-None-Match') or '').strip() == etag:
+        resp = Response(status=304)
+    else:
+        resp = jsonify({'month': month, 'sha256': entry['sha256'], 'scores': rows})
+    resp.headers['ETag'] = etag
+    resp.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return resp
+
+
 @points_bp.route('/offline-data', methods=['GET', 'POST'])
 @csrf.exempt  # Required for peer-to-peer sync, but secured with sync key validation
 @limiter.limit("2000 per hour")  # LAN mode: allow frequent sync while preventing runaway abuse
@@ -7398,7 +8827,11 @@ def offline_data():
                 resp = jsonify({'success': False, 'error': 'Roster snapshot incomplete. Recovery required.'})
                 resp.headers['Cache-Control'] = 'no-store'
                 return resp, 503
-        data, _ = _recover_stale_snapshot_if_needed(data, min_students=min_students)
+        if not replicated_auth:
+            # A peer's replication pull must not fan out into this node pulling
+            # its own peers (which may be the caller): the cycle depends on an
+            # unchanged ledger answering 304/204 without any outbound traffic.
+            data, _ = _recover_stale_snapshot_if_needed(data, min_students=min_students)
         if _ensure_score_timestamps(data):
             # Defer the heavy write to a background thread — the in-memory
             # cache already has the fix, so subsequent reads are correct.
@@ -7406,7 +8839,7 @@ def offline_data():
             def _deferred_timestamp_save():
                 try:
                     with app.app_context():
-                        _save_offline_data(data)
+                        _save_offline_data(data, durable=False)
                 except Exception:
                     try:
                         current_app.logger.exception("Failed to persist score timestamp normalization (deferred)")
@@ -7424,19 +8857,106 @@ def offline_data():
         is_authenticated = (user is not None)
         is_admin = is_authenticated and str(actor_role or '').strip().lower() == 'admin'
         anon_full_allowed = replicated_auth or str(os.getenv('EA_ALLOW_ANON_FULL_SYNC', '')).strip() == '1'
+        # The caller's view of the ledger: 'full' (admin, replication peers,
+        # teachers without configured windows), 'member' (month-clipped) or
+        # 'anon' (sanitized). Every caller with the same view gets the same body.
+        view_scope = 'full'
+        view_months = None
         if not is_authenticated and not anon_full_allowed:
+            view_scope = 'anon'
+            view_months = set(_recent_public_month_window())
+        elif is_authenticated and not is_admin:
+            view_months = _allowed_months_for_user(data, user)
+            if view_months is not None:
+                view_scope = 'member'
+
+        since = request.args.get('since') if hasattr(request, 'args') else None
+        # ?archived=omit: locked months stay in their archives; the client gets
+        # the index and pulls /archive/<month> only when a month is viewed.
+        omit_archived = str(request.args.get('archived') or '').strip().lower() == 'omit'
+
+        # ── Change-feed patch (?since_version=N) ──────────────────────────
+        # Rows added/edited/deleted in every collection since version N, as
+        # recorded by _record_change_feed. When N is not on this process's
+        # feed (too old, another worker's write, restart) the client gets the
+        # full snapshot below and resumes from its server_version.
+        since_version = str(request.args.get('since_version') or '').strip()
+        if since_version and not since:
+            base_version = _parse_int_safe(since_version, -1)
+            current_version = _parse_int_safe(data.get('server_version'), 0)
+            if base_version == current_version:
+                return ('', 204)
+            patch = _change_feed.patch_since(base_version, data) if base_version >= 0 else None
+            if patch is not None:
+                updated_at = data.get('server_updated_at') or data.get('updated_at')
+                patch_out = {
+                    'patch': True,
+                    'since_version': patch['since_version'],
+                    'server_version': patch['server_version'],
+                    'server_updated_at': updated_at,
+                    'updated_at': updated_at,
+                    'changes': _scope_change_patch(patch['changes'], view_scope, view_months),
+                }
+                if view_scope != 'full':
+                    patch_out['allowed_months'] = sorted(
+                        m for m in (view_months or ()) if _month_key_from_date_like(m)
+                    )
+                if view_scope == 'anon':
+                    patch_out['sync_scope'] = 'anonymous-public'
+                resp = jsonify({'data': patch_out, 'updated_at': updated_at})
+                resp.headers['Cache-Control'] = 'no-store'
+                return resp
+
+        # ── Serialized-response cache (full syncs, every view) ────────────
+        # Without ?since= the response body is identical across consecutive
+        # GETs of the same view until a write changes the data, so it is
+        # serialized once per (version, view) and served from memory — and
+        # skipped entirely (304) when the client's ETag already matches.
+        cache_mtime = 0
+        cache_size = -1
+        cache_ver = -1
+        cache_view = None
+        cache_etag = None
+        if not since:
+            try:
+                st = os.stat(_offline_data_path())
+                cache_mtime = getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))
+                cache_size = st.st_size
+                cache_ver = _parse_int_safe(data.get('server_version'), 0)
+                cache_view, cache_etag = _offline_view_cache_key(
+                    cache_ver, cache_size, view_scope, view_months, omit_archived,
+                )
+                # Conditional GET: if the client already has this version,
+                # return 304 Not Modified — saves ~18 MB of bandwidth per pull.
+                if_none_match = (request.headers.get('If-None-Match') or '').strip()
+                if _etag_matches(if_none_match, cache_etag):
+                    resp = Response(status=304)
+                    resp.headers['ETag'] = cache_etag
+                    resp.headers['Cache-Control'] = 'no-store'
+                    return resp
+                cached_body, cached_etag = _get_serialized_response(
+                    cache_mtime, cache_size, cache_ver, cache_view,
+                )
+                if cached_body is not None:
+                    resp = Response(cached_body, mimetype='application/json')
+                    resp.headers['Cache-Control'] = 'no-store'
+                    if cached_etag:
+                        resp.headers['ETag'] = cached_etag
+                    return resp
+            except Exception:
+                cache_etag = None  # Fall through to normal serialization
+
+        if view_scope == 'anon':
             # Unauthenticated viewers (wall displays, logged-out SPA tabs) get a
             # sanitized recent-months snapshot — never fees/appeals/logs/profile
             # data. Replication peers authenticate via X-EA-Replicated +
             # X-EA-Sync-Key and still receive the full ledger. Set
             # EA_ALLOW_ANON_FULL_SYNC=1 to restore the legacy open behavior.
-            data = _sanitize_anonymous_snapshot(data)
-        elif is_authenticated and not is_admin:
-            allowed_months = _allowed_months_for_user(data, user)
-            data = _clip_payload_to_allowed_months(data, allowed_months)
+            data = _sanitize_anonymous_snapshot(data, view_months)
+        elif view_scope == 'member':
+            data = _clip_payload_to_allowed_months(data, view_months)
 
         updated_at = data.get('server_updated_at') or data.get('updated_at')
-        since = request.args.get('since') if hasattr(request, 'args') else None
         if since and updated_at:
             server_stamp = _parse_sync_stamp(updated_at)
             since_stamp = _parse_sync_stamp(since)
@@ -7451,11 +8971,13 @@ def offline_data():
                 # Filter by updated_at FIRST so edits to old score rows are
                 # included in the delta (filtering by score date alone silently
                 # missed edits to historical rows — clients then kept stale values).
-                delta_scores = [
-                    s for s in data.get('scores', [])
-                    if isinstance(s, dict) and _parse_sync_stamp(s.get('updated_at') or s.get('created_at') or s.get('date') or '') and
-                       _parse_sync_stamp(s.get('updated_at') or s.get('created_at') or s.get('date') or '') >= since_stamp
-                ]
+                delta_scores = []
+                for s in data.get('scores', []):
+                    if not isinstance(s, dict):
+                        continue
+                    row_stamp = _parse_sync_stamp(s.get('updated_at') or s.get('created_at') or s.get('date') or '')
+                    if row_stamp and row_stamp >= since_stamp:
+                        delta_scores.append(s)
                 # If delta is small enough (<50% of total), send delta payload.
                 # Otherwise fall through to full sync for consistency.
                 total_scores = len(data.get('scores', []))
@@ -7482,39 +9004,6 @@ def offline_data():
                     resp.headers['Cache-Control'] = 'no-store'
                     return resp
         
-        # ── Serialized-response cache (admin full-sync only) ──────────────
-        # For admin users requesting a full sync (no ?since=), the response
-        # body is identical across consecutive GETs until a write changes the
-        # data.  Caching the pre-serialized bytes saves ~124ms per request.
-        cache_mtime = 0
-        cache_size = -1
-        cache_ver = -1
-        if is_admin and not since:
-            try:
-                path = _offline_data_path()
-                st = os.stat(path)
-                cache_mtime = getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))
-                cache_size = st.st_size
-                cache_ver = _parse_int_safe(data.get('server_version'), 0)
-                expected_etag = f'W/"{cache_ver}-{cache_size}"'
-                # Conditional GET: if the client already has this version,
-                # return 304 Not Modified — saves ~18 MB of bandwidth per pull.
-                if_none_match = (request.headers.get('If-None-Match') or '').strip()
-                if if_none_match and if_none_match == expected_etag:
-                    resp = Response(status=304)
-                    resp.headers['ETag'] = expected_etag
-                    resp.headers['Cache-Control'] = 'no-store'
-                    return resp
-                cached_body, cached_etag = _get_serialized_response(cache_mtime, cache_size, cache_ver)
-                if cached_body is not None:
-                    resp = Response(cached_body, mimetype='application/json')
-                    resp.headers['Cache-Control'] = 'no-store'
-                    if cached_etag:
-                        resp.headers['ETag'] = cached_etag
-                    return resp
-            except Exception:
-                pass  # Fall through to normal serialization
-
         # DIAGNOSTIC FIX: Ensure attendance records are present in GET response
         attendance_records = data.get('attendance', [])
         if not attendance_records:
@@ -7530,21 +9019,25 @@ def offline_data():
         data_out['notification_history'] = (data_out.get('notification_history') or [])[-50:]  # Keep only recent
         data_out['proposal_messages'] = (data_out.get('proposal_messages') or [])[-30:]  # Keep only recent
         data_out['_sync_ops'] = []  # Clear pending sync ops
+        if omit_archived:
+            _omit_archived_months(data_out)
         resp = jsonify({'data': data_out, 'updated_at': updated_at})
         resp.headers['Cache-Control'] = 'no-store'
 
-        # Store the serialized response for future admin full-sync cache hits.
-        if is_admin and not since:
+        # Store the serialized response for later full syncs of the same view.
+        if cache_etag:
             try:
                 body = resp.get_data()
-                etag = f'W/"{cache_ver}-{cache_size}"'
-                _store_serialized_response(cache_mtime, cache_size, cache_ver, body, etag)
+                resp.headers['ETag'] = cache_etag
+                _store_serialized_response(cache_mtime, cache_size, cache_ver, body, cache_etag, cache_view)
             except Exception:
                 pass
 
         return resp
 
-    payload = request.get_json(silent=True) or {}
+    payload, error_response = _request_json_payload()
+    if error_response is not None:
+        return error_response
     data = payload.get('data', payload)
     historical_score_ops = payload.get('historical_score_ops', []) if isinstance(payload, dict) else []
     request_peers = payload.get('peers', []) if isinstance(payload, dict) else []
@@ -7583,6 +9076,36 @@ def offline_data():
 
     existing = _load_offline_data() or {}
     existing_version = _parse_int_safe(existing.get('server_version'), 0)
+    replication_patch = payload.get('replication_patch') if isinstance(payload, dict) else None
+    replication_origin = payload.get('origin') if isinstance(payload, dict) else None
+    if not replicated_auth or not isinstance(replication_origin, dict) or not replication_origin.get('node'):
+        replication_origin = None
+    if replication_patch is not None:
+        # Change-feed delta from a peer (see _forward_offline_data_to_peers):
+        # rebuild the sender's ledger on top of ours, then merge it below
+        # exactly like a full snapshot push.
+        if replication_origin is None:
+            return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+        if not isinstance(replication_patch, dict) or not isinstance(replication_patch.get('changes'), dict):
+            return jsonify({'success': False, 'error': 'Invalid replication patch'}), 400
+        applied = existing.get('replica_origin') if isinstance(existing.get('replica_origin'), dict) else {}
+        if (
+            not existing or
+            applied.get('node') != replication_origin.get('node') or
+            _parse_int_safe(applied.get('version'), -1) != _parse_int_safe(replication_patch.get('since_version'), -2)
+        ):
+            return jsonify({
+                'success': False,
+                'error': 'Replication patch base is not applied here',
+                'code': 'patch_base_mismatch',
+                'origin_version': applied.get('version') if applied.get('node') == replication_origin.get('node') else None,
+            }), 409
+        try:
+            data = _change_feed.apply_patch(existing, replication_patch['changes'])
+        except (ValueError, TypeError, AttributeError):
+            return jsonify({'success': False, 'error': 'Invalid replication patch'}), 400
+    if not replicated_auth:
+        _strip_row_clocks(data)
     if request_op_id and _is_duplicate_sync_op(existing, request_op_id):
         current_stamp = existing.get('server_updated_at') or existing.get('updated_at')
         return jsonify({
@@ -7743,8 +9266,9 @@ def offline_data():
         _reconcile_role_veto_monthly(merged)
         _reconcile_veto_counters_from_scores(merged)
         _ensure_score_timestamps(merged)
-        if not _validate_veto_jurisdictions(merged):
-            return jsonify({'success': False, 'error': 'Veto jurisdiction validation failed'}), 400
+        veto_report = _veto_jurisdiction_report(merged)
+        if not veto_report['valid']:
+            return _veto_jurisdiction_error(veto_report)
         merged['updated_at'] = data.get('updated_at', existing.get('updated_at'))
         merged['server_updated_at'] = _server_now_iso()
         _record_sync_op(merged, request_op_id, actor_login_id or 'Teacher')
@@ -7795,8 +9319,9 @@ def offline_data():
         if isinstance(patch.get('appeals'), list):
             merged['appeals'] = _merge_appeals_superset(existing_obj.get('appeals', []), patch.get('appeals', []))
         _ensure_score_timestamps(merged)
-        if not _validate_veto_jurisdictions(merged):
-            return jsonify({'success': False, 'error': 'Veto jurisdiction validation failed'}), 400
+        veto_report = _veto_jurisdiction_report(merged)
+        if not veto_report['valid']:
+            return _veto_jurisdiction_error(veto_report)
         merged['server_updated_at'] = _server_now_iso()
         _record_sync_op(merged, request_op_id, actor_login_id or 'Student')
         _save_offline_data(merged)
@@ -8041,8 +9566,9 @@ def offline_data():
     _reconcile_role_veto_monthly(data)
     _reconcile_veto_counters_from_scores(data)
     _ensure_score_timestamps(data)
-    if not _validate_veto_jurisdictions(data):
-        return jsonify({'success': False, 'error': 'Veto jurisdiction validation failed'}), 400
+    veto_report = _veto_jurisdiction_report(data)
+    if not veto_report['valid']:
+        return _veto_jurisdiction_error(veto_report)
     if is_replicated:
         # Preserve the source timestamp so the receiver never appears artificially
         # newer than the sender.  Generating a fresh _server_now_iso() here would
@@ -8050,8 +9576,21 @@ def offline_data():
         # causing the next background-sync cycle to pull from Render and silently
         # revert any local changes (deactivations, edits) made after the push.
         data['server_updated_at'] = data.get('server_updated_at') or _server_now_iso()
+        # Likewise keep the sender's ledger clock (the newer of the two).
+        data['server_hlc'] = _hlc.latest(data.get('server_hlc'), existing.get('server_hlc'))
     else:
         data['server_updated_at'] = _server_now_iso()
+    # Which origin revision this ledger contains decides whether the next
+    # replication patch from that origin applies; client pushes keep ours.
+    if replication_origin is not None:
+        data['replica_origin'] = {
+            'node': str(replication_origin.get('node'))[:120],
+            'version': _parse_int_safe(replication_origin.get('version'), 0),
+        }
+    elif isinstance(existing, dict) and isinstance(existing.get('replica_origin'), dict):
+        data['replica_origin'] = existing['replica_origin']
+    else:
+        data.pop('replica_origin', None)
     _record_sync_op(data, request_op_id, actor_login_id or ('replica' if is_replicated else 'Admin'))
     _save_offline_data(data)
     _broadcast_sync_event(data['server_updated_at'], source='replica' if is_replicated else 'client')
@@ -8216,6 +9755,95 @@ def supabase_health():
     return jsonify(response)
 
 
+@points_bp.route('/replication-status', methods=['GET'])
+@login_required
+def replication_status():
+    """Per-peer outbox state: queue depth, pending and last acknowledged version, retry timing."""
+    if current_user.role not in ['admin', 'teacher']:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 403
+    return jsonify({
+        'success': True,
+        'node': _replication_node_id(),
+        'peers': _replication_outbox().status(),
+        'mirrors': _mirror_outbox().status(),
+        'checked_at': _server_now_iso(),
+    })
+
+
+def _sync_digest_caller_allowed():
+    if _is_valid_replication_request():
+        return True
+    user, actor_role, _ = _get_request_user()
+    return bool(user) and str(actor_role or '').strip().lower() == 'admin'
+
+
+@points_bp.route('/sync/digest', methods=['GET'])
+@limiter.limit("2000 per hour")
+def sync_digest():
+    """
+    Merkle digest of the ledger for peer anti-entropy (see ledger_digest.py).
+    ``scope=external`` digests the fee-free WAN copy; when ``root`` equals
+    this node's root only the match is reported, so idle cycles stay tiny.
+    """
+    if not _sync_digest_caller_allowed():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    data = _load_offline_data() or {}
+    tree = _ledger_digest_for(data, request.args.get('scope') == 'external')
+    out = {
+        'success': True,
+        'root': tree['root'],
+        'server_version': _parse_int_safe(data.get('server_version'), 0),
+        'server_updated_at': data.get('server_updated_at') or '',
+        'updated_at': data.get('updated_at') or '',
+        'server_hlc': data.get('server_hlc') or '',
+        'replica_origin': data.get('replica_origin') if isinstance(data.get('replica_origin'), dict) else None,
+    }
+    if request.args.get('root') == tree['root']:
+        out['match'] = True
+    else:
+        out['collections'] = tree['collections']
+    resp = jsonify(out)
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+@points_bp.route('/sync/buckets', methods=['GET'])
+@limiter.limit("2000 per hour")
+def sync_buckets():
+    """
+    Contents of digest buckets: ``want=scores:2026-04,students:*``. With
+    ``server_version`` (from the caller's /sync/digest reply) a ledger that
+    has moved on since answers 409, so buckets never mix two revisions.
+    """
+    if not _sync_digest_caller_allowed():
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    wanted = {}
+    for item in str(request.args.get('want') or '').split(','):
+        key, sep, bucket = item.strip().partition(':')
+        if key and sep and bucket:
+            wanted.setdefault(key, []).append(bucket)
+    if not wanted:
+        return jsonify({'success': False, 'error': 'No buckets requested'}), 400
+    data = _load_offline_data() or {}
+    current_version = _parse_int_safe(data.get('server_version'), 0)
+    expected_version = request.args.get('server_version')
+    if expected_version and _parse_int_safe(expected_version, 0) != current_version:
+        return jsonify({'success': False, 'error': 'Ledger changed since the digest',
+                        'server_version': current_version}), 409
+    buckets = _ledger_digest.extract(
+        data, wanted, *_ledger_digest_shape(), external=request.args.get('scope') == 'external'
+    )
+    resp = jsonify({
+        'success': True,
+        'buckets': buckets,
+        'server_version': current_version,
+        'server_updated_at': data.get('server_updated_at') or '',
+        'updated_at': data.get('updated_at') or '',
+    })
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
 @points_bp.route('/offline-force-publish', methods=['POST'])
 @csrf.exempt
 @login_required
@@ -8280,13 +9908,7 @@ def offline_force_publish():
     # This avoids user-visible publish failures caused by WAN/Supabase timeouts.
     if not wait_for_results:
         public_site_result = _publish_public_site_snapshot(data, push=False)
-        if auto_push_public_site:
-            threading.Thread(
-                target=_publish_public_site_snapshot,
-                args=(dict(data), True),
-                daemon=True,
-                name='ea-public-site-push'
-            ).start()
+        if auto_push_public_site and _queue_public_site_push(data):
             public_site_result['status'] = 'queued'
         _gist_push_snapshot_async(data, reason='force_publish')
         _forward_offline_data_to_peers_async(data, request_peers)
@@ -8349,25 +9971,19 @@ def offline_force_publish():
         started = time.time()
         result = {'base_url': base, 'status': 'failed'}
         try:
-            req = urllib.request.Request(
+            resp = _replication_http.post(
                 target_url,
-                data=peer_body,
-                method='POST',
+                body=peer_body,
                 headers={
                     'Content-Type': 'application/json',
                     'X-EA-Replicated': '1',
                     'X-EA-Sync-Key': shared_key
-                }
-            )
-            with urllib.request.urlopen(req, timeout=12) as resp:
-                raw = resp.read()
-            updated_at = ''
-            try:
-                parsed = json.loads(raw.decode('utf-8', errors='replace')) if raw else {}
-                if isinstance(parsed, dict):
-                    updated_at = parsed.get('updated_at') or ''
-            except Exception:
-                updated_at = ''
+                },
+                timeout=12,
+                compress=_replication_gzip_enabled(),
+            ).raise_for_status()
+            parsed = resp.json({})
+            updated_at = (parsed.get('updated_at') or '') if isinstance(parsed, dict) else ''
             result['status'] = 'ok'
             result['updated_at'] = updated_at
         except Exception as exc:
@@ -8869,6 +10485,7 @@ def offline_restore_points():
     ]
 
     seen = set()
+    cataloged = {}
     for source, root in roots:
         if source == 'live':
             path = root
@@ -8881,13 +10498,23 @@ def offline_restore_points():
             continue
         if not os.path.isdir(root):
             continue
+        if source in ('rolling', 'hourly'):
+            # Cataloged backups: no directory scan or per-file stat.
+            _sync_backup_catalog(source)
+            for entry in _backup_catalog.entries(source):
+                if entry['id'] not in seen:
+                    seen.add(entry['id'])
+                    cataloged[entry['id']] = entry
+                    candidates.append((source, entry['path'], entry['id']))
+            continue
         for name in os.listdir(root):
-            if not name.endswith('.json'):
+            is_shard_set = name.endswith(_SHARD_SET_SUFFIX) and source in ('rolling', 'hourly')
+            if not name.endswith('.json') and not is_shard_set:
                 continue
             if source == 'legacy-instance' and not name.startswith('offline_scoreboard_data'):
                 continue
             path = os.path.join(root, name)
-            if not os.path.isfile(path):
+            if not (os.path.isdir(path) if is_shard_set else os.path.isfile(path)):
                 continue
             if source == 'legacy-instance':
                 rel = f"legacy/{name}"
@@ -8901,9 +10528,49 @@ def offline_restore_points():
 
     meta = _load_restore_points_meta()
     items = []
+    # Incremental-store backups are listed from the store index (no per-file stat/open).
+    for key, entry in (_backup_store.list_backups() if _backup_store.enabled() else {}).items():
+        if key in seen:
+            continue
+        seen.add(key)
+        key_meta = meta.get(key, {}) if isinstance(meta.get(key), dict) else {}
+        items.append({
+            'id': key,
+            'source': str(entry.get('kind') or 'store'),
+            'name': os.path.basename(key),
+            'path': key,
+            'modified_at': str(entry.get('created_at') or ''),
+            'size': int(entry.get('size') or 0),
+            'students': int(entry.get('students') or 0),
+            'scores': int(entry.get('scores') or 0),
+            'incremental': True,
+            'locked': bool(key_meta.get('locked')),
+            'label': str(key_meta.get('label') or '').strip()
+        })
     for source, path, key in candidates:
+        entry = cataloged.get(key)
+        if entry is not None:
+            key_meta = meta.get(key, {}) if isinstance(meta.get(key), dict) else {}
+            item = {
+                'id': key,
+                'source': source,
+                'name': os.path.basename(path),
+                'path': key,
+                'modified_at': datetime.fromtimestamp(entry['created']).isoformat(),
+                'size': entry['size'] if entry['size'] is not None else _backup_entry_size(path),
+                'locked': bool(key_meta.get('locked')),
+                'label': str(key_meta.get('label') or '').strip()
+            }
+            if entry['students'] is not None:
+                item.update(students=entry['students'], scores=entry['scores'])
+            items.append(item)
+            continue
         try:
             stat = os.stat(path)
+            size = stat.st_size
+            if os.path.isdir(path):
+                from app.utils.ledger_shards import shard_set_size
+                size = shard_set_size(path)
             key_meta = meta.get(key, {}) if isinstance(meta.get(key), dict) else {}
             items.append({
                 'id': key,
@@ -8911,7 +10578,7 @@ def offline_restore_points():
                 'name': os.path.basename(path),
                 'path': key,
                 'modified_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                'size': stat.st_size,
+                'size': size,
                 'locked': bool(key_meta.get('locked')),
                 'label': str(key_meta.get('label') or '').strip()
             })
@@ -8943,7 +10610,7 @@ def offline_restore_point_lock():
         allowed_root = storage_root
     if not source_path.startswith(allowed_root):
         return jsonify({'success': False, 'error': 'Invalid restore path'}), 400
-    if not os.path.isfile(source_path):
+    if not (os.path.isfile(source_path) or _is_shard_set_dir(source_path)):
         return jsonify({'success': False, 'error': 'Restore file not found'}), 404
 
     meta = _load_restore_points_meta()
@@ -8953,6 +10620,10 @@ def offline_restore_point_lock():
     entry['updated_at'] = _server_now_iso()
     meta[restore_id] = entry
     _save_restore_points_meta(meta)
+    try:
+        _backup_catalog.set_locked(restore_id, lock_state)
+    except Exception:
+        _ledger_log.exception('Failed to record restore point lock in the backup catalog')
     return jsonify({'success': True, 'id': restore_id, 'locked': lock_state, 'label': entry['label']})
 
 
@@ -8980,12 +10651,16 @@ def offline_restore():
         allowed_root = storage_root
     if not source_path.startswith(allowed_root):
         return jsonify({'success': False, 'error': 'Invalid restore path'}), 400
-    if not os.path.isfile(source_path):
+    if not (os.path.isfile(source_path) or _is_shard_set_dir(source_path)):
         return jsonify({'success': False, 'error': 'Restore file not found'}), 404
 
     try:
-        with open(source_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if os.path.isdir(source_path):
+            data = _load_json_file(source_path)
+            if data is None:
+                raise ValueError('incomplete shard set')
+        else:
+            data = _read_ledger_file(source_path)
     except Exception:
         return jsonify({'success': False, 'error': 'Restore file is not valid JSON'}), 400
     if not isinstance(data, dict):
@@ -8996,7 +10671,7 @@ def offline_restore():
     if isinstance(current, dict):
         stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         safety = os.path.join(storage_root, f'offline_scoreboard_data.pre_ui_restore_{stamp}.json')
-        _atomic_write_json(safety, current)
+        _atomic_write_json(safety, current, codec=_ledger_backup_codec())
 
     data['server_updated_at'] = _server_now_iso()
     data['updated_at'] = data.get('updated_at') or data['server_updated_at']
@@ -0,0 +1,257 @@
+"""
+backup_catalog.py — Persistent catalog of file backups.
+
+Every save used to os.listdir() the rolling/hourly backup directories and
+sort them by os.path.getmtime() to prune old copies, _load_latest_offline_backup
+repeated the scan, and /offline-restore-points stat-ed every file without
+being able to say what was in it. The catalog keeps one row per backup in
+<storage_root>/offline_backup_catalog.sqlite3:
+
+  backups  id (path relative to the storage root, = restore id), kind,
+           created (mtime), size, sha256, students, scores, server_version,
+           locked
+
+Rows are added by record() when the scoreboard writes a backup and removed
+by prune(); "latest backup" and pruning are indexed queries. Student/score
+counts come from the payload when the backup is serialized from one, or from
+note_live() — the counts of the live snapshot, noted whenever it is written —
+when the backup is a copy of that file.
+
+Backups added or deleted by hand are picked up by sync_directory(): the
+catalog remembers each directory's mtime as of its own last change, and a
+single os.stat() per call detects anything else and triggers one rescan.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from app.utils.data_paths import get_storage_root
+
+__all__ = [
+    'catalog_path', 'sync_directory', 'record', 'prune', 'entries', 'latest',
+    'set_locked', 'note_live',
+]
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS catalog_info (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS backups ('
+    ' id TEXT PRIMARY KEY, kind TEXT NOT NULL, created REAL NOT NULL,'
+    ' size INTEGER, sha256 TEXT, students INTEGER, scores INTEGER,'
+    ' server_version INTEGER, locked INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX IF NOT EXISTS ix_backups_kind_created ON backups (kind, created)',
+]
+_COLUMNS = ('id', 'kind', 'created', 'size', 'sha256', 'students', 'scores', 'server_version', 'locked')
+_SHARD_SET_SUFFIX = '.shards'
+
+_state = {'path': None, 'conn': None}
+_lock = threading.RLock()
+
+
+def catalog_path() -> str:
+    return os.path.join(get_storage_root(), 'offline_backup_catalog.sqlite3')
+
+
+def _connection():
+    path = catalog_path()
+    if _state['conn'] is not None and _state['path'] == path:
+        return _state['conn']
+    if _state['conn'] is not None:
+        try:
+            _state['conn'].close()
+        except sqlite3.Error:
+            pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Shared across request threads; every use is serialized by _lock.
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    _state.update({'path': path, 'conn': conn})
+    return conn
+
+
+def _get_info(conn, key, default=None):
+    found = conn.execute('SELECT value FROM catalog_info WHERE key = ?', (key,)).fetchone()
+    return json.loads(found[0]) if found else default
+
+
+def _set_info(conn, key, value):
+    conn.execute(
+        'INSERT INTO catalog_info (key, value) VALUES (?, ?) '
+        'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+        (key, json.dumps(value)),
+    )
+
+
+def _backup_id(path):
+    return os.path.relpath(path, get_storage_root()).replace('\\', '/')
+
+
+def _abs(backup_id):
+    return os.path.join(get_storage_root(), backup_id)
+
+
+def _dir_signature(directory):
+    try:
+        return [os.path.abspath(directory), os.stat(directory).st_mtime_ns]
+    except OSError:
+        return [os.path.abspath(directory), None]
+
+
+def _remember_directory(conn, kind, directory):
+    _set_info(conn, f'dir:{kind}', _dir_signature(directory))
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def sync_directory(kind, directory, locked_ids=()):
+    """
+    Bring ``kind``'s rows in line with ``directory`` if something other than
+    the catalog changed it (or the catalog is new). ``locked_ids`` seeds the
+    lock flag of rows discovered by a rescan.
+    """
+    with _lock:
+        conn = _connection()
+        if _get_info(conn, f'dir:{kind}') == _dir_signature(directory):
+            return False
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = []
+        on_disk = {}
+        for name in names:
+            if not (name.endswith('.json') or name.endswith(_SHARD_SET_SUFFIX)):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            on_disk[_backup_id(path)] = st
+        known = {row[0] for row in conn.execute('SELECT id FROM backups WHERE kind = ?', (kind,))}
+        locked = set(locked_ids or ())
+        conn.execute('BEGIN')
+        try:
+            for backup_id in known - set(on_disk):
+                conn.execute('DELETE FROM backups WHERE id = ?', (backup_id,))
+            for backup_id in set(on_disk) - known:
+                st = on_disk[backup_id]
+                conn.execute(
+                    'INSERT OR REPLACE INTO backups (id, kind, created, size, locked) VALUES (?, ?, ?, ?, ?)',
+                    (backup_id, kind, st.st_mtime, None if os.path.isdir(_abs(backup_id)) else st.st_size,
+                     1 if backup_id in locked else 0),
+                )
+            _remember_directory(conn, kind, directory)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+
+def record(kind, path, *, students=None, scores=None, server_version=None, sha256=None, source=None):
+    """
+    Catalog a backup just written at ``path``. Without explicit counts, a
+    backup copied from the live snapshot ``source`` inherits note_live()'s
+    counts when that file is unchanged since they were noted.
+    """
+    with _lock:
+        conn = _connection()
+        if students is None and source is not None:
+            live = _get_info(conn, 'live') or {}
+            try:
+                if live.get('file') == [os.path.abspath(source)] + _file_signature(source):
+                    students, scores = live.get('students'), live.get('scores')
+                    server_version = live.get('server_version')
+            except OSError:
+                pass
+        st = os.stat(path)
+        conn.execute(
+            'INSERT OR REPLACE INTO backups (id, kind, created, size, sha256, students, scores, server_version, locked)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, COALESCE((SELECT locked FROM backups WHERE id = ?), 0))',
+            (_backup_id(path), kind, st.st_mtime, None if os.path.isdir(path) else st.st_size,
+             sha256, students, scores, server_version, _backup_id(path)),
+        )
+        _remember_directory(conn, kind, os.path.dirname(path))
+
+
+def prune(kind, keep, remove):
+    """
+    Remove all but the newest ``keep`` unlocked backups of ``kind``, calling
+    ``remove(path)`` for each. Returns the removed paths.
+    """
+    with _lock:
+        conn = _connection()
+        doomed = [row[0] for row in conn.execute(
+            'SELECT id FROM backups WHERE kind = ? AND locked = 0 ORDER BY created DESC LIMIT -1 OFFSET ?',
+            (kind, max(0, int(keep))),
+        )]
+        if not doomed:
+            return []
+        removed = []
+        directory = None
+        for backup_id in doomed:
+            path = _abs(backup_id)
+            directory = os.path.dirname(path)
+            try:
+                remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+            conn.execute('DELETE FROM backups WHERE id = ?', (backup_id,))
+            removed.append(path)
+        if directory is not None:
+            _remember_directory(conn, kind, directory)
+        return removed
+
+
+def _as_dict(row):
+    entry = dict(zip(_COLUMNS, row))
+    entry['locked'] = bool(entry['locked'])
+    entry['path'] = _abs(entry['id'])
+    return entry
+
+
+def entries(kind=None):
+    """Catalog rows (newest first), optionally for one kind."""
+    with _lock:
+        conn = _connection()
+        sql = f'SELECT {", ".join(_COLUMNS)} FROM backups'
+        params = ()
+        if kind is not None:
+            sql += ' WHERE kind = ?'
+            params = (kind,)
+        return [_as_dict(row) for row in conn.execute(sql + ' ORDER BY created DESC', params)]
+
+
+def latest(kind):
+    """Newest backup of ``kind`` or None."""
+    found = entries(kind)
+    return found[0] if found else None
+
+
+def set_locked(backup_id, locked):
+    with _lock:
+        _connection().execute('UPDATE backups SET locked = ? WHERE id = ?', (1 if locked else 0, backup_id))
+
+
+def note_live(path, payload):
+    """Remember the counts of the live snapshot just written at ``path``."""
+    if not isinstance(payload, dict):
+        return
+    counts = {
+        key: len(payload.get(key)) if isinstance(payload.get(key), list) else 0
+        for key in ('students', 'scores')
+    }
+    with _lock:
+        conn = _connection()
+        _set_info(conn, 'live', {
+            'file': [os.path.abspath(path)] + _file_signature(path),
+            'server_version': payload.get('server_version'),
+            **counts,
+        })
@@ -0,0 +1,408 @@
+"""
+backup_store.py — Content-addressed, incremental ledger backups.
+
+Hourly backups (720 kept) and startup restore points (200 kept) used to be
+full copies of the ledger, nearly identical to each other outside the current
+month. The store instead splits each backup into chunks and writes only the
+chunks it has not seen before:
+
+  <storage_root>/offline_backup_store/
+      chunks/<sha[:2]>/<sha256>        snapshot_codec frame of one chunk's JSON
+      manifests/<kind>/<name>.json     one small manifest per backup
+      index.json                       {backup id: summary} for listings
+
+Chunking of a ledger's top-level keys:
+
+- scalars are stored inline in the manifest;
+- large lists of rows (scores, attendance, ...) get one chunk per month
+  (row ``month`` or ``date[:7]``) plus the rows' (start, count) position runs,
+  so reassembly restores the exact order;
+- dicts keyed mostly by month (month_roster_profiles, ...) get one chunk per
+  key;
+- any other value is one chunk.
+
+A month that did not change between backups hashes to the same chunk, so an
+hourly backup typically writes the current month plus a few small chunks.
+Chunks are verified against their hash on read. Pruning a kind drops its
+oldest manifests (never ``protected`` ones) and then deletes chunks no
+remaining manifest references (after a grace period, since several
+workers may back up concurrently).
+
+Manifests are ordinary JSON files, so a backup id is just the manifest's
+path relative to the storage root and the existing restore/lock routes can
+address it; scoreboard readers call materialize() when they find one.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from app.utils import snapshot_codec
+from app.utils.data_paths import get_storage_root
+
+__all__ = [
+    'MANIFEST_KEY', 'enabled', 'store_dir', 'manifest_path', 'has_backup',
+    'write_backup', 'is_manifest', 'materialize', 'load_backup', 'list_backups',
+    'latest_backup_path', 'manifest_values', 'prune',
+]
+
+MANIFEST_KEY = 'ea_backup_manifest'
+_FORMAT = 1
+_MONTH_RE = re.compile(r'^\d{4}-\d{2}$')
+_NAME_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+_MIN_SPLIT_ROWS = 64
+# Unreferenced chunks younger than this are kept: another process may be
+# writing the manifest that will reference them.
+_GC_GRACE_SECONDS = 600
+
+_log = logging.getLogger(__name__)
+_lock = threading.RLock()
+# Parsed index.json, keyed by (path, mtime_ns, size).
+_index_cache = {'sig': None, 'index': {}}
+
+
+def enabled() -> bool:
+    flag = str(os.getenv('EA_BACKUP_STORE', '1') or '').strip().lower()
+    return flag not in {'0', 'false', 'no', 'off'}
+
+
+def store_dir() -> str:
+    return os.path.join(get_storage_root(), 'offline_backup_store')
+
+
+def _chunk_path(digest):
+    return os.path.join(store_dir(), 'chunks', digest[:2], digest)
+
+
+def _index_path():
+    return os.path.join(store_dir(), 'index.json')
+
+
+def manifest_path(kind, name) -> str:
+    if not (_NAME_RE.match(str(kind)) and _NAME_RE.match(str(name))):
+        raise ValueError(f'Invalid backup name {kind!r}/{name!r}')
+    return os.path.join(store_dir(), 'manifests', kind, f'{name}.json')
+
+
+def _backup_id(kind, name):
+    return f'offline_backup_store/manifests/{kind}/{name}.json'
+
+
+def has_backup(kind, name) -> bool:
+    return os.path.exists(manifest_path(kind, name))
+
+
+def _write_atomic(path, body: bytes):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix='.store.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _put_chunk(value, stats):
+    raw = _encode(value)
+    digest = hashlib.sha256(raw).hexdigest()
+    path = _chunk_path(digest)
+    try:
+        # Refresh the mtime so a concurrent sweep's grace period covers reused chunks.
+        os.utime(path)
+    except FileNotFoundError:
+        body = snapshot_codec.frame(raw)
+        _write_atomic(path, body)
+        stats['new_chunks'] += 1
+        stats['bytes_written'] += len(body)
+    stats['chunks'] += 1
+    stats['raw_bytes'] += len(raw)
+    return digest
+
+
+def _get_chunk(digest):
+    with open(_chunk_path(digest), 'rb') as f:
+        raw = snapshot_codec.unframe(f.read())
+    if hashlib.sha256(raw).hexdigest() != digest:
+        raise ValueError(f'Backup chunk {digest} does not match its hash')
+    return json.loads(raw.decode('utf-8'))
+
+
+def _row_month(row):
+    if not isinstance(row, dict):
+        return ''
+    month = str(row.get('month') or str(row.get('date') or '')[:7]).strip()
+    return month if _MONTH_RE.match(month) else ''
+
+
+def _runs(positions):
+    runs = []
+    for pos in positions:
+        if runs and runs[-1][0] + runs[-1][1] == pos:
+            runs[-1][1] += 1
+        else:
+            runs.append([pos, 1])
+    return runs
+
+
+def _split_rows(rows, stats):
+    buckets, positions = {}, {}
+    for pos, row in enumerate(rows):
+        month = _row_month(row)
+        buckets.setdefault(month, []).append(row)
+        positions.setdefault(month, []).append(pos)
+    return {
+        'length': len(rows),
+        'months': {
+            month: {'sha256': _put_chunk(bucket, stats), 'positions': _runs(positions[month])}
+            for month, bucket in buckets.items()
+        },
+    }
+
+
+def _is_month_keyed(value):
+    if not isinstance(value, dict) or len(value) < 2:
+        return False
+    return sum(1 for k in value if _MONTH_RE.match(str(k))) * 2 >= len(value)
+
+
+def _entry_for(value, stats):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {'inline': value}
+    if isinstance(value, list) and len(value) >= _MIN_SPLIT_ROWS and all(isinstance(r, dict) for r in value):
+        return {'rows': _split_rows(value, stats)}
+    if _is_month_keyed(value):
+        return {'keys': [[key, _put_chunk(item, stats)] for key, item in value.items()]}
+    return {'sha256': _put_chunk(value, stats)}
+
+
+def _value_for(entry):
+    if 'inline' in entry:
+        return entry['inline']
+    if 'keys' in entry:
+        return {key: _get_chunk(digest) for key, digest in entry['keys']}
+    if 'rows' in entry:
+        split = entry['rows']
+        out = [None] * int(split.get('length') or 0)
+        for month, part in (split.get('months') or {}).items():
+            rows = _get_chunk(part['sha256'])
+            spots = [p for start, count in part.get('positions') or [] for p in range(start, start + count)]
+            if len(spots) != len(rows):
+                raise ValueError(f'Backup chunk positions for {month!r} do not match its rows')
+            for spot, row in zip(spots, rows):
+                out[spot] = row
+        if any(row is None for row in out):
+            raise ValueError('Backup manifest rows are incomplete')
+        return out
+    return _get_chunk(entry['sha256'])
+
+
+def _count(payload, key):
+    value = payload.get(key)
+    return len(value) if isinstance(value, list) else 0
+
+
+def _load_index():
+    path = _index_path()
+    try:
+        st = os.stat(path)
+        sig = (path, st.st_mtime_ns, st.st_size)
+        if _index_cache['sig'] == sig:
+            return dict(_index_cache['index'])
+        with open(path, 'rb') as f:
+            data = json.loads(f.read().decode('utf-8'))
+        if not isinstance(data, dict):
+            raise ValueError('Backup store index is not an object')
+    except (OSError, ValueError):
+        return _rebuild_index()
+    _index_cache.update(sig=sig, index=data)
+    return dict(data)
+
+
+def _save_index(index):
+    path = _index_path()
+    _write_atomic(path, _encode(index))
+    st = os.stat(path)
+    _index_cache.update(sig=(path, st.st_mtime_ns, st.st_size), index=dict(index))
+
+
+def _summary(manifest, raw_bytes=None):
+    return {
+        'kind': manifest.get('kind'),
+        'name': manifest.get('name'),
+        'created_at': manifest.get('created_at'),
+        'server_version': manifest.get('server_version'),
+        'students': (manifest.get('counts') or {}).get('students', 0),
+        'scores': (manifest.get('counts') or {}).get('scores', 0),
+        'size': raw_bytes if raw_bytes is not None else manifest.get('raw_bytes', 0),
+    }
+
+
+def _iter_manifests():
+    root = os.path.join(store_dir(), 'manifests')
+    if not os.path.isdir(root):
+        return
+    for kind in sorted(os.listdir(root)):
+        directory = os.path.join(root, kind)
+        if not os.path.isdir(directory):
+            continue
+        for fname in sorted(os.listdir(directory)):
+            if not fname.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, fname), 'rb') as f:
+                    manifest = json.loads(f.read().decode('utf-8'))
+            except (OSError, ValueError):
+                continue
+            if is_manifest(manifest):
+                yield _backup_id(kind, fname[:-5]), manifest
+
+
+def _rebuild_index():
+    index = {backup_id: _summary(manifest) for backup_id, manifest in _iter_manifests()}
+    try:
+        _save_index(index)
+    except OSError:
+        _log.exception('Failed to rebuild backup store index')
+    return index
+
+
+def write_backup(kind, name, payload, *, keep=None, protected=()):
+    """
+    Store ``payload`` as backup ``kind``/``name`` (no-op if it exists) and
+    prune ``kind`` to ``keep`` backups. Returns the backup's index summary.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Backup payload must be a dict')
+    path = manifest_path(kind, name)
+    with _lock:
+        index = _load_index()
+        backup_id = _backup_id(kind, name)
+        if os.path.exists(path) and backup_id in index:
+            return index[backup_id]
+        stats = {'chunks': 0, 'new_chunks': 0, 'bytes_written': 0, 'raw_bytes': 0}
+        entries = [[key, _entry_for(value, stats)] for key, value in payload.items()]
+        manifest = {
+            MANIFEST_KEY: _FORMAT,
+            'kind': kind,
+            'name': name,
+            'created_at': datetime.now().isoformat(),
+            'server_version': payload.get('server_version'),
+            'counts': {'students': _count(payload, 'students'), 'scores': _count(payload, 'scores')},
+            'raw_bytes': stats['raw_bytes'],
+            'entries': entries,
+        }
+        _write_atomic(path, _encode(manifest))
+        index[backup_id] = _summary(manifest)
+        _save_index(index)
+        _log.debug('Backup %s: %d/%d new chunks, %d bytes written',
+                   backup_id, stats['new_chunks'], stats['chunks'], stats['bytes_written'])
+        if keep is not None:
+            prune(kind, keep, protected=protected)
+        return index[backup_id]
+
+
+def is_manifest(data) -> bool:
+    return isinstance(data, dict) and data.get(MANIFEST_KEY) == _FORMAT and isinstance(data.get('entries'), list)
+
+
+def materialize(manifest):
+    """Reassemble the ledger a manifest describes (raises on a missing/corrupt chunk)."""
+    return {key: _value_for(entry) for key, entry in manifest['entries']}
+
+
+def load_backup(kind, name):
+    with open(manifest_path(kind, name), 'rb') as f:
+        return materialize(json.loads(f.read().decode('utf-8')))
+
+
+def list_backups():
+    """{backup id: {kind, name, created_at, server_version, students, scores, size}}, from the index."""
+    with _lock:
+        return dict(_load_index())
+
+
+def latest_backup_path(kind=None):
+    """Absolute manifest path of the newest backup (of ``kind``), or None."""
+    entries = [
+        (entry.get('created_at') or '', backup_id)
+        for backup_id, entry in list_backups().items()
+        if kind is None or entry.get('kind') == kind
+    ]
+    if not entries:
+        return None
+    return os.path.join(get_storage_root(), max(entries)[1])
+
+
+def manifest_values(key):
+    """Yield top-level ``key`` of every stored backup, reading only that entry's chunks."""
+    for _, manifest in _iter_manifests():
+        for entry_key, entry in manifest.get('entries') or []:
+            if entry_key == key:
+                yield _value_for(entry)
+
+
+def _collect_garbage():
+    live = set()
+    for _, manifest in _iter_manifests():
+        for _, entry in manifest.get('entries') or []:
+            if 'sha256' in entry:
+                live.add(entry['sha256'])
+            live.update(digest for _, digest in entry.get('keys') or [])
+            live.update(part['sha256'] for part in ((entry.get('rows') or {}).get('months') or {}).values())
+    removed = 0
+    cutoff = time.time() - _GC_GRACE_SECONDS
+    chunk_root = os.path.join(store_dir(), 'chunks')
+    for sub in os.listdir(chunk_root) if os.path.isdir(chunk_root) else []:
+        directory = os.path.join(chunk_root, sub)
+        for digest in os.listdir(directory):
+            if digest in live or digest.startswith('.'):
+                continue
+            path = os.path.join(directory, digest)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def prune(kind, keep, *, protected=()):
+    """Drop all but the newest ``keep`` backups of ``kind`` (``protected`` ids are kept) and sweep chunks."""
+    protected = set(protected or ())
+    with _lock:
+        index = _load_index()
+        ordered = sorted(
+            (bid for bid, entry in index.items() if entry.get('kind') == kind),
+            key=lambda bid: index[bid].get('created_at') or '',
+            reverse=True,
+        )
+        doomed = [bid for bid in ordered[max(0, int(keep)):] if bid not in protected]
+        if not doomed:
+            return 0
+        for backup_id in doomed:
+            entry = index.pop(backup_id)
+            try:
+                os.remove(manifest_path(entry['kind'], entry['name']))
+            except (OSError, KeyError, ValueError):
+                pass
+        _save_index(index)
+        _collect_garbage()
+        return len(doomed)
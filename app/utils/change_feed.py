@@ -0,0 +1,448 @@
+"""
+change_feed.py — Per-version change feed over the offline ledger.
+
+The `?since=` delta of GET /offline-data filtered scores by timestamp and
+still shipped every other collection whole. The feed instead records, for
+each saved server_version, which rows of which collections changed:
+
+  {"op": "rows", "upsert": [row, ...], "delete": ["<id>", ...]}   lists keyed by row id
+  {"op": "keys", "set": {...}, "delete": [...]}                  dict collections
+  {"op": "set", "value": ...}                                    scalars / id-less lists
+  {"op": "drop"}                                                 key removed
+
+``delete`` entries are tombstones: str(id) of rows that left the list. A
+list is diffed by id only when every row is a dict with a unique non-empty
+``id``; otherwise a change ships the whole collection.
+
+record() runs after a revision is durable. It diffs per-row digests
+against the state recorded for the previous save, reusing the revision
+journal's fingerprints when it computed them, and keeps the last
+EA_CHANGE_FEED_REVISIONS entries (default 256) as (base, version, changes).
+patch_since(n, data) folds the entries chained from version n up to the
+current one into a single patch, or returns None when n is not on this
+process's chain (pruned, written by another worker, reset after a restore)
+and the caller must send a full snapshot instead. apply_patch(base, changes)
+is the inverse, used by replication receivers to rebuild the sender's
+ledger on top of their own before merging it.
+
+State lives in module globals guarded by a lock, like the data_paths caches.
+Entries hold references to the saved rows, which the cache contract already
+treats as read-only.
+
+Each entry is also appended to change_feed.jsonl next to the journal
+segments, so the feed is shared by every worker process: patch_since()
+falls back to the file when its own chain does not reach ``n``, and
+record() first catches its per-row state up with entries other workers
+appended, so its entry chains from the version they left on disk. The file
+keeps at most twice EA_CHANGE_FEED_REVISIONS entries and is cleared when
+versions go backwards.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import deque
+
+from app.utils.ledger_repository import _digest, _fingerprint, journal_dir
+
+__all__ = ['record', 'patch_since', 'apply_patch', 'reset', 'status', 'row_keys']
+
+_state = {
+    'version': None,      # server_version of the last recorded save
+    'collections': None,  # key -> ('rows' | 'dict', {key: digest}) or ('list' | 'value', digest)
+    'entries': deque(),   # {'base', 'version', 'changes'} in version order
+}
+_lock = threading.Lock()
+_file = {'sig': None, 'entries': []}  # parsed change_feed.jsonl, keyed by (path, size, mtime)
+
+_log = logging.getLogger(__name__)
+
+
+def _max_entries():
+    try:
+        return max(1, int(str(os.getenv('EA_CHANGE_FEED_REVISIONS', '') or '').strip() or 256))
+    except ValueError:
+        return 256
+
+
+def row_keys(rows):
+    """str(id) of every row, or None when the list cannot be diffed by id."""
+    keys = []
+    for row in rows:
+        if not isinstance(row, dict):
+            return None
+        rid = row.get('id')
+        if rid is None or rid == '':
+            return None
+        keys.append(str(rid))
+    return keys if len(set(keys)) == len(keys) else None
+
+
+def _collection_state(value, fingerprint):
+    kind, body = fingerprint
+    if kind == 'list':
+        keys = row_keys(value)
+        if keys is not None:
+            return 'rows', dict(zip(keys, body))
+        return 'list', _digest(body)
+    return kind, body
+
+
+def _diff(old, new, value):
+    if old == new:
+        return None
+    if old is None or old[0] != new[0] or new[0] in ('list', 'value'):
+        return {'op': 'set', 'value': value}
+    old_body, new_body = old[1], new[1]
+    if new[0] == 'rows':
+        changed = {k for k, d in new_body.items() if old_body.get(k) != d}
+        return {
+            'op': 'rows',
+            'upsert': [row for row in value if str(row.get('id')) in changed],
+            'delete': [k for k in old_body if k not in new_body],
+        }
+    return {
+        'op': 'keys',
+        'set': {k: value[k] for k, d in new_body.items() if old_body.get(k) != d},
+        'delete': [k for k in old_body if k not in new_body],
+    }
+
+
+def _feed_path():
+    return os.path.join(journal_dir(), 'change_feed.jsonl')
+
+
+def _read_feed():
+    """Entries persisted by every worker, oldest first; caller holds the lock."""
+    path = _feed_path()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return []
+    sig = (path, st.st_size, st.st_mtime_ns)
+    if _file['sig'] == sig:
+        return _file['entries']
+    entries = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # a line torn by a crash mid-append
+                if isinstance(entry, dict) and isinstance(entry.get('changes'), dict):
+                    entries.append(entry)
+    except OSError:
+        return []
+    _file.update(sig=sig, entries=entries)
+    return entries
+
+
+def _rewrite_feed(entries):
+    path = _feed_path()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.change_feed.', dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str) + '\n')
+    os.replace(tmp, path)
+    _file.update(sig=None, entries=[])
+
+
+def _append_feed(entry):
+    path = _feed_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(line)
+    entries = _read_feed()
+    if len(entries) > 2 * _max_entries():
+        _rewrite_feed(entries[-_max_entries():])
+
+
+def _clear_feed():
+    try:
+        os.remove(_feed_path())
+    except OSError:
+        pass
+    _file.update(sig=None, entries=[])
+
+
+def _chain(entries, since, until=None, below=None):
+    """
+    Shortest run of entries leading from version ``since`` to ``until``, or,
+    with ``below``, to the newest version under it that can be reached.
+    None when there is no such run.
+    """
+    by_base = {}
+    for entry in entries:
+        base, version = entry.get('base'), entry.get('version')
+        if not isinstance(base, int) or not isinstance(version, int) or not since <= base < version:
+            continue
+        if (until is not None and version > until) or (below is not None and version >= below):
+            continue
+        by_base.setdefault(base, []).append(entry)
+    reached = {since: None}
+    queue = deque([since])
+    while queue:
+        cursor = queue.popleft()
+        for entry in by_base.get(cursor, ()):
+            if entry['version'] not in reached:
+                reached[entry['version']] = entry
+                queue.append(entry['version'])
+    target = until if until is not None else max(reached)
+    if target not in reached:
+        return None
+    chain = []
+    while target != since:
+        entry = reached[target]
+        chain.append(entry)
+        target = entry['base']
+    return chain[::-1]
+
+
+def _advance(collections, changes):
+    """Per-key state after ``changes``; None when an op cannot be followed from digests alone."""
+    out = dict(collections)
+    for key, op in changes.items():
+        kind = op.get('op') if isinstance(op, dict) else None
+        state = out.get(key)
+        if kind == 'drop':
+            out.pop(key, None)
+        elif kind == 'set':
+            value = op.get('value')
+            out[key] = _collection_state(value, _fingerprint(value))
+        elif kind == 'rows' and state is not None and state[0] == 'rows':
+            body = dict(state[1])
+            for rid in op.get('delete') or ():
+                body.pop(str(rid), None)
+            for row in op.get('upsert') or ():
+                body[str(row.get('id'))] = _digest(row)
+            out[key] = ('rows', body)
+        elif kind == 'keys' and state is not None and state[0] == 'dict':
+            body = dict(state[1])
+            for k in op.get('delete') or ():
+                body.pop(k, None)
+            for k, v in (op.get('set') or {}).items():
+                body[k] = _digest(v)
+            out[key] = ('dict', body)
+        else:
+            return None
+    return out
+
+
+def _catch_up(base, previous, version):
+    """(base, state) advanced along entries other workers persisted after ``base``."""
+    chain = _chain(_read_feed(), base, below=version)
+    for entry in chain or ():
+        advanced = _advance(previous, entry['changes'])
+        if advanced is None:
+            break
+        previous, base = advanced, entry['version']
+        _state['entries'].append(entry)
+    return base, previous
+
+
+def record(payload, fingerprints=None, changed_keys=None, changed_since=None):
+    """
+    Record the save of ``payload`` (already durable). ``fingerprints`` are the
+    journal's per-key fingerprints of this payload, if it computed them;
+    ``changed_keys`` with ``changed_since`` promise every other key is
+    unchanged since that version. Returns the entry, or None when this save
+    only (re)established the baseline.
+    """
+    if not isinstance(payload, dict):
+        return None
+    try:
+        version = int(payload.get('server_version') or 0)
+    except (TypeError, ValueError):
+        return None
+    fingerprints = fingerprints or {}
+    with _lock:
+        base = _state['version']
+        previous = _state['collections']
+        if previous is not None and base is not None and version > base:
+            try:
+                base, previous = _catch_up(base, previous, version)
+            except Exception:
+                _log.exception('Change feed could not read the persisted feed')
+        if previous is None or base is None or version <= base:
+            # First save seen, or versions went backwards (restore/reseed):
+            # earlier entries no longer describe this ledger.
+            _state['entries'].clear()
+            _state['collections'] = {
+                str(key): _collection_state(value, fingerprints.get(str(key)) or _fingerprint(value))
+                for key, value in payload.items()
+            }
+            _state['version'] = version
+            try:
+                persisted = _read_feed()
+                if (base is not None and version <= base) or (persisted and persisted[-1].get('version', 0) >= version):
+                    _clear_feed()
+            except Exception:
+                _log.exception('Change feed could not reset the persisted feed')
+            return None
+        if changed_keys is not None and changed_since == base:
+            keys = {str(k) for k in changed_keys}
+        else:
+            keys = {str(k) for k in payload} | set(previous)
+        collections = dict(previous)
+        changes = {}
+        for key in keys:
+            if key not in payload:
+                if collections.pop(key, None) is not None:
+                    changes[key] = {'op': 'drop'}
+                continue
+            value = payload[key]
+            state = _collection_state(value, fingerprints.get(key) or _fingerprint(value))
+            op = _diff(previous.get(key), state, value)
+            if op is not None:
+                changes[key] = op
+            collections[key] = state
+        entry = {'base': base, 'version': version, 'changes': changes}
+        entries = _state['entries']
+        entries.append(entry)
+        while len(entries) > _max_entries():
+            entries.popleft()
+        _state['collections'] = collections
+        _state['version'] = version
+        try:
+            _append_feed(entry)
+        except Exception:
+            _log.exception('Change feed entry for version %s was not persisted', version)
+        return entry
+
+
+def _fold(out, key, op, data):
+    prev = out.get(key)
+    kind = op['op']
+    if kind == 'rows':
+        upsert = {str(row.get('id')): row for row in op['upsert']}
+        if prev is None:
+            out[key] = {'op': 'rows', 'upsert': upsert, 'delete': set(op['delete'])}
+            return
+        if prev['op'] == 'rows':
+            for rid in op['delete']:
+                prev['upsert'].pop(rid, None)
+                prev['delete'].add(rid)
+            for rid, row in upsert.items():
+                prev['delete'].discard(rid)
+                prev['upsert'][rid] = row
+            return
+    elif kind == 'keys':
+        if prev is None:
+            out[key] = {'op': 'keys', 'set': dict(op['set']), 'delete': set(op['delete'])}
+            return
+        if prev['op'] == 'keys':
+            for k in op['delete']:
+                prev['set'].pop(k, None)
+                prev['delete'].add(k)
+            for k, v in op['set'].items():
+                prev['delete'].discard(k)
+                prev['set'][k] = v
+            return
+    else:
+        out[key] = dict(op)
+        return
+    # An incremental op on top of a whole-value op: the patch ends at the
+    # current version, so ship the collection as it is now.
+    out[key] = {'op': 'set', 'value': data.get(key)} if key in data else {'op': 'drop'}
+
+
+def patch_since(version, data):
+    """
+    Changes turning the ledger at ``version`` into ``data`` (the current,
+    recorded ledger), as {'since_version', 'server_version', 'changes'}; or
+    None when that cannot be answered from the feed.
+    """
+    if not isinstance(data, dict):
+        return None
+    try:
+        version = int(version)
+        current = int(data.get('server_version') or 0)
+    except (TypeError, ValueError):
+        return None
+    if version > current:
+        return None
+    with _lock:
+        chain = _chain(_state['entries'], version, until=current) if _state['version'] == current else None
+        if chain is None:
+            # Not on this process's chain: another worker may have recorded it.
+            try:
+                chain = _chain(_read_feed(), version, until=current)
+            except Exception:
+                _log.exception('Change feed could not read the persisted feed')
+            if chain is None:
+                return None
+    out = {}
+    for entry in chain:
+        for key, op in entry['changes'].items():
+            _fold(out, key, op, data)
+    for op in out.values():
+        if op['op'] == 'rows':
+            op['upsert'] = list(op['upsert'].values())
+            op['delete'] = sorted(op['delete'])
+        elif op['op'] == 'keys':
+            op['delete'] = sorted(op['delete'])
+    return {'since_version': version, 'server_version': current, 'changes': out}
+
+
+def apply_patch(base, changes):
+    """
+    New ledger dict: ``base`` with patch ``changes`` applied. Upserted rows
+    replace the row with the same id (or are appended) and tombstoned ids are
+    removed. Containers are copied one level, so ``base`` is left untouched.
+    """
+    out = {}
+    for key, value in (base or {}).items():
+        out[key] = list(value) if isinstance(value, list) else dict(value) if isinstance(value, dict) else value
+    for key, op in (changes or {}).items():
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind == 'drop':
+            out.pop(key, None)
+        elif kind == 'set':
+            out[key] = op.get('value')
+        elif kind == 'rows':
+            rows = out.get(key) if isinstance(out.get(key), list) else []
+            gone = {str(rid) for rid in op.get('delete') or ()}
+            upsert = {}
+            for row in op.get('upsert') or ():
+                if isinstance(row, dict) and row.get('id') not in (None, ''):
+                    upsert[str(row['id'])] = row
+            merged = []
+            for row in rows:
+                rid = str(row.get('id')) if isinstance(row, dict) else None
+                if rid in gone:
+                    continue
+                merged.append(upsert.pop(rid, row) if rid is not None else row)
+            merged.extend(upsert.values())
+            out[key] = merged
+        elif kind == 'keys':
+            current = out.get(key) if isinstance(out.get(key), dict) else {}
+            current.update(op.get('set') or {})
+            for k in op.get('delete') or ():
+                current.pop(k, None)
+            out[key] = current
+        else:
+            raise ValueError(f'Unknown change-feed op {kind!r} for key {key!r}')
+    return out
+
+
+def reset():
+    with _lock:
+        _state['version'] = None
+        _state['collections'] = None
+        _state['entries'].clear()
+        _clear_feed()
+
+
+def status():
+    with _lock:
+        entries = _state['entries']
+        return {
+            'version': _state['version'],
+            'entries': len(entries),
+            'oldest_base': entries[0]['base'] if entries else _state['version'],
+        }
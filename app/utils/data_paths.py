@@ -15,12 +15,16 @@ Priority:
 import os
 import json as _json
 import threading as _threading
+from collections import OrderedDict as _OrderedDict
 from pathlib import Path
 
 __all__ = [
     'get_storage_root', 'get_data_path', 'get_backup_dir',
     'load_json_data_cached', 'invalidate_data_cache', 'prime_data_cache',
     'get_serialized_response', 'store_serialized_response',
+    'register_ledger_writer', 'save_ledger_data',
+    'ledger_backend', 'get_ledger_store', 'ledger_index_for',
+    'month_totals_for', 'get_month_totals_path', 'roll_resolver_for',
 ]
 
 _storage_root_cache: str = ''
@@ -35,24 +39,51 @@ _data_cache = {
     'path': None,
     'mtime_ns': 0,
     'size': -1,
+    'store_sig': None,   # backend store signature (shard manifest stat), if any
+    'shared_seq': None,  # ledger_coordinator commit sequence the data was read at
     'data': None,
 }
 _data_cache_lock = _threading.Lock()
 
+# ── Ledger lookup index (app.utils.ledger_index) ─────────────────────────────
+# Built lazily, once per cache generation: every prime/invalidate drops it,
+# since a primed dict may be the same object mutated in place.
+_index_state = {'index': None}
+_index_lock = _threading.Lock()
+
+# ── Per-student month totals (app.utils.month_totals) ────────────────────────
+# Unlike the index this survives a prime: the recorded merge delta advances
+# it to the new version. Any other cache change drops it.
+_totals_state = {'table': None}
+_totals_lock = _threading.Lock()
+
+# ── Roll-history resolver (app.utils.roll_resolver) ──────────────────────────
+# Tied to the students/roll_history lists rather than the version, so it
+# outlives a prime of the same (refreshed) lists.
+_roll_state = {'resolver': None}
+_roll_lock = _threading.Lock()
+
 # ── Serialized-response cache ────────────────────────────────────────────────
 # GET /offline-data spends ~124ms re-serializing the same 13 MB dict on every
 # request when nothing changed.  We cache the pre-serialized bytes keyed on
 # the same mtime/size as the data cache, so a cache hit returns instantly.
-# Invalidated whenever prime_data_cache or invalidate_data_cache is called.
-_response_cache = {
-    'mtime_ns': 0,
-    'size': -1,
-    'version': -1,       # server_version from payload (monotonic counter)
-    'body': None,        # bytes — pre-serialized JSON response body
-    'etag': None,        # str  — ETag header value
-}
+# Entries are further keyed by the caller's view (scope + allowed months), so
+# e.g. a classroom of student tablets on the same months shares one body.
+# Bounded LRU (EA_RESPONSE_CACHE_ENTRIES, default 16); emptied whenever
+# prime_data_cache or invalidate_data_cache is called.
+_RESPONSE_CACHE_DEFAULT_ENTRIES = 16
+_response_cache = _OrderedDict()   # (mtime_ns, size, version, view) -> (body, etag)
 _response_cache_lock = _threading.Lock()
 
+# ── Ledger writer hook ───────────────────────────────────────────────────────
+# The scoreboard blueprint owns the canonical save path (version bump, revision
+# journal, backups, cache priming). It registers itself here so utilities and
+# other blueprints can persist a full ledger without importing route modules.
+_ledger_writer = None
+# Returns the newest revision staged by the writer but not yet durable (group
+# commit), so a cache miss in that window never serves the older disk state.
+_staged_ledger = None
+
 
 def _project_instance_path() -> str:
     """Return <project_root>/instance/ for use outside Flask context."""
@@ -130,6 +161,56 @@ def get_backup_dir() -> str:
     return os.path.join(get_storage_root(), 'offline_scoreboard_backups')
 
 
+def ledger_backend() -> str:
+    """
+    Storage backend selected by EA_LEDGER_BACKEND: 'json' (default, the single
+    JSON file plus revision journal), 'sqlite' (ledger_sqlite row tables) or
+    'sharded' (ledger_shards per-collection files).
+    """
+    value = str(os.getenv('EA_LEDGER_BACKEND', '') or '').strip().lower()
+    if value in ('sqlite', 'sqlite3'):
+        return 'sqlite'
+    if value in ('sharded', 'shards'):
+        return 'sharded'
+    return 'json'
+
+
+def get_ledger_store():
+    """
+    The store module for the selected backend, or None for plain JSON. Store
+    modules share one protocol: replace_all, apply_revision,
+    note_snapshot_file, load_ledger and store_status.
+    """
+    backend = ledger_backend()
+    if backend == 'sqlite':
+        from app.utils import ledger_sqlite
+        return ledger_sqlite
+    if backend == 'sharded':
+        from app.utils import ledger_shards
+        return ledger_shards
+    return None
+
+
+def _store_signature():
+    # Only the shard store changes on disk without touching the JSON snapshot
+    # in a way a stat can see cheaply; SQLite readers go through the primed cache.
+    if ledger_backend() != 'sharded':
+        return None
+    from app.utils.ledger_shards import manifest_signature
+    return manifest_signature()
+
+
+def _shared_sequence():
+    # Another worker process may have appended a journal revision (no snapshot
+    # stat change) or rewritten the store; its commit sequence bump is what
+    # tells this process's cache to reload.
+    try:
+        from app.utils.ledger_coordinator import shared_sequence
+        return shared_sequence()
+    except Exception:
+        return None
+
+
 def reset_cache():
     """Clear the cached storage root (useful for testing or env change)."""
     global _storage_root_cache
@@ -157,13 +238,17 @@ def load_json_data_cached():
 
     mtime_ns = getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))
     size = st.st_size
+    store_sig = _store_signature()
+    shared_seq = _shared_sequence()
 
     # Fast path — cache hit.
     cache = _data_cache
     if (cache['data'] is not None
             and cache['path'] == path
             and cache['mtime_ns'] == mtime_ns
-            and cache['size'] == size):
+            and cache['size'] == size
+            and cache['store_sig'] == store_sig
+            and cache['shared_seq'] == shared_seq):
         return cache['data']
 
     # Cache miss — reload (under lock so concurrent requests don't stampede).
@@ -172,37 +257,94 @@ def load_json_data_cached():
         if (cache['data'] is not None
                 and cache['path'] == path
                 and cache['mtime_ns'] == mtime_ns
-                and cache['size'] == size):
+                and cache['size'] == size
+                and cache['store_sig'] == store_sig
+                and cache['shared_seq'] == shared_seq):
             return cache['data']
-        try:
-            from app.utils.file_operations import SafeFileReader
-            data = SafeFileReader.read_json(Path(path), default=None)
-            if data is None:
-                # Fallback to existing cache if file read/parse fails to protect in-memory state
+        staged = _staged_ledger() if _staged_ledger is not None else None
+        if isinstance(staged, dict):
+            return staged
+        data = _load_from_ledger_store(path)
+        if data is None:
+            try:
+                from app.utils.file_operations import SafeFileReader
+                data = SafeFileReader.read_json(Path(path), default=None)
+                if data is None:
+                    # Fallback to existing cache if file read/parse fails to protect in-memory state
+                    return cache['data']
+            except Exception:
                 return cache['data']
-        except Exception:
-            return cache['data']
+            # Locked months live in immutable archive files referenced by hash.
+            try:
+                from app.utils.ledger_archive import attach
+                attach(data)
+            except Exception:
+                import logging
+                logging.getLogger(__name__).exception('Ledger archive attach failed')
+            # The snapshot may lag the revision journal by up to one compaction
+            # window; re-apply committed revisions recorded since it was written.
+            try:
+                from app.utils.ledger_repository import replay_journal
+                replay_journal(data, path)
+            except Exception:
+                import logging
+                logging.getLogger(__name__).exception('Ledger journal replay failed; serving snapshot as-is')
+            _import_into_ledger_store(data, path)
+            store_sig = _store_signature()
         cache['path'] = path
         cache['mtime_ns'] = mtime_ns
         cache['size'] = size
+        cache['store_sig'] = store_sig
+        cache['shared_seq'] = shared_seq
         cache['data'] = data
         return data
 
 
+def _load_from_ledger_store(path):
+    """Materialize the ledger from the backend store (SQLite rows / shard files), if one is selected."""
+    try:
+        store = get_ledger_store()
+        if store is None:
+            return None
+        return store.load_ledger(path)
+    except Exception:
+        import logging
+        logging.getLogger(__name__).exception('Ledger store read failed; falling back to the JSON snapshot')
+        return None
+
+
+def _import_into_ledger_store(data, path):
+    """Seed the backend store from a snapshot it has not seen (first switch, external rewrite)."""
+    try:
+        store = get_ledger_store()
+        if store is None or not isinstance(data, dict):
+            return
+        try:
+            revision = int(data.get('server_version') or 0)
+        except (TypeError, ValueError):
+            revision = 0
+        store.replace_all(data, revision)
+        store.note_snapshot_file(path)
+    except Exception:
+        import logging
+        logging.getLogger(__name__).exception('Ledger store import failed; continuing on the JSON snapshot')
+
+
 def invalidate_data_cache():
     """Clear the offline-data cache. Call after writes that bypass mtime."""
     with _data_cache_lock:
         _data_cache['path'] = None
         _data_cache['mtime_ns'] = 0
         _data_cache['size'] = -1
+        _data_cache['store_sig'] = None
+        _data_cache['shared_seq'] = None
         _data_cache['data'] = None
+        _index_state['index'] = None
+        _totals_state['table'] = None
+        _roll_state['resolver'] = None
     # Also invalidate the serialized-response cache.
     with _response_cache_lock:
-        _response_cache['mtime_ns'] = 0
-        _response_cache['size'] = -1
-        _response_cache['version'] = -1
-        _response_cache['body'] = None
-        _response_cache['etag'] = None
+        _response_cache.clear()
 
 
 def prime_data_cache(data: dict):
@@ -220,45 +362,186 @@ def prime_data_cache(data: dict):
     except OSError:
         # File write hasn't landed; bail and let the next reader populate.
         return
+    store_sig = _store_signature()
+    shared_seq = _shared_sequence()
+    totals = _advance_month_totals(data)
     with _data_cache_lock:
         _data_cache['path'] = path
         _data_cache['mtime_ns'] = getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))
         _data_cache['size'] = st.st_size
+        _data_cache['store_sig'] = store_sig
+        _data_cache['shared_seq'] = shared_seq
         _data_cache['data'] = data
+        _index_state['index'] = None
+        _totals_state['table'] = totals
+        resolver = _roll_state['resolver']
+        if resolver is not None and not resolver.matches(data):
+            _roll_state['resolver'] = None
     # Invalidate response cache — data changed, serialized form is stale.
     with _response_cache_lock:
-        _response_cache['mtime_ns'] = 0
-        _response_cache['size'] = -1
-        _response_cache['version'] = -1
-        _response_cache['body'] = None
-        _response_cache['etag'] = None
+        _response_cache.clear()
+
+
+def ledger_index_for(data):
+    """
+    LedgerIndex of the cached ledger when ``data`` is that ledger (or a
+    LedgerView still sharing its collections), else None — callers then scan.
+    Built on first use after each prime/reload.
+    """
+    index = _index_state['index']
+    if index is not None and index.matches(data):
+        return index
+    base = _data_cache['data']
+    if not isinstance(base, dict) or not isinstance(data, dict):
+        return None
+    if data is not base and (data.get('scores') is not base.get('scores')
+                             or data.get('students') is not base.get('students')):
+        return None
+    from app.utils.ledger_index import LedgerIndex
+    with _index_lock:
+        index = _index_state['index']
+        if index is None or not index.matches(base):
+            index = LedgerIndex(base)
+            if _data_cache['data'] is base:
+                _index_state['index'] = index
+    return index if index.matches(data) else None
+
+
+def get_month_totals_path() -> str:
+    from app.utils.month_totals import path_for
+    return path_for(get_data_path())
+
+
+def _advance_month_totals(data):
+    """Previous month totals + the delta recorded for ``data['scores']``, or None."""
+    from app.utils import month_totals
+    changes = month_totals.take(data.get('scores'))
+    table = _totals_state['table']
+    if table is None or changes is None:
+        return None
+    try:
+        return table.advanced(data, changes)
+    except Exception:
+        import logging
+        logging.getLogger(__name__).exception('Month totals advance failed; rebuilding on next read')
+        return None
+
+
+def month_totals_for(data, build=True):
+    """
+    MonthTotals of the cached ledger when ``data`` is that ledger (or a
+    LedgerView still sharing its scores list), else None. Loaded from
+    offline_month_totals.json or rebuilt on first use when the primed delta
+    could not be applied; ``build=False`` only returns an existing table.
+    """
+    table = _totals_state['table']
+    if table is not None and table.matches(data):
+        return table
+    base = _data_cache['data']
+    if not build or not isinstance(base, dict) or not isinstance(data, dict):
+        return None
+    if data is not base and data.get('scores') is not base.get('scores'):
+        return None
+    from app.utils import month_totals
+    with _totals_lock:
+        table = _totals_state['table']
+        if table is None or not table.matches(base):
+            table = month_totals.load(get_month_totals_path(), base) or month_totals.MonthTotals.build(base)
+            if _data_cache['data'] is base:
+                _totals_state['table'] = table
+    return table if table.matches(data) else None
 
 
-def get_serialized_response(mtime_ns: int, size: int, version: int):
+def roll_resolver_for(data, build=True):
     """
-    Return (body_bytes, etag) if the serialized response cache matches the
-    given (mtime_ns, size, version), otherwise (None, None).
+    RollResolver of the cached ledger when ``data`` shares its students and
+    roll_history lists, else None — callers then scan. Compiled on first use;
+    ``build=False`` only returns an existing resolver.
     """
+    resolver = _roll_state['resolver']
+    if resolver is not None and resolver.matches(data):
+        return resolver
+    base = _data_cache['data']
+    if not build or not isinstance(base, dict) or not isinstance(data, dict):
+        return None
+    if data is not base and (data.get('students') is not base.get('students')
+                             or data.get('roll_history') is not base.get('roll_history')):
+        return None
+    from app.utils.roll_resolver import RollResolver
+    with _roll_lock:
+        resolver = _roll_state['resolver']
+        if resolver is None or not resolver.matches(base):
+            resolver = RollResolver(base)
+            if _data_cache['data'] is base:
+                _roll_state['resolver'] = resolver
+    return resolver if resolver.matches(data) else None
+
+
+def _response_cache_limit() -> int:
+    raw = str(os.getenv('EA_RESPONSE_CACHE_ENTRIES', '') or '').strip()
+    try:
+        return max(1, int(raw)) if raw else _RESPONSE_CACHE_DEFAULT_ENTRIES
+    except ValueError:
+        return _RESPONSE_CACHE_DEFAULT_ENTRIES
+
+
+def get_serialized_response(mtime_ns: int, size: int, version: int, view=None):
+    """
+    Return (body_bytes, etag) if the serialized response cache holds an
+    entry for (mtime_ns, size, version, view), otherwise (None, None).
+    ``view`` is any hashable describing the caller's slice of the ledger
+    (None for the full admin payload).
+    """
+    key = (mtime_ns, size, version, view)
     with _response_cache_lock:
-        rc = _response_cache
-        if (rc['body'] is not None
-                and rc['mtime_ns'] == mtime_ns
-                and rc['size'] == size
-                and rc['version'] == version):
-            return rc['body'], rc['etag']
-    return None, None
+        entry = _response_cache.get(key)
+        if entry is None:
+            return None, None
+        _response_cache.move_to_end(key)
+        return entry
 
 
 def store_serialized_response(mtime_ns: int, size: int, version: int,
-                              body: bytes, etag: str):
+                              body: bytes, etag: str, view=None):
     """
     Store a pre-serialized response body in the cache.  Call after building
     a full GET /offline-data response so subsequent identical requests skip
-    the ~124ms json.dumps + encoding step.
+    the ~124ms json.dumps + encoding step.  Entries for an older file state
+    are dropped; past the entry limit the least recently used view goes.
     """
+    key = (mtime_ns, size, version, view)
+    limit = _response_cache_limit()
     with _response_cache_lock:
-        _response_cache['mtime_ns'] = mtime_ns
-        _response_cache['size'] = size
-        _response_cache['version'] = version
-        _response_cache['body'] = body
-        _response_cache['etag'] = etag
+        for stale in [k for k in _response_cache if k[:3] != key[:3]]:
+            del _response_cache[stale]
+        _response_cache[key] = (body, etag)
+        _response_cache.move_to_end(key)
+        while len(_response_cache) > limit:
+            _response_cache.popitem(last=False)
+
+
+def register_ledger_writer(writer, staged=None):
+    """
+    Register the callable used by save_ledger_data() (scoreboard._save_offline_data).
+    ``staged`` optionally returns the newest write-behind payload not yet on disk.
+    """
+    global _ledger_writer, _staged_ledger
+    _ledger_writer = writer
+    _staged_ledger = staged
+
+
+def save_ledger_data(data: dict):
+    """
+    Persist a full offline-ledger dict through the registered writer.
+
+    Direct file rewrites bypass the revision journal and the ledger write
+    lock; every in-app writer should come through here. Falls back to a plain
+    atomic write when no writer is registered (standalone scripts).
+    """
+    writer = _ledger_writer
+    if writer is not None:
+        return writer(data)
+    from app.utils.file_operations import atomic_write_json
+    atomic_write_json(Path(get_data_path()), data, separators=(',', ':'))
+    prime_data_cache(data)
+    return data
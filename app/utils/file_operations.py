@@ -13,18 +13,26 @@ from typing import Any, Dict, Optional, Callable
 from datetime import datetime
 import time
 
+import app.utils.snapshot_codec as snapshot_codec
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
 
 _DEFAULT_READ_VALUE = object()
 
 
 class FileLock:
-    """Simple file-based lock mechanism with stale-lock reclamation.
+    """Cross-process file lock.
 
-    If the holder process crashes mid-operation, its lock file would otherwise
-    block every subsequent writer forever. To prevent this, a lock file older
-    than ``stale_after`` seconds is treated as orphaned and reclaimed. The
-    default (60s) is far longer than any legitimate JSON write, so a healthy
-    holder is never disturbed.
+    On POSIX this is an flock() on ``lock_file``: the kernel releases it when
+    the holder exits or crashes, so nothing can be orphaned and the lock file
+    itself is left in place. Where fcntl is unavailable (Windows) it falls
+    back to an O_EXCL lock file; one older than ``stale_after`` seconds is
+    treated as orphaned and reclaimed. The default (60s) is far longer than
+    any legitimate JSON write, so a healthy holder is never disturbed.
     """
 
     def __init__(self, lock_file: Path, timeout: int = 30, stale_after: int = 60):
@@ -32,6 +40,7 @@ class FileLock:
         self.timeout = timeout
         self.stale_after = stale_after
         self.acquired = False
+        self._fd = None
 
     def _reclaim_if_stale(self):
         """Remove the lock file if it is older than stale_after seconds."""
@@ -44,8 +53,27 @@ class FileLock:
         except Exception:
             pass  # Best-effort; fall through and keep retrying.
 
+    def _acquire_flock(self) -> bool:
+        fd = os.open(str(self.lock_file), os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fd = fd
+                self.acquired = True
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
     def acquire(self) -> bool:
         """Acquire lock with timeout"""
+        if fcntl is not None:
+            return self._acquire_flock()
         start_time = time.time()
         while time.time() - start_time < self.timeout:
             try:
@@ -64,6 +92,14 @@ class FileLock:
     
     def release(self):
         """Release lock"""
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            self.acquired = False
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+            return
         if self.acquired and self.lock_file.exists():
             try:
                 self.lock_file.unlink()
@@ -80,9 +116,49 @@ class FileLock:
         self.release()
 
 
+# Client-view markers stamped on sanitized/month-clipped GET responses. A
+# payload carrying either one is a partial view and must never replace the
+# canonical ledger on disk.
+_LEDGER_VIEW_MARKERS = ('sync_scope', 'allowed_months')
+_LEDGER_LIST_COLLECTIONS = ('students', 'scores', 'attendance')
+
+
+def ensure_ledger_payload(payload: Any) -> Any:
+    """
+    Validate that ``payload`` looks like a full offline-scoreboard ledger.
+
+    Raises ValueError for non-dict payloads, clipped client views and core
+    collections of the wrong type. Returns the payload unchanged so it can be
+    used inline.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError(f'Ledger payload must be a dict, got {type(payload).__name__}')
+    for marker in _LEDGER_VIEW_MARKERS:
+        if payload.get(marker):
+            raise ValueError(f'Refusing to persist a clipped ledger view ({marker}={payload.get(marker)!r})')
+    for key in _LEDGER_LIST_COLLECTIONS:
+        if key in payload and payload[key] is not None and not isinstance(payload[key], list):
+            raise ValueError(f'Ledger collection {key!r} must be a list, got {type(payload[key]).__name__}')
+    return payload
+
+
 def atomic_write_json(file_path: Path, data: Any, *, indent=None, separators=None,
                       ensure_ascii: bool = False, backup: bool = False,
-                      lock_timeout: int = 30) -> None:
+                      lock_timeout: int = 30,
+                      validator: Optional[Callable[[Any], Any]] = None,
+                      codec: Optional[str] = None) -> None:
+    """
+    Atomically replace ``file_path`` with the JSON encoding of ``data``.
+
+    ``validator`` (if given) is called with ``data`` before anything touches
+    disk; raising from it aborts the write and leaves the old file intact.
+    ``codec='zlib'`` writes a compressed snapshot_codec frame instead of plain
+    JSON (``indent`` is ignored); SafeFileReader reads either form.
+    """
+    if codec not in (None, 'json', 'zlib'):
+        raise ValueError(f'Unknown snapshot codec {codec!r}')
+    if validator is not None:
+        validator(data)
     file_path = Path(file_path)
     file_path.parent.mkdir(parents=True, exist_ok=True)
     lock_file = file_path.parent / f'.{file_path.name}.lock'
@@ -98,6 +174,16 @@ def atomic_write_json(file_path: Path, data: Any, *, indent=None, separators=Non
         )
         temp_path = Path(temp_name)
         try:
+            if codec == 'zlib':
+                body = snapshot_codec.dumps(data, separators=separators or (',', ':'),
+                                            ensure_ascii=ensure_ascii)
+                with os.fdopen(fd, 'wb') as temp_file:
+                    temp_file.write(body)
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+                os.replace(temp_path, file_path)
+                temp_path = None
+                return
             with os.fdopen(fd, 'w', encoding='utf-8') as temp_file:
                 json.dump(
                     data,
@@ -190,6 +276,7 @@ class SafeFileReader:
                   lock_timeout: int = 30) -> Any:
         """
         Safely read JSON file with fallback to backup if corrupted.
+        Compressed snapshots (see snapshot_codec) are detected and decoded.
         """
         fallback = {} if default is _DEFAULT_READ_VALUE else default
         try:
@@ -202,15 +289,13 @@ class SafeFileReader:
             
             with FileLock(lock_file, timeout=lock_timeout):
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        return json.load(f)
+                    return snapshot_codec.read_file(file_path)
                 except (json.JSONDecodeError, ValueError):
                     # Try backup file if main is corrupted
                     backup_path = file_path.parent / f"{file_path.name}.backup"
                     if backup_path.exists():
                         try:
-                            with open(backup_path, 'r', encoding='utf-8') as f:
-                                return json.load(f)
+                            return snapshot_codec.read_file(backup_path)
                         except Exception:
                             pass
                     
@@ -321,8 +406,7 @@ class FileIntegrityChecker:
             if not file_path.exists():
                 return False, "File does not exist"
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                json.load(f)
+            snapshot_codec.read_file(file_path)
             
             return True, "JSON is valid"
             
@@ -43,15 +43,40 @@ def month_key(value):
     return ''
 
 
+# Merges compare updated_at/created_at/history stamps of every row on each
+# sync, and the same few thousand strings come back every time; fromisoformat
+# dominated the merge profile. Parsed epochs are memoized per string, and the
+# table is simply dropped when it fills up. Only stamps with an explicit offset
+# (or Z) are memoized: a naive stamp is read in local time, so its epoch moves
+# if the process timezone changes.
+_STAMP_CACHE = {}
+_STAMP_CACHE_LIMIT = 200_000
+
+
 def parse_stamp(value):
     """Parse an ISO timestamp to a float epoch. Returns 0.0 on failure."""
-    raw = str(value or '').strip()
-    if not raw:
-        return 0.0
-    try:
-        return datetime.fromisoformat(raw.replace('Z', '+00:00')).timestamp()
-    except Exception:
+    if not value:
         return 0.0
+    is_text = isinstance(value, str)
+    if is_text:
+        cached = _STAMP_CACHE.get(value)
+        if cached is not None:
+            return cached
+    raw = str(value).strip()
+    stamp = 0.0
+    cacheable = is_text
+    if raw:
+        try:
+            parsed = datetime.fromisoformat(raw.replace('Z', '+00:00'))
+            stamp = parsed.timestamp()
+            cacheable = cacheable and parsed.tzinfo is not None
+        except Exception:
+            stamp = 0.0
+    if cacheable:
+        if len(_STAMP_CACHE) >= _STAMP_CACHE_LIMIT:
+            _STAMP_CACHE.clear()
+        _STAMP_CACHE[value] = stamp
+    return stamp
 
 
 def name_key(value):
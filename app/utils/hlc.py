@@ -0,0 +1,123 @@
+"""
+hlc.py — Hybrid logical clock stamps for ordering ledger changes.
+
+Superset merges and the peer-sync cycle used to order rows and ledgers by
+wall-clock ISO stamps, which needed a 30 s skew margin, Render cold-start
+special cases and a scan of each score row's edit history. An HLC stamp
+keeps the wall clock as its physical part but never runs backwards and
+never falls behind a stamp this node has seen:
+
+  "<physical ms, 13 digits>-<logical counter, 4 hex digits>-<node id>"
+
+Stamps of the same width sort as strings, but callers compare key(stamp),
+an (int, node) tuple: the physical and logical parts packed into one
+integer, with the node id as the deterministic tie-break.
+
+  HybridClock(node).now()          stamp for a local change
+  HybridClock(node).observe(stamp) fold in a stamp received from a peer
+  HybridClock(node).admits(stamp)  whether observe() would accept it
+  key(stamp)                       sort key; (0, '') for missing/invalid
+  legacy(seconds)                  stamp for a pre-HLC row from its wall time
+  latest(*stamps)                  the newest valid stamp, or ''
+
+A peer stamp more than EA_HLC_MAX_DRIFT_SECONDS (default 300) ahead of the
+local wall clock is not folded in, so one badly set clock cannot drag every
+node's stamps into the future; callers ordering rows should likewise ignore
+stamps the clock does not admit.
+"""
+import os
+import re
+import threading
+import time
+
+__all__ = ['HybridClock', 'key', 'legacy', 'latest', 'parse']
+
+_COUNTER_BITS = 16
+_COUNTER_MAX = (1 << _COUNTER_BITS) - 1
+_STAMP_RE = re.compile(r'^(\d{13})-([0-9a-f]{4})-(.*)$')
+
+
+def _format(wall_ms, counter, node):
+    return f'{wall_ms:013d}-{counter:04x}-{node}'
+
+
+def parse(stamp):
+    """(wall_ms, counter, node) of a stamp, or None when it is not one."""
+    match = _STAMP_RE.match(str(stamp or ''))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2), 16), match.group(3)
+
+
+def key(stamp):
+    parsed = parse(stamp)
+    if parsed is None:
+        return 0, ''
+    wall_ms, counter, node = parsed
+    return (wall_ms << _COUNTER_BITS) | counter, node
+
+
+def legacy(seconds):
+    """Stamp standing in for a row that only has a wall-clock time (epoch seconds)."""
+    try:
+        wall_ms = max(0, int(float(seconds) * 1000))
+    except (TypeError, ValueError):
+        wall_ms = 0
+    return _format(wall_ms, 0, '') if wall_ms else ''
+
+
+def latest(*stamps):
+    best = ''
+    for stamp in stamps:
+        if parse(stamp) is not None and (not best or key(stamp) > key(best)):
+            best = stamp
+    return best
+
+
+def _max_drift_ms():
+    try:
+        return max(0, int(float(os.getenv('EA_HLC_MAX_DRIFT_SECONDS', '') or 300) * 1000))
+    except ValueError:
+        return 300 * 1000
+
+
+class HybridClock:
+    def __init__(self, node, wall=time.time):
+        self.node = str(node or '').replace('\n', ' ')[:120]
+        self._wall = wall
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._counter = 0
+
+    def _wall_ms(self):
+        return int(self._wall() * 1000)
+
+    def now(self):
+        with self._lock:
+            wall_ms = self._wall_ms()
+            if wall_ms > self._last_ms:
+                self._last_ms, self._counter = wall_ms, 0
+            elif self._counter < _COUNTER_MAX:
+                self._counter += 1
+            else:
+                # Counter exhausted within one millisecond: borrow the next one.
+                self._last_ms, self._counter = self._last_ms + 1, 0
+            return _format(self._last_ms, self._counter, self.node)
+
+    def admits(self, stamp):
+        """False when ``stamp`` is invalid or further ahead of the wall clock than the allowed drift."""
+        parsed = parse(stamp)
+        return parsed is not None and parsed[0] <= self._wall_ms() + _max_drift_ms()
+
+    def observe(self, stamp):
+        """Advance past ``stamp``; returns False when it is invalid or too far ahead."""
+        parsed = parse(stamp)
+        if parsed is None:
+            return False
+        remote_ms, remote_counter, _ = parsed
+        with self._lock:
+            if remote_ms > self._wall_ms() + _max_drift_ms():
+                return False
+            if (remote_ms, remote_counter) > (self._last_ms, self._counter):
+                self._last_ms, self._counter = remote_ms, remote_counter
+            return True
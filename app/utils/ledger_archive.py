@@ -0,0 +1,362 @@
+"""
+ledger_archive.py — Immutable per-month archives for locked/frozen months.
+
+Score rows of months in locked_months / hardened frozen_months never change
+through normal sync (_preserve_locked_historical_window restores them from
+the server copy), yet they made up most of every snapshot write, backup copy
+and cache-miss parse. When the scoreboard writes the JSON snapshot, the rows
+of each locked month are moved into a content-addressed archive file
+
+  <storage_root>/offline_ledger_archive/<YYYY-MM>.<sha256[:20]>.json
+
+and the snapshot keeps only a reference:
+
+  "archived_months": {"2026-01": {"file": ..., "sha256": ..., "rows": 812,
+                                  "positions": [[0, 812]]}}
+
+``positions`` are (start, count) runs of the rows' indices in the full
+``scores`` list, so attach() restores the exact original order. Archives are
+written once and never modified (backups copy the snapshot and keep
+referring to them); an admin edit to a locked month simply produces a new
+archive file with a new hash. prune() deletes the files that no snapshot,
+backup or restore point references any more.
+
+Rows are compared by content, never by identity: write paths may edit a
+cached row in place, so a month is re-archived whenever the digest of its
+rows differs from the one its archive was built from.
+
+Readers: data_paths.load_json_data_cached() and the scoreboard backup/restore
+loaders call attach() on every snapshot-format file they parse, so the
+in-memory ledger is always complete. Archived rows are parsed once per
+process and shared across reloads (the per-hash cache never goes stale). A
+client can instead ask GET /offline-data?archived=omit for the live months
+plus the index, and fetch a month from /scoreboard/archive/<month> only when
+it is viewed.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from app.utils.data_paths import get_storage_root
+from app.utils.ledger_repository import _digest
+
+__all__ = [
+    'INDEX_KEY', 'archive_dir', 'split_locked_months', 'attach', 'read_month',
+    'current_index', 'referenced_files', 'prune',
+]
+
+INDEX_KEY = 'archived_months'
+_FORMAT = 1
+_MONTH_RE = re.compile(r'^\d{4}-\d{2}$')
+_FILE_RE = re.compile(r'^\d{4}-\d{2}\.[0-9a-f]{20}\.json$')
+_END = object()
+# Unreferenced archives younger than this are kept: the snapshot that will
+# reference them may still be on its way to disk.
+_GC_GRACE_SECONDS = 600
+
+_log = logging.getLogger(__name__)
+_lock = threading.RLock()
+# sha256 -> parsed rows. The rows are shared with the ledger they were
+# attached to, so they are only reused while their content digest still
+# equals _content_by_sha[sha256] (the digest of the archived rows).
+_rows_by_sha = {}
+_content_by_sha = {}
+# month -> (content digest, sha256, file) of its latest archive; lets repeated
+# snapshot writes skip rewriting a month whose rows did not change.
+_memo = {}
+# Index of the last snapshot written or attached (for ?archived=omit
+# responses), and the last current_index() answer keyed by ledger revision.
+_current = {'root': None, 'index': {}, 'answer': None}
+
+
+def archive_dir() -> str:
+    return os.path.join(get_storage_root(), 'offline_ledger_archive')
+
+
+def _row_month(row):
+    if not isinstance(row, dict):
+        return ''
+    return str(row.get('month') or str(row.get('date') or '')[:7]).strip()
+
+
+def _runs(positions):
+    runs = []
+    for pos in positions:
+        if runs and runs[-1][0] + runs[-1][1] == pos:
+            runs[-1][1] += 1
+        else:
+            runs.append([pos, 1])
+    return runs
+
+
+def _expand(runs):
+    out = []
+    for start, count in runs or []:
+        out.extend(range(int(start), int(start) + int(count)))
+    return out
+
+
+def _write_archive(month, rows):
+    body = json.dumps({'format': _FORMAT, 'month': month, 'scores': rows},
+                      ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()
+    directory = archive_dir()
+    name = f'{month}.{digest[:20]}.json'
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(dir=directory, prefix='.archive.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_name, path)
+        except BaseException:
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
+            raise
+    return digest, name
+
+
+def _cached_rows(digest):
+    rows = _rows_by_sha.get(digest)
+    if rows is not None and _digest(rows) == _content_by_sha.get(digest):
+        return rows
+    return None
+
+
+def _archive_month(month, rows):
+    content = _digest(rows)
+    memo = _memo.get(month)
+    if memo and memo[0] == content and os.path.exists(os.path.join(archive_dir(), memo[2])):
+        return memo[1], memo[2]
+    digest, name = _write_archive(month, rows)
+    _rows_by_sha[digest] = rows
+    _content_by_sha[digest] = content
+    _memo[month] = (content, digest, name)
+    return digest, name
+
+
+def _remember_index(index):
+    _current['root'] = get_storage_root()
+    _current['index'] = dict(index)
+    _current['answer'] = None
+
+
+def split_locked_months(payload, locked_months):
+    """
+    Return the on-disk form of ``payload``: a shallow copy whose ``scores``
+    omit the rows of ``locked_months`` and whose INDEX_KEY references their
+    archives. Returns ``payload`` itself when nothing is archived.
+
+    A month still listed in the payload's own index but with no rows in it
+    (a payload that was never attached) keeps its reference, so a snapshot
+    written from it loses nothing.
+    """
+    if not isinstance(payload, dict):
+        return payload
+    locked = {m for m in (locked_months or ()) if _MONTH_RE.match(str(m))}
+    carried = payload.get(INDEX_KEY) if isinstance(payload.get(INDEX_KEY), dict) else {}
+    scores = payload.get('scores') if isinstance(payload.get('scores'), list) else []
+    if not locked:
+        return payload
+    by_month, positions, live = {}, {}, []
+    for pos, row in enumerate(scores):
+        month = _row_month(row)
+        if month in locked:
+            by_month.setdefault(month, []).append(row)
+            positions.setdefault(month, []).append(pos)
+        else:
+            live.append(row)
+    # Carried references no longer know their place in this list; attach() puts them first.
+    index = {
+        m: {k: v for k, v in e.items() if k != 'positions'}
+        for m, e in carried.items() if isinstance(e, dict) and m not in by_month
+    }
+    if not by_month:
+        return payload
+    with _lock:
+        for month in sorted(by_month):
+            rows = by_month[month]
+            digest, name = _archive_month(month, rows)
+            index[month] = {
+                'file': name,
+                'sha256': digest,
+                'rows': len(rows),
+                'positions': _runs(positions[month]),
+            }
+        _remember_index(index)
+    out = dict(payload)
+    out['scores'] = live
+    out[INDEX_KEY] = index
+    return out
+
+
+def _load_rows(entry):
+    digest = str(entry.get('sha256') or '')
+    rows = _cached_rows(digest)
+    if rows is not None:
+        return rows
+    path = os.path.join(archive_dir(), os.path.basename(str(entry.get('file') or '')))
+    with open(path, 'rb') as f:
+        body = f.read()
+    if hashlib.sha256(body).hexdigest() != digest:
+        raise ValueError(f'Archive {path} does not match its hash')
+    rows = json.loads(body.decode('utf-8')).get('scores') or []
+    _rows_by_sha[digest] = rows
+    _content_by_sha[digest] = _digest(rows)
+    return rows
+
+
+def attach(payload):
+    """
+    Re-insert archived rows into ``payload['scores']`` in place (original
+    order) and drop the index. Months whose archive cannot be read keep their
+    index entry so the reference survives the next snapshot write.
+    """
+    if not isinstance(payload, dict):
+        return payload
+    index = payload.get(INDEX_KEY)
+    if not isinstance(index, dict):
+        payload.pop(INDEX_KEY, None)
+        return payload
+    live = payload.get('scores') if isinstance(payload.get('scores'), list) else []
+    head, placed, extra, missing = [], {}, [], {}
+    with _lock:
+        for month, entry in index.items():
+            try:
+                rows = _load_rows(entry)
+                spots = _expand(entry.get('positions'))
+            except (OSError, ValueError, AttributeError) as exc:
+                _log.error('Ledger archive for %s unreadable: %s', month, exc)
+                missing[month] = entry
+                continue
+            if len(spots) != len(rows):
+                # No usable positions: archived rows go first, as the lock guard orders them.
+                head.extend(rows)
+                continue
+            for spot, row in zip(spots, rows):
+                if spot in placed:
+                    extra.append(row)
+                else:
+                    placed[spot] = row
+        _remember_index({m: e for m, e in index.items() if m not in missing})
+    merged = list(head)
+    rest = iter(live)
+    for pos in range(len(live) + len(placed)):
+        if pos in placed:
+            merged.append(placed.pop(pos))
+            continue
+        row = next(rest, _END)
+        if row is _END:
+            break
+        merged.append(row)
+    merged.extend(rest)
+    merged.extend(placed[pos] for pos in sorted(placed))
+    merged.extend(extra)
+    payload['scores'] = merged
+    if missing:
+        payload[INDEX_KEY] = missing
+    else:
+        payload.pop(INDEX_KEY, None)
+    return payload
+
+
+def _matches(entry, rows):
+    content = _content_by_sha.get(str(entry.get('sha256') or ''))
+    return content is not None and len(rows) == entry.get('rows') and _digest(rows) == content
+
+
+def current_index(payload):
+    """
+    Archived months whose archive still holds exactly ``payload``'s rows for
+    that month (an admin edit since the last snapshot makes a month stale
+    until the next one): {month: {sha256, rows, file}}. The answer is reused
+    for the same ledger object at the same server_version.
+    """
+    with _lock:
+        if _current['root'] != get_storage_root() or not _current['index']:
+            return {}
+        key = (id(payload), (payload or {}).get('server_version'))
+        if _current['answer'] is not None and _current['answer'][0] == key:
+            return dict(_current['answer'][1])
+        index = _current['index']
+        month_rows = {}
+        for row in (payload or {}).get('scores') or []:
+            month = _row_month(row)
+            if month in index:
+                month_rows.setdefault(month, []).append(row)
+        answer = {
+            m: {k: e[k] for k in ('sha256', 'rows', 'file')}
+            for m, e in index.items() if _matches(e, month_rows.get(m, []))
+        }
+        _current['answer'] = (key, answer)
+        return dict(answer)
+
+
+def read_month(payload, month):
+    """(entry, rows) when ``month`` of ``payload`` is served by a current archive, else (None, None)."""
+    entry = current_index(payload).get(month)
+    if entry is None:
+        return None, None
+    with _lock:
+        try:
+            rows = _load_rows(entry)
+        except (OSError, ValueError):
+            return None, None
+    return entry, rows
+
+
+def referenced_files(payload):
+    """Archive file names a snapshot-format ledger (or backup) refers to."""
+    index = payload.get(INDEX_KEY) if isinstance(payload, dict) else None
+    if not isinstance(index, dict):
+        return set()
+    return {
+        os.path.basename(str(entry.get('file') or ''))
+        for entry in index.values() if isinstance(entry, dict) and entry.get('file')
+    }
+
+
+def prune(referenced, grace_seconds=_GC_GRACE_SECONDS):
+    """
+    Delete archive files not named in ``referenced`` (see referenced_files)
+    and older than ``grace_seconds``; the current snapshot's own archives are
+    always kept. Returns the number of files removed.
+    """
+    directory = archive_dir()
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    with _lock:
+        keep = set(referenced or ()) | {
+            entry.get('file') for entry in _current['index'].values() if isinstance(entry, dict)
+        }
+        for name in os.listdir(directory):
+            if name in keep or not _FILE_RE.match(name):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            gone = [sha for sha in _content_by_sha if f'.{sha[:20]}.' in name]
+            for sha in gone:
+                _rows_by_sha.pop(sha, None)
+                _content_by_sha.pop(sha, None)
+            for month, memo in list(_memo.items()):
+                if memo[2] == name:
+                    _memo.pop(month, None)
+    return removed
@@ -0,0 +1,267 @@
+"""
+ledger_coordinator.py — Cross-process coordination for the offline ledger.
+
+The ledger used to be safe in one process only: _LEDGER_WRITE_LOCK was a
+threading.RLock, and the revision journal, store caches and the parsed-ledger
+cache all assumed nobody else writes. With several Gunicorn/Waitress worker
+processes on one box two things are needed:
+
+1. LedgerLock — a reentrant lock that is exclusive across threads *and*
+   processes. Threads queue on an in-process RLock; the outermost holder in
+   the process takes flock(LOCK_EX) on <storage_root>/.ledger.lock. The kernel
+   drops the flock when a worker dies, so there is no stale-lock reclamation.
+   pin()/unpin() keep the flock held while a group-commit batch is staged but
+   not yet on disk, so another process never reads-modifies-writes around it.
+
+2. A shared commit sequence — an 8-byte counter in <storage_root>/.ledger.seq,
+   memory-mapped by every process. Writers bump it (under the lock) after each
+   durable ledger write; readers compare it to the value their cache was
+   built at (a single memory read), so a journal-only append in another
+   worker — which does not change the snapshot's size/mtime — still
+   invalidates their cache. When the lock is acquired after another process
+   has written, the registered listeners (journal state, data cache) resync.
+
+3. Process roles — hold_role(name) elects one process for a job that must
+   not run in every worker (the replication and mirror outboxes): the first
+   process to take a non-blocking flock on <storage_root>/.<name>.owner keeps
+   it for its lifetime. When it dies the kernel drops the flock and the next
+   hold_role() call in another worker takes over.
+
+Without fcntl (Windows) the lock degrades to the in-process RLock and
+cross_process_supported() is False; the counter still works and every
+process holds every role.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from app.utils.data_paths import get_storage_root
+
+__all__ = [
+    'LedgerLock', 'cross_process_supported', 'shared_sequence',
+    'publish_write', 'register_resync_listener', 'hold_role',
+]
+
+_LOCK_NAME = '.ledger.lock'
+_SEQ_NAME = '.ledger.seq'
+_SEQ = struct.Struct('<Q')
+
+_files_lock = threading.Lock()
+_files = {'pid': None, 'root': None, 'lock_fd': None, 'seq_fd': None, 'seq_map': None}
+# Last sequence value this process wrote or resynced to.
+_seen = {'seq': None}
+_resync_listeners = []
+# role name -> (pid, storage root, fd holding the flock)
+_roles = {}
+
+
+def cross_process_supported() -> bool:
+    return fcntl is not None
+
+
+def _handles():
+    """Per-process, per-storage-root file handles (reopened after fork or a root change)."""
+    root = get_storage_root()
+    pid = os.getpid()
+    if _files['pid'] == pid and _files['root'] == root:
+        return _files
+    with _files_lock:
+        if _files['pid'] == pid and _files['root'] == root:
+            return _files
+        if _files['pid'] == pid:
+            _close_handles()
+        os.makedirs(root, exist_ok=True)
+        lock_fd = os.open(os.path.join(root, _LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        seq_fd = os.open(os.path.join(root, _SEQ_NAME), os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(seq_fd).st_size < _SEQ.size:
+            os.ftruncate(seq_fd, _SEQ.size)
+        _files.update({
+            'pid': pid,
+            'root': root,
+            'lock_fd': lock_fd,
+            'seq_fd': seq_fd,
+            'seq_map': mmap.mmap(seq_fd, _SEQ.size),
+        })
+        _seen['seq'] = None
+        return _files
+
+
+def _close_handles():
+    for key in ('seq_map', 'lock_fd', 'seq_fd'):
+        handle = _files.get(key)
+        if handle is None:
+            continue
+        try:
+            handle.close() if key == 'seq_map' else os.close(handle)
+        except (OSError, ValueError):
+            pass
+        _files[key] = None
+
+
+def shared_sequence() -> int:
+    """Current cross-process commit sequence (0 before the first write)."""
+    try:
+        return _SEQ.unpack_from(_handles()['seq_map'], 0)[0]
+    except (OSError, ValueError):
+        return 0
+
+
+def publish_write() -> int:
+    """Bump the commit sequence after a durable ledger write. Call under LedgerLock."""
+    handles = _handles()
+    value = _SEQ.unpack_from(handles['seq_map'], 0)[0] + 1
+    _SEQ.pack_into(handles['seq_map'], 0, value)
+    _seen['seq'] = value
+    return value
+
+
+def register_resync_listener(callback):
+    """``callback()`` runs under the lock when another process wrote since we last looked."""
+    if callback not in _resync_listeners:
+        _resync_listeners.append(callback)
+
+
+def _resync_if_foreign_write():
+    current = shared_sequence()
+    seen = _seen['seq']
+    _seen['seq'] = current
+    if seen is None or seen == current:
+        return
+    for callback in list(_resync_listeners):
+        try:
+            callback()
+        except Exception:
+            import logging
+            logging.getLogger(__name__).exception('Ledger resync listener failed')
+
+
+def hold_role(name) -> bool:
+    """
+    True when this process holds the process-lifetime role ``name``. Cheap
+    once held; otherwise one non-blocking flock attempt per call, so a
+    worker takes over as soon as the previous holder has died.
+    """
+    if fcntl is None:
+        return True
+    root = get_storage_root()
+    pid = os.getpid()
+    with _files_lock:
+        held = _roles.get(name)
+        if held is not None and held[0] == pid and held[1] == root:
+            return True
+        if held is not None:
+            # Inherited across fork (the parent still holds it) or a root change.
+            _roles.pop(name, None)
+            try:
+                os.close(held[2])
+            except OSError:
+                pass
+        os.makedirs(root, exist_ok=True)
+        fd = os.open(os.path.join(root, f'.{name}.owner'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        _roles[name] = (pid, root, fd)
+        return True
+
+
+class LedgerLock:
+    """Reentrant lock exclusive across threads and (with fcntl) worker processes."""
+
+    def __init__(self):
+        self._local = threading.RLock()
+        self._state = threading.Lock()
+        self._depth = threading.local()
+        self._holders = 0          # outermost thread holds + pins in this process
+        self._flock_fd = None
+
+    def _is_owned(self):
+        return self._local._is_owned()
+
+    def _take_flock(self, deadline):
+        if fcntl is None:
+            return True
+        fd = _handles()['lock_fd']
+        if deadline is None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        return False
+                    time.sleep(0.01)
+        self._flock_fd = fd
+        return True
+
+    def _drop_flock(self):
+        fd, self._flock_fd = self._flock_fd, None
+        if fcntl is not None and fd is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            except OSError:
+                pass
+
+    def acquire(self, blocking=True, timeout=-1):
+        deadline = None
+        if not blocking:
+            timeout = 0
+        if timeout is not None and timeout >= 0:
+            deadline = time.monotonic() + timeout
+        if not self._local.acquire(blocking, timeout if blocking else -1):
+            return False
+        depth = getattr(self._depth, 'value', 0)
+        if depth == 0:
+            with self._state:
+                first = self._holders == 0
+                if first and not self._take_flock(deadline):
+                    self._local.release()
+                    return False
+                self._holders += 1
+            if first:
+                _resync_if_foreign_write()
+        self._depth.value = depth + 1
+        return True
+
+    def release(self):
+        depth = getattr(self._depth, 'value', 0)
+        if depth <= 0:
+            raise RuntimeError('Cannot release an un-acquired ledger lock')
+        self._depth.value = depth - 1
+        if depth == 1:
+            self._unhold()
+        self._local.release()
+
+    def _unhold(self):
+        with self._state:
+            self._holders -= 1
+            if self._holders == 0:
+                self._drop_flock()
+
+    def pin(self):
+        """Keep the process-level lock after release() (call while holding it)."""
+        if not self._is_owned():
+            raise RuntimeError('pin() requires holding the ledger lock')
+        with self._state:
+            self._holders += 1
+
+    def unpin(self):
+        self._unhold()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
@@ -0,0 +1,213 @@
+"""
+ledger_digest.py — Merkle digest of the offline ledger for peer anti-entropy.
+
+The background peer-sync cycle used to download a peer's whole snapshot
+every 30 s just to compare stamps and roster sizes. Peers now exchange a
+two-level hash tree instead:
+
+  root
+   └─ collection (one per top-level ledger key)
+       └─ bucket   month ("YYYY-MM") for month-scoped row lists and
+                   month-keyed dicts, WHOLE ("*") for everything else
+
+A bucket hash is the hash of its sorted row digests, so row order (which
+superset merges do not preserve) never counts as a difference. Keys that
+legitimately differ per node (versions, stamps, replica_origin, sync-op and
+activity logs) are left out. With ``external=True`` the digest describes
+the fee-free copy sent to WAN mirrors (payload_for_external_replication),
+so a master and its Render mirror agree when they hold the same data.
+
+  build(payload, month_fields, month_keyed, month_key, external)  -> tree
+  diff(local_tree, remote_tree)        -> {key: [bucket, ...]} that differ
+  extract(payload, wanted, ...)        -> {key: {bucket: rows | value}}
+  replace_buckets(base, buckets, ...)  -> base with those buckets swapped in
+  patch_changes(payload, buckets, ...) -> change-feed ops carrying them
+
+``month_fields`` maps a row-list collection to the row fields holding its
+date (first non-empty wins); ``month_key`` turns a date-like value into
+"YYYY-MM" or ''. Rows without a month land in the WHOLE bucket.
+"""
+import hashlib
+
+from app.utils.change_feed import row_keys
+from app.utils.ledger_repository import _digest
+
+__all__ = ['WHOLE', 'NODE_LOCAL_KEYS', 'build', 'diff', 'extract', 'replace_buckets', 'patch_changes']
+
+WHOLE = '*'
+
+NODE_LOCAL_KEYS = frozenset({
+    'server_version', 'server_updated_at', 'updated_at', 'server_hlc', 'replica_origin',
+    '_sync_ops', 'activity_log', 'sync_scope', 'allowed_months',
+})
+
+_EXTERNAL_KEYS = frozenset({'fee_records'})
+
+
+def _combine(digests):
+    joined = ','.join(sorted(digests))
+    return hashlib.blake2b(joined.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _row_bucket(row, fields, month_key):
+    if not isinstance(row, dict):
+        return WHOLE
+    value = next((row.get(f) for f in fields if row.get(f)), None)
+    return month_key(value) or WHOLE
+
+
+def _key_bucket(sub_key, month_key):
+    return sub_key if month_key(sub_key) == sub_key else WHOLE
+
+
+def _external_row(key, row):
+    if key == 'students' and isinstance(row, dict) and 'fees' in row:
+        row = dict(row)
+        row.pop('fees', None)
+    return row
+
+
+def _buckets_of(key, value, month_fields, month_keyed, month_key, external):
+    """{bucket: value-or-rows} for one collection."""
+    if isinstance(value, list):
+        fields = month_fields.get(key)
+        if external:
+            value = [_external_row(key, row) for row in value]
+        if not fields:
+            return {WHOLE: value}
+        out = {}
+        for row in value:
+            out.setdefault(_row_bucket(row, fields, month_key), []).append(row)
+        return out
+    if isinstance(value, dict) and key in month_keyed:
+        out = {}
+        for sub_key, sub_value in value.items():
+            bucket = _key_bucket(sub_key, month_key)
+            if bucket == WHOLE:
+                out.setdefault(WHOLE, {})[sub_key] = sub_value
+            else:
+                out[bucket] = sub_value
+        return out
+    return {WHOLE: value}
+
+
+def _bucket_hash(bucket_value):
+    if isinstance(bucket_value, list):
+        return _combine(_digest(row) for row in bucket_value)
+    return _digest(bucket_value)
+
+
+def _included(key, external):
+    return key not in NODE_LOCAL_KEYS and not (external and key in _EXTERNAL_KEYS)
+
+
+def build(payload, month_fields, month_keyed, month_key, external=False):
+    """Hash tree of ``payload``: {'root', 'collections': {key: {'hash', 'buckets'}}}."""
+    collections = {}
+    for key, value in (payload or {}).items():
+        key = str(key)
+        if not _included(key, external):
+            continue
+        buckets = {
+            bucket: _bucket_hash(bucket_value)
+            for bucket, bucket_value in _buckets_of(key, value, month_fields, month_keyed, month_key, external).items()
+        }
+        collections[key] = {
+            'hash': _combine(f'{b}={h}' for b, h in buckets.items()),
+            'buckets': buckets,
+        }
+    root = _combine(f"{k}={c['hash']}" for k, c in collections.items())
+    return {'root': root, 'collections': collections}
+
+
+def diff(local, remote):
+    """Buckets whose hashes differ, as {key: sorted buckets}; absent on one side counts as different."""
+    local_c = (local or {}).get('collections') or {}
+    remote_c = (remote or {}).get('collections') or {}
+    out = {}
+    for key in set(local_c) | set(remote_c):
+        mine, theirs = local_c.get(key), remote_c.get(key)
+        if mine is not None and theirs is not None and mine.get('hash') == theirs.get('hash'):
+            continue
+        mine_b = (mine or {}).get('buckets') or {}
+        theirs_b = (theirs or {}).get('buckets') or {}
+        changed = {b for b in set(mine_b) | set(theirs_b) if mine_b.get(b) != theirs_b.get(b)}
+        out[key] = sorted(changed or {WHOLE})
+    return out
+
+
+def extract(payload, wanted, month_fields, month_keyed, month_key, external=False):
+    """Contents of the ``wanted`` buckets ({key: [bucket, ...]}); absent buckets come back empty."""
+    out = {}
+    for key, buckets in (wanted or {}).items():
+        key = str(key)
+        if not _included(key, external) or key not in (payload or {}):
+            continue
+        have = _buckets_of(key, payload[key], month_fields, month_keyed, month_key, external)
+        out[key] = {str(b): have.get(str(b)) for b in buckets}
+    return out
+
+
+def replace_buckets(base, buckets, month_fields, month_keyed, month_key):
+    """
+    New payload: ``base`` with every bucket in ``buckets`` (as returned by
+    extract) replaced by the given contents; a None bucket is emptied.
+    Containers are copied one level, so ``base`` is left untouched.
+    """
+    out = dict(base or {})
+    for key, contents in (buckets or {}).items():
+        current = out.get(key)
+        if key in month_fields:
+            fields = month_fields[key]
+            rows = current if isinstance(current, list) else []
+            kept = [row for row in rows if _row_bucket(row, fields, month_key) not in contents]
+            for bucket_rows in contents.values():
+                if isinstance(bucket_rows, list):
+                    kept.extend(bucket_rows)
+            out[key] = kept
+        elif key in month_keyed:
+            by_month = current if isinstance(current, dict) else {}
+            merged = {k: v for k, v in by_month.items() if _key_bucket(k, month_key) not in contents}
+            for bucket, value in contents.items():
+                if value is None:
+                    continue
+                if bucket == WHOLE:
+                    merged.update(value)
+                else:
+                    merged[bucket] = value
+            out[key] = merged
+        elif contents.get(WHOLE) is None:
+            out.pop(key, None)
+        else:
+            out[key] = contents[WHOLE]
+    return out
+
+
+def patch_changes(payload, buckets, month_fields, month_keyed, month_key):
+    """
+    Change-feed ops (see change_feed.apply_patch) that carry ``buckets``, as
+    extracted from ``payload``, to a peer. Month buckets of id-keyed row
+    lists become upserts; a list whose rows cannot be keyed by id ships whole.
+    """
+    changes = {}
+    for key, contents in (buckets or {}).items():
+        if key not in payload:
+            changes[key] = {'op': 'drop'}
+        elif key in month_fields and isinstance(payload[key], list):
+            rows = [row for bucket_rows in contents.values() if isinstance(bucket_rows, list) for row in bucket_rows]
+            if row_keys(rows) is not None:
+                changes[key] = {'op': 'rows', 'upsert': rows, 'delete': []}
+            else:
+                changes[key] = {'op': 'set', 'value': payload[key]}
+        elif key in month_keyed:
+            if isinstance(payload[key], dict) and WHOLE not in contents:
+                changes[key] = {
+                    'op': 'keys',
+                    'set': {b: v for b, v in contents.items() if v is not None},
+                    'delete': sorted(b for b, v in contents.items() if v is None),
+                }
+            else:
+                changes[key] = {'op': 'set', 'value': payload[key]}
+        else:
+            changes[key] = {'op': 'set', 'value': contents.get(WHOLE, payload[key])}
+    return changes
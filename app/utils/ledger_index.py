@@ -0,0 +1,153 @@
+"""
+ledger_index.py — Versioned lookup index over the cached offline ledger.
+
+The balance helpers (score_balance, StarCalculator, the scoreboard VETO and
+points sums) each scanned every student and every score row per student, so
+/scoreboard/balances over ~90 students and ~12k scores cost a few million
+row visits per request. A LedgerIndex is built in one pass over a ledger:
+
+  students            by id, by normalized roll
+  scores              by studentId, (studentId, month), (studentId, date)
+  roll_history        by student_id
+  month profiles      per month: by studentId, by roll (built on first use)
+
+Buckets hold the row objects themselves, in ledger order, so callers keep
+applying their own filters and sums exactly as before — the index only
+replaces "scan everything" with "scan this student's rows".
+
+data_paths.ledger_index_for(data) hands out the index of the cached ledger,
+built once per cache generation (every prime/reload starts a new one) and
+only for ``data`` that is that ledger or a LedgerView still sharing its
+collections (matches() checks server_version, list identity, length and the
+first/last score row). For any other dict it returns None and callers fall
+back to a scan.
+"""
+from app.utils.helpers import norm_roll, safe_int, month_key
+
+__all__ = ['LedgerIndex']
+
+_EMPTY = ()
+
+
+def _rows(value):
+    return value if isinstance(value, list) else []
+
+
+class LedgerIndex:
+    """One-pass lookup tables over a ledger dict (treat as read-only)."""
+
+    def __init__(self, data):
+        data = data if isinstance(data, dict) else {}
+        self.version = data.get('server_version')
+        self._students_ref = data.get('students')
+        self._scores_ref = data.get('scores')
+        self._history_ref = data.get('roll_history')
+        self._profiles_ref = data.get('month_roster_profiles')
+        self._sizes = (
+            len(_rows(self._students_ref)), len(_rows(self._scores_ref)), len(_rows(self._history_ref)),
+        )
+        self._score_ends = self._ends(self._scores_ref)
+
+        self.students_by_id = {}
+        self.students_by_roll = {}
+        for student in _rows(self._students_ref):
+            if not isinstance(student, dict):
+                continue
+            sid = safe_int(student.get('id'), 0)
+            if sid > 0:
+                self.students_by_id.setdefault(sid, student)
+            roll = norm_roll(student.get('roll'))
+            if roll:
+                self.students_by_roll.setdefault(roll, student)
+
+        self._by_student = {}
+        self._by_student_month = {}
+        self._by_student_date = {}
+        for row in _rows(self._scores_ref):
+            if not isinstance(row, dict):
+                continue
+            sid = safe_int(row.get('studentId'), 0)
+            self._by_student.setdefault(sid, []).append(row)
+            self._by_student_month.setdefault((sid, month_key(row.get('month') or row.get('date'))), []).append(row)
+            date = str(row.get('date') or '').strip()
+            if date:
+                self._by_student_date.setdefault((sid, date), []).append(row)
+
+        self._history = {}
+        for entry in _rows(self._history_ref):
+            if isinstance(entry, dict):
+                self._history.setdefault(safe_int(entry.get('student_id'), 0), []).append(entry)
+
+        self._profiles = {}
+
+    @staticmethod
+    def _ends(rows):
+        rows = _rows(rows)
+        return (rows[0], rows[-1]) if rows else None
+
+    def _same_ends(self, rows):
+        ends = self._ends(rows)
+        if ends is None or self._score_ends is None:
+            return ends is self._score_ends
+        return ends[0] is self._score_ends[0] and ends[1] is self._score_ends[1]
+
+    def matches(self, data) -> bool:
+        """True while ``data`` still has the collections this index was built from."""
+        if not isinstance(data, dict):
+            return False
+        students, scores, history = data.get('students'), data.get('scores'), data.get('roll_history')
+        return (
+            data.get('server_version') == self.version
+            and students is self._students_ref
+            and scores is self._scores_ref
+            and history is self._history_ref
+            and data.get('month_roster_profiles') is self._profiles_ref
+            and (len(_rows(students)), len(_rows(scores)), len(_rows(history))) == self._sizes
+            and self._same_ends(scores)
+        )
+
+    def student(self, student_id):
+        return self.students_by_id.get(safe_int(student_id, 0))
+
+    def student_by_roll(self, roll):
+        return self.students_by_roll.get(norm_roll(roll))
+
+    def scores_for(self, student_id, month=None):
+        """Score rows of a student (in a YYYY-MM month, keyed on month or date), in ledger order."""
+        sid = safe_int(student_id, 0)
+        if month is None:
+            return self._by_student.get(sid, _EMPTY)
+        return self._by_student_month.get((sid, month_key(month)), _EMPTY)
+
+    def scores_on(self, student_id, date):
+        return self._by_student_date.get((safe_int(student_id, 0), str(date or '').strip()), _EMPTY)
+
+    def roll_history_for(self, student_id):
+        return self._history.get(safe_int(student_id, 0), _EMPTY)
+
+    def _month_profiles(self, month):
+        month = month_key(month)
+        found = self._profiles.get(month)
+        if found is not None:
+            return found
+        raw = (self._profiles_ref or {}).get(month) if isinstance(self._profiles_ref, dict) else None
+        rows = raw.values() if isinstance(raw, dict) else (raw if isinstance(raw, list) else ())
+        by_id, by_roll = {}, {}
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            sid = safe_int(row.get('studentId') or row.get('student_id'), 0)
+            if sid:
+                by_id.setdefault(sid, row)
+            roll = norm_roll(row.get('roll'))
+            if roll:
+                by_roll.setdefault(roll, row)
+        found = (by_id, by_roll)
+        self._profiles[month] = found
+        return found
+
+    def month_profile_by_id(self, month, student_id):
+        return self._month_profiles(month)[0].get(safe_int(student_id, 0))
+
+    def month_profile_by_roll(self, month, roll):
+        return self._month_profiles(month)[1].get(norm_roll(roll))
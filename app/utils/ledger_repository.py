@@ -0,0 +1,708 @@
+"""
+ledger_repository.py — Append-only revision journal for the offline ledger.
+
+Every _save_offline_data() call becomes one *revision*: a compact record of
+what changed since the previous revision, appended to the current segment
+file under <storage_root>/ledger_journal/. The full offline_scoreboard_data.json
+snapshot is only rewritten on *compaction* (every EA_LEDGER_COMPACT_EVERY
+revisions or EA_LEDGER_COMPACT_SECONDS seconds), so a one-row proposal vote
+costs a few-KB append instead of a multi-MB rewrite.
+
+Segment layout (JSON lines, one file per compaction epoch):
+  {"type": "snapshot", "revision": N, "size": ..., "mtime_ns": ...}   first line
+  {"type": "revision", "revision": N+1, "op_id": ..., "changes": {...}}
+  {"type": "commit",   "revision": N+1, "op_id": ..., "payload_sha256": ...}
+  {"type": "failed",   "revision": N+2, "op_id": ..., "error": ...}
+  ...
+
+Change records are diffs against the previous revision, per top-level key:
+  {"op": "splice", "start": i, "delete": k, "rows": [...]}   list collections
+  {"op": "rows", "set": {"<index>": row, ...}}                in-place row edits
+  {"op": "keys", "set": {...}, "delete": [...]}               dict collections
+  {"op": "set", "value": ...}                                 scalars / type change
+  {"op": "drop"}                                              key removed
+
+replay_journal() is called by data_paths.load_json_data_cached on a cache
+miss: when the snapshot file on disk is exactly the one recorded by the last
+snapshot marker, committed revisions newer than it are re-applied in order.
+A snapshot replaced outside the journal (a script, a manual copy) has a
+different size/mtime: revisions chained from its server_version are
+re-applied and the rewrite is logged as an error; an older ledger (a
+restore) is served as-is. Both force a full snapshot on the next save.
+
+State lives in module globals guarded by a lock, like the data_paths caches.
+Tools that edit offline_scoreboard_data.json directly (scripts/reconcile_stars.py,
+the fix_*.py scripts) must only run right after a forced compaction, with the
+server stopped: ``python -m app.utils.ledger_repository compact`` writes the
+replayed ledger as a self-contained snapshot and starts an empty segment.
+
+Writers in several worker processes are serialized by ledger_coordinator's
+LedgerLock; when it sees another process wrote in between, resync_state()
+drops this process's view so it is rebuilt from the segment files and the
+next revision is recorded as a checkpoint.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from app.utils.data_paths import get_storage_root
+
+__all__ = [
+    'journal_dir', 'prepare_revision', 'mark_revision_committed',
+    'mark_revision_failed', 'note_snapshot_written', 'replay_journal',
+    'journal_status', 'resync_state', 'compact_snapshot',
+]
+
+_SEGMENT_PREFIX = 'segment_'
+_SEGMENT_SUFFIX = '.jsonl'
+_OP_INDEX_MAX = 4000
+
+_state = {
+    'dir': None,             # journal directory the state below belongs to
+    'segment': None,         # path of the segment currently appended to
+    'revision': 0,           # last committed revision
+    'snapshot_revision': 0,  # revision contained in the on-disk snapshot
+    'snapshot_at': 0.0,      # wall-clock epoch of the last snapshot write
+    'fingerprints': None,    # per-key fingerprints of the last committed revision
+    'sources': None,         # {'payload', 'values'}: the objects those fingerprints were taken from
+    'force_snapshot': False, # the snapshot was rewritten outside the journal; write a full one next
+    'pending': {},           # revision -> {'fingerprints', 'op_id', 'payload_sha256'}
+    'op_index': OrderedDict(),  # op_id -> (revision, payload_sha256)
+}
+_state_lock = threading.RLock()
+_log = logging.getLogger(__name__)
+
+
+def journal_dir() -> str:
+    return os.path.join(get_storage_root(), 'ledger_journal')
+
+
+def _env_int(name, default, minimum=0):
+    try:
+        value = int(str(os.getenv(name, '') or '').strip() or default)
+    except (TypeError, ValueError):
+        value = default
+    return max(minimum, value)
+
+
+def compact_every() -> int:
+    """Revisions between full snapshot rewrites (EA_LEDGER_COMPACT_EVERY, default 50)."""
+    return _env_int('EA_LEDGER_COMPACT_EVERY', 50, minimum=1)
+
+
+def compact_interval_seconds() -> int:
+    """Max seconds a revision may live only in the journal (EA_LEDGER_COMPACT_SECONDS, default 300)."""
+    return _env_int('EA_LEDGER_COMPACT_SECONDS', 300, minimum=0)
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ── Fingerprinting / diffing ────────────────────────────────────────────────
+
+def _digest(value) -> str:
+    raw = json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _fingerprint(value):
+    if isinstance(value, list):
+        return ('list', [_digest(row) for row in value])
+    if isinstance(value, dict):
+        return ('dict', {k: _digest(v) for k, v in value.items()})
+    return ('value', _digest(value))
+
+
+def _fingerprint_payload(payload):
+    return {str(key): _fingerprint(value) for key, value in payload.items()}
+
+
+def _fingerprint_changed(payload, changed_keys, changed_since):
+    """
+    Fingerprint ``payload`` against the last committed revision. With a
+    change set from the revision a view started from, only ``changed_keys``
+    are hashed. Without one, a key whose value is still the very object the
+    baseline was fingerprinted from keeps its fingerprint: the cache contract
+    makes objects shared with a committed ledger read-only, except through
+    that ledger's own dict, which in-place writers edit and which is
+    therefore always hashed in full.
+    """
+    baseline = _state['fingerprints']
+    if baseline is None:
+        return _fingerprint_payload(payload)
+    if changed_keys is not None and changed_since is not None and _state['revision'] == changed_since:
+        fingerprints = dict(baseline)
+        for key in changed_keys:
+            key = str(key)
+            if key in payload:
+                fingerprints[key] = _fingerprint(payload[key])
+            else:
+                fingerprints.pop(key, None)
+        return fingerprints
+    sources = _state['sources']
+    if sources is None or payload is sources['payload']:
+        return _fingerprint_payload(payload)
+    values = sources['values']
+    fingerprints = {}
+    for key, value in payload.items():
+        key = str(key)
+        if key in baseline and key in values and values[key] is value:
+            fingerprints[key] = baseline[key]
+        else:
+            fingerprints[key] = _fingerprint(value)
+    return fingerprints
+
+
+def _collection_digest(fp) -> str:
+    kind, body = fp
+    if kind == 'list':
+        joined = ','.join(body)
+    elif kind == 'dict':
+        joined = ','.join(sorted(f'{k}={v}' for k, v in body.items()))
+    else:
+        joined = body
+    return hashlib.sha256(f'{kind}:{joined}'.encode('utf-8')).hexdigest()
+
+
+def _payload_root(fingerprints) -> str:
+    h = hashlib.sha256()
+    for key in sorted(fingerprints):
+        h.update(key.encode('utf-8'))
+        h.update(b'\0')
+        h.update(_collection_digest(fingerprints[key]).encode('ascii'))
+        h.update(b'\n')
+    return h.hexdigest()
+
+
+def _diff_list(old, new, rows):
+    """Smallest single splice (or in-place row set) turning `old` into `new`."""
+    old_len, new_len = len(old), len(new)
+    limit = min(old_len, new_len)
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    if prefix == old_len == new_len:
+        return None
+    suffix = 0
+    while (suffix < limit - prefix
+           and old[old_len - 1 - suffix] == new[new_len - 1 - suffix]):
+        suffix += 1
+    old_mid = old_len - prefix - suffix
+    new_mid = new_len - prefix - suffix
+    if old_mid == new_mid:
+        changed = {
+            str(i): rows[i]
+            for i in range(prefix, prefix + new_mid)
+            if old[i] != new[i]
+        }
+        return {'op': 'rows', 'set': changed}
+    return {
+        'op': 'splice',
+        'start': prefix,
+        'delete': old_mid,
+        'rows': rows[prefix:prefix + new_mid],
+    }
+
+
+def _diff_payload(old_fps, new_fps, payload):
+    changes = {}
+    for key, new_fp in new_fps.items():
+        old_fp = old_fps.get(key)
+        if old_fp == new_fp:
+            continue
+        value = payload.get(key)
+        if old_fp is None or old_fp[0] != new_fp[0] or new_fp[0] == 'value':
+            changes[key] = {'op': 'set', 'value': value}
+        elif new_fp[0] == 'list':
+            op = _diff_list(old_fp[1], new_fp[1], value)
+            if op is not None:
+                changes[key] = op
+        else:
+            old_keys, new_keys = old_fp[1], new_fp[1]
+            changes[key] = {
+                'op': 'keys',
+                'set': {k: value[k] for k, d in new_keys.items() if old_keys.get(k) != d},
+                'delete': [k for k in old_keys if k not in new_keys],
+            }
+    for key in old_fps:
+        if key not in new_fps:
+            changes[key] = {'op': 'drop'}
+    return changes
+
+
+def _apply_changes(payload, changes):
+    for key, op in (changes or {}).items():
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind == 'drop':
+            payload.pop(key, None)
+        elif kind == 'set':
+            payload[key] = op.get('value')
+        elif kind == 'splice':
+            rows = payload.get(key)
+            rows = list(rows) if isinstance(rows, list) else []
+            start = int(op.get('start') or 0)
+            rows[start:start + int(op.get('delete') or 0)] = list(op.get('rows') or [])
+            payload[key] = rows
+        elif kind == 'rows':
+            rows = payload.get(key)
+            rows = list(rows) if isinstance(rows, list) else []
+            for index, row in (op.get('set') or {}).items():
+                i = int(index)
+                if 0 <= i < len(rows):
+                    rows[i] = row
+            payload[key] = rows
+        elif kind == 'keys':
+            current = payload.get(key)
+            current = dict(current) if isinstance(current, dict) else {}
+            current.update(op.get('set') or {})
+            for k in op.get('delete') or []:
+                current.pop(k, None)
+            payload[key] = current
+        else:
+            raise ValueError(f'Unknown journal op {kind!r} for key {key!r}')
+
+
+# ── Segment files ───────────────────────────────────────────────────────────
+
+def _segment_name(first_revision):
+    return f'{_SEGMENT_PREFIX}{int(first_revision):012d}{_SEGMENT_SUFFIX}'
+
+
+def _list_segments(directory):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(
+        os.path.join(directory, name)
+        for name in names
+        if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX)
+    )
+
+
+def _read_records(segment_path):
+    records = []
+    try:
+        with open(segment_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn tail from a crash mid-append; everything after it is suspect.
+                    break
+                if isinstance(record, dict):
+                    records.append(record)
+    except OSError:
+        pass
+    return records
+
+
+def _append_record(segment_path, record):
+    line = json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+    with open(segment_path, 'a', encoding='utf-8') as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(line)
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_size, getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))
+
+
+def _prune_segments(directory, keep):
+    segments = _list_segments(directory)
+    for old in segments[:-keep] if keep > 0 else segments:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+
+
+def _ensure_state():
+    """(Re)load journal state when first used or the storage root moved."""
+    directory = journal_dir()
+    if _state['dir'] == directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _state.update({
+        'dir': directory,
+        'segment': None,
+        'revision': 0,
+        'snapshot_revision': 0,
+        'snapshot_at': 0.0,
+        'fingerprints': None,
+        'sources': None,
+        'pending': {},
+        'op_index': OrderedDict(),
+    })
+    segments = _list_segments(directory)
+    if not segments:
+        return
+    _state['segment'] = segments[-1]
+    coalesced = {}
+    for record in _read_records(segments[-1]):
+        kind = record.get('type')
+        revision = int(record.get('revision') or 0)
+        if kind == 'revision' and record.get('coalesced_op_ids'):
+            coalesced[revision] = record['coalesced_op_ids']
+        elif kind == 'snapshot':
+            _state['snapshot_revision'] = revision
+            _state['revision'] = max(_state['revision'], revision)
+            _state['snapshot_at'] = float(record.get('epoch') or 0.0)
+        elif kind == 'commit':
+            _state['revision'] = max(_state['revision'], revision)
+            _remember_op(record.get('op_id'), revision, record.get('payload_sha256'))
+            for coalesced_op in coalesced.pop(revision, ()):
+                _remember_op(coalesced_op, revision, record.get('payload_sha256'))
+
+
+def _remember_op(op_id, revision, payload_sha256):
+    if not op_id:
+        return
+    index = _state['op_index']
+    index[op_id] = (revision, payload_sha256)
+    index.move_to_end(op_id)
+    while len(index) > _OP_INDEX_MAX:
+        index.popitem(last=False)
+
+
+def _start_segment(snapshot_revision, snapshot_path):
+    """Begin a new segment whose first line records the snapshot just written."""
+    _state['force_snapshot'] = False
+    directory = _state['dir']
+    size, mtime_ns = _file_signature(snapshot_path)
+    segment = os.path.join(directory, _segment_name(snapshot_revision))
+    if os.path.exists(segment):
+        # Same revision snapshotted twice (e.g. external rewrite) — keep names unique.
+        segment = os.path.join(directory, _segment_name(snapshot_revision).replace(
+            _SEGMENT_SUFFIX, f'.{int(time.time() * 1000)}{_SEGMENT_SUFFIX}'))
+    epoch = time.time()
+    _append_record(segment, {
+        'type': 'snapshot',
+        'revision': snapshot_revision,
+        'size': size,
+        'mtime_ns': mtime_ns,
+        'epoch': epoch,
+        'at': _now_iso(),
+    })
+    _state['segment'] = segment
+    _state['snapshot_revision'] = snapshot_revision
+    _state['snapshot_at'] = epoch
+    _prune_segments(directory, _env_int('EA_LEDGER_JOURNAL_KEEP_SEGMENTS', 8, minimum=1))
+
+
+def _snapshot_due(revision):
+    if _state['fingerprints'] is None or _state['segment'] is None or _state['force_snapshot']:
+        return True
+    if revision - _state['snapshot_revision'] >= compact_every():
+        return True
+    interval = compact_interval_seconds()
+    return interval <= 0 or (time.time() - _state['snapshot_at']) >= interval
+
+
+# ── Public API (called from scoreboard._save_offline_data_locked) ───────────
+
+def prepare_revision(*, revision, payload, op_id, source='server', actor_login_id='',
+                     actor_role='', base_version=None, changed_keys=None, changed_since=None,
+                     coalesced_op_ids=()):
+    """
+    Append a revision record for ``payload`` and report whether the full
+    snapshot must be rewritten for this save.
+
+    Returns a dict with ``revision``, ``payload_sha256``, ``changed`` (keys
+    touched), ``snapshot_due`` and ``duplicate``. A duplicate is the same
+    op_id re-submitting byte-identical content; the caller should skip the
+    write and reuse ``revision``. ``changes`` holds the diff ops against
+    ``base_revision`` (both None for a checkpoint) for row-level stores.
+
+    ``changed_keys`` (with ``changed_since``, the revision the caller's
+    copy-on-write view was taken from) promises that every other key is
+    unchanged since that revision; only those keys are fingerprinted.
+    Without it, values that are still the objects of the last committed
+    revision (outside that revision's own dict) reuse its fingerprints.
+
+    ``fingerprints`` are the per-key row digests of ``payload`` (the change
+    feed reuses them instead of hashing the ledger again).
+
+    ``coalesced_op_ids`` lists the other operations folded into this revision
+    by group commit; they are recorded and remembered for duplicate checks
+    alongside ``op_id``. Revisions may therefore skip numbers, so each diff
+    records the revision it was taken against (``diff_base``).
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Journal payload must be a dict')
+    with _state_lock:
+        _ensure_state()
+        fingerprints = _fingerprint_changed(payload, changed_keys, changed_since)
+        root = _payload_root(fingerprints)
+        seen = _state['op_index'].get(op_id) if op_id else None
+        if seen and seen[1] == root:
+            return {
+                'duplicate': True,
+                'revision': seen[0],
+                'payload_sha256': root,
+                'changed': [],
+                'snapshot_due': False,
+                'changes': {},
+                'base_revision': seen[0],
+            }
+
+        snapshot_due = _snapshot_due(revision)
+        record = {
+            'type': 'revision',
+            'revision': revision,
+            'op_id': op_id,
+            'base_version': base_version,
+            'source': source,
+            'actor_login_id': actor_login_id,
+            'actor_role': actor_role,
+            'at': _now_iso(),
+            'payload_sha256': root,
+        }
+        coalesced = [str(o) for o in coalesced_op_ids or () if o and o != op_id]
+        if coalesced:
+            record['coalesced_op_ids'] = coalesced
+        if _state['fingerprints'] is None:
+            # No in-memory baseline (fresh process / external rewrite): the
+            # snapshot itself carries this revision.
+            record['checkpoint'] = True
+            changed = sorted(fingerprints)
+            changes = base_revision_out = None
+        else:
+            changes = _diff_payload(_state['fingerprints'], fingerprints, payload)
+            record['changes'] = changes
+            changed = sorted(changes)
+            base_revision_out = _state['revision']
+            record['diff_base'] = base_revision_out
+        if _state['segment'] is not None:
+            _append_record(_state['segment'], record)
+        _state['pending'][revision] = {
+            'fingerprints': fingerprints,
+            'sources': {'payload': payload, 'values': {str(k): v for k, v in payload.items()}},
+            'op_id': op_id,
+            'payload_sha256': root,
+            'coalesced_op_ids': coalesced,
+        }
+        return {
+            'duplicate': False,
+            'revision': revision,
+            'payload_sha256': root,
+            'changed': changed,
+            'snapshot_due': snapshot_due,
+            'changes': changes,
+            'base_revision': base_revision_out,
+            'fingerprints': fingerprints,
+        }
+
+
+def mark_revision_committed(*, revision, op_id, payload_sha256, snapshot_written=True,
+                            snapshot_path=None):
+    """
+    Record that ``revision`` is durable. When ``snapshot_written`` the full
+    snapshot at ``snapshot_path`` now contains it and a new segment starts.
+    """
+    with _state_lock:
+        _ensure_state()
+        pending = _state['pending'].pop(revision, None)
+        if _state['segment'] is not None:
+            _append_record(_state['segment'], {
+                'type': 'commit',
+                'revision': revision,
+                'op_id': op_id,
+                'payload_sha256': payload_sha256,
+            })
+        elif not snapshot_written:
+            raise RuntimeError('Journal has no open segment; revision must be snapshotted')
+        _state['revision'] = max(_state['revision'], revision)
+        _state['fingerprints'] = pending['fingerprints'] if pending else None
+        _state['sources'] = pending['sources'] if pending else None
+        _remember_op(op_id, revision, payload_sha256)
+        for coalesced_op in (pending or {}).get('coalesced_op_ids') or ():
+            _remember_op(coalesced_op, revision, payload_sha256)
+        if snapshot_written and snapshot_path:
+            _start_segment(revision, snapshot_path)
+
+
+def mark_revision_failed(*, revision, op_id, error=''):
+    with _state_lock:
+        _ensure_state()
+        _state['pending'].pop(revision, None)
+        if _state['segment'] is not None:
+            _append_record(_state['segment'], {
+                'type': 'failed',
+                'revision': revision,
+                'op_id': op_id,
+                'error': str(error or '')[:500],
+            })
+
+
+def note_snapshot_written(snapshot_path, revision):
+    """
+    Register a snapshot written outside prepare/commit (recovery, seed,
+    restore). Journal history before it no longer applies and the next
+    revision is recorded as a checkpoint.
+    """
+    with _state_lock:
+        _ensure_state()
+        _state['fingerprints'] = None
+        _state['sources'] = None
+        _state['pending'].clear()
+        _state['revision'] = max(_state['revision'], int(revision or 0))
+        _start_segment(int(revision or 0), snapshot_path)
+
+
+def replay_journal(snapshot, snapshot_path):
+    """
+    Apply committed revisions newer than ``snapshot`` in place. Returns the
+    number of revisions applied (0 when the snapshot is current).
+
+    A snapshot rewritten outside the journal (a maintenance script, a raw
+    restore) no longer matches the segment's marker. Its server_version says
+    which revision it was read at: committed revisions chained from there
+    are re-applied on top of it and the mismatch is logged as an error, so
+    the rewrite cannot silently discard newer journaled saves (a ledger
+    older than the segment's own snapshot is a restore and is served as-is,
+    also logged). Either way the next save writes a full snapshot. Tools
+    that edit the file directly should only run right after
+    compact_snapshot() (see SERVER_OPERATIONS_GUIDE.md).
+    """
+    if not isinstance(snapshot, dict):
+        return 0
+    with _state_lock:
+        segments = _list_segments(journal_dir())
+        if not segments:
+            return 0
+        records = _read_records(segments[-1])
+        if not records or records[0].get('type') != 'snapshot':
+            return 0
+        marker = records[0]
+        committed = {
+            int(r.get('revision') or 0): r.get('payload_sha256')
+            for r in records if r.get('type') == 'commit'
+        }
+        revision = int(marker.get('revision') or 0)
+        foreign = _file_signature(snapshot_path) != (marker.get('size'), marker.get('mtime_ns'))
+        if foreign:
+            try:
+                foreign_version = int(snapshot.get('server_version') or 0)
+            except (TypeError, ValueError):
+                foreign_version = 0
+            newest = max(committed, default=revision)
+            if foreign_version >= newest:
+                return 0
+            if foreign_version < revision:
+                # Older than the segment's own snapshot: a deliberate restore of
+                # an earlier ledger, which the journal's diffs do not apply to.
+                _log.error(
+                    'Ledger snapshot %s was replaced by an older ledger (server_version %s < %s); '
+                    'journaled revisions up to %s are not applied to it',
+                    snapshot_path, foreign_version, revision, newest,
+                )
+                _state['force_snapshot'] = True
+                return 0
+            _log.error(
+                'Ledger snapshot %s was rewritten outside the journal at server_version %s; '
+                'journal has committed revisions up to %s — re-applying them on top of it',
+                snapshot_path, foreign_version, newest,
+            )
+            revision = foreign_version
+            _state['force_snapshot'] = True
+        applied = 0
+        # Ops replace top-level values instead of mutating them, so a shallow
+        # working copy keeps `snapshot` untouched if a record fails to apply.
+        working = dict(snapshot)
+        for record in records[1:]:
+            if record.get('type') != 'revision':
+                continue
+            rec_rev = int(record.get('revision') or 0)
+            # Group commit skips revision numbers; older records predate diff_base.
+            diff_base = record.get('diff_base')
+            if rec_rev <= revision or int(diff_base if diff_base is not None else rec_rev - 1) != revision:
+                continue
+            if committed.get(rec_rev) != record.get('payload_sha256'):
+                continue
+            if record.get('checkpoint') or 'changes' not in record:
+                break
+            _apply_changes(working, record['changes'])
+            revision = rec_rev
+            applied += 1
+        if applied:
+            snapshot.clear()
+            snapshot.update(working)
+        elif foreign:
+            _log.error('No journaled revision chains from the rewritten snapshot; newer revisions are lost')
+        return applied
+
+
+def resync_state():
+    """Forget in-memory journal state; another process appended since we last looked."""
+    with _state_lock:
+        _state['dir'] = None
+
+
+def journal_status():
+    with _state_lock:
+        _ensure_state()
+        return {
+            'dir': _state['dir'],
+            'segment': os.path.basename(_state['segment'] or ''),
+            'revision': _state['revision'],
+            'snapshot_revision': _state['snapshot_revision'],
+            'pending_revisions': _state['revision'] - _state['snapshot_revision'],
+            'has_baseline': _state['fingerprints'] is not None,
+        }
+
+
+def compact_snapshot():
+    """
+    Write the current ledger (snapshot + replayed revisions, archived months
+    inlined) as a full snapshot and start an empty segment. Run with the
+    server stopped, before a tool edits the snapshot file directly. Returns
+    the snapshot's server_version, or None when there is no ledger.
+    """
+    from pathlib import Path
+    from app.utils.data_paths import (
+        get_data_path, get_ledger_store, invalidate_data_cache, load_json_data_cached,
+    )
+    from app.utils.file_operations import SafeFileWriter
+
+    data = load_json_data_cached()
+    if not isinstance(data, dict):
+        return None
+    path = get_data_path()
+    if not SafeFileWriter.write_json(Path(path), data):
+        raise OSError(f'Failed to write ledger snapshot {path}')
+    try:
+        revision = int(data.get('server_version') or 0)
+    except (TypeError, ValueError):
+        revision = 0
+    note_snapshot_written(path, revision)
+    store = get_ledger_store()
+    if store is not None:
+        store.note_snapshot_file(path)
+    invalidate_data_cache()
+    return revision
+
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] != ['compact']:
+        sys.exit('usage: python -m app.utils.ledger_repository compact')
+    version = compact_snapshot()
+    if version is None:
+        sys.exit('No ledger snapshot found')
+    print(f'Ledger compacted at server_version {version}')
@@ -0,0 +1,308 @@
+"""
+ledger_shards.py — Per-collection shard files for the offline ledger.
+
+Selected with EA_LEDGER_BACKEND=sharded. Every top-level collection (list or
+dict value: scores, attendance, fee_records, veto_tracking, activity_log,
+proposal_votes, ...) is its own JSON file under
+<storage_root>/offline_ledger_shards/, named after its content hash:
+
+  manifest.json                         server_version, key order, scalars
+  scores.<sha256[:20]>.json             one file per collection
+  veto_tracking.<sha256[:20]>.json
+  ...
+
+A save re-serializes only the keys the revision journal reports as changed,
+writes the shards whose hash moved, and then atomically replaces the
+manifest — the manifest swap is the commit point, so a crash mid-save leaves
+the previous shard set intact. Because unchanged shards keep their file
+name, a backup is a directory of hard links plus a manifest copy
+(link_shard_set) and costs almost nothing.
+
+Reads keep a per-shard cache keyed on (file name, size, mtime): after an
+external rewrite only the shards that actually changed are re-parsed.
+
+Authority between the shard set and the monolithic JSON snapshot (still
+written at journal compaction for replication and tools) works as in
+ledger_sqlite: the manifest records the size/mtime of the last snapshot it
+wrote or imported, and a snapshot replaced outside the app is imported.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from app.utils.data_paths import get_storage_root
+
+__all__ = [
+    'shard_dir', 'replace_all', 'apply_revision', 'note_snapshot_file',
+    'load_ledger', 'read_shard_set', 'link_shard_set', 'shard_set_size',
+    'manifest_signature', 'store_status', 'MANIFEST_NAME',
+]
+
+MANIFEST_NAME = 'manifest.json'
+_FORMAT = 1
+
+_lock = threading.RLock()
+# key -> (file name, (size, mtime_ns), parsed value); belongs to _cache_dir.
+_shard_cache = {}
+_cache_dir = {'path': None}
+
+
+def shard_dir() -> str:
+    return os.path.join(get_storage_root(), 'offline_ledger_shards')
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))]
+
+
+def manifest_signature():
+    """(size, mtime_ns) of the live manifest, or None; used by the data_paths cache key."""
+    sig = _file_signature(os.path.join(shard_dir(), MANIFEST_NAME))
+    return tuple(sig) if sig else None
+
+
+def _shard_name(key, digest):
+    safe = re.sub(r'[^A-Za-z0-9_-]', '_', str(key))[:60] or 'key'
+    return f'{safe}.{digest[:20]}.json'
+
+
+def _encode(key, value):
+    body = json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    digest = hashlib.sha256(str(key).encode('utf-8') + b'\0' + body).hexdigest()
+    return body, digest
+
+
+def _write_bytes(path, body):
+    directory = os.path.dirname(path)
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix='.shard.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get('format') != _FORMAT:
+        return None
+    return manifest
+
+
+def _write_manifest(directory, manifest):
+    body = json.dumps(manifest, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    _write_bytes(os.path.join(directory, MANIFEST_NAME), body)
+
+
+def _collect_garbage(directory, manifest):
+    keep = {entry['file'] for entry in (manifest.get('shards') or {}).values()}
+    keep.add(MANIFEST_NAME)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if name in keep or not name.endswith('.json'):
+            continue
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+
+def _remember(directory, key, name, value):
+    if _cache_dir['path'] != directory:
+        _shard_cache.clear()
+        _cache_dir['path'] = directory
+    _shard_cache[key] = (name, _file_signature(os.path.join(directory, name)), value)
+
+
+def _write_shards(payload, revision, dirty):
+    """
+    Bring the shard set in line with ``payload``. ``dirty`` limits which keys
+    are re-serialized (None = all). Returns the keys whose shard was written.
+    """
+    directory = shard_dir()
+    os.makedirs(directory, exist_ok=True)
+    previous = _read_manifest(directory) or {}
+    old_shards = previous.get('shards') or {}
+    shards, inline, written = {}, {}, []
+    for key, value in payload.items():
+        key = str(key)
+        if not isinstance(value, (dict, list)):
+            inline[key] = value
+            continue
+        entry = old_shards.get(key)
+        if entry is not None and dirty is not None and key not in dirty:
+            shards[key] = entry
+            continue
+        body, digest = _encode(key, value)
+        if entry is not None and entry.get('sha256') == digest:
+            shards[key] = entry
+            continue
+        name = _shard_name(key, digest)
+        _write_bytes(os.path.join(directory, name), body)
+        shards[key] = {'file': name, 'sha256': digest, 'size': len(body)}
+        written.append(key)
+        _remember(directory, key, name, value)
+    manifest = {
+        'format': _FORMAT,
+        'server_version': payload.get('server_version'),
+        'revision': int(revision or 0),
+        'updated_at': datetime.now(timezone.utc).isoformat(),
+        'keys': [str(k) for k in payload.keys()],
+        'inline': inline,
+        'shards': shards,
+        'snapshot': previous.get('snapshot'),
+    }
+    _write_manifest(directory, manifest)
+    _collect_garbage(directory, manifest)
+    return written
+
+
+def replace_all(payload, revision):
+    """Write every collection whose content differs from the current shard set."""
+    if not isinstance(payload, dict):
+        raise ValueError('Ledger shard payload must be a dict')
+    with _lock:
+        return _write_shards(payload, revision, None)
+
+
+def apply_revision(*, revision, base_revision, changes, payload):
+    """
+    Write the shards touched by one journal revision. Without a usable diff
+    (checkpoint, or the shard set is not at ``base_revision``) every key is
+    hashed and only the ones that differ are written.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Ledger shard payload must be a dict')
+    with _lock:
+        manifest = _read_manifest(shard_dir()) or {}
+        dirty = None
+        if changes is not None and base_revision is not None and manifest.get('revision') == int(base_revision):
+            dirty = set(changes)
+        return _write_shards(payload, revision, dirty)
+
+
+def note_snapshot_file(snapshot_path):
+    """Record the JSON snapshot the shard set is known to be at or ahead of."""
+    with _lock:
+        directory = shard_dir()
+        manifest = _read_manifest(directory)
+        if manifest is None:
+            return
+        manifest['snapshot'] = _file_signature(snapshot_path)
+        _write_manifest(directory, manifest)
+
+
+def _assemble(directory, manifest, use_cache):
+    payload = {}
+    inline = manifest.get('inline') or {}
+    shards = manifest.get('shards') or {}
+    for key in manifest.get('keys') or []:
+        if key in inline:
+            payload[key] = inline[key]
+            continue
+        entry = shards.get(key)
+        if not entry:
+            continue
+        path = os.path.join(directory, entry['file'])
+        cached = _shard_cache.get(key) if use_cache and _cache_dir['path'] == directory else None
+        if cached and cached[0] == entry['file'] and cached[1] == _file_signature(path):
+            payload[key] = cached[2]
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            value = json.load(f)
+        payload[key] = value
+        if use_cache:
+            _remember(directory, key, entry['file'], value)
+    return payload
+
+
+def load_ledger(snapshot_path):
+    """
+    Assemble the legacy dict view, or None when there is no shard set or the
+    snapshot file was replaced outside the app (the caller imports it).
+    Unchanged shards come from the per-shard cache without re-parsing.
+    """
+    with _lock:
+        directory = shard_dir()
+        manifest = _read_manifest(directory)
+        if manifest is None or manifest.get('snapshot') != _file_signature(snapshot_path):
+            return None
+        return _assemble(directory, manifest, use_cache=True)
+
+
+def read_shard_set(directory):
+    """Assemble a shard-set backup directory into a ledger dict (None if unreadable)."""
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        return None
+    try:
+        return _assemble(directory, manifest, use_cache=False)
+    except (OSError, ValueError):
+        return None
+
+
+def shard_set_size(directory):
+    """Total bytes referenced by a shard set's manifest (no shard is opened)."""
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        return 0
+    return sum(int(entry.get('size') or 0) for entry in (manifest.get('shards') or {}).values())
+
+
+def link_shard_set(dest_dir):
+    """
+    Snapshot the live shard set into ``dest_dir``: shards are hard-linked
+    (copied when the filesystem refuses links) and the manifest is copied.
+    Returns ``dest_dir``, or None when there is no shard set yet.
+    """
+    with _lock:
+        directory = shard_dir()
+        manifest = _read_manifest(directory)
+        if manifest is None:
+            return None
+        os.makedirs(dest_dir, exist_ok=True)
+        for entry in (manifest.get('shards') or {}).values():
+            src = os.path.join(directory, entry['file'])
+            dst = os.path.join(dest_dir, entry['file'])
+            if os.path.exists(dst):
+                continue
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
+        _write_manifest(dest_dir, manifest)
+        return dest_dir
+
+
+def store_status():
+    with _lock:
+        manifest = _read_manifest(shard_dir()) or {}
+        return {
+            'path': shard_dir(),
+            'revision': manifest.get('revision'),
+            'shards': len(manifest.get('shards') or {}),
+            'bytes': sum(int(e.get('size') or 0) for e in (manifest.get('shards') or {}).values()),
+        }
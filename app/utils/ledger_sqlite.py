@@ -0,0 +1,379 @@
+"""
+ledger_sqlite.py — Normalized SQLite store for the offline ledger.
+
+Selected with EA_LEDGER_BACKEND=sqlite (default: json). The hot collections
+live in indexed row tables inside <storage_root>/offline_ledger.sqlite3:
+
+  students               pos, student_id (id),        row_key (roll)
+  scores                 pos, student_id, month, date, row_key (id)
+  attendance             pos, student_id, month, date, row_key (id)
+  fee_records            pos, student_id,              row_key (id)
+  month_roster_profiles  month, pos, roll, student_id
+
+``pos`` is the row's index in the legacy list, so the dict view materialized
+by load_ledger() is byte-for-byte the list the routes wrote. Every other
+top-level key is one JSON value in ``ledger_meta``.
+
+Writes arrive as the per-key diff ops produced by ledger_repository for each
+revision (see apply_revision); a one-score upsert is a single-row UPDATE or
+INSERT inside one transaction instead of a full JSON re-serialize. The JSON
+snapshot keeps being written at journal compaction as a lagging export for
+backups, gist/peer replication and tools that read the file directly.
+
+Which copy is authoritative is decided like the journal does it: the store
+records the size/mtime of the last snapshot file it wrote or imported. While
+the file on disk still matches, the store is ahead of (or equal to) it and
+load_ledger() materializes from the tables; a file replaced outside the app
+(bootstrap, manual copy) no longer matches and is imported instead.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+from app.utils.data_paths import get_storage_root
+
+__all__ = [
+    'store_path', 'replace_all', 'apply_revision',
+    'note_snapshot_file', 'load_ledger', 'query_rows', 'row_month', 'store_status',
+]
+
+_ROW_TABLES = {
+    'students': ('id', None, None, 'roll'),
+    'scores': ('studentId', 'month', 'date', 'id'),
+    'attendance': ('studentId', 'month', 'date', 'id'),
+    'fee_records': ('studentId', None, None, 'id'),
+}
+_PROFILES = 'month_roster_profiles'
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS ledger_info (key TEXT PRIMARY KEY, value TEXT)',
+    'CREATE TABLE IF NOT EXISTS ledger_meta (key TEXT PRIMARY KEY, body TEXT NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS month_roster_profiles ('
+    ' month TEXT NOT NULL, pos INTEGER NOT NULL, roll TEXT, student_id TEXT,'
+    ' body TEXT NOT NULL, PRIMARY KEY (month, pos))',
+    'CREATE INDEX IF NOT EXISTS ix_month_roster_profiles_roll ON month_roster_profiles (roll, month)',
+]
+for _table in _ROW_TABLES:
+    _SCHEMA.extend([
+        f'CREATE TABLE IF NOT EXISTS {_table} ('
+        ' pos INTEGER PRIMARY KEY, student_id TEXT, month TEXT, date TEXT,'
+        ' row_key TEXT, body TEXT NOT NULL)',
+        f'CREATE INDEX IF NOT EXISTS ix_{_table}_student_month ON {_table} (student_id, month)',
+        f'CREATE INDEX IF NOT EXISTS ix_{_table}_student_date ON {_table} (student_id, date)',
+        f'CREATE INDEX IF NOT EXISTS ix_{_table}_month ON {_table} (month)',
+        f'CREATE INDEX IF NOT EXISTS ix_{_table}_row_key ON {_table} (row_key)',
+    ])
+
+_state = {'path': None, 'conn': None}
+_lock = threading.RLock()
+
+
+def store_path() -> str:
+    return os.path.join(get_storage_root(), 'offline_ledger.sqlite3')
+
+
+def _connection():
+    path = store_path()
+    if _state['conn'] is not None and _state['path'] == path:
+        return _state['conn']
+    if _state['conn'] is not None:
+        try:
+            _state['conn'].close()
+        except sqlite3.Error:
+            pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Shared across request threads; every use is serialized by _lock.
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=FULL')
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    _state.update({'path': path, 'conn': conn})
+    return conn
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _text(value):
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _row_columns(table, row):
+    sid_field, month_field, date_field, key_field = _ROW_TABLES[table]
+    if not isinstance(row, dict):
+        return None, None, None, None
+    date = _text(row.get(date_field)) if date_field else None
+    month = _text(row.get(month_field)) if month_field else None
+    if month_field and not month and date:
+        month = date[:7]
+    return _text(row.get(sid_field)), month, date, _text(row.get(key_field))
+
+
+def row_month(row):
+    """The month a score/attendance row is indexed under: ``month``, else ``date[:7]``."""
+    return _row_columns('scores', row)[1]
+
+
+def _get_info(conn, key, default=None):
+    found = conn.execute('SELECT value FROM ledger_info WHERE key = ?', (key,)).fetchone()
+    return json.loads(found[0]) if found else default
+
+
+def _set_info(conn, key, value):
+    conn.execute(
+        'INSERT INTO ledger_info (key, value) VALUES (?, ?) '
+        'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+        (key, _dumps(value)),
+    )
+
+
+def _is_profile_map(value):
+    return isinstance(value, dict) and all(isinstance(v, list) for v in value.values())
+
+
+# ── Writers (all run inside one transaction) ────────────────────────────────
+
+def _insert_rows(conn, table, start, rows):
+    conn.executemany(
+        f'INSERT INTO {table} (pos, student_id, month, date, row_key, body) VALUES (?, ?, ?, ?, ?, ?)',
+        [(start + i, *_row_columns(table, row), _dumps(row)) for i, row in enumerate(rows)],
+    )
+
+
+def _splice_rows(conn, table, start, delete, rows):
+    conn.execute(f'DELETE FROM {table} WHERE pos >= ? AND pos < ?', (start, start + delete))
+    shift = len(rows) - delete
+    if shift:
+        # Two-step renumber through negative positions keeps the primary key
+        # unique at every statement boundary.
+        conn.execute(f'UPDATE {table} SET pos = -(pos + ?) - 1 WHERE pos >= ?', (shift, start + delete))
+        conn.execute(f'UPDATE {table} SET pos = -pos - 1 WHERE pos < 0')
+    _insert_rows(conn, table, start, rows)
+
+
+def _replace_profiles(conn, month, profiles):
+    conn.execute('DELETE FROM month_roster_profiles WHERE month = ?', (month,))
+    conn.executemany(
+        'INSERT INTO month_roster_profiles (month, pos, roll, student_id, body) VALUES (?, ?, ?, ?, ?)',
+        [
+            (
+                month, i,
+                _text(p.get('roll')) if isinstance(p, dict) else None,
+                _text(p.get('studentId')) if isinstance(p, dict) else None,
+                _dumps(p),
+            )
+            for i, p in enumerate(profiles)
+        ],
+    )
+
+
+def _write_key(conn, key, value, tabled):
+    """Store one top-level value from scratch (row tables when it has the normalized shape)."""
+    conn.execute('DELETE FROM ledger_meta WHERE key = ?', (key,))
+    if key in _ROW_TABLES:
+        conn.execute(f'DELETE FROM {key}')
+        if isinstance(value, list):
+            _insert_rows(conn, key, 0, value)
+            tabled[key] = True
+            return
+    elif key == _PROFILES:
+        conn.execute('DELETE FROM month_roster_profiles')
+        if _is_profile_map(value):
+            for month, profiles in value.items():
+                _replace_profiles(conn, month, profiles)
+            tabled[key] = True
+            return
+    tabled.pop(key, None)
+    conn.execute('INSERT INTO ledger_meta (key, body) VALUES (?, ?)', (key, _dumps(value)))
+
+
+def _drop_key(conn, key, tabled):
+    conn.execute('DELETE FROM ledger_meta WHERE key = ?', (key,))
+    if key in _ROW_TABLES:
+        conn.execute(f'DELETE FROM {key}')
+    elif key == _PROFILES:
+        conn.execute('DELETE FROM month_roster_profiles')
+    tabled.pop(key, None)
+
+
+def _apply_op(conn, key, op, payload, tabled):
+    kind = op.get('op') if isinstance(op, dict) else None
+    if kind == 'drop':
+        _drop_key(conn, key, tabled)
+    elif kind == 'splice' and tabled.get(key) and key in _ROW_TABLES:
+        _splice_rows(conn, key, int(op.get('start') or 0), int(op.get('delete') or 0), list(op.get('rows') or []))
+    elif kind == 'rows' and tabled.get(key) and key in _ROW_TABLES:
+        conn.executemany(
+            f'UPDATE {key} SET student_id = ?, month = ?, date = ?, row_key = ?, body = ? WHERE pos = ?',
+            [(*_row_columns(key, row), _dumps(row), int(index)) for index, row in (op.get('set') or {}).items()],
+        )
+    elif kind == 'keys' and tabled.get(key) and key == _PROFILES and _is_profile_map(payload.get(key)):
+        for month, profiles in (op.get('set') or {}).items():
+            _replace_profiles(conn, month, profiles)
+        for month in op.get('delete') or []:
+            conn.execute('DELETE FROM month_roster_profiles WHERE month = ?', (month,))
+    else:
+        # Scalars, meta dicts, and shape changes: rewrite the whole key from
+        # the payload (which already reflects this revision).
+        _write_key(conn, key, payload.get(key), tabled)
+
+
+def _finish(conn, payload, revision, tabled):
+    keys = list(payload.keys())
+    if _get_info(conn, 'keys') != keys:
+        _set_info(conn, 'keys', keys)
+    if tabled.get(_PROFILES):
+        # Month order (and months with an empty roster) are not visible in the rows.
+        months = list(payload[_PROFILES].keys())
+        if _get_info(conn, 'profile_months') != months:
+            _set_info(conn, 'profile_months', months)
+    _set_info(conn, 'tabled', sorted(tabled))
+    _set_info(conn, 'revision', int(revision or 0))
+
+
+def _transaction(conn, work):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        work()
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def replace_all(payload, revision):
+    """Rewrite the whole store from ``payload`` (checkpoint / import / restore)."""
+    if not isinstance(payload, dict):
+        raise ValueError('Ledger store payload must be a dict')
+    with _lock:
+        conn = _connection()
+        tabled = {}
+
+        def work():
+            conn.execute('DELETE FROM ledger_meta')
+            for table in _ROW_TABLES:
+                conn.execute(f'DELETE FROM {table}')
+            conn.execute('DELETE FROM month_roster_profiles')
+            for key, value in payload.items():
+                _write_key(conn, str(key), value, tabled)
+            _finish(conn, payload, revision, tabled)
+
+        _transaction(conn, work)
+
+
+def apply_revision(*, revision, base_revision, changes, payload):
+    """
+    Apply one journal revision as row writes. ``changes`` is the diff against
+    ``base_revision``; when the store is not at that revision (or there is no
+    diff) the revision is written in full instead. Returns 'rows' or 'full'.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError('Ledger store payload must be a dict')
+    with _lock:
+        conn = _connection()
+        if changes is None or base_revision is None or _get_info(conn, 'revision') != int(base_revision):
+            replace_all(payload, revision)
+            return 'full'
+        tabled = {key: True for key in _get_info(conn, 'tabled', [])}
+
+        def work():
+            for key, op in changes.items():
+                _apply_op(conn, str(key), op, payload, tabled)
+            _finish(conn, payload, revision, tabled)
+
+        _transaction(conn, work)
+        return 'rows'
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9))]
+
+
+def note_snapshot_file(snapshot_path):
+    """Record the JSON snapshot the store is known to be at or ahead of."""
+    with _lock:
+        conn = _connection()
+        _set_info(conn, 'snapshot', _file_signature(snapshot_path))
+
+
+def load_ledger(snapshot_path):
+    """
+    Materialize the legacy dict view, or None when the store is empty or the
+    snapshot file was replaced outside the app (the caller imports it).
+    """
+    with _lock:
+        conn = _connection()
+        keys = _get_info(conn, 'keys')
+        if keys is None:
+            return None
+        if _get_info(conn, 'snapshot') != _file_signature(snapshot_path):
+            return None
+        tabled = set(_get_info(conn, 'tabled', []))
+        meta = {key: json.loads(body) for key, body in conn.execute('SELECT key, body FROM ledger_meta')}
+        payload = {}
+        for key in keys:
+            if key in tabled and key in _ROW_TABLES:
+                payload[key] = [json.loads(body) for (body,) in conn.execute(f'SELECT body FROM {key} ORDER BY pos')]
+            elif key in tabled and key == _PROFILES:
+                profiles = {month: [] for month in _get_info(conn, 'profile_months', [])}
+                for month, body in conn.execute('SELECT month, body FROM month_roster_profiles ORDER BY month, pos'):
+                    profiles.setdefault(month, []).append(json.loads(body))
+                payload[key] = profiles
+            elif key in meta:
+                payload[key] = meta[key]
+        return payload
+
+
+def query_rows(collection, *, student_id=None, month=None, date=None, revision=None):
+    """
+    Indexed lookup of rows in a normalized collection, in ledger order.
+    ``month_roster_profiles`` supports ``month`` and ``student_id``. A row's
+    month is its ``month`` field, else the first 7 characters of its date
+    (see row_month). With ``revision``, returns None unless the store has
+    applied exactly that revision.
+    """
+    if collection == _PROFILES:
+        sql, clauses = 'SELECT body FROM month_roster_profiles', []
+        order = ' ORDER BY month, pos'
+    elif collection in _ROW_TABLES:
+        sql, clauses = f'SELECT body FROM {collection}', []
+        order = ' ORDER BY pos'
+    else:
+        raise ValueError(f'{collection!r} is not a normalized ledger collection')
+    params = []
+    for column, value in (('student_id', student_id), ('month', month), ('date', date)):
+        if value is None:
+            continue
+        if collection == _PROFILES and column == 'date':
+            raise ValueError('month_roster_profiles has no date column')
+        clauses.append(f'{column} = ?')
+        params.append(_text(value))
+    if clauses:
+        sql += ' WHERE ' + ' AND '.join(clauses)
+    with _lock:
+        conn = _connection()
+        if revision is not None and _get_info(conn, 'revision') != int(revision):
+            return None
+        return [json.loads(body) for (body,) in conn.execute(sql + order, params)]
+
+
+def store_status():
+    with _lock:
+        conn = _connection()
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in _ROW_TABLES}
+        counts[_PROFILES] = conn.execute('SELECT COUNT(*) FROM month_roster_profiles').fetchone()[0]
+        return {
+            'path': _state['path'],
+            'revision': _get_info(conn, 'revision'),
+            'rows': counts,
+        }
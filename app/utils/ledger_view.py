@@ -0,0 +1,98 @@
+"""
+ledger_view.py — Copy-on-write view over the shared (read-only) ledger dict.
+
+load_json_data_cached() hands every caller the same parsed ledger, so write
+paths used to copy.deepcopy() all of it (hundreds of ms on a 13 MB ledger)
+to change one score row. A LedgerView is a shallow dict over that cache:
+
+    data = LedgerView(load_json_data_cached())
+    scores = data.mutable('scores')          # private list, rows still shared
+    scores[i] = dict(scores[i], points=5)    # replace rows, never edit in place
+    data['updated_at'] = now                 # top-level writes are tracked
+    save_ledger_data(data)
+
+Collections are copied (one level) the first time mutable() asks for them,
+and every top-level key that was assigned, removed or made mutable lands in
+changed_keys(). The scoreboard save path passes that change set to the
+revision journal, which then fingerprints only those keys instead of the
+whole ledger.
+
+The rule that keeps it safe is the cache's existing contract: objects
+reached through the view that were not created by the caller belong to the
+cache and must be replaced, not mutated.
+"""
+
+__all__ = ['LedgerView']
+
+
+class LedgerView(dict):
+    """Shallow, change-tracking dict over a read-only ledger."""
+
+    def __init__(self, base=None):
+        super().__init__(base or {})
+        self._changed = set()
+        self._owned = set()
+        self._base_version = (base or {}).get('server_version')
+
+    @property
+    def base_version(self):
+        """server_version of the ledger this view was taken from."""
+        return self._base_version
+
+    def changed_keys(self):
+        return frozenset(self._changed)
+
+    def mutable(self, key, default_factory=list):
+        """
+        Return a private one-level copy of collection ``key`` (created with
+        ``default_factory`` when missing) and mark the key changed. Rows inside
+        are still shared with the cache: replace them, don't edit them.
+        """
+        if key not in self._owned:
+            value = dict.get(self, key)
+            if isinstance(value, list):
+                value = list(value)
+            elif isinstance(value, dict):
+                value = dict(value)
+            else:
+                value = default_factory()
+            dict.__setitem__(self, key, value)
+            self._owned.add(key)
+        self._changed.add(key)
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self._changed.add(key)
+        self._owned.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._changed.add(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._changed.add(key)
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        self._changed.add(key)
+        return key, value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        self._changed.update(self.keys())
+        dict.clear(self)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
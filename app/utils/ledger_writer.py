@@ -0,0 +1,173 @@
+"""
+ledger_writer.py — Group-commit, write-behind persistence for the offline ledger.
+
+A burst of ledger POSTs (a teacher marking 40 attendance rows) used to pay the
+full durable-write cost per request: journal fsync, snapshot/compaction check,
+backup probe, gist push. With group commit each request only *stages* its
+revision (version bump + cache prime, done by the caller) and hands the
+payload to GroupCommitWriter.submit(). One writer thread persists the newest
+staged payload; everything that arrived while the previous batch was being
+written is coalesced into the next one. Because each payload is a complete
+ledger, persisting the latest one makes every earlier staged version durable.
+
+Durability barrier: submit() returns a ticket (a per-process sequence number,
+not the ledger's server_version, which may move backwards after a restore).
+wait_durable(ticket) blocks until a batch containing it is on disk, and
+raises LedgerWriteError if that batch failed (the writer keeps retrying in
+the background; the staged data stays visible).
+
+Lock discipline: batches run while holding the caller-supplied ledger lock,
+and a batch is only taken off the queue once that lock is held. A thread that
+already owns the ledger lock must therefore call flush() (persist inline)
+rather than wait_durable(), which would deadlock against the writer thread.
+If the lock supports pin()/unpin() (ledger_coordinator.LedgerLock) a staged
+batch pins it, so the cross-process part stays held until the batch is durable
+and other worker processes never read around a write still in memory.
+"""
+import logging
+import threading
+import time
+
+__all__ = ['GroupCommitWriter', 'LedgerWriteError']
+
+_log = logging.getLogger(__name__)
+
+
+class LedgerWriteError(RuntimeError):
+    """A staged ledger version could not be made durable."""
+
+
+class GroupCommitWriter:
+    def __init__(self, persist, *, lock, window_seconds=0.0, retry_seconds=1.0,
+                 name='ea-ledger-writer'):
+        self._persist = persist
+        self._lock = lock
+        self._window = max(0.0, float(window_seconds or 0.0))
+        self._retry = max(0.05, float(retry_seconds or 0.05))
+        self._name = name
+        self._cond = threading.Condition()
+        self._pending = None          # (ticket, payload, [contexts])
+        self._staged_ticket = 0
+        self._durable_ticket = 0
+        self._failed_ticket = 0       # newest ticket whose batch failed
+        self._last_error = None
+        self._batches = 0
+        self._coalesced = 0
+        self._thread = None
+
+    # ── Producer side ────────────────────────────────────────────────────────
+
+    def submit(self, payload, context=None):
+        """Queue an already-staged ``payload`` for the next batch; returns its ticket."""
+        with self._cond:
+            contexts = list(self._pending[2]) if self._pending else []
+            if self._pending:
+                self._coalesced += 1
+            elif hasattr(self._lock, 'pin'):
+                self._lock.pin()
+            contexts.append(context)
+            self._staged_ticket += 1
+            self._pending = (self._staged_ticket, payload, contexts)
+            self._ensure_thread()
+            self._cond.notify_all()
+            return self._staged_ticket
+
+    def pending_payload(self):
+        """The newest staged payload not yet durable, or None."""
+        with self._cond:
+            return self._pending[1] if self._pending else None
+
+    def wait_durable(self, ticket, timeout=None):
+        """
+        Block until ``ticket`` is durable. Returns False on timeout; raises
+        LedgerWriteError when the batch carrying it failed.
+        """
+        with self._cond:
+            done = self._cond.wait_for(
+                lambda: self._durable_ticket >= ticket or self._failed_ticket >= ticket,
+                timeout,
+            )
+            if self._durable_ticket >= ticket:
+                return True
+            if done:
+                raise LedgerWriteError(f'Staged ledger write {ticket} was not persisted: {self._last_error}')
+            return False
+
+    def flush(self):
+        """Persist whatever is staged in the calling thread. Raises on failure."""
+        self._run_batch()
+
+    def close(self, timeout=5.0):
+        """Best-effort final flush (atexit); gives up if the ledger lock stays busy."""
+        if not self._lock.acquire(timeout=timeout):
+            return False
+        try:
+            self._run_batch()
+            return True
+        except Exception:
+            _log.exception('Final ledger flush failed')
+            return False
+        finally:
+            self._lock.release()
+
+    def status(self):
+        with self._cond:
+            return {
+                'staged': self._staged_ticket,
+                'durable': self._durable_ticket,
+                'pending': self._pending is not None,
+                'batches': self._batches,
+                'coalesced': self._coalesced,
+                'last_error': str(self._last_error) if self._last_error else '',
+            }
+
+    # ── Writer side ──────────────────────────────────────────────────────────
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=self._name)
+        self._thread.start()
+
+    def _run_batch(self):
+        with self._lock:
+            with self._cond:
+                batch, self._pending = self._pending, None
+            if batch is None:
+                return
+            ticket, payload, contexts = batch
+            try:
+                self._persist(payload, contexts)
+            except Exception as exc:
+                with self._cond:
+                    if self._pending is None:
+                        self._pending = batch
+                    else:
+                        # A newer payload supersedes this one; keep its audit trail.
+                        newer = self._pending
+                        self._pending = (newer[0], newer[1], contexts + newer[2])
+                        if hasattr(self._lock, 'unpin'):
+                            self._lock.unpin()
+                    self._failed_ticket = max(self._failed_ticket, ticket)
+                    self._last_error = exc
+                    self._cond.notify_all()
+                raise
+            if hasattr(self._lock, 'unpin'):
+                self._lock.unpin()
+            with self._cond:
+                self._durable_ticket = max(self._durable_ticket, ticket)
+                self._last_error = None
+                self._batches += 1
+                self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None)
+            if self._window:
+                time.sleep(self._window)
+            try:
+                self._run_batch()
+            except Exception:
+                _log.exception('Ledger group commit failed; retrying in %.1fs', self._retry)
+                time.sleep(self._retry)
@@ -0,0 +1,308 @@
+"""
+month_totals.py — Materialized per-student, per-month score aggregates.
+
+Monthly rankings, the public scoreboard, historical star/VETO balances and
+the SPA all re-derived the same sums from raw score rows: for every student
+and month, points, stars awarded/used and VETOs awarded/used. A MonthTotals
+table keeps those sums per (month, studentId) so a month's totals cost one
+dict lookup per student instead of a pass over ~12k rows:
+
+  points          sum of row points
+  stars_awarded   sum of positive star deltas
+  stars_used      sum of |negative star deltas|
+  vetos_awarded   sum of positive VETO deltas
+  vetos_used      sum of |negative VETO deltas|
+  rows            number of score rows
+
+Rows are bucketed exactly like score_balance does it: safe_int(studentId)
+and month_key(month or date).
+
+The table is maintained incrementally. The score merge/upsert paths in the
+scoreboard call track() on the list they produce and record(old, new) for
+every row they add or change; when that list is saved and primed into the
+data cache, data_paths folds the recorded delta into the previous table
+(advanced()) instead of rebuilding. The delta carries a fingerprint of the
+rows it started from (row count + grand totals), so it is only applied to
+the table it was computed against; anything else — a write that did not
+record its changes, a reload from disk, a mismatched row count — drops the
+table and the next reader rebuilds it in one pass.
+
+The current table is persisted next to the ledger as offline_month_totals.json
+(save()/load()), so a restart reuses it while its server_version and row
+count still match the ledger.
+"""
+import json
+import os
+import tempfile
+import threading
+
+from app.utils.helpers import safe_float, safe_int, month_key
+
+__all__ = [
+    'FIELDS', 'FILENAME', 'MonthTotals',
+    'path_for', 'save', 'load', 'track', 'record', 'take',
+]
+
+FIELDS = ('points', 'stars_awarded', 'stars_used', 'vetos_awarded', 'vetos_used', 'rows')
+FILENAME = 'offline_month_totals.json'
+_FORMAT = 1
+
+_lock = threading.RLock()
+_pending = {}   # id(scores list) -> (scores list, _Changes)
+
+
+def _cell_key(row):
+    if not isinstance(row, dict):
+        return None
+    return month_key(row.get('month') or row.get('date')), safe_int(row.get('studentId'), 0)
+
+
+def _contribution(row):
+    stars = safe_int(row.get('stars'), 0)
+    vetos = safe_int(row.get('vetos'), 0)
+    return (
+        safe_float(row.get('points'), 0.0),
+        stars if stars > 0 else 0,
+        -stars if stars < 0 else 0,
+        vetos if vetos > 0 else 0,
+        -vetos if vetos < 0 else 0,
+        1,
+    )
+
+
+class MonthTotals:
+    """Per-(month, studentId) sums over a score list (treat as read-only once published)."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.rows_seen = 0
+        self._months = {}
+        self._scores_ref = None
+
+    @classmethod
+    def build(cls, data):
+        data = data if isinstance(data, dict) else {}
+        scores = data.get('scores')
+        table = cls(data.get('server_version'))
+        table.add_rows(scores if isinstance(scores, list) else ())
+        table._scores_ref = scores
+        return table
+
+    def add_rows(self, rows, sign=1):
+        for row in rows:
+            self.add(row, sign)
+            self.rows_seen += sign
+
+    def add(self, row, sign=1):
+        """Add (sign=1) or remove (sign=-1) one row's contribution; non-rows are ignored."""
+        key = _cell_key(row)
+        if key is None:
+            return
+        month, sid = key
+        cells = self._months.setdefault(month, {})
+        cell = cells.get(sid)
+        if cell is None:
+            cell = cells[sid] = [0.0, 0, 0, 0, 0, 0]
+        for i, value in enumerate(_contribution(row)):
+            cell[i] += sign * value
+        if _is_empty(cell):
+            del cells[sid]
+            if not cells:
+                del self._months[month]
+
+    def apply(self, old_row, new_row):
+        """Replace one row's contribution (old_row None for an insert, new_row None for a delete)."""
+        if old_row is not None:
+            self.add(old_row, -1)
+        if new_row is not None:
+            self.add(new_row, 1)
+        self.rows_seen += (new_row is not None) - (old_row is not None)
+
+    def merge(self, other):
+        """Fold another table's cells (typically a delta) into this one."""
+        for month, cells in other._months.items():
+            target = self._months.setdefault(month, {})
+            for sid, values in cells.items():
+                cell = target.get(sid)
+                if cell is None:
+                    cell = target[sid] = [0.0, 0, 0, 0, 0, 0]
+                for i, value in enumerate(values):
+                    cell[i] += value
+                if _is_empty(cell):
+                    del target[sid]
+            if not target:
+                del self._months[month]
+        self.rows_seen += other.rows_seen
+
+    def copy(self):
+        clone = MonthTotals(self.version)
+        clone.rows_seen = self.rows_seen
+        clone._months = {m: {sid: list(cell) for sid, cell in cells.items()} for m, cells in self._months.items()}
+        clone._scores_ref = self._scores_ref
+        return clone
+
+    def fingerprint(self):
+        """Row count and rounded grand totals — identifies the rows a delta was computed against."""
+        grand = [0.0, 0, 0, 0, 0, 0]
+        for cells in self._months.values():
+            for cell in cells.values():
+                for i, value in enumerate(cell):
+                    grand[i] += value
+        grand[0] = round(grand[0], 2)
+        return (self.rows_seen,) + tuple(grand)
+
+    def matches(self, data) -> bool:
+        if not isinstance(data, dict):
+            return False
+        scores = data.get('scores')
+        return (
+            data.get('server_version') == self.version
+            and scores is self._scores_ref
+            and len(scores if isinstance(scores, list) else ()) == self.rows_seen
+        )
+
+    def advanced(self, data, changes):
+        """New table for ``data`` = this table + ``changes``, or None when the delta does not apply."""
+        if changes is None or changes.base != self.fingerprint():
+            return None
+        scores = data.get('scores') if isinstance(data, dict) else None
+        table = self.copy()
+        table.merge(changes.delta)
+        table.version = data.get('server_version')
+        table._scores_ref = scores
+        if table.rows_seen != len(scores if isinstance(scores, list) else ()):
+            return None
+        return table
+
+    def months(self):
+        return sorted(self._months)
+
+    def get(self, student_id, month):
+        """Totals of one student in one month (zeros when the student has no rows)."""
+        cell = self._months.get(month_key(month), {}).get(safe_int(student_id, 0))
+        return _as_dict(cell or (0.0, 0, 0, 0, 0, 0))
+
+    def month(self, month):
+        """{studentId: totals} for every student with rows in ``month``."""
+        return {sid: _as_dict(cell) for sid, cell in self._months.get(month_key(month), {}).items()}
+
+    def to_payload(self):
+        return {
+            'format': _FORMAT,
+            'server_version': self.version,
+            'rows': self.rows_seen,
+            'months': {
+                m: {str(sid): [round(cell[0], 4)] + cell[1:] for sid, cell in cells.items()}
+                for m, cells in self._months.items()
+            },
+        }
+
+    @classmethod
+    def from_payload(cls, payload):
+        if not isinstance(payload, dict) or payload.get('format') != _FORMAT:
+            return None
+        table = cls(payload.get('server_version'))
+        table.rows_seen = safe_int(payload.get('rows'), 0)
+        for m, cells in (payload.get('months') or {}).items():
+            if not isinstance(cells, dict):
+                return None
+            table._months[m] = {
+                safe_int(sid, 0): [safe_float(cell[0], 0.0)] + [safe_int(v, 0) for v in cell[1:]]
+                for sid, cell in cells.items()
+                if isinstance(cell, list) and len(cell) == len(FIELDS)
+            }
+        return table
+
+
+def _is_empty(cell):
+    # A delta cell can net to zero rows while still moving points or stars.
+    return not any(cell[1:]) and abs(cell[0]) < 1e-6
+
+
+def _as_dict(cell):
+    totals = dict(zip(FIELDS, cell))
+    totals['points'] = round(totals['points'], 2)
+    return totals
+
+
+# ── Persistence ─────────────────────────────────────────────────────────────
+
+def path_for(ledger_path):
+    return os.path.join(os.path.dirname(os.path.abspath(ledger_path)), FILENAME)
+
+
+def save(path, table):
+    """Atomically write ``table`` to ``path``."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.month_totals_', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(table.to_payload(), f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load(path, data):
+    """Persisted table for ``data``, or None when missing, unreadable or stale."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            table = MonthTotals.from_payload(json.load(f))
+    except (OSError, ValueError):
+        return None
+    if table is None or not isinstance(data, dict):
+        return None
+    table._scores_ref = data.get('scores')
+    return table if table.matches(data) else None
+
+
+# ── Change tracking for the merge/upsert paths ──────────────────────────────
+
+class _Changes:
+    __slots__ = ('base', 'delta')
+
+    def __init__(self, base_rows):
+        base = MonthTotals()
+        base.add_rows(base_rows or ())
+        self.base = base.fingerprint()
+        self.delta = MonthTotals()
+
+
+def track(scores, base_rows=None):
+    """
+    Start recording changes that turn ``base_rows`` (default: ``scores`` as it
+    is now) into ``scores``. Continuing an existing recording is a no-op, so a
+    list touched by several paths before it is saved keeps one delta.
+    """
+    if not isinstance(scores, list):
+        return
+    with _lock:
+        entry = _pending.get(id(scores))
+        if entry is not None and entry[0] is scores:
+            return
+        _pending[id(scores)] = (scores, _Changes(scores if base_rows is None else base_rows))
+
+
+def record(scores, old_row, new_row):
+    """Note that ``old_row`` became ``new_row`` in a tracked ``scores`` list."""
+    with _lock:
+        entry = _pending.get(id(scores))
+        if entry is not None and entry[0] is scores:
+            entry[1].delta.apply(old_row, new_row)
+
+
+def take(scores):
+    """Recorded changes for ``scores`` (or None); forgets every other recording too."""
+    with _lock:
+        entry = _pending.get(id(scores))
+        _pending.clear()
+    if entry is None or entry[0] is not scores:
+        return None
+    return entry[1]
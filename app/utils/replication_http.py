@@ -0,0 +1,209 @@
+"""
+replication_http.py — Shared pooled HTTP client for replication traffic.
+
+Peer replication, the background peer-sync cycle, backup bootstrap and the
+Gist/Supabase mirrors each built a fresh urllib request per call, so every
+30 s cycle paid a new TCP + TLS handshake to Render. This module keeps one
+process-wide requests.Session whose adapter holds a keep-alive connection
+pool per host:
+
+  request(method, url, ...)   -> HTTPResponse(status, headers, content)
+  get(url, ...) / post(url, ...)
+
+HTTP error statuses are returned, not raised (callers such as the patch
+sender need the 409 body); transport failures (connect, TLS, timeout) raise
+ReplicationHTTPError, an OSError, so existing ``except OSError`` handlers keep
+working. Responses are requested with ``Accept-Encoding: gzip`` and decoded
+transparently; ``compress=True`` gzips the request body once it reaches
+EA_HTTP_GZIP_MIN_BYTES.
+
+Tuning (read per call):
+  EA_HTTP_CONNECT_TIMEOUT_SECONDS  connect timeout, default 10 (the per-call
+                                   ``timeout`` is the read timeout)
+  EA_HTTP_POOL_MAXSIZE             keep-alive connections per host, default 4
+  EA_HTTP_GZIP_MIN_BYTES           smallest body worth compressing, default 1024
+
+read_decoded_body(stream, encoding, max_bytes) is the receiving half: it
+undoes a gzip/deflate Content-Encoding incrementally, refusing bodies that
+inflate past ``max_bytes`` (BodyTooLarge) before they are buffered whole.
+
+Nothing here touches Flask, so it is safe from daemon threads and workers
+that run outside any request or app context.
+"""
+import gzip
+import json
+import os
+import threading
+import zlib
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__all__ = ['BodyTooLarge', 'HTTPResponse', 'ReplicationHTTPError', 'read_decoded_body', 'request', 'get', 'post', 'reset']
+
+_DEFAULT_TIMEOUT = 30.0
+
+_state = {'session': None, 'pid': None}
+_lock = threading.Lock()
+
+
+class ReplicationHTTPError(OSError):
+    """The request never produced an HTTP response, or raise_for_status() on an error status."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class BodyTooLarge(ValueError):
+    """A compressed request body inflated past the receiver's cap."""
+
+
+class HTTPResponse:
+    __slots__ = ('status', 'headers', 'content', 'url')
+
+    def __init__(self, status, headers, content, url):
+        self.status = status
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    def json(self, default=None):
+        """Parsed JSON body, or ``default`` when it is empty or not JSON."""
+        if not self.content:
+            return default
+        try:
+            return json.loads(self.content.decode('utf-8', errors='replace'))
+        except ValueError:
+            return default
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise ReplicationHTTPError(f'HTTP {self.status} from {self.url}', status=self.status)
+        return self
+
+
+def _env_float(name, default):
+    try:
+        return max(0.1, float(os.getenv(name, '') or default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_int(name, default):
+    try:
+        return max(1, int(str(os.getenv(name, '') or '').strip() or default))
+    except ValueError:
+        return default
+
+
+def _session():
+    pid = os.getpid()
+    session = _state['session']
+    if session is not None and _state['pid'] == pid:
+        return session
+    with _lock:
+        session = _state['session']
+        if session is None or _state['pid'] != pid:
+            # A forked worker must not share the parent's sockets.
+            pool_size = _env_int('EA_HTTP_POOL_MAXSIZE', 4)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _state['session'] = session
+            _state['pid'] = pid
+        return session
+
+
+def reset():
+    """Close every pooled connection (tests, or after peers change address)."""
+    with _lock:
+        session = _state['session']
+        _state['session'] = None
+        _state['pid'] = None
+    if session is not None:
+        session.close()
+
+
+def request(method, url, *, headers=None, body=None, json_body=None, timeout=None, compress=False):
+    """
+    Send one request over the pooled session. ``body`` is bytes (or str);
+    ``json_body`` is serialized compactly with a JSON content type. Returns
+    an HTTPResponse for any status; raises ReplicationHTTPError when no
+    response arrives.
+    """
+    out_headers = {'Accept-Encoding': 'gzip, deflate'}
+    out_headers.update(headers or {})
+    if json_body is not None:
+        body = json.dumps(json_body, separators=(',', ':')).encode('utf-8')
+        out_headers.setdefault('Content-Type', 'application/json')
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    if compress and body and len(body) >= _env_int('EA_HTTP_GZIP_MIN_BYTES', 1024):
+        body = gzip.compress(body, compresslevel=6)
+        out_headers['Content-Encoding'] = 'gzip'
+    read_timeout = float(timeout) if timeout is not None else _DEFAULT_TIMEOUT
+    connect_timeout = min(read_timeout, _env_float('EA_HTTP_CONNECT_TIMEOUT_SECONDS', 10.0))
+    try:
+        resp = _session().request(
+            method,
+            url,
+            data=body,
+            headers=out_headers,
+            timeout=(connect_timeout, read_timeout),
+            allow_redirects=True,
+        )
+        # Reading the body here returns the connection to the pool.
+        content = resp.content
+    except requests.RequestException as exc:
+        raise ReplicationHTTPError(f'{method} {url} failed: {exc}') from exc
+    return HTTPResponse(resp.status_code, resp.headers, content, url)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+_DECODABLE = {'gzip', 'x-gzip', 'deflate'}
+
+
+def read_decoded_body(stream, encoding, max_bytes, chunk_size=64 * 1024):
+    """
+    Read ``stream`` to EOF and undo its Content-Encoding (gzip, or zlib-wrapped
+    deflate). Output is inflated at most ``max_bytes`` + 1 bytes at a time, so
+    a decompression bomb costs no more than the cap. Raises BodyTooLarge past
+    the cap, ValueError for an unknown encoding or a corrupt/truncated body.
+    """
+    encoding = str(encoding or '').strip().lower()
+    if encoding not in _DECODABLE:
+        raise ValueError(f'Unsupported Content-Encoding {encoding!r}')
+    # +32: accept either a gzip or a zlib header.
+    inflater = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    out = bytearray()
+    try:
+        while not inflater.eof:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            while chunk:
+                out += inflater.decompress(chunk, max_bytes + 1 - len(out))
+                if len(out) > max_bytes:
+                    raise BodyTooLarge(f'Decoded body exceeds {max_bytes} bytes')
+                chunk = inflater.unconsumed_tail
+        out += inflater.flush()
+    except zlib.error as exc:
+        raise ValueError(f'Corrupt {encoding} body: {exc}') from exc
+    if len(out) > max_bytes:
+        raise BodyTooLarge(f'Decoded body exceeds {max_bytes} bytes')
+    if not inflater.eof:
+        raise ValueError(f'Truncated {encoding} body')
+    return bytes(out)
@@ -0,0 +1,372 @@
+"""
+replication_outbox.py — Persistent per-peer replication outbox.
+
+Every ledger save used to start its own daemon thread that POSTed the whole
+ledger to every peer (45 s timeouts). A burst of 30 saves while the Render
+peer was cold-starting left 30 threads each holding a 13 MB payload, and a
+push that failed was simply lost until the next save.
+
+A ReplicationOutbox keeps one entry and one worker thread per peer:
+
+  enqueue(peer, payload)   record that ``payload``'s server_version must
+                           reach ``peer``; only the newest payload is kept
+                           (each one is a complete ledger, so delivering it
+                           delivers every earlier queued version)
+  worker                   send(peer, payload) -> (ok, error); on failure
+                           retries with exponential backoff (base_delay
+                           doubling up to max_delay)
+
+Entries (pending and acknowledged version, queue depth, attempts, last
+error) are written to a small JSON file, so pushes still owed survive a
+restart: resume() starts workers for them, and the worker then sends the
+current ledger from ``load()`` since the queued payload itself is not
+persisted. acked_version(peer) is what the sender diffs the next patch from.
+
+With several worker processes on one box only one of them may push and
+write the file, or pushes run concurrently and acknowledged versions are
+lost last-writer-wins. ``owner`` (e.g. ledger_coordinator.hold_role) elects
+that process; every other outbox is a follower: enqueue() and mark_acked()
+append a one-line request to <path>.requests under an flock, and the
+owner's request thread drains that file every ``poll_interval`` seconds and
+queues the peer as if the save were its own (the worker then sends the
+current ledger from ``load()``). Followers read acknowledged versions and
+status from the owner's file. A follower whose owner died takes over on its
+next call.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from app.utils.file_operations import atomic_write_json
+
+__all__ = ['ReplicationOutbox']
+
+_log = logging.getLogger(__name__)
+
+_PERSISTED = ('pending_version', 'queue_depth', 'acked_version', 'attempts',
+              'last_error', 'last_attempt_at', 'last_ack_at')
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _version_of(payload):
+    try:
+        return int((payload or {}).get('server_version') or 0)
+    except (TypeError, ValueError, AttributeError):
+        return 0
+
+
+class ReplicationOutbox:
+    def __init__(self, path, send, *, load=None, base_delay=2.0, max_delay=300.0,
+                 name='ea-replication', owner=None, poll_interval=1.0):
+        self.path = path
+        self._send = send
+        self._load = load
+        self._owner = owner
+        self._owning = owner is None
+        self._requests_path = f'{path}.requests'
+        self._poll_interval = max(0.01, float(poll_interval))
+        self._requests_thread = None
+        self._base_delay = max(0.01, float(base_delay))
+        self._max_delay = max(self._base_delay, float(max_delay))
+        self._name = name
+        self._cond = threading.Condition()
+        self._peers = {}       # peer -> entry dict (persisted fields + payload/next_at)
+        self._threads = {}
+        self._closed = False
+        self._read()
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    def _persisted(self):
+        """peer -> saved fields, as last written by the owner."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        peers = raw.get('peers') if isinstance(raw, dict) else None
+        return {peer: saved for peer, saved in (peers or {}).items() if isinstance(saved, dict)}
+
+    def _read(self):
+        for peer, saved in self._persisted().items():
+            entry = self._entry(peer)
+            entry.update({k: saved.get(k, entry[k]) for k in _PERSISTED})
+
+    def _write(self):
+        """Persist all entries; caller holds the condition."""
+        body = {'peers': {peer: {k: e[k] for k in _PERSISTED} for peer, e in self._peers.items()}}
+        try:
+            atomic_write_json(Path(self.path), body)
+        except Exception:
+            _log.exception('Failed to persist replication outbox %s', self.path)
+
+    def _entry(self, peer):
+        entry = self._peers.get(peer)
+        if entry is None:
+            entry = self._peers[peer] = {
+                'pending_version': None,
+                'queue_depth': 0,
+                'acked_version': None,
+                'attempts': 0,
+                'last_error': '',
+                'last_attempt_at': '',
+                'last_ack_at': '',
+                'payload': None,
+                'next_at': 0.0,
+                'seq': 0,          # bumped per enqueue; tells a finished push whether newer work arrived
+            }
+        return entry
+
+    # ── Ownership ────────────────────────────────────────────────────────────
+
+    def _is_owner(self):
+        if self._owning:
+            return True
+        try:
+            owning = bool(self._owner())
+        except Exception:
+            _log.exception('Replication outbox ownership check failed for %s', self.path)
+            owning = False
+        if owning:
+            self._take_over()
+        return owning
+
+    def _take_over(self):
+        """Become the pushing process: adopt the last owner's entries and serve followers."""
+        with self._cond:
+            if self._owning or self._closed:
+                return
+            self._owning = True
+            self._read()
+            for peer, entry in self._peers.items():
+                if entry['pending_version'] is not None:
+                    self._ensure_thread(peer)
+            self._requests_thread = threading.Thread(
+                target=self._serve_requests, daemon=True, name=f'{self._name}:requests'[:60])
+            self._requests_thread.start()
+            self._cond.notify_all()
+
+    def _hand_off(self, record):
+        """Follower side: leave ``record`` for the owner's request thread."""
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        try:
+            fd = os.open(self._requests_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+        except OSError:
+            _log.exception('Failed to hand replication work to the owning process (%s)', self._requests_path)
+
+    def _take_requests(self):
+        try:
+            fd = os.open(self._requests_path, os.O_RDWR)
+        except OSError:
+            return []
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            chunks = []
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            if chunks:
+                os.ftruncate(fd, 0)
+        finally:
+            os.close(fd)
+        records = []
+        for line in b''.join(chunks).splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get('peer'):
+                records.append(record)
+        return records
+
+    def _serve_requests(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                self._cond.wait(self._poll_interval)
+                if self._closed:
+                    return
+            records = self._take_requests()
+            if not records:
+                continue
+            with self._cond:
+                for record in records:
+                    if record.get('acked'):
+                        self._acked(self._entry(record['peer']), record.get('version'))
+                    else:
+                        self._queue(record['peer'], record.get('version'), None)
+                self._write()
+                self._cond.notify_all()
+
+    # ── Producer side ────────────────────────────────────────────────────────
+
+    def _queue(self, peer, version, payload):
+        """Record that ``version`` is owed to ``peer``; caller holds the condition and persists."""
+        entry = self._entry(peer)
+        if entry['pending_version'] is None and version == entry['acked_version']:
+            return False
+        # The newest save wins even if its version is lower (a restore).
+        entry['pending_version'] = version
+        entry['payload'] = payload
+        entry['seq'] += 1
+        entry['queue_depth'] += 1
+        self._ensure_thread(peer)
+        return True
+
+    def enqueue(self, peer, payload):
+        """Queue ``payload`` (a full ledger) for ``peer``, replacing any older queued one."""
+        version = _version_of(payload)
+        if not self._is_owner():
+            self._hand_off({'peer': peer, 'version': version})
+            return
+        with self._cond:
+            if self._closed:
+                return
+            if self._queue(peer, version, payload):
+                self._write()
+                self._cond.notify_all()
+
+    def resume(self):
+        """Start workers for entries still owed from before a restart."""
+        if not self._is_owner():
+            return
+        with self._cond:
+            for peer, entry in self._peers.items():
+                if entry['pending_version'] is not None:
+                    self._ensure_thread(peer)
+            self._cond.notify_all()
+
+    def acked_version(self, peer):
+        if not self._owning:
+            return (self._persisted().get(peer) or {}).get('acked_version')
+        with self._cond:
+            entry = self._peers.get(peer)
+            return entry['acked_version'] if entry else None
+
+    def mark_acked(self, peer, version):
+        """Record a delivery made outside the worker (e.g. a synchronous push)."""
+        if not self._is_owner():
+            self._hand_off({'peer': peer, 'version': version, 'acked': True})
+            return
+        with self._cond:
+            self._acked(self._entry(peer), version)
+            self._write()
+
+    def status(self):
+        now = time.monotonic()
+        if not self._owning:
+            return {
+                peer: {**{k: saved.get(k) for k in _PERSISTED}, 'retry_in_seconds': 0.0}
+                for peer, saved in self._persisted().items()
+            }
+        with self._cond:
+            return {
+                peer: {
+                    **{k: e[k] for k in _PERSISTED},
+                    'retry_in_seconds': round(max(0.0, e['next_at'] - now), 1) if e['pending_version'] is not None else 0.0,
+                }
+                for peer, e in self._peers.items()
+            }
+
+    def close(self, timeout=5.0):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            threads = list(self._threads.values())
+            if self._requests_thread is not None:
+                threads.append(self._requests_thread)
+        for thread in threads:
+            thread.join(timeout)
+
+    # ── Worker side ──────────────────────────────────────────────────────────
+
+    def _ensure_thread(self, peer):
+        thread = self._threads.get(peer)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=self._run, args=(peer,), daemon=True,
+                                      name=f'{self._name}:{peer}'[:60])
+            self._threads[peer] = thread
+            thread.start()
+
+    def _acked(self, entry, version, sent_seq=None):
+        entry['acked_version'] = version
+        entry['last_ack_at'] = _now_iso()
+        # Settled unless something was enqueued while the push was in flight
+        # (a delivery made outside the worker only settles its own version).
+        if sent_seq is not None:
+            settled = entry['seq'] == sent_seq
+        else:
+            settled = entry['pending_version'] == version
+        if settled:
+            entry['pending_version'] = None
+            entry['payload'] = None
+            entry['queue_depth'] = 0
+        entry['attempts'] = 0
+        entry['last_error'] = ''
+        entry['next_at'] = 0.0
+
+    def _run(self, peer):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    entry = self._peers[peer]
+                    if entry['pending_version'] is None:
+                        self._cond.wait()
+                        continue
+                    delay = entry['next_at'] - time.monotonic()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                        continue
+                    break
+                payload = entry['payload']
+                sent_seq = entry['seq']
+            if payload is None and self._load is not None:
+                try:
+                    payload = self._load()
+                except Exception:
+                    _log.exception('Replication outbox could not load the ledger for %s', peer)
+                    payload = None
+            version = _version_of(payload)
+            if payload is None:
+                ok, error = False, 'ledger unavailable'
+            else:
+                try:
+                    ok, error = self._send(peer, payload)
+                except Exception as exc:
+                    _log.exception('Replication push to %s failed', peer)
+                    ok, error = False, repr(exc)
+            with self._cond:
+                entry = self._peers[peer]
+                entry['last_attempt_at'] = _now_iso()
+                if ok:
+                    self._acked(entry, version, sent_seq)
+                else:
+                    entry['attempts'] += 1
+                    entry['last_error'] = str(error or 'failed')[:300]
+                    delay = min(self._max_delay, self._base_delay * (2 ** (entry['attempts'] - 1)))
+                    entry['next_at'] = time.monotonic() + delay
+                self._write()
@@ -0,0 +1,167 @@
+"""
+roll_resolver.py — Month-aware roll lookups compiled from roll_history.
+
+score_balance.get_roll_for_month looked the student up with a scan and then
+filtered and sorted all of data['roll_history'] on every call, and
+_find_month_profile calls it for every student of every month it renders.
+A RollResolver compiles the history once into per-student interval lists:
+
+  effective months  sorted, one per distinct effective_month with an old_roll
+  old rolls         the roll held *before* each of those months
+
+so roll_for(student, month) is a bisect: the first change effective after
+``month`` names the roll held then; past the last change it is the current
+roll. The same intervals are indexed by roll (start month, end month,
+student) for student_for(roll, month) — who held a roll in a given month.
+
+Tie-breaks reproduce get_roll_for_month exactly: the first student record
+per id wins, entries without an old_roll are skipped, and among entries
+sharing an effective month the last one in history order wins.
+
+data_paths.roll_resolver_for(data) hands out the resolver of the cached
+ledger. It stays valid while ``data`` still has the same students and
+roll_history lists with the same lengths — across saves too — and
+record_roll_change keeps it that way by calling refresh() for the students
+it touched instead of letting the next reader recompile everything.
+"""
+from bisect import bisect_right
+
+from app.utils.helpers import norm_roll, safe_int, month_key
+
+__all__ = ['RollResolver']
+
+
+def _rows(value):
+    return value if isinstance(value, list) else []
+
+
+class RollResolver:
+    """Per-student roll intervals and their by-roll inverse (treat as read-only outside refresh())."""
+
+    def __init__(self, data):
+        data = data if isinstance(data, dict) else {}
+        self._students = {}
+        self._order = {}
+        self._changes = {}
+        self._by_roll = {}
+        self._indexed = {}   # sid -> rolls it has spans under
+        self._bind(data)
+        for position, student in enumerate(self._students_ref):
+            if not isinstance(student, dict):
+                continue
+            sid = safe_int(student.get('id'), 0)
+            if sid > 0 and sid not in self._students:
+                self._students[sid] = student
+                self._order[sid] = position
+        history = {}
+        for entry in self._history_ref:
+            if isinstance(entry, dict):
+                history.setdefault(safe_int(entry.get('student_id'), 0), []).append(entry)
+        for sid in self._students:
+            self._compile(sid, history.get(sid, ()))
+
+    def _bind(self, data):
+        self._students_ref = _rows(data.get('students'))
+        self._history_ref = _rows(data.get('roll_history'))
+        self._raw_students = data.get('students')
+        self._raw_history = data.get('roll_history')
+        self._sizes = (len(self._students_ref), len(self._history_ref))
+
+    def matches(self, data) -> bool:
+        """True while ``data`` still has the students and roll_history this resolver describes."""
+        if not isinstance(data, dict):
+            return False
+        students, history = data.get('students'), data.get('roll_history')
+        return (
+            students is self._raw_students
+            and history is self._raw_history
+            and (len(_rows(students)), len(_rows(history))) == self._sizes
+        )
+
+    # ── compilation ─────────────────────────────────────────────────────────
+
+    def _compile(self, sid, entries):
+        by_month = {}
+        for entry in entries:
+            old = norm_roll(entry.get('old_roll'))
+            if old:
+                by_month[str(entry.get('effective_month') or '').strip()] = old
+        months = sorted(by_month)
+        self._changes[sid] = (months, [by_month[m] for m in months])
+        self._index_intervals(sid)
+
+    def _intervals(self, sid):
+        months, olds = self._changes.get(sid, ((), ()))
+        start = ''
+        for month, old in zip(months, olds):
+            if month > start:
+                yield old, start, month
+            start = month
+        yield norm_roll(self._students[sid].get('roll')), start, None
+
+    def _index_intervals(self, sid):
+        rolls = self._indexed[sid] = set()
+        for roll, start, end in self._intervals(sid):
+            if not roll:
+                continue
+            rolls.add(roll)
+            spans = self._by_roll.setdefault(roll, [])
+            spans.insert(bisect_right([s[0] for s in spans], start), (start, end, sid))
+
+    def _unindex_intervals(self, sid):
+        # The student's current roll may already have been changed in place.
+        for roll in self._indexed.pop(sid, ()):
+            spans = [span for span in self._by_roll.get(roll, ()) if span[2] != sid]
+            if spans:
+                self._by_roll[roll] = spans
+            else:
+                self._by_roll.pop(roll, None)
+
+    def refresh(self, data, student_ids):
+        """Recompile the given students after ``data`` changed only for them (e.g. a roll change)."""
+        self._bind(data)
+        wanted = {safe_int(sid, 0) for sid in student_ids}
+        for sid in wanted:
+            self._unindex_intervals(sid)
+            self._students.pop(sid, None)
+            self._changes.pop(sid, None)
+        for position, student in enumerate(self._students_ref):
+            if not isinstance(student, dict):
+                continue
+            sid = safe_int(student.get('id'), 0)
+            if sid in wanted and sid not in self._students:
+                self._students[sid] = student
+                self._order[sid] = position
+        for sid in wanted:
+            if sid in self._students:
+                self._compile(sid, [
+                    e for e in self._history_ref
+                    if isinstance(e, dict) and safe_int(e.get('student_id'), 0) == sid
+                ])
+
+    # ── lookups ─────────────────────────────────────────────────────────────
+
+    def roll_for(self, student_id, month):
+        """Roll a student held in ``month`` (None for an unknown student)."""
+        sid = safe_int(student_id, 0)
+        student = self._students.get(sid)
+        if student is None:
+            return None
+        months, olds = self._changes.get(sid, ((), ()))
+        pos = bisect_right(months, month_key(month))
+        return olds[pos] if pos < len(olds) else norm_roll(student.get('roll'))
+
+    def student_for(self, roll, month):
+        """Id of the student who held ``roll`` in ``month`` (active, then first-listed, on overlap)."""
+        spans = self._by_roll.get(norm_roll(roll))
+        if not spans:
+            return None
+        month = month_key(month)
+        best = None
+        for start, end, sid in spans[:bisect_right([s[0] for s in spans], month)]:
+            if end is not None and month >= end:
+                continue
+            rank = (start, self._students[sid].get('active', True) is not False, -self._order.get(sid, 0))
+            if best is None or rank > best[0]:
+                best = (rank, sid)
+        return best[1] if best else None
@@ -11,11 +11,53 @@ Formula (mirrors offline_scoreboard.html JS):
           historical month: carry + awards - used  (from month profile)
   VETOs:  individual + role_grant + awards - used  (current month)
           carry + role_grant + awards - used        (historical months)
+
+Lookups go through the cached ledger's LedgerIndex when ``data`` is the
+cached ledger (see data_paths.ledger_index_for); any other dict is scanned.
+Monthly star/VETO awards and usage come from the ledger's MonthTotals
+(data_paths.month_totals_for) and roll lookups from its RollResolver
+(data_paths.roll_resolver_for) under the same condition.
 """
 from datetime import datetime
+from app.utils.data_paths import ledger_index_for, month_totals_for, roll_resolver_for
+from app.utils.roll_resolver import RollResolver
 from app.utils.helpers import norm_roll as _norm_roll, safe_int as _safe_int, month_key as _month_key
 
 
+def _find_student(data, sid, index=None):
+    if index is not None:
+        return index.student(sid)
+    students = data.get('students', []) or []
+    return next((s for s in students if _safe_int(s.get('id'), 0) == sid), None)
+
+
+def _candidate_scores(data, sid, month, index=None):
+    """Score rows that can belong to (sid, month); callers still apply their filters."""
+    if index is not None:
+        return index.scores_for(sid, month)
+    return data.get('scores') or []
+
+
+def _month_awards_used(data, sid, month, field, index=None):
+    """(awards, used) of a score field ('stars' or 'vetos') for one student and month."""
+    totals = month_totals_for(data)
+    if totals is not None:
+        cell = totals.get(sid, month)
+        return cell[f'{field}_awarded'], cell[f'{field}_used']
+    awards = used = 0
+    for r in _candidate_scores(data, sid, month, index):
+        if not (isinstance(r, dict)
+                and _safe_int(r.get('studentId'), 0) == sid
+                and _month_key(r.get('month') or r.get('date')) == month):
+            continue
+        value = _safe_int(r.get(field), 0)
+        if value > 0:
+            awards += value
+        elif value < 0:
+            used -= value
+    return awards, used
+
+
 def _iter_month_profiles(data, month_key):
     """Return the month profile rows for a month as a list."""
     month = _month_key(month_key)
@@ -33,6 +75,14 @@ def _find_month_profile(data, student_id, month_key):
     if sid <= 0:
         return None
 
+    index = ledger_index_for(data)
+    if index is not None:
+        profile = index.month_profile_by_id(month_key, sid)
+        if profile is None:
+            roll_key = get_roll_for_month(data, sid, month_key)
+            profile = index.month_profile_by_roll(month_key, roll_key) if roll_key else None
+        return profile
+
     profiles = _iter_month_profiles(data, month_key)
     if not profiles:
         return None
@@ -71,17 +121,18 @@ def get_roll_for_month(data, student_id, month_key):
     if sid <= 0:
         return None
 
+    resolver = roll_resolver_for(data)
+    if resolver is not None:
+        return resolver.roll_for(sid, month_key)
+
     month = _month_key(month_key)
-    students = data.get('students', []) or []
-    student = next(
-        (s for s in students if _safe_int(s.get('id'), 0) == sid),
-        None
-    )
+    index = ledger_index_for(data)
+    student = _find_student(data, sid, index)
     if not student:
         return None
 
     current_roll = _norm_roll(student.get('roll'))
-    roll_history = data.get('roll_history', []) or []
+    roll_history = index.roll_history_for(sid) if index is not None else (data.get('roll_history', []) or [])
 
     # Entries for this student, newest-change-first
     entries = sorted(
@@ -109,6 +160,17 @@ def get_roll_for_month(data, student_id, month_key):
     return roll
 
 
+def get_student_id_for_roll(data, roll, month_key):
+    """Return the id of the student who held ``roll`` in a given month, or None.
+
+    The inverse of get_roll_for_month over the same roll_history intervals.
+    When several records cover the roll that month (stale duplicates), the
+    one whose interval started latest wins, then active, then first listed.
+    """
+    resolver = roll_resolver_for(data) or RollResolver(data)
+    return resolver.student_for(roll, month_key)
+
+
 # ── Star balance ──────────────────────────────────────────────────────────
 
 def compute_star_balance(data, student_id, month_key, current_month=None):
@@ -132,8 +194,8 @@ def compute_star_balance(data, student_id, month_key, current_month=None):
     current_month : YYYY-MM treated as "current". Defaults to today's month.
     """
     sid = _safe_int(student_id, 0)
-    students = data.get('students', []) or []
-    student = next((s for s in students if _safe_int(s.get('id'), 0) == sid), None)
+    index = ledger_index_for(data)
+    student = _find_student(data, sid, index)
     if not student:
         return 0
 
@@ -153,23 +215,7 @@ def compute_star_balance(data, student_id, month_key, current_month=None):
 
     if profile and profile.get('month_star_count') is not None:
         carry = max(0, _safe_int(profile.get('month_star_count'), 0))
-        scores = data.get('scores') or []
-        awards = sum(
-            _safe_int(r.get('stars'), 0)
-            for r in scores
-            if isinstance(r, dict)
-            and _safe_int(r.get('studentId'), 0) == sid
-            and _month_key(r.get('month') or r.get('date')) == month
-            and _safe_int(r.get('stars'), 0) > 0
-        )
-        used = sum(
-            abs(_safe_int(r.get('stars'), 0))
-            for r in scores
-            if isinstance(r, dict)
-            and _safe_int(r.get('studentId'), 0) == sid
-            and _month_key(r.get('month') or r.get('date')) == month
-            and _safe_int(r.get('stars'), 0) < 0
-        )
+        awards, used = _month_awards_used(data, sid, month, 'stars', index)
         return max(0, carry + awards - used)
 
     return global_stars
@@ -193,30 +239,15 @@ def compute_veto_balance(data, student_id, month_key, current_month):
                     to keep this module import-free from datetime deps)
     """
     sid = _safe_int(student_id, 0)
-    students = data.get('students', []) or []
-    student = next((s for s in students if _safe_int(s.get('id'), 0) == sid), None)
+    index = ledger_index_for(data)
+    student = _find_student(data, sid, index)
     if not student:
         return 0
 
     month = _month_key(month_key)
     individual = max(0, _safe_int(student.get('veto_count'), 0))
 
-    scores_for_month = [
-        r for r in (data.get('scores') or [])
-        if isinstance(r, dict)
-        and _safe_int(r.get('studentId'), 0) == sid
-        and _month_key(r.get('month') or r.get('date')) == month
-    ]
-    awards = sum(
-        _safe_int(r.get('vetos'), 0)
-        for r in scores_for_month
-        if _safe_int(r.get('vetos'), 0) > 0
-    )
-    used = sum(
-        abs(_safe_int(r.get('vetos'), 0))
-        for r in scores_for_month
-        if _safe_int(r.get('vetos'), 0) < 0
-    )
+    awards, used = _month_awards_used(data, sid, month, 'vetos', index)
 
     if month == current_month:
         role_veto = max(0, _safe_int(student.get('role_veto_count'), 0))
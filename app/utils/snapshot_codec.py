@@ -0,0 +1,160 @@
+"""
+snapshot_codec.py — Compressed, checksummed framing for ledger snapshots.
+
+The ledger JSON compresses ~5-10x (it is mostly repeated keys), and the
+backup directories keep up to 50 rolling + 720 hourly copies of it. Snapshot
+files written through this codec are:
+
+  offset  size  field
+  0       8     magic b'EASNAP1\\n'
+  8       1     codec (1 = zlib)
+  9       3     reserved (zero)
+  12      4     CRC-32 of the uncompressed JSON bytes
+  16      8     uncompressed length
+  24      ...   zlib stream of UTF-8 JSON
+
+File names do not change (backups stay ``*.json``); readers sniff the first
+bytes instead. loads() accepts framed snapshots, bare gzip files and plain
+JSON, so every reader can switch to it before any writer compresses, and a
+corrupt frame (bad CRC/length) raises ValueError like a JSON parse error.
+Stdlib only.
+"""
+import gzip
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+__all__ = [
+    'MAGIC', 'CODEC_ZLIB', 'dumps', 'loads', 'is_framed', 'read_file',
+    'write_file', 'frame_file', 'verify_file', 'codec_from_env', 'frame',
+    'unframe',
+]
+
+MAGIC = b'EASNAP1\n'
+CODEC_ZLIB = 1
+_HEADER = struct.Struct('<8sB3xIQ')
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def is_framed(head: bytes) -> bool:
+    return head[:len(MAGIC)] == MAGIC
+
+
+def codec_from_env(name: str, default: str = 'json') -> str:
+    """'zlib' or 'json' from environment variable ``name``."""
+    value = str(os.getenv(name, default) or default).strip().lower()
+    return 'zlib' if value in {'zlib', 'gzip', 'compressed', '1', 'true', 'yes', 'on'} else 'json'
+
+
+def frame(raw: bytes, level: int = 6) -> bytes:
+    """Compress already-serialized bytes into a snapshot frame."""
+    return _frame(raw, level)
+
+
+def unframe(blob: bytes) -> bytes:
+    """Checked inverse of frame(); raises ValueError on a corrupt frame."""
+    if not is_framed(blob):
+        raise ValueError('Not a snapshot frame')
+    return _unframe(blob)
+
+
+def _frame(raw: bytes, level: int) -> bytes:
+    header = _HEADER.pack(MAGIC, CODEC_ZLIB, zlib.crc32(raw) & 0xFFFFFFFF, len(raw))
+    return header + zlib.compress(raw, level)
+
+
+def dumps(data, *, level: int = 6, separators=(',', ':'), ensure_ascii: bool = False) -> bytes:
+    """Serialize ``data`` to a framed, zlib-compressed snapshot."""
+    raw = json.dumps(data, ensure_ascii=ensure_ascii, separators=separators, default=str).encode('utf-8')
+    return _frame(raw, level)
+
+
+def _unframe(blob: bytes) -> bytes:
+    if len(blob) < _HEADER.size:
+        raise ValueError('Truncated snapshot header')
+    magic, codec, crc, length = _HEADER.unpack_from(blob, 0)
+    if magic != MAGIC or codec != CODEC_ZLIB:
+        raise ValueError(f'Unsupported snapshot codec {codec}')
+    inflater = zlib.decompressobj()
+    # Cap output at the declared length so a corrupt frame cannot balloon memory.
+    try:
+        raw = inflater.decompress(memoryview(blob)[_HEADER.size:], length + 1)
+    except zlib.error as exc:
+        raise ValueError(f'Corrupt snapshot body: {exc}') from exc
+    if len(raw) != length or not inflater.eof:
+        raise ValueError('Snapshot length mismatch')
+    if zlib.crc32(raw) & 0xFFFFFFFF != crc:
+        raise ValueError('Snapshot checksum mismatch')
+    return raw
+
+
+def loads(blob: bytes):
+    """Parse a framed snapshot, a gzip file or plain JSON (auto-detected)."""
+    if is_framed(blob):
+        raw = _unframe(blob)
+    elif blob[:2] == _GZIP_MAGIC:
+        try:
+            raw = gzip.decompress(blob)
+        except (OSError, EOFError) as exc:
+            raise ValueError(f'Corrupt gzip snapshot: {exc}') from exc
+    else:
+        raw = blob
+    return json.loads(raw.decode('utf-8-sig') if isinstance(raw, (bytes, bytearray)) else raw)
+
+
+def read_file(path):
+    """Read and parse a snapshot file in any supported format."""
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def verify_file(path, expected_length=None) -> bool:
+    """
+    Check a framed snapshot's length and CRC without parsing the JSON (plain
+    files are only checked against ``expected_length``).
+    """
+    try:
+        with open(path, 'rb') as f:
+            blob = f.read()
+        raw_length = len(_unframe(blob)) if is_framed(blob) else len(blob)
+    except (OSError, ValueError):
+        return False
+    return expected_length is None or raw_length == expected_length
+
+
+def _write_bytes(path, body: bytes):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.remove(temp_name)
+        except OSError:
+            pass
+        raise
+
+
+def write_file(path, data, *, level: int = 6):
+    """Atomically write ``data`` as a framed snapshot."""
+    _write_bytes(path, dumps(data, level=level))
+
+
+def frame_file(source, dest, *, level: int = 6):
+    """
+    Copy snapshot ``source`` to ``dest`` framed and compressed, without
+    re-parsing the JSON (already framed sources are copied byte for byte).
+    Returns the number of bytes written.
+    """
+    with open(source, 'rb') as f:
+        blob = f.read()
+    body = blob if is_framed(blob) else _frame(blob, level)
+    _write_bytes(dest, body)
+    return len(body)
@@ -4,11 +4,11 @@ Unified Star Calculation System
 Simplifies complex star logic into single, consistent formula.
 Formula: available_stars = carry_in + awards - usage
 """
-import json
 from pathlib import Path
 from typing import Dict, Optional, Tuple
 from datetime import datetime
-from app.utils.data_paths import get_data_path
+from app.utils.data_paths import get_data_path, ledger_index_for, load_json_data_cached
+from app.utils.snapshot_codec import read_file as read_snapshot_file
 import app.utils.score_balance as _score_balance
 
 
@@ -23,9 +23,13 @@ class StarCalculator:
     def _load_data(self):
         """Load the offline scoreboard data"""
         try:
-            if self.data_path.exists():
-                with open(self.data_path, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
+            # Live ledger: the shared cache includes journaled revisions the
+            # snapshot file may not have yet. Read-only here, so no copy.
+            cached = load_json_data_cached() if self.data_path == Path(get_data_path()) else None
+            if cached is not None:
+                self.data = cached
+            elif self.data_path.exists():
+                self.data = read_snapshot_file(self.data_path)
             else:
                 print(f"⚠️ Data file not found: {self.data_path}")
                 self.data = {'students': [], 'scores': []}
@@ -33,6 +37,19 @@ class StarCalculator:
             print(f"❌ Error loading data: {e}")
             self.data = {'students': [], 'scores': []}
     
+    def _score_rows(self, student_id: int, month_key: Optional[str] = None, date: Optional[str] = None):
+        """
+        Score rows that can match a student (and month/date): the ledger
+        index bucket for the cached ledger, every row otherwise. Callers keep
+        their own filters.
+        """
+        index = ledger_index_for(self.data)
+        if index is None:
+            return self.data.get('scores', [])
+        if date is not None:
+            return index.scores_on(student_id, date)
+        return index.scores_for(student_id, month_key)
+
     def get_student_carry_in_stars(self, student_id: int, month_key: str) -> int:
         """
         Get carry-in stars for a student in a given month.
@@ -63,7 +80,7 @@ class StarCalculator:
         """
         try:
             total_awards = 0
-            for score in self.data.get('scores', []):
+            for score in self._score_rows(student_id, month_key):
                 if not isinstance(score, dict):
                     continue
                 
@@ -93,7 +110,7 @@ class StarCalculator:
         """
         try:
             total_usage = 0
-            for score in self.data.get('scores', []):
+            for score in self._score_rows(student_id, month_key):
                 if not isinstance(score, dict):
                     continue
                 
@@ -163,7 +180,7 @@ class StarCalculator:
             day_score = 0
             normal_usage = 0
             
-            for score in self.data.get('scores', []):
+            for score in self._score_rows(student_id, date=date):
                 if not isinstance(score, dict):
                     continue
                 
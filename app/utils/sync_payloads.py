@@ -17,3 +17,24 @@ def payload_for_external_replication(payload):
         external = dict(payload)
         external.pop('fee_records', None)
         return external
+
+
+def patch_for_external_replication(changes):
+    """Change-feed counterpart of payload_for_external_replication: no fee data."""
+    if not isinstance(changes, dict):
+        return {}
+    external = dict(changes)
+    external.pop('fee_records', None)
+    op = external.get('students')
+    if isinstance(op, dict):
+        field = 'upsert' if op.get('op') == 'rows' else 'value' if op.get('op') == 'set' else None
+        rows = op.get(field) if field else None
+        if isinstance(rows, list):
+            stripped = []
+            for row in rows:
+                if isinstance(row, dict) and 'fees' in row:
+                    row = dict(row)
+                    row.pop('fees', None)
+                stripped.append(row)
+            external['students'] = dict(op, **{field: stripped})
+    return external
@@ -4,13 +4,14 @@ Unified VETO Manager - Single Source of Truth
 Fixes the dual tracking issue by using veto_tracking as the authoritative source.
 All VETO operations go through this manager.
 """
-import json
 import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass, asdict
-from app.utils.data_paths import get_data_path
+from app.utils.data_paths import get_data_path, load_json_data_cached, save_ledger_data
+from app.utils.ledger_view import LedgerView
+from app.utils.snapshot_codec import read_file as read_snapshot_file
 from app.utils.file_operations import SafeFileWriter
 
 
@@ -65,9 +66,7 @@ class UnifiedVetoManager:
                 print("⚠️ VETO data file not found. Run veto_manager.py first.")
                 return
             
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
+            data = self._read_ledger()
             veto_tracking = data.get('veto_tracking', {})
             
             if not veto_tracking.get('hardened'):
@@ -90,6 +89,33 @@ class UnifiedVetoManager:
         except Exception as e:
             print(f"❌ Error loading VETO data: {e}")
     
+    def _is_live_ledger(self) -> bool:
+        return self.data_path == Path(get_data_path())
+
+    def _read_ledger(self) -> Dict:
+        """Parsed ledger; the live one comes from the shared (journal-aware) cache."""
+        if self._is_live_ledger():
+            cached = load_json_data_cached()
+            if cached is not None:
+                return cached
+        return read_snapshot_file(self.data_path)
+
+    def _write_ledger(self, data) -> bool:
+        if self._is_live_ledger():
+            # Versioned, journaled save shared with the scoreboard routes.
+            save_ledger_data(data)
+            return True
+        # Write atomically using SafeFileWriter (temp file + rename)
+        return SafeFileWriter.write_json(Path(self.data_path), data, backup=True)
+
+    def _append_usage_log(self, entry: Dict):
+        """Append an audit entry to veto_tracking.usage_log through the same save path."""
+        data = LedgerView(self._read_ledger())
+        veto_tracking = data.mutable('veto_tracking', dict)
+        veto_tracking['usage_log'] = list(veto_tracking.get('usage_log') or []) + [entry]
+        if not self._write_ledger(data):
+            raise OSError('ledger write failed')
+
     def _save_atomically(self, operation_name: str = ""):
         """
         Save VETO state atomically to file.
@@ -97,14 +123,15 @@ class UnifiedVetoManager:
         """
         try:
             with self._lock:
-                # Read current data
-                with open(self.data_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                # Copy-on-write view: the live ledger is a shared cache, so only
+                # the collections written below are copied.
+                data = LedgerView(self._read_ledger())
                 
                 # Update veto_tracking (authoritative source)
-                veto_tracking = data.get('veto_tracking', {})
+                veto_tracking = data.mutable('veto_tracking', dict)
+                students_map = veto_tracking['students'] = dict(veto_tracking.get('students') or {})
                 for roll, balance in self.balances.items():
-                    veto_tracking['students'][roll] = {
+                    students_map[roll] = {
                         'name': balance.name,
                         'individual_vetos': balance.individual_vetos,
                         'role_vetos': balance.role_vetos,
@@ -115,9 +142,11 @@ class UnifiedVetoManager:
                     }
                 
                 # Sync students[] array from veto_tracking
-                for student in data.get('students', []):
+                students = data.mutable('students')
+                for index, student in enumerate(students):
                     roll = student.get('roll', '')
                     if roll in self.balances:
+                        student = students[index] = dict(student)
                         balance = self.balances[roll]
                         # Deduct used vetoes using the same priority logic (individual first, then role)
                         remaining = balance.used_vetos
@@ -137,8 +166,7 @@ class UnifiedVetoManager:
                         student['role_veto_count'] = role_rem
                         student['used_veto_count'] = balance.used_vetos
                 
-                # Write atomically using SafeFileWriter (temp file + rename)
-                success = SafeFileWriter.write_json(Path(self.data_path), data, backup=True)
+                success = self._write_ledger(data)
 
                 if operation_name:
                     if success:
@@ -202,9 +230,6 @@ class UnifiedVetoManager:
             
             # Log usage
             try:
-                with open(self.data_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
                 usage_entry = {
                     'timestamp': datetime.now().isoformat(),
                     'roll': roll,
@@ -214,10 +239,7 @@ class UnifiedVetoManager:
                     'reason': reason,
                     'action': 'veto_used'
                 }
-                data['veto_tracking']['usage_log'].append(usage_entry)
-                
-                with open(self.data_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
+                self._append_usage_log(usage_entry)
             except Exception as e:
                 print(f"⚠️ Warning: Could not log usage: {e}")
             
@@ -247,9 +269,6 @@ class UnifiedVetoManager:
             
             # Log restoration
             try:
-                with open(self.data_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
                 restoration_entry = {
                     'timestamp': datetime.now().isoformat(),
                     'roll': roll,
@@ -259,10 +278,7 @@ class UnifiedVetoManager:
                     'reason': reason,
                     'action': 'veto_restored'
                 }
-                data['veto_tracking']['usage_log'].append(restoration_entry)
-                
-                with open(self.data_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=2, ensure_ascii=False)
+                self._append_usage_log(restoration_entry)
             except Exception as e:
                 print(f"⚠️ Warning: Could not log restoration: {e}")
             
@@ -301,8 +317,7 @@ class UnifiedVetoManager:
     def get_recent_usage(self, limit: int = 20) -> List[Dict]:
         """Get recent VETO usage from the log"""
         try:
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = self._read_ledger()
             
             usage_log = data.get('veto_tracking', {}).get('usage_log', [])
             recent = sorted(usage_log, key=lambda x: x.get('timestamp', ''), reverse=True)[:limit]
@@ -320,8 +335,7 @@ class UnifiedVetoManager:
         issues = []
         
         try:
-            with open(self.data_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = self._read_ledger()
             
             veto_tracking = data.get('veto_tracking', {})
             students = data.get('students', [])
@@ -0,0 +1,87 @@
+"""
+veto_markers.py — Index of postholder-VETO markers in score notes.
+
+The scoreboard's VETO jurisdiction check ran three regexes over every score
+note of the whole ledger on each teacher, student and admin POST, although
+only the rows a payload adds or edits can carry new markers. The markers it
+looks for are:
+
+  [VETO-Postholder] Removed penalty for Group X   → ('penalty', 'X')
+  [VETO-Shield-Group X]                           → ('shield', 'X')
+  [VETO-Postholder-Penalty-Group X] Penalty removed → ('target', 'X')
+
+A VetoMarkerIndex lists the rows that carry markers and keeps every
+distinct note text with its parsed markers. Markers depend on the note text
+alone, so an index can take over the previous one's parsed notes: building
+the index of a freshly merged score list only parses notes that are new
+(added or edited rows), and ``parsed`` reports how many that was. index_for(scores)
+keeps the last index (normally that of the ledger last validated/saved) as
+the base for the next list; entries of rows that left the list are dropped
+with it.
+"""
+import re
+import threading
+
+__all__ = ['VetoMarkerIndex', 'parse_markers', 'index_for']
+
+_PENALTY_RE = re.compile(r'\[VETO-Postholder\] Removed penalty for Group ([A-Z])', re.IGNORECASE)
+_SHIELD_RE = re.compile(r'\[VETO-Shield-Group ([A-Z])\]', re.IGNORECASE)
+_TARGET_RE = re.compile(r'\[VETO-Postholder-Penalty-Group ([A-Z])\] Penalty removed', re.IGNORECASE)
+_PATTERNS = (('penalty', _PENALTY_RE), ('shield', _SHIELD_RE), ('target', _TARGET_RE))
+
+_lock = threading.Lock()
+_state = {'index': None}
+
+
+def parse_markers(notes):
+    """Markers in one note as a tuple of (kind, group) — first match per kind."""
+    text = str(notes or '')
+    if '[VETO-' not in text.upper():
+        return ()
+    found = []
+    for kind, pattern in _PATTERNS:
+        match = pattern.search(text)
+        if match:
+            found.append((kind, match.group(1).upper()))
+    return tuple(found)
+
+
+class VetoMarkerIndex:
+    """Parsed markers of a score list; ``rows`` lists (row, markers) for rows that have any."""
+
+    def __init__(self, scores, previous=None):
+        self.scores_ref = scores
+        self.entries = {}
+        self.rows = []
+        self.parsed = 0
+        known = previous.entries if previous is not None else {}
+        for row in scores if isinstance(scores, list) else ():
+            if not isinstance(row, dict):
+                continue
+            notes = row.get('notes', '')
+            if not notes:
+                continue
+            key = str(notes)
+            markers = self.entries.get(key)
+            if markers is None:
+                markers = known.get(key)
+                if markers is None:
+                    markers = parse_markers(notes)
+                    self.parsed += 1
+                self.entries[key] = markers
+            if markers:
+                self.rows.append((row, markers))
+
+
+def index_for(scores):
+    """
+    Marker index of ``scores``, reusing the previous index's parsed notes.
+    Every row's key is still looked up (rows can be edited in place), but
+    only notes not seen in the previous list are run through the regexes.
+    """
+    with _lock:
+        previous = _state['index']
+    index = VetoMarkerIndex(scores, previous)
+    with _lock:
+        _state['index'] = index
+    return index
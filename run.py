@@ -1,14 +1,15 @@
 import os
 import json
-import urllib.request
-import urllib.error
 import atexit
 from datetime import datetime
 from pathlib import Path
 from app import app, db
 from app.models import User, StudentProfile, ActivityLog
-from app.utils.data_paths import get_data_path
+from app.utils import backup_store, replication_http
+from app.utils.data_paths import get_data_path, load_json_data_cached
 from app.utils.file_operations import atomic_write_json
+from app.utils.ledger_archive import attach as attach_archived_months
+from app.utils.snapshot_codec import codec_from_env, read_file as read_snapshot_file
 from app.utils.sync_config import get_sync_peers, is_full_ledger_snapshot, resolve_sync_shared_key
 _SERVER_LOCK_FD = None
 
@@ -24,12 +25,19 @@ def create_startup_restore_point(flask_app, keep=200):
     if not source.exists():
         return
     restore_dir = instance_dir / 'startup_restore_points'
-    restore_dir.mkdir(parents=True, exist_ok=True)
     stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     target = restore_dir / f'offline_scoreboard_startup_{stamp}.json'
     try:
-        data = json.loads(source.read_text(encoding='utf-8'))
-        atomic_write_json(target, data, indent=2)
+        # Cached loader replays journal revisions the snapshot file may not have yet.
+        data = load_json_data_cached()
+        if not isinstance(data, dict):
+            data = read_snapshot_file(source)
+        if backup_store.enabled():
+            # Incremental store: only months that changed since the last restore point are written.
+            backup_store.write_backup('startup', stamp, data, keep=keep)
+            return
+        restore_dir.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(target, data, codec=codec_from_env('EA_LEDGER_BACKUP_CODEC', 'json'))
     except Exception:
         return
 
@@ -138,7 +146,7 @@ def acquire_single_instance_lock(flask_app):
 
 def _load_json_file(path_obj):
     try:
-        return json.loads(path_obj.read_text(encoding='utf-8'))
+        return attach_archived_months(read_snapshot_file(path_obj))
     except Exception:
         return None
 
@@ -169,7 +177,7 @@ def maybe_bootstrap_backup_from_master(flask_app):
 
     instance_dir = Path(flask_app.instance_path)
     local_path = Path(get_data_path())
-    local_data = _load_json_file(local_path) if local_path.exists() else None
+    local_data = (load_json_data_cached() or _load_json_file(local_path)) if local_path.exists() else None
     local_count = _student_count(local_data)
     local_stamp = str((local_data or {}).get('server_updated_at') or (local_data or {}).get('updated_at') or '')
 
@@ -182,12 +190,11 @@ def maybe_bootstrap_backup_from_master(flask_app):
     for peer in peers:
         url = f'{peer}/scoreboard/offline-data'
         try:
-            req = urllib.request.Request(url, method='GET', headers={
+            resp = replication_http.get(url, headers={
                 'X-EA-Replicated': '1',
                 'X-EA-Sync-Key': sync_key,
-            })
-            with urllib.request.urlopen(req, timeout=4) as resp:
-                payload = json.loads(resp.read().decode('utf-8'))
+            }, timeout=4).raise_for_status()
+            payload = json.loads(resp.content.decode('utf-8'))
             remote = payload.get('data', {}) if isinstance(payload, dict) else {}
             if not isinstance(remote, dict):
                 continue
@@ -202,7 +209,7 @@ def maybe_bootstrap_backup_from_master(flask_app):
                 best_remote = remote
                 best_stamp = remote_stamp
                 best_count = remote_count
-        except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError, OSError, ValueError, json.JSONDecodeError):
+        except (OSError, ValueError):
             continue
 
     if not isinstance(best_remote, dict):
@@ -224,7 +231,7 @@ def maybe_bootstrap_backup_from_master(flask_app):
     if local_path.exists():
         pre = instance_dir / f'offline_scoreboard_data.pre_backup_bootstrap_{stamp}.json'
         try:
-            pre.write_text(local_path.read_text(encoding='utf-8'), encoding='utf-8')
+            pre.write_bytes(local_path.read_bytes())
         except Exception:
             pass
     try:
@@ -281,6 +288,12 @@ def initialize_runtime(flask_app):
         start_peer_sync_background(flask_app)
     except Exception:
         pass
+    # Pushes a previous run still owed to peers (see replication_outbox.py).
+    try:
+        from app.routes.scoreboard import resume_replication_outbox
+        resume_replication_outbox(flask_app)
+    except Exception:
+        pass
 
 if __name__ == '__main__':
     port_value = os.getenv('PORT') or os.getenv('BACKUP_PORT') or '5000'
@@ -29,6 +29,10 @@ The script never touches VETO counts, scores, or month_roster_profiles. It
 only writes to `student.stars` in the current data file, and only under
 `--apply`. A pre-change backup of the current file is written to the
 `offline_scoreboard_backups/` directory before any apply.
+
+Stop the server and run `python -m app.utils.ledger_repository compact`
+first: the snapshot file lags the revision journal, and edits made to a
+lagging snapshot are replayed over on the next load.
 """
 from __future__ import annotations
 
@@ -0,0 +1,77 @@
+"""Tests for the persistent backup catalog (app.utils.backup_catalog)."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from app.utils.file_operations import atomic_write_json
+
+
+class BackupCatalogTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_backup_catalog_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import backup_catalog, data_paths
+        data_paths.reset_cache()
+        self.data_paths = data_paths
+        self.catalog = backup_catalog
+        self.dir = os.path.join(self._tmp, 'backups')
+        os.makedirs(self.dir)
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _write(self, name, age):
+        path = os.path.join(self.dir, name)
+        Path(path).write_text('{}', encoding='utf-8')
+        stamp = time.time() - age
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def test_sync_picks_up_external_changes_only_when_the_directory_changed(self):
+        self._write('a.json', 30)
+        self._write('ignored.txt', 30)
+        self.assertTrue(self.catalog.sync_directory('rolling', self.dir))
+        self.assertEqual([e['id'] for e in self.catalog.entries('rolling')], ['backups/a.json'])
+        self.assertFalse(self.catalog.sync_directory('rolling', self.dir))
+
+        os.remove(os.path.join(self.dir, 'a.json'))
+        self._write('b.json', 10)
+        self.assertTrue(self.catalog.sync_directory('rolling', self.dir))
+        self.assertEqual([e['id'] for e in self.catalog.entries('rolling')], ['backups/b.json'])
+
+    def test_prune_keeps_newest_and_locked_backups(self):
+        for n, age in enumerate([50, 40, 30, 20, 10]):
+            self.catalog.record('rolling', self._write(f'b{n}.json', age))
+        self.catalog.set_locked('backups/b0.json', True)
+        removed = self.catalog.prune('rolling', 2, os.remove)
+        self.assertEqual(sorted(os.path.basename(p) for p in removed), ['b1.json', 'b2.json'])
+        self.assertEqual(sorted(os.listdir(self.dir)), ['b0.json', 'b3.json', 'b4.json'])
+        self.assertFalse(self.catalog.sync_directory('rolling', self.dir))
+
+    def test_copy_of_live_snapshot_inherits_its_counts(self):
+        live = os.path.join(self._tmp, 'live.json')
+        payload = {'server_version': 9, 'students': [{'id': 1}, {'id': 2}], 'scores': [{'id': 1}]}
+        atomic_write_json(Path(live), payload)
+        self.catalog.note_live(live, payload)
+        copy_path = os.path.join(self.dir, 'copy.json')
+        shutil.copy2(live, copy_path)
+        self.catalog.record('rolling', copy_path, source=live)
+        entry = self.catalog.latest('rolling')
+        self.assertEqual((entry['students'], entry['scores'], entry['server_version']), (2, 1, 9))
+
+        atomic_write_json(Path(live), {'students': []})
+        self.catalog.record('rolling', copy_path, source=live)
+        self.assertIsNone(self.catalog.latest('rolling')['students'])
+
+
+if __name__ == '__main__':
+    unittest.main()
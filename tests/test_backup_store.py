@@ -0,0 +1,124 @@
+"""Tests for the content-addressed incremental backup store (app.utils.backup_store)."""
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _ledger():
+    months = ['2026-01', '2026-02', '2026-03']
+    scores = [
+        {'id': n, 'studentId': n % 7, 'month': months[(n * 5) % 3], 'points': n % 4}
+        for n in range(150)
+    ]
+    return {
+        'server_version': 4,
+        'server_updated_at': '2026-03-05T10:00:00+00:00',
+        'students': [{'id': i, 'roll': f'EA24A{i:02d}'} for i in range(7)],
+        'scores': scores,
+        'month_roster_profiles': {'2026-01': [{'roll': 'EA24A01'}], '2026-02': [], 'legacy': {'x': 1}},
+        'veto_tracking': {'usage_log': []},
+    }
+
+
+class BackupStoreTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_backup_store_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import backup_store, data_paths
+        data_paths.reset_cache()
+        self.data_paths = data_paths
+        self.store = backup_store
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _chunk_files(self):
+        root = os.path.join(self.store.store_dir(), 'chunks')
+        return {name for _, _, names in os.walk(root) for name in names}
+
+    def test_round_trip_preserves_order_and_only_new_months_are_written(self):
+        first = _ledger()
+        self.store.write_backup('hourly', 'h1', first)
+        self.assertEqual(self.store.load_backup('hourly', 'h1'), first)
+        before = self._chunk_files()
+
+        second = copy.deepcopy(first)
+        second['server_version'] = 5
+        second['scores'].append({'id': 999, 'studentId': 1, 'month': '2026-03', 'points': 2})
+        self.store.write_backup('hourly', 'h2', second)
+        self.assertEqual(self.store.load_backup('hourly', 'h2'), second)
+        self.assertEqual(len(self._chunk_files() - before), 1)
+
+        listing = self.store.list_backups()
+        self.assertEqual(listing['offline_backup_store/manifests/hourly/h2.json']['scores'], 151)
+
+    def test_prune_keeps_protected_backups_and_sweeps_unreferenced_chunks(self):
+        self.store._GC_GRACE_SECONDS = 0
+        self.addCleanup(setattr, self.store, '_GC_GRACE_SECONDS', 600)
+        for n in range(3):
+            payload = _ledger()
+            payload['scores'][0] = dict(payload['scores'][0], points=100 + n)
+            self.store.write_backup('startup', f's{n}', payload)
+        protected = {'offline_backup_store/manifests/startup/s0.json'}
+        self.assertEqual(self.store.prune('startup', 1, protected=protected), 1)
+        self.assertEqual(set(self.store.list_backups()), protected | {'offline_backup_store/manifests/startup/s2.json'})
+        self.assertEqual(self.store.load_backup('startup', 's0')['scores'][0]['points'], 100)
+        self.assertFalse(self.store.has_backup('startup', 's1'))
+        # s1's changed month is referenced by no remaining manifest.
+        month_chunks = self._chunk_files()
+        os.remove(self.store._index_path())
+        self.assertEqual(set(self.store.list_backups()), protected | {'offline_backup_store/manifests/startup/s2.json'})
+        self.assertEqual(self._chunk_files(), month_chunks)
+
+
+class BackupStoreScoreboardTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_backup_store_sb_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+
+        from app import app
+        import app.routes.scoreboard as sb
+        cls.app = app
+        cls.sb = sb
+        cls.data_paths = data_paths
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('Ledger path escaped the temp root')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def test_hourly_backup_goes_to_the_store_and_reads_back_as_a_ledger(self):
+        from app.utils import backup_store
+        with self.app.app_context():
+            self.sb._backup_offline_hourly_immutable(_ledger())
+            self.assertFalse(os.path.isdir(self.sb._offline_hourly_backup_dir()))
+            (backup_id, entry), = backup_store.list_backups().items()
+            self.assertEqual((entry['kind'], entry['students']), ('hourly', 7))
+            path = os.path.join(self.data_paths.get_storage_root(), backup_id)
+            self.assertEqual(self.sb._load_json_file(path), _ledger())
+            self.assertEqual(self.sb._load_latest_offline_backup(), _ledger())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+"""Tests for the per-version change feed behind GET /offline-data?since_version=."""
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+from collections import deque
+from pathlib import Path
+from unittest import mock
+
+from app.utils import change_feed
+from app.utils.file_operations import atomic_write_json
+
+
+def _ledger(version=1):
+    students = [{'id': i, 'roll': f'EA26A{i:02d}', 'name': f'S{i}', 'remarks': 'private'}
+                for i in range(1, 31)]
+    scores = [{'id': n, 'studentId': 1 + n % 30, 'date': f"2026-0{3 + n % 2}-{1 + n % 28:02d}",
+               'points': 1, 'created_at': '2026-03-01T00:00:00Z', 'updated_at': '2026-03-01T00:00:00Z'}
+              for n in range(1, 61)]
+    return {
+        'server_version': version,
+        'server_updated_at': '2026-04-01T10:00:00Z',
+        'students': students,
+        'scores': scores,
+        'attendance': [{'studentId': 1, 'date': '2026-04-01', 'status': 'present'}],
+        'month_students': {'2026-03': [1, 2], '2026-04': [1, 2, 3]},
+        'fee_records': [{'id': 'f1', 'studentId': 1, 'amount': 500}],
+    }
+
+
+class ChangeFeedTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_change_feed_unit_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        self.data_paths = data_paths
+        change_feed.reset()
+
+    def tearDown(self):
+        change_feed.reset()
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def test_rows_keys_and_tombstones(self):
+        v1 = _ledger(1)
+        self.assertIsNone(change_feed.record(v1))
+        v2 = copy.deepcopy(v1)
+        v2['server_version'] = 2
+        v2['scores'][0]['points'] = 5
+        del v2['scores'][1]
+        v2['scores'].append({'id': 99, 'studentId': 1, 'date': '2026-04-09', 'points': 2})
+        v2['month_students']['2026-05'] = [4]
+        v2['attendance'].append({'studentId': 2, 'date': '2026-04-01', 'status': 'absent'})
+        changes = change_feed.record(v2)['changes']
+
+        self.assertEqual(sorted(changes), ['attendance', 'month_students', 'scores', 'server_version'])
+        self.assertEqual([r['id'] for r in changes['scores']['upsert']], [1, 99])
+        self.assertEqual(changes['scores']['delete'], ['2'])
+        self.assertEqual(changes['month_students'], {'op': 'keys', 'set': {'2026-05': [4]}, 'delete': []})
+        self.assertEqual(changes['attendance']['op'], 'set')
+
+    def test_patch_folds_the_chain_and_breaks_off_chain(self):
+        data = _ledger(1)
+        change_feed.record(data)
+        for version, edit in ((2, 'a'), (4, 'b'), (5, 'c')):
+            data = copy.deepcopy(data)
+            data['server_version'] = version
+            data['scores'][0]['notes'] = edit
+            if version == 4:
+                data['scores'] = [r for r in data['scores'] if r['id'] != 3]
+            if version == 5:
+                data['scores'].append({'id': 3, 'studentId': 1, 'date': '2026-04-02', 'points': 9})
+            change_feed.record(data)
+
+        patch = change_feed.patch_since(2, data)
+        scores = patch['changes']['scores']
+        self.assertEqual(patch['server_version'], 5)
+        self.assertEqual(sorted(r['id'] for r in scores['upsert']), [1, 3])
+        self.assertEqual(scores['delete'], [])
+        self.assertEqual(change_feed.patch_since(5, data)['changes'], {})
+        self.assertIsNone(change_feed.patch_since(3, data))
+        self.assertIsNone(change_feed.patch_since(0, data))
+        self.assertIsNone(change_feed.patch_since(2, dict(data, server_version=6)))
+
+        rolled_back = dict(data, server_version=3)
+        self.assertIsNone(change_feed.record(rolled_back))
+        self.assertEqual(change_feed.status()['entries'], 0)
+
+    def test_changed_keys_limit_the_diff(self):
+        v1 = _ledger(1)
+        change_feed.record(v1)
+        v2 = dict(v1, server_version=2, scores=v1['scores'] + [{'id': 100, 'date': '2026-04-03'}])
+        v2['students'] = list(v1['students'])
+        v2['students'][0] = dict(v2['students'][0], name='changed')
+        entry = change_feed.record(v2, changed_keys={'scores', 'server_version'}, changed_since=1)
+        self.assertEqual(sorted(entry['changes']), ['scores', 'server_version'])
+
+    def test_other_workers_use_the_persisted_feed(self):
+        data = _ledger(1)
+        change_feed.record(data)
+        for version in (2, 3):
+            data = copy.deepcopy(data)
+            data['server_version'] = version
+            data['scores'][version]['notes'] = f'v{version}'
+            change_feed.record(data)
+        worker_state = {'version': 1, 'collections': None, 'entries': deque()}
+
+        # A worker whose memory stopped at version 1 still answers from the file...
+        with mock.patch.dict(change_feed._state, worker_state):
+            patch = change_feed.patch_since(2, data)
+            self.assertEqual([r['id'] for r in patch['changes']['scores']['upsert']], [4])
+
+        # ...and chains its own next save from the version the others left on disk.
+        change_feed.reset()
+        v1 = _ledger(1)
+        change_feed.record(v1)
+        stale = {k: change_feed._state[k] for k in ('version', 'collections')}
+        v2 = dict(copy.deepcopy(v1), server_version=2)
+        v2['scores'][0]['points'] = 7
+        change_feed.record(v2)
+        v3 = dict(copy.deepcopy(v2), server_version=3)
+        v3['scores'][1]['points'] = 8
+        with mock.patch.dict(change_feed._state, dict(stale, entries=deque())):
+            entry = change_feed.record(v3)
+        self.assertEqual(entry['base'], 2)
+        self.assertEqual([r['id'] for r in entry['changes']['scores']['upsert']], [2])
+        self.assertEqual(change_feed.patch_since(1, v3)['changes']['scores']['delete'], [])
+
+
+class SinceVersionRouteTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_env = {k: os.environ.get(k) for k in ('EA_STORAGE_ROOT', 'EA_ALLOW_ANON_FULL_SYNC')}
+        cls._tmp = tempfile.mkdtemp(prefix='ea_change_feed_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        # Dedicated app instance (see test_cache_headers).
+        from app import create_app
+        import app.routes.scoreboard as sb
+        cls.app = create_app()
+        cls.sb = sb
+        cls.data_paths = data_paths
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('REFUSING TO RUN: ledger path escaped the temp root.')
+
+    @classmethod
+    def tearDownClass(cls):
+        change_feed.reset()  # clears the persisted feed under the temp root
+        for key, value in cls._old_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def _save(self, data):
+        with self.app.app_context():
+            self.sb._save_offline_data(data)
+
+    def test_since_version_returns_scoped_patch(self):
+        change_feed.reset()
+        atomic_write_json(Path(self.data_paths.get_data_path()), _ledger(1))
+        self.data_paths.invalidate_data_cache()
+        data = copy.deepcopy(self.data_paths.load_json_data_cached())
+        self._save(data)
+        base = data['server_version']
+
+        data = copy.deepcopy(data)
+        data['scores'][0]['points'] = 7
+        data['scores'].pop()
+        data['fee_records'][0]['amount'] = 600
+        self._save(data)
+
+        client = self.app.test_client()
+        os.environ['EA_ALLOW_ANON_FULL_SYNC'] = '1'
+        try:
+            resp = client.get(f'/scoreboard/offline-data?since_version={base}')
+        finally:
+            os.environ.pop('EA_ALLOW_ANON_FULL_SYNC', None)
+        patch = resp.get_json()['data']
+        self.assertTrue(patch['patch'])
+        self.assertEqual(patch['server_version'], data['server_version'])
+        scores = patch['changes']['scores']
+        self.assertEqual([r['id'] for r in scores['upsert']], [1])
+        self.assertEqual(scores['delete'], ['60'])
+        self.assertIn('fee_records', patch['changes'])
+
+        anon = client.get(f'/scoreboard/offline-data?since_version={base}').get_json()['data']
+        self.assertEqual(anon['sync_scope'], 'anonymous-public')
+        self.assertNotIn('fee_records', anon['changes'])
+
+        self.assertEqual(
+            client.get(f"/scoreboard/offline-data?since_version={data['server_version']}").status_code, 204,
+        )
+        full = client.get('/scoreboard/offline-data?since_version=0').get_json()['data']
+        self.assertNotIn('patch', full)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Tests for conditional, version-aware replication pulls of /offline-data."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.utils.file_operations import atomic_write_json
+from app.utils.replication_http import HTTPResponse
+
+PEER = 'http://192.168.1.70:5000'
+
+
+def _ledger(version=1, stamp='2026-04-01T10:00:00+00:00'):
+    students = [{'id': i, 'roll': f'EA26A{i:02d}', 'name': f'S{i}', 'active': True} for i in range(1, 31)]
+    scores = [{'id': n, 'studentId': n, 'date': '2026-04-02', 'month': '2026-04', 'points': 1,
+               'created_at': stamp, 'updated_at': stamp} for n in range(1, 11)]
+    return {'server_version': version, 'server_updated_at': stamp, 'updated_at': stamp,
+            'students': students, 'scores': scores, 'fee_records': []}
+
+
+def _response(status, payload=None, etag=None):
+    headers = {'ETag': etag} if etag else {}
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    return HTTPResponse(status, headers, body, f'{PEER}/scoreboard/offline-data')
+
+
+class ConditionalPullTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_env = {k: os.environ.get(k) for k in ('EA_STORAGE_ROOT', 'EA_MASTER_MODE', 'SYNC_PEERS', 'SYNC_PEER')}
+        cls._tmp = tempfile.mkdtemp(prefix='ea_conditional_pulls_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        for key in ('EA_MASTER_MODE', 'SYNC_PEERS', 'SYNC_PEER'):
+            os.environ.pop(key, None)
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        # Dedicated app instance (see test_cache_headers).
+        from app import create_app
+        import app.routes.scoreboard as sb
+        from app.utils.sync_config import resolve_sync_shared_key
+        cls.app = create_app()
+        cls.sb = sb
+        cls.data_paths = data_paths
+        cls.headers = {'X-EA-Replicated': '1', 'X-EA-Sync-Key': resolve_sync_shared_key()}
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('REFUSING TO RUN: ledger path escaped the temp root.')
+
+    @classmethod
+    def tearDownClass(cls):
+        for key, value in cls._old_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        atomic_write_json(Path(self.data_paths.get_data_path()), _ledger(3))
+        self.data_paths.invalidate_data_cache()
+        self.client = self.app.test_client()
+        with self.sb._peer_pull_state_lock:
+            self.sb._peer_pull_state.clear()
+
+    def test_etag_comparison_ignores_weakness_and_encoding_suffix(self):
+        matches = self.sb._etag_matches
+        self.assertTrue(matches('W/"3-120:gzip"', 'W/"3-120"'))
+        self.assertTrue(matches('"0-1", W/"3-120"', 'W/"3-120"'))
+        self.assertTrue(matches('*', 'W/"3-120"'))
+        self.assertFalse(matches('W/"3-121"', 'W/"3-120"'))
+        self.assertFalse(matches('', 'W/"3-120"'))
+
+    def test_replicated_revalidation_answers_without_contacting_peers(self):
+        with mock.patch.object(self.sb, '_best_peer_snapshot', return_value=(None, None)) as best:
+            first = self.client.get('/scoreboard/offline-data', headers=self.headers)
+            etag = first.headers['ETag']
+            compressed_tag = etag[:-1] + ':gzip"'
+            again = self.client.get('/scoreboard/offline-data',
+                                    headers=dict(self.headers, **{'If-None-Match': compressed_tag}))
+            same_version = self.client.get('/scoreboard/offline-data?since_version=3', headers=self.headers)
+        best.assert_not_called()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual((again.status_code, again.get_data()), (304, b''))
+        self.assertEqual(same_version.status_code, 204)
+
+    def test_sync_cycle_pull_reuses_its_copy_and_applies_patches(self):
+        sb = self.sb
+        full = _ledger(7)
+        patch = {'data': {
+            'patch': True, 'since_version': 7, 'server_version': 8,
+            'server_updated_at': '2026-04-02T00:00:00+00:00', 'updated_at': '2026-04-02T00:00:00+00:00',
+            'changes': {'scores': {'op': 'rows', 'upsert': [{'id': 11, 'studentId': 1, 'date': '2026-04-03',
+                                                              'points': 2}], 'delete': []}},
+        }}
+        replies = [_response(200, {'data': full}, etag='W/"7-900:gzip"'), _response(304), _response(200, patch)]
+        with mock.patch.object(sb._replication_http, 'get', side_effect=replies) as get:
+            first, changed = sb._pull_peer_ledger(PEER, 5, 'sync-cycle', keep_data=True)
+            self.assertTrue(changed)
+            cached, changed = sb._pull_peer_ledger(PEER, 5, 'sync-cycle', keep_data=True)
+            self.assertIs(cached, first)
+            self.assertFalse(changed)
+            patched, changed = sb._pull_peer_ledger(PEER, 5, 'sync-cycle', keep_data=True)
+
+        self.assertEqual(get.call_args_list[0].args[0], f'{PEER}/scoreboard/offline-data')
+        self.assertNotIn('If-None-Match', get.call_args_list[0].kwargs['headers'])
+        second = get.call_args_list[1]
+        self.assertTrue(second.args[0].endswith('?since_version=7'))
+        self.assertEqual(second.kwargs['headers']['If-None-Match'], 'W/"7-900:gzip"')
+        self.assertTrue(changed)
+        self.assertEqual((patched['server_version'], len(patched['scores'])), (8, 11))
+        self.assertEqual(len(first['scores']), 10)
+
+    def test_recovery_pull_skips_an_unchanged_peer(self):
+        sb = self.sb
+        replies = [_response(200, {'data': _ledger(9)}, etag='W/"9-900"'), _response(304)]
+        with mock.patch.object(sb._replication_http, 'get', side_effect=replies) as get:
+            self.assertEqual(sb._fetch_peer_offline_payload(PEER)['server_version'], 9)
+            self.assertIsNone(sb._fetch_peer_offline_payload(PEER))
+        second = get.call_args_list[1]
+        self.assertNotIn('since_version', second.args[0])
+        self.assertEqual(second.kwargs['headers']['If-None-Match'], 'W/"9-900"')
+
+        with mock.patch.object(sb._replication_http, 'get',
+                               return_value=_response(200, {'data': _ledger(9)})) as get:
+            self.assertEqual(sb._fetch_peer_offline_payload(PEER, revalidate=False)['server_version'], 9)
+        self.assertNotIn('If-None-Match', get.call_args.kwargs['headers'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+"""Tests for hybrid logical clock stamps and HLC-ordered merges."""
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from app.utils import hlc
+
+
+class _Wall:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self):
+        return self.seconds
+
+
+class HybridClockTests(unittest.TestCase):
+    def test_stamps_stay_monotonic_when_the_wall_clock_stalls_or_steps_back(self):
+        wall = _Wall(1_700_000_000.0)
+        clock = hlc.HybridClock('node-a', wall=wall)
+        first = clock.now()
+        second = clock.now()
+        wall.seconds -= 5
+        third = clock.now()
+        self.assertLess(hlc.key(first), hlc.key(second))
+        self.assertLess(hlc.key(second), hlc.key(third))
+        self.assertEqual(hlc.parse(third), (1_700_000_000_000, 2, 'node-a'))
+        self.assertEqual(sorted([third, first, second]), [first, second, third])
+
+    def test_observe_moves_past_peer_stamps_within_the_drift_bound(self):
+        wall = _Wall(1_700_000_000.0)
+        clock = hlc.HybridClock('node-a', wall=wall)
+        peer = hlc.HybridClock('node-b', wall=_Wall(1_700_000_060.0)).now()
+        self.assertTrue(clock.observe(peer))
+        self.assertGreater(hlc.key(clock.now()), hlc.key(peer))
+
+        far_ahead = hlc.HybridClock('node-c', wall=_Wall(1_700_009_000.0)).now()
+        self.assertFalse(clock.observe(far_ahead))
+        self.assertFalse(clock.observe('2026-04-01T10:00:00+00:00'))
+        self.assertLess(hlc.key(clock.now()), hlc.key(far_ahead))
+
+    def test_keys_legacy_and_latest(self):
+        self.assertEqual(hlc.key(''), (0, ''))
+        self.assertEqual(hlc.legacy(1.5), '0000000001500-0000-')
+        self.assertEqual(hlc.legacy(None), '')
+        a = '1700000000000-0001-node-a'
+        b = '1700000000000-0001-node-b'
+        self.assertLess(hlc.key(a), hlc.key(b))
+        self.assertEqual(hlc.latest(a, 'junk', b, ''), b)
+
+
+class LedgerClockTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_hlc_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        import app.routes.scoreboard as sb
+        cls.sb = sb
+        cls.data_paths = data_paths
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        clock = hlc.HybridClock('node-a')
+        patcher = mock.patch.dict(self.sb._hlc_state, {'clock': clock, 'rows': None, 'ledger': None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _score(points, updated_at, **extra):
+        return dict({'id': 1, 'studentId': 7, 'date': '2026-04-02', 'month': '2026-04', 'points': points,
+                     'updated_at': updated_at}, **extra)
+
+    def test_staging_stamps_only_rows_changed_here(self):
+        sb = self.sb
+        old = '2026-04-01T10:00:00+00:00'
+        payload = {'server_updated_at': old, 'scores': [self._score(1, old)]}
+        sb._seed_ledger_clocks(payload)
+        sb._stamp_ledger_clocks(payload)
+        self.assertNotIn('hlc', payload['scores'][0])
+        ledger_stamp = payload['server_hlc']
+
+        with mock.patch.object(sb, '_hlc_row_key', wraps=sb._hlc_row_key) as keyed:
+            sb._stamp_ledger_clocks(payload)
+        keyed.assert_not_called()
+        self.assertEqual(payload['server_hlc'], ledger_stamp)
+
+        edited = {'server_updated_at': old, 'scores': [self._score(4, '2026-04-01T09:00:00+00:00')]}
+        sb._stamp_ledger_clocks(edited)
+        fresh = edited['scores'][0]['hlc']
+        self.assertEqual(hlc.parse(fresh)[2], 'node-a')
+        self.assertGreater(hlc.key(edited['server_hlc']), hlc.key(ledger_stamp))
+
+        peer_stamp = hlc.HybridClock('node-b', wall=_Wall(time.time() + 1)).now()
+        from_peer = {'server_updated_at': old, 'server_hlc': peer_stamp,
+                     'scores': [self._score(5, old, hlc=peer_stamp)]}
+        sb._stamp_ledger_clocks(from_peer)
+        self.assertEqual(from_peer['scores'][0]['hlc'], peer_stamp)
+        self.assertEqual(from_peer['server_hlc'], peer_stamp)
+        self.assertGreater(hlc.key(sb._server_now_hlc()), hlc.key(peer_stamp))
+
+    def test_stamps_from_a_runaway_clock_are_not_trusted(self):
+        sb = self.sb
+        future = hlc.HybridClock('node-b', wall=_Wall(time.time() + 86400)).now()
+        row = self._score(5, '2026-04-01T10:00:00+00:00', hlc=future)
+        self.assertEqual(sb._row_clock(row), sb._row_clock(self._score(5, '2026-04-01T10:00:00+00:00')))
+        self.assertIsNone(sb._payload_clock({'server_hlc': future}))
+
+        payload = {'server_updated_at': '2026-04-01T10:00:00+00:00', 'server_hlc': future, 'scores': [row]}
+        sb._seed_ledger_clocks({'scores': []})
+        sb._stamp_ledger_clocks(payload)
+        self.assertEqual(hlc.parse(payload['scores'][0]['hlc'])[2], 'node-a')
+        self.assertLess(hlc.key(payload['server_hlc']), hlc.key(future))
+
+    def test_merges_order_by_hlc_not_wall_clock(self):
+        sb = self.sb
+        early = hlc.HybridClock('node-a', wall=_Wall(1_700_000_000.0)).now()
+        late = hlc.HybridClock('node-b', wall=_Wall(1_700_000_001.0)).now()
+        # The newer edit came from a node whose wall clock ran behind.
+        local = self._score(2, '2026-04-02T12:00:00+00:00', hlc=early)
+        incoming = self._score(9, '2026-04-02T08:00:00+00:00', hlc=late)
+        merged = sb._merge_scores_superset([local], [incoming])
+        self.assertEqual((merged[0]['points'], merged[0]['hlc']), (9, late))
+        self.assertEqual(sb._merge_scores_superset([incoming], [local])[0]['points'], 9)
+
+        student = {'id': 3, 'roll': 'EA26A03', 'name': 'Old', 'active': True, 'updated_at': '2026-04-02T12:00:00+00:00',
+                   'hlc': early}
+        renamed = dict(student, name='New', base_name='New', updated_at='2026-04-01T00:00:00+00:00', hlc=late)
+        self.assertEqual(sb._merge_students_preserve_active([student], [renamed])[0]['hlc'], late)
+
+        existing = {'students': [], 'attendance': [
+            {'date': '2026-04-02', 'studentId': 3, 'status': 'absent', 'updated_at': '2026-04-02T12:00:00+00:00',
+             'hlc': late}]}
+        stale = {'students': [], 'attendance': [
+            {'date': '2026-04-02', 'studentId': 3, 'status': 'present', 'updated_at': '2026-04-03T00:00:00+00:00',
+             'hlc': early}]}
+        self.assertEqual(sb._merge_attendance_superset(existing, stale)[0]['status'], 'absent')
+
+    def test_client_push_rows_lose_their_stamps(self):
+        payload = {'server_hlc': 'x', 'scores': [self._score(1, '', hlc='1700000000000-0000-node-b')], 'fee_records': []}
+        self.sb._strip_row_clocks(payload)
+        self.assertNotIn('hlc', payload['scores'][0])
+        self.assertNotIn('server_hlc', payload)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""Tests for immutable locked-month archives (app.utils.ledger_archive)."""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _ledger():
+    scores = []
+    for n, month in enumerate(['2026-01', '2026-02', '2026-01', '2026-03', '2026-02', '2026-03']):
+        scores.append({'id': n, 'studentId': n % 3, 'month': month, 'date': f'{month}-0{n + 1}', 'points': n})
+    return {'server_version': 3, 'locked_months': ['2026-01', '2026-02'], 'students': [{'id': 1}], 'scores': scores}
+
+
+class LedgerArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_ledger_archive_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import data_paths, ledger_archive
+        data_paths.reset_cache()
+        self.data_paths = data_paths
+        self.archive = ledger_archive
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def test_split_and_attach_round_trip_in_original_order(self):
+        payload = _ledger()
+        on_disk = self.archive.split_locked_months(payload, {'2026-01', '2026-02'})
+        self.assertEqual([r['month'] for r in on_disk['scores']], ['2026-03', '2026-03'])
+        self.assertEqual(set(on_disk[self.archive.INDEX_KEY]), {'2026-01', '2026-02'})
+        self.assertEqual(len(payload['scores']), 6)
+
+        restored = self.archive.attach(json.loads(json.dumps(on_disk)))
+        self.assertEqual(restored, _ledger())
+
+    def test_unchanged_month_is_not_rewritten_and_edits_get_a_new_archive(self):
+        payload = _ledger()
+        first = self.archive.split_locked_months(payload, {'2026-01'})
+        path = os.path.join(self.archive.archive_dir(), first['archived_months']['2026-01']['file'])
+        mtime = os.stat(path).st_mtime_ns
+        again = self.archive.split_locked_months(payload, {'2026-01'})
+        self.assertEqual(again['archived_months'], first['archived_months'])
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+        payload['scores'][0] = dict(payload['scores'][0], points=99)
+        edited = self.archive.split_locked_months(payload, {'2026-01'})
+        self.assertNotEqual(edited['archived_months']['2026-01']['sha256'],
+                            first['archived_months']['2026-01']['sha256'])
+        self.assertTrue(os.path.exists(path))
+
+    def test_unattached_reference_survives_a_rewrite(self):
+        on_disk = self.archive.split_locked_months(_ledger(), {'2026-01', '2026-02'})
+        rewritten = self.archive.split_locked_months(copy.deepcopy(on_disk), {'2026-01', '2026-02'})
+        self.assertEqual(set(rewritten['archived_months']), {'2026-01', '2026-02'})
+        restored = self.archive.attach(json.loads(json.dumps(rewritten)))
+        self.assertEqual(sorted(r['id'] for r in restored['scores']), list(range(6)))
+
+    def test_in_place_edit_of_a_locked_month_is_archived_again(self):
+        payload = _ledger()
+        first = self.archive.split_locked_months(payload, {'2026-01'})
+        payload['scores'][0]['points'] = 99
+        edited = self.archive.split_locked_months(payload, {'2026-01'})
+        self.assertNotEqual(edited['archived_months']['2026-01']['sha256'],
+                            first['archived_months']['2026-01']['sha256'])
+        restored = self.archive.attach(json.loads(json.dumps(edited)))
+        self.assertEqual(restored['scores'][0]['points'], 99)
+
+    def test_prune_removes_only_old_unreferenced_files(self):
+        payload = _ledger()
+        first = self.archive.split_locked_months(payload, {'2026-01'})
+        payload['scores'][0] = dict(payload['scores'][0], points=99)
+        current = self.archive.split_locked_months(payload, {'2026-01'})
+        directory = self.archive.archive_dir()
+        stale = first['archived_months']['2026-01']['file']
+        live = current['archived_months']['2026-01']['file']
+        for name in os.listdir(directory):
+            os.utime(os.path.join(directory, name), (1, 1))
+
+        self.assertEqual(self.archive.prune(set(), grace_seconds=3600), 1)
+        self.assertFalse(os.path.exists(os.path.join(directory, stale)))
+        self.assertTrue(os.path.exists(os.path.join(directory, live)))
+
+        payload['scores'][0] = dict(payload['scores'][0], points=7)
+        newest = self.archive.split_locked_months(payload, {'2026-01'})
+        os.utime(os.path.join(directory, live), (1, 1))
+        kept = self.archive.prune(self.archive.referenced_files(current), grace_seconds=3600)
+        self.assertEqual(kept, 0)
+        self.assertTrue(os.path.exists(os.path.join(directory, live)))
+        self.assertNotEqual(newest['archived_months']['2026-01']['file'], live)
+
+
+class LedgerArchiveSavePathTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._old_archive_flag = os.environ.get('EA_LEDGER_ARCHIVE_LOCKED')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_ledger_archive_save_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        os.environ['EA_LEDGER_ARCHIVE_LOCKED'] = '1'
+
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+
+        from app import app
+        import app.routes.scoreboard as sb
+        cls.app = app
+        cls.sb = sb
+        cls.data_paths = data_paths
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('Ledger path escaped the temp root')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        if cls._old_archive_flag is None:
+            os.environ.pop('EA_LEDGER_ARCHIVE_LOCKED', None)
+        else:
+            os.environ['EA_LEDGER_ARCHIVE_LOCKED'] = cls._old_archive_flag
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_snapshot_keeps_locked_months_out_of_the_live_file(self):
+        payload = _ledger()
+        payload['students'] = [{'id': i, 'name': f'S{i}', 'roll': f'R{i}'} for i in range(5)]
+        saved = self.sb._save_offline_data(payload)
+
+        with open(self.data_paths.get_data_path(), encoding='utf-8') as f:
+            on_disk = json.load(f)
+        self.assertEqual({r['month'] for r in on_disk['scores']}, {'2026-03'})
+        self.assertIn('2026-01', on_disk['archived_months'])
+
+        self.data_paths.invalidate_data_cache()
+        reloaded = self.sb._load_offline_data()
+        self.assertEqual(reloaded['scores'], saved['scores'])
+        self.assertNotIn('archived_months', reloaded)
+
+    def test_archiving_is_opt_in(self):
+        os.environ.pop('EA_LEDGER_ARCHIVE_LOCKED', None)
+        try:
+            payload = _ledger()
+            self.assertIs(self.sb._archive_locked_months(payload), payload)
+        finally:
+            os.environ['EA_LEDGER_ARCHIVE_LOCKED'] = '1'
+
+
+if __name__ == '__main__':
+    unittest.main()
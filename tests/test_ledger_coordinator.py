@@ -0,0 +1,124 @@
+"""Tests for cross-process ledger coordination (app.utils.ledger_coordinator)."""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+
+from app.utils import ledger_coordinator
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = """
+import sys, time
+from app.utils.ledger_coordinator import LedgerLock, publish_write
+lock = LedgerLock()
+with lock:
+    publish_write()
+    print('locked', flush=True)
+    sys.stdin.readline()
+"""
+
+
+@unittest.skipUnless(ledger_coordinator.cross_process_supported(), 'flock not available')
+class LedgerCoordinatorTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_ledger_coord_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        self.data_paths = data_paths
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _spawn_holder(self):
+        env = dict(os.environ, PYTHONPATH=_ROOT)
+        child = subprocess.Popen([sys.executable, '-c', _CHILD], cwd=_ROOT, env=env,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        # Importing the package builds the app, which may log to stdout first.
+        for line in child.stdout:
+            if line.strip() == 'locked':
+                return child
+        self.fail('lock holder exited early')
+
+    def test_lock_excludes_other_processes_and_resyncs_after_their_write(self):
+        lock = ledger_coordinator.LedgerLock()
+        with lock:
+            pass  # establish this process's view of the sequence
+        resyncs = []
+        listener = lambda: resyncs.append(1)  # noqa: E731
+        ledger_coordinator.register_resync_listener(listener)
+        self.addCleanup(ledger_coordinator._resync_listeners.remove, listener)
+
+        child = self._spawn_holder()
+        try:
+            self.assertFalse(lock.acquire(timeout=0.2))
+        finally:
+            child.communicate('\n', timeout=10)
+        self.assertTrue(lock.acquire(timeout=5))
+        lock.release()
+        self.assertEqual(resyncs, [1])
+
+    def test_pinned_lock_stays_held_after_release(self):
+        lock = ledger_coordinator.LedgerLock()
+        with lock:
+            lock.pin()
+        env = dict(os.environ, PYTHONPATH=_ROOT)
+        probe = ("from app.utils.ledger_coordinator import LedgerLock\n"
+                 "print(LedgerLock().acquire(timeout=0.2))")
+        out = subprocess.run([sys.executable, '-c', probe], cwd=_ROOT, env=env,
+                             capture_output=True, text=True, timeout=30).stdout.strip().splitlines()
+        self.assertEqual(out[-1], 'False')
+        lock.unpin()
+
+    def test_threads_in_one_process_are_serialized_and_reentrant(self):
+        lock = ledger_coordinator.LedgerLock()
+        order = []
+        with lock:
+            with lock:
+                self.assertTrue(lock._is_owned())
+            worker = threading.Thread(target=lambda: (lock.acquire(), order.append('worker'), lock.release()))
+            worker.start()
+            worker.join(0.1)
+            order.append('main')
+        worker.join(5)
+        self.assertEqual(order, ['main', 'worker'])
+
+    def test_role_is_held_by_one_process_until_it_exits(self):
+        env = dict(os.environ, PYTHONPATH=_ROOT)
+        probe = ("from app.utils.ledger_coordinator import hold_role\n"
+                 "print(hold_role('test_role'))")
+
+        def _probe():
+            return subprocess.run([sys.executable, '-c', probe], cwd=_ROOT, env=env,
+                                  capture_output=True, text=True, timeout=30).stdout.strip().splitlines()[-1]
+
+        self.assertTrue(ledger_coordinator.hold_role('test_role'))
+        self.assertTrue(ledger_coordinator.hold_role('test_role'))
+        self.assertEqual(_probe(), 'False')
+        held = ledger_coordinator._roles.pop('test_role')
+        os.close(held[2])
+        self.assertEqual(_probe(), 'True')
+
+    def test_cached_ledger_reloads_after_another_process_writes(self):
+        from app.utils.file_operations import atomic_write_json
+        atomic_write_json(self.data_paths.get_data_path(), {'server_version': 1, 'students': []})
+        first = self.data_paths.load_json_data_cached()
+        self.assertIs(self.data_paths.load_json_data_cached(), first)
+        self._spawn_holder().communicate('\n', timeout=10)
+        self.assertIsNot(self.data_paths.load_json_data_cached(), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
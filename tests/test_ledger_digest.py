@@ -0,0 +1,187 @@
+"""Tests for Merkle-digest anti-entropy between sync peers."""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.utils import ledger_digest
+from app.utils.file_operations import atomic_write_json
+
+MONTH_FIELDS = {'scores': ('month', 'date'), 'attendance': ('month', 'date')}
+MONTH_KEYED = ('month_students',)
+
+
+def _month_key(value):
+    text = str(value or '')
+    return text[:7] if len(text) >= 7 and text[4:5] == '-' else ''
+
+
+def _ledger(version=1):
+    students = [{'id': i, 'roll': f'EA26A{i:02d}', 'name': f'S{i}', 'active': True, 'fees': {'due': i}}
+                for i in range(1, 31)]
+    stamp = '2026-04-01T10:00:00+00:00'
+    scores = [{'id': n, 'studentId': 1 + n % 30, 'date': f"2026-0{3 + n % 2}-{1 + n % 28:02d}", 'points': 1,
+               'created_at': stamp, 'updated_at': stamp} for n in range(1, 41)]
+    return {
+        'server_version': version,
+        'server_updated_at': stamp,
+        'updated_at': stamp,
+        'students': students,
+        'scores': scores,
+        'attendance': [{'studentId': 1, 'date': '2026-04-01', 'status': 'present'}],
+        'month_students': {'2026-03': [1, 2], '2026-04': [1, 2, 3]},
+        'fee_records': [{'id': 'f1', 'studentId': 1}],
+    }
+
+
+def _build(payload, external=False):
+    return ledger_digest.build(payload, MONTH_FIELDS, MONTH_KEYED, _month_key, external=external)
+
+
+class LedgerDigestTests(unittest.TestCase):
+    def test_order_and_node_local_keys_do_not_count(self):
+        a = _ledger(1)
+        b = copy.deepcopy(a)
+        b['scores'].reverse()
+        b['server_version'] = 99
+        b['replica_origin'] = {'node': 'x', 'version': 3}
+        b['_sync_ops'] = [{'id': 'op'}]
+        self.assertEqual(_build(a)['root'], _build(b)['root'])
+
+        b['fee_records'] = []
+        for student in b['students']:
+            student.pop('fees')
+        self.assertNotEqual(_build(a)['root'], _build(b)['root'])
+        self.assertEqual(_build(a, external=True)['root'], _build(b, external=True)['root'])
+
+    def test_diff_extract_and_replace_only_touch_changed_months(self):
+        local = _ledger(1)
+        remote = copy.deepcopy(local)
+        march = next(r for r in remote['scores'] if r['date'].startswith('2026-03'))
+        march['points'] = 9
+        remote['month_students']['2026-05'] = [4]
+
+        differing = ledger_digest.diff(_build(local), _build(remote))
+        self.assertEqual(differing, {'scores': ['2026-03'], 'month_students': ['2026-05']})
+
+        contents = ledger_digest.extract(remote, differing, MONTH_FIELDS, MONTH_KEYED, _month_key)
+        self.assertTrue(all(r['date'].startswith('2026-03') for r in contents['scores']['2026-03']))
+        rebuilt = ledger_digest.replace_buckets(local, contents, MONTH_FIELDS, MONTH_KEYED, _month_key)
+        self.assertEqual(_build(rebuilt)['root'], _build(remote)['root'])
+        self.assertEqual(len(local['scores']), 40)
+
+        changes = ledger_digest.patch_changes(remote, contents, MONTH_FIELDS, MONTH_KEYED, _month_key)
+        self.assertEqual(changes['scores']['op'], 'rows')
+        self.assertEqual(changes['month_students'], {'op': 'keys', 'set': {'2026-05': [4]}, 'delete': []})
+
+
+class PeerDigestCycleTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        keys = ('EA_STORAGE_ROOT', 'EA_MASTER_MODE', 'SYNC_PEERS', 'SYNC_PEER', 'EA_NODE_ID')
+        cls._old_env = {k: os.environ.get(k) for k in keys}
+        cls._tmp = tempfile.mkdtemp(prefix='ea_ledger_digest_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        for key in ('EA_MASTER_MODE', 'SYNC_PEERS', 'SYNC_PEER'):
+            os.environ.pop(key, None)
+        os.environ['EA_NODE_ID'] = 'master-a'
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        # Dedicated app instance (see test_cache_headers).
+        from app import create_app
+        import app.routes.scoreboard as sb
+        from app.utils.sync_config import resolve_sync_shared_key
+        cls.app = create_app()
+        cls.sb = sb
+        cls.data_paths = data_paths
+        cls.headers = {'X-EA-Replicated': '1', 'X-EA-Sync-Key': resolve_sync_shared_key()}
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('REFUSING TO RUN: ledger path escaped the temp root.')
+
+    @classmethod
+    def tearDownClass(cls):
+        for key, value in cls._old_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        atomic_write_json(Path(self.data_paths.get_data_path()), _ledger(5))
+        self.data_paths.invalidate_data_cache()
+        self.client = self.app.test_client()
+
+    def test_digest_route_reports_match_and_serves_buckets(self):
+        first = self.client.get('/scoreboard/sync/digest?scope=full', headers=self.headers).get_json()
+        self.assertIn('scores', first['collections'])
+        again = self.client.get(f"/scoreboard/sync/digest?scope=full&root={first['root']}", headers=self.headers)
+        self.assertTrue(again.get_json()['match'])
+        self.assertNotIn('collections', again.get_json())
+        self.assertLess(len(again.get_data()), 400)
+
+        buckets = self.client.get('/scoreboard/sync/buckets?scope=external&want=scores:2026-04,students:*',
+                                  headers=self.headers).get_json()['buckets']
+        self.assertTrue(all(r['date'].startswith('2026-04') for r in buckets['scores']['2026-04']))
+        self.assertNotIn('fees', buckets['students']['*'][0])
+        self.assertEqual(self.client.get('/scoreboard/sync/digest').status_code, 401)
+
+    def test_buckets_refuse_a_ledger_that_moved_past_the_digest(self):
+        digest = self.client.get('/scoreboard/sync/digest?scope=full', headers=self.headers).get_json()
+        url = '/scoreboard/sync/buckets?scope=full&want=students:*&server_version='
+        same = self.client.get(url + str(digest['server_version']), headers=self.headers)
+        self.assertEqual(same.status_code, 200)
+        moved = self.client.get(url + str(digest['server_version'] + 1), headers=self.headers)
+        self.assertEqual(moved.status_code, 409)
+        self.assertEqual(moved.get_json()['server_version'], digest['server_version'])
+
+    def test_master_cycle_pushes_only_differing_buckets(self):
+        sb = self.sb
+        peer = 'http://192.168.1.60:5000'
+        local = self.data_paths.load_json_data_cached()
+        remote = copy.deepcopy(local)
+        stale = next(r for r in remote['scores'] if r['date'].startswith('2026-03'))
+        stale['points'] = 0
+        remote['replica_origin'] = {'node': 'master-a', 'version': 4}
+        remote_digest = dict(sb._ledger_digest.build(remote, *sb._ledger_digest_shape()),
+                             replica_origin=remote['replica_origin'], server_updated_at=remote['server_updated_at'])
+        sent = []
+
+        def _post(target, body, key):
+            sent.append(json.loads(body.decode('utf-8')))
+            return 200, {}
+
+        env = {'EA_MASTER_MODE': '1', 'SYNC_PEERS': peer}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch.object(sb, '_fetch_peer_digest', return_value=remote_digest), \
+                mock.patch.object(sb, '_fetch_peer_buckets', return_value={}) as buckets, \
+                mock.patch.object(sb, '_post_replication_body', side_effect=_post):
+            sb._do_peer_sync_cycle(self.app)
+            sb._do_peer_sync_cycle(self.app)
+
+        buckets.assert_not_called()
+        # The peer still reports the stale digest, so the second cycle pushes again.
+        self.assertEqual(len(sent), 2)
+        patch = sent[0]['replication_patch']
+        self.assertEqual((patch['since_version'], patch['server_version']), (4, 5))
+        scores = patch['changes']['scores']['upsert']
+        self.assertTrue(scores and all(r['date'].startswith('2026-03') for r in scores))
+        self.assertNotIn('students', patch['changes'])
+        self.assertEqual(sb._replication_outbox().acked_version(peer), 5)
+
+        with mock.patch.dict(os.environ, env), \
+                mock.patch.object(sb, '_fetch_peer_digest', return_value={'root': 'x', 'match': True}), \
+                mock.patch.object(sb, '_post_replication_body') as post:
+            sb._do_peer_sync_cycle(self.app)
+        post.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
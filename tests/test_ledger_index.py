@@ -0,0 +1,101 @@
+"""Tests for the cached-ledger lookup index (app.utils.ledger_index)."""
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.utils.file_operations import atomic_write_json
+
+
+def _ledger():
+    students = [{'id': i, 'roll': f'EA24A{i:02d}', 'stars': 10 + i, 'veto_count': i % 3} for i in range(1, 9)]
+    scores = []
+    for n in range(400):
+        sid = 1 + n % 8
+        month = ['2026-01', '2026-02', '2026-03'][n % 3]
+        scores.append({
+            'id': n, 'studentId': sid, 'month': month, 'date': f'{month}-{1 + n % 28:02d}',
+            'points': n % 11 - 3, 'stars': (n % 5) - 2, 'vetos': (n % 4) - 2,
+            'notes': '[veto shield]' if n % 17 == 0 else '',
+        })
+    profiles = {
+        '2026-01': [{'studentId': sid, 'roll': f'EA24A{sid:02d}', 'month_star_count': sid, 'month_veto_count': 1}
+                    for sid in range(1, 9)],
+        '2026-02': [{'roll': 'EA24A03', 'month_star_count': 7}, {'roll': 'OLD05', 'month_star_count': 2}],
+    }
+    history = [{'student_id': 5, 'old_roll': 'OLD05', 'new_roll': 'EA24A05', 'effective_month': '2026-03'}]
+    return {
+        'server_version': 11, 'students': students, 'scores': scores,
+        'month_roster_profiles': profiles, 'roll_history': history,
+    }
+
+
+class LedgerIndexTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_ledger_index_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        self.data_paths = data_paths
+        atomic_write_json(Path(data_paths.get_data_path()), _ledger())
+        self.cached = data_paths.load_json_data_cached()
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def test_index_answers_match_full_scans(self):
+        from app.utils import score_balance
+        from app.utils.star_calculator import StarCalculator
+        import app.routes.scoreboard as sb
+
+        self.assertIsNotNone(self.data_paths.ledger_index_for(self.cached))
+        scanned = copy.deepcopy(self.cached)
+        self.assertIsNone(self.data_paths.ledger_index_for(scanned))
+        calc = StarCalculator()
+        self.assertIs(calc.data, self.cached)
+        for sid in range(0, 10):
+            for month in ('2026-01', '2026-02', '2026-03'):
+                for fn in (score_balance.get_roll_for_month, sb._sum_points_for_student_month):
+                    self.assertEqual(fn(self.cached, sid, month), fn(scanned, sid, month))
+                self.assertEqual(score_balance.compute_star_balance(self.cached, sid, month, '2026-04'),
+                                 score_balance.compute_star_balance(scanned, sid, month, '2026-04'))
+                self.assertEqual(score_balance.compute_veto_balance(self.cached, sid, month, '2026-03'),
+                                 score_balance.compute_veto_balance(scanned, sid, month, '2026-03'))
+                awards = sum(r['stars'] for r in scanned['scores']
+                             if r['studentId'] == sid and r['month'] == month and r['stars'] > 0)
+                self.assertEqual(calc.get_student_month_awards(sid, month), awards)
+            self.assertEqual(sb._get_student_total_used_vetos_from_scores(self.cached, sid),
+                             sb._get_student_total_used_vetos_from_scores(scanned, sid))
+        self.assertEqual(score_balance.get_roll_for_month(self.cached, 5, '2026-02'), 'OLD05')
+
+    def test_index_is_rebuilt_after_a_mutation_or_prime(self):
+        from app.utils.ledger_view import LedgerView
+        first = self.data_paths.ledger_index_for(self.cached)
+        view = LedgerView(self.cached)
+        self.assertIs(self.data_paths.ledger_index_for(view), first)
+
+        scores = view.mutable('scores')
+        scores.append({'id': 999, 'studentId': 1, 'month': '2026-03', 'points': 50})
+        self.assertIsNone(self.data_paths.ledger_index_for(view))
+
+        self.cached['scores'].append({'id': 1000, 'studentId': 1, 'month': '2026-03', 'points': 5})
+        rebuilt = self.data_paths.ledger_index_for(self.cached)
+        self.assertIsNot(rebuilt, first)
+        self.assertEqual(rebuilt.scores_for(1, '2026-03')[-1]['id'], 1000)
+
+        self.data_paths.prime_data_cache(self.cached)
+        self.assertIsNot(self.data_paths.ledger_index_for(self.cached), rebuilt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""Tests for the append-only ledger journal (app.utils.ledger_repository)."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class LedgerJournalTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_journal_tests_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+
+        from app.utils import data_paths, ledger_repository
+        from app.utils.file_operations import atomic_write_json
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        self.data_paths = data_paths
+        self.journal = ledger_repository
+        self.write = atomic_write_json
+        self.path = data_paths.get_data_path()
+        self.assertTrue(self.path.startswith(self._tmp))
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _save(self, payload, op_id):
+        state = self.journal.prepare_revision(
+            revision=payload['server_version'], payload=payload, op_id=op_id,
+        )
+        if state['duplicate']:
+            return state
+        if state['snapshot_due']:
+            self.write(self.path, payload)
+        self.journal.mark_revision_committed(
+            revision=state['revision'], op_id=op_id,
+            payload_sha256=state['payload_sha256'],
+            snapshot_written=state['snapshot_due'], snapshot_path=self.path,
+        )
+        return state
+
+    def _ledger(self, version):
+        return {
+            'server_version': version,
+            'students': [{'id': i, 'roll': f'R{i}'} for i in range(5)],
+            'scores': [{'id': i, 'studentId': i % 5, 'points': 1} for i in range(20)],
+            'veto_tracking': {'students': {'R1': {'used_vetos': 0}}},
+        }
+
+    def test_first_revision_is_a_checkpoint_snapshot(self):
+        state = self._save(self._ledger(1), 'op-1')
+        self.assertTrue(state['snapshot_due'])
+        self.assertEqual(self.journal.journal_status()['snapshot_revision'], 1)
+
+    def test_small_edit_is_journal_only_and_replays(self):
+        payload = self._ledger(1)
+        self._save(payload, 'op-1')
+        on_disk_before = json.loads(open(self.path, encoding='utf-8').read())
+
+        payload = json.loads(json.dumps(payload))
+        payload['server_version'] = 2
+        payload['scores'][7]['points'] = 9
+        payload['scores'].append({'id': 99, 'studentId': 1, 'points': 4})
+        payload['veto_tracking']['students']['R1']['used_vetos'] = 1
+        state = self._save(payload, 'op-2')
+
+        self.assertFalse(state['snapshot_due'])
+        self.assertEqual(state['changed'], ['scores', 'server_version', 'veto_tracking'])
+        self.assertEqual(json.loads(open(self.path, encoding='utf-8').read()), on_disk_before)
+
+        replayed = json.loads(open(self.path, encoding='utf-8').read())
+        self.assertEqual(self.journal.replay_journal(replayed, self.path), 1)
+        self.assertEqual(replayed, payload)
+
+    def test_uncommitted_revision_is_not_replayed(self):
+        payload = self._ledger(1)
+        self._save(payload, 'op-1')
+        payload = dict(payload, server_version=2, scores=[])
+        self.journal.prepare_revision(revision=2, payload=payload, op_id='op-2')
+
+        replayed = json.loads(open(self.path, encoding='utf-8').read())
+        self.assertEqual(self.journal.replay_journal(replayed, self.path), 0)
+        self.assertEqual(len(replayed['scores']), 20)
+
+    def test_external_rewrite_keeps_newer_journaled_revisions(self):
+        payload = self._ledger(1)
+        self._save(payload, 'op-1')
+        self._save(dict(payload, server_version=2, scores=[]), 'op-2')
+
+        # A maintenance script read the lagging snapshot and rewrote it.
+        edited = self._ledger(1)
+        edited['students'][0]['roll'] = 'EDITED'
+        self.write(self.path, edited)
+        replayed = json.loads(open(self.path, encoding='utf-8').read())
+        with self.assertLogs('app.utils.ledger_repository', level='ERROR'):
+            self.assertEqual(self.journal.replay_journal(replayed, self.path), 1)
+        self.assertEqual((replayed['server_version'], replayed['scores']), (2, []))
+        self.assertEqual(replayed['students'][0]['roll'], 'EDITED')
+        self.assertTrue(self.journal.prepare_revision(
+            revision=3, payload=dict(replayed, server_version=3), op_id='op-3')['snapshot_due'])
+
+    def test_restored_older_ledger_is_served_as_is(self):
+        payload = self._ledger(1)
+        self._save(payload, 'op-1')
+        self._save(dict(payload, server_version=2, scores=[]), 'op-2')
+
+        self.write(self.path, self._ledger(0))
+        restored = json.loads(open(self.path, encoding='utf-8').read())
+        with self.assertLogs('app.utils.ledger_repository', level='ERROR'):
+            self.assertEqual(self.journal.replay_journal(restored, self.path), 0)
+        self.assertEqual(len(restored['scores']), 20)
+
+    def test_forced_compaction_writes_replayed_snapshot(self):
+        payload = self._ledger(1)
+        self._save(payload, 'op-1')
+        self._save(dict(payload, server_version=2, scores=[]), 'op-2')
+
+        self.assertEqual(self.journal.compact_snapshot(), 2)
+        on_disk = json.loads(open(self.path, encoding='utf-8').read())
+        self.assertEqual(on_disk['scores'], [])
+        self.assertEqual(self.journal.journal_status()['pending_revisions'], 0)
+        self.assertEqual(self.journal.replay_journal(on_disk, self.path), 0)
+
+    def test_resubmitted_op_is_duplicate(self):
+        payload = self._ledger(1)
+        self._save(payload, 'op-1')
+        again = self.journal.prepare_revision(revision=2, payload=payload, op_id='op-1')
+        self.assertTrue(again['duplicate'])
+        self.assertEqual(again['revision'], 1)
+
+    def test_compaction_after_revision_budget(self):
+        os.environ['EA_LEDGER_COMPACT_EVERY'] = '2'
+        try:
+            payload = self._ledger(1)
+            self._save(payload, 'op-1')
+            self.assertFalse(self._save(dict(payload, server_version=2, tick=1), 'op-2')['snapshot_due'])
+            self.assertTrue(self._save(dict(payload, server_version=3, tick=2), 'op-3')['snapshot_due'])
+        finally:
+            os.environ.pop('EA_LEDGER_COMPACT_EVERY', None)
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['server_version'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
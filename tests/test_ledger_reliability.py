@@ -117,6 +117,18 @@ class LedgerSaveReliabilityTests(unittest.TestCase):
         self.assertTrue(os.path.exists(path))
         self.assertEqual(saved.get('server_version'), before_version + 1)
 
+    def test_journal_only_save_survives_cache_reset(self):
+        path = self.sb._offline_data_path()
+        payload = dict(self.seed, scores=[{'id': 1, 'studentId': 1, 'points': 5}])
+        saved = self.sb._save_offline_data(payload)
+        self.data_paths.invalidate_data_cache()
+
+        reloaded = self.sb._load_offline_data()
+        self.assertEqual(reloaded.get('server_version'), saved.get('server_version'))
+        self.assertEqual(reloaded.get('scores'), payload['scores'])
+        with open(path, 'r', encoding='utf-8') as f:
+            self.assertLess(json.load(f).get('server_version'), saved.get('server_version'))
+
     def test_verify_backup_copy_removes_truncated_copy(self):
         src = os.path.join(self._tmp, 'src.json')
         bad = os.path.join(self._tmp, 'bad.json')
@@ -0,0 +1,154 @@
+"""Tests for the per-collection shard store (app.utils.ledger_shards)."""
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _ledger(version):
+    return {
+        'server_version': version,
+        'updated_at': '2026-05-01T00:00:00+00:00',
+        'students': [{'id': i, 'roll': f'R{i}'} for i in range(5)],
+        'scores': [{'id': i, 'studentId': i % 5, 'month': '2026-05', 'points': 1} for i in range(40)],
+        'veto_tracking': {'students': {'R1': {'used_vetos': 0}}},
+        'proposal_votes': [],
+    }
+
+
+class LedgerShardStoreTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_ledger_shard_tests_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+
+        from app.utils import data_paths, ledger_shards
+        from app.utils.file_operations import atomic_write_json
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        self.data_paths = data_paths
+        self.shards = ledger_shards
+        self.path = data_paths.get_data_path()
+        atomic_write_json(self.path, _ledger(1))
+        self.shards.replace_all(_ledger(1), 1)
+        self.shards.note_snapshot_file(self.path)
+        self.assertTrue(self.shards.shard_dir().startswith(self._tmp))
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _shard_files(self):
+        return sorted(n for n in os.listdir(self.shards.shard_dir()) if n != self.shards.MANIFEST_NAME)
+
+    def test_only_dirty_shards_are_written(self):
+        before = {n: os.stat(os.path.join(self.shards.shard_dir(), n)).st_ino for n in self._shard_files()}
+        payload = _ledger(2)
+        payload['proposal_votes'] = [{'id': 'p1', 'vote': 'yes'}]
+        written = self.shards.apply_revision(
+            revision=2, base_revision=1, changes={'proposal_votes': {}, 'server_version': {}}, payload=payload,
+        )
+        self.assertEqual(written, ['proposal_votes'])
+        after = self._shard_files()
+        unchanged = [n for n in after if not n.startswith('proposal_votes.')]
+        self.assertEqual({n: before[n] for n in unchanged},
+                         {n: os.stat(os.path.join(self.shards.shard_dir(), n)).st_ino for n in unchanged})
+        self.assertEqual(len(after), len(before))
+        self.assertEqual(self.shards.load_ledger(self.path), payload)
+
+    def test_unknown_base_hashes_every_shard(self):
+        payload = _ledger(3)
+        payload['scores'][0]['points'] = 5
+        written = self.shards.apply_revision(revision=3, base_revision=1, changes=None, payload=payload)
+        self.assertEqual(written, ['scores'])
+
+    def test_unchanged_shards_are_not_reparsed(self):
+        first = self.shards.load_ledger(self.path)
+        payload = _ledger(2)
+        payload['veto_tracking'] = {'students': {'R1': {'used_vetos': 1}}}
+        self.shards.apply_revision(revision=2, base_revision=1, changes={'veto_tracking': {}}, payload=payload)
+        second = self.shards.load_ledger(self.path)
+        self.assertIs(second['scores'], first['scores'])
+        self.assertEqual(second['veto_tracking'], payload['veto_tracking'])
+
+    def test_snapshot_replaced_outside_the_app_is_not_served(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"students": []}')
+        self.assertIsNone(self.shards.load_ledger(self.path))
+
+    def test_backup_hard_links_shards_and_stays_immutable(self):
+        backup = os.path.join(self._tmp, 'backup.shards')
+        self.shards.link_shard_set(backup)
+        for name in self._shard_files():
+            self.assertEqual(os.stat(os.path.join(backup, name)).st_ino,
+                             os.stat(os.path.join(self.shards.shard_dir(), name)).st_ino)
+
+        changed = copy.deepcopy(_ledger(2))
+        changed['scores'] = []
+        self.shards.replace_all(changed, 2)
+        self.assertEqual(self.shards.read_shard_set(backup), _ledger(1))
+        self.assertGreater(self.shards.shard_set_size(backup), 0)
+
+
+class LedgerShardSavePathTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_ledger_shard_save_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        os.environ['EA_LEDGER_BACKEND'] = 'sharded'
+
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+
+        from app import app
+        import app.routes.scoreboard as sb
+        cls.app = app
+        cls.sb = sb
+        cls.data_paths = data_paths
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('Ledger path escaped the temp root')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        os.environ.pop('EA_LEDGER_BACKEND', None)
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_save_round_trips_and_hourly_backup_is_a_shard_set(self):
+        seed = {'students': [{'id': i, 'name': f'S{i}', 'roll': f'R{i}'} for i in range(10)], 'scores': []}
+        self.sb._save_offline_data(copy.deepcopy(seed))
+        payload = copy.deepcopy(self.sb._load_offline_data())
+        payload['scores'].append({'id': 1, 'studentId': 2, 'date': '2026-05-02', 'points': 3})
+        saved = self.sb._save_offline_data(payload)
+
+        hourly = os.listdir(self.sb._offline_hourly_backup_dir())
+        self.assertTrue(any(name.endswith('.shards') for name in hourly))
+
+        self.data_paths.invalidate_data_cache()
+        reloaded = self.sb._load_offline_data()
+        self.assertEqual(reloaded['server_version'], saved['server_version'])
+        self.assertEqual(reloaded['scores'], payload['scores'])
+
+
+if __name__ == '__main__':
+    unittest.main()
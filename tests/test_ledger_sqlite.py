@@ -0,0 +1,206 @@
+"""Tests for the SQLite ledger row store (app.utils.ledger_sqlite)."""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _ledger(version):
+    return {
+        'server_version': version,
+        'students': [{'id': i, 'roll': f'R{i}'} for i in range(5)],
+        'scores': [
+            {'id': i, 'studentId': i % 5, 'date': f'2026-0{1 + i % 3}-1{i % 9}',
+             'month': f'2026-0{1 + i % 3}', 'points': 1}
+            for i in range(30)
+        ],
+        'attendance': [{'id': 1, 'studentId': 2, 'date': '2026-02-03', 'status': 'present'}],
+        'month_roster_profiles': {'2026-01': [{'roll': 'R1', 'studentId': 1}], '2026-02': []},
+        'veto_tracking': {'students': {'R1': {'used_vetos': 0}}},
+    }
+
+
+class LedgerSqliteStoreTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_ledger_sqlite_tests_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+
+        from app.utils import data_paths, ledger_repository, ledger_sqlite
+        from app.utils.file_operations import atomic_write_json
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        self.data_paths = data_paths
+        self.journal = ledger_repository
+        self.store = ledger_sqlite
+        self.write = atomic_write_json
+        self.path = data_paths.get_data_path()
+        self.assertTrue(self.store.store_path().startswith(self._tmp))
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        os.environ.pop('EA_LEDGER_BACKEND', None)
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _checkpoint(self, payload):
+        self.write(self.path, payload)
+        self.store.replace_all(payload, payload['server_version'])
+        self.store.note_snapshot_file(self.path)
+
+    def _revision(self, payload, op_id):
+        state = self.journal.prepare_revision(
+            revision=payload['server_version'], payload=payload, op_id=op_id,
+        )
+        mode = self.store.apply_revision(
+            revision=state['revision'], base_revision=state['base_revision'],
+            changes=state['changes'], payload=payload,
+        )
+        self.journal.mark_revision_committed(
+            revision=state['revision'], op_id=op_id,
+            payload_sha256=state['payload_sha256'], snapshot_written=False,
+        )
+        return mode
+
+    def test_round_trip_preserves_legacy_view(self):
+        payload = _ledger(1)
+        payload['fee_records'] = {'not': 'a list'}
+        self._checkpoint(payload)
+        self.assertEqual(self.store.load_ledger(self.path), payload)
+        self.assertEqual(list(self.store.load_ledger(self.path)), list(payload))
+
+    def test_journal_diff_becomes_row_writes(self):
+        payload = _ledger(1)
+        self._checkpoint(payload)
+        self.journal.note_snapshot_written(self.path, 1)
+        self._revision(payload, 'op-1')
+
+        payload = copy.deepcopy(payload)
+        payload['server_version'] = 2
+        payload['scores'][4]['points'] = 7
+        del payload['scores'][10:12]
+        payload['scores'].append({'id': 99, 'studentId': 3, 'date': '2026-03-01', 'month': '2026-03'})
+        payload['month_roster_profiles']['2026-02'] = [{'roll': 'R2', 'studentId': 2}]
+        payload['veto_tracking']['students']['R1']['used_vetos'] = 1
+        payload.pop('attendance')
+
+        self.assertEqual(self._revision(payload, 'op-2'), 'rows')
+        self.assertEqual(self.store.load_ledger(self.path), payload)
+        self.assertEqual(self.store.store_status()['revision'], 2)
+
+    def test_stale_base_falls_back_to_full_rewrite(self):
+        payload = _ledger(1)
+        self._checkpoint(payload)
+        mode = self.store.apply_revision(
+            revision=5, base_revision=3, changes={}, payload=dict(payload, server_version=5),
+        )
+        self.assertEqual(mode, 'full')
+        self.assertEqual(self.store.load_ledger(self.path)['server_version'], 5)
+
+    def test_month_and_student_queries_use_indexed_columns(self):
+        self._checkpoint(_ledger(1))
+        rows = self.store.query_rows('scores', month='2026-02')
+        self.assertEqual([r['id'] for r in rows], [i for i in range(30) if i % 3 == 1])
+        rows = self.store.query_rows('scores', student_id=2, month='2026-01')
+        self.assertTrue(rows and all(r['studentId'] == 2 and r['month'] == '2026-01' for r in rows))
+        self.assertEqual(self.store.query_rows('attendance', month='2026-02')[0]['id'], 1)
+        self.assertEqual(self.store.query_rows('month_roster_profiles', month='2026-01'), [{'roll': 'R1', 'studentId': 1}])
+        with self.assertRaises(ValueError):
+            self.store.query_rows('veto_tracking')
+
+    def test_query_at_a_revision_the_store_has_not_applied_is_refused(self):
+        self._checkpoint(_ledger(1))
+        self.assertIsNone(self.store.query_rows('scores', month='2026-02', revision=2))
+        self.assertTrue(self.store.query_rows('scores', month='2026-02', revision=1))
+
+    def test_row_month_falls_back_to_the_date(self):
+        self.assertEqual(self.store.row_month({'month': ' 2026-03 ', 'date': '2026-04-01'}), '2026-03')
+        self.assertEqual(self.store.row_month({'month': '', 'date': '2026-04-01'}), '2026-04')
+        self.assertIsNone(self.store.row_month({}))
+
+    def test_external_rewrite_is_imported_on_cache_miss(self):
+        os.environ['EA_LEDGER_BACKEND'] = 'sqlite'
+        self._checkpoint(_ledger(1))
+        replaced = _ledger(7)
+        replaced['scores'] = []
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(replaced, f)
+        self.data_paths.invalidate_data_cache()
+
+        self.assertEqual(self.data_paths.load_json_data_cached(), replaced)
+        self.assertEqual(self.store.store_status()['revision'], 7)
+        self.assertEqual(self.store.query_rows('scores'), [])
+
+
+class LedgerSqliteSavePathTests(unittest.TestCase):
+    """The scoreboard save path keeps the row store in step with every revision."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_ledger_sqlite_save_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        os.environ['EA_LEDGER_BACKEND'] = 'sqlite'
+
+        from app.utils import data_paths, ledger_sqlite
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+
+        from app import app
+        import app.routes.scoreboard as sb
+        cls.app = app
+        cls.sb = sb
+        cls.data_paths = data_paths
+        cls.store = ledger_sqlite
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('Ledger path escaped the temp root')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        os.environ.pop('EA_LEDGER_BACKEND', None)
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_saves_are_materialized_from_the_store(self):
+        seed = {
+            'students': [{'id': i, 'name': f'S{i}', 'roll': f'R{i}'} for i in range(10)],
+            'scores': [],
+        }
+        self.sb._save_offline_data(copy.deepcopy(seed))
+        payload = copy.deepcopy(self.sb._load_offline_data())
+        payload['scores'].append({'id': 1, 'studentId': 3, 'date': '2026-04-02', 'month': '2026-04', 'points': 4})
+        saved = self.sb._save_offline_data(payload)
+
+        self.assertEqual(self.store.store_status()['revision'], saved['server_version'])
+        self.assertEqual(self.sb._month_score_rows(self.sb._load_offline_data(), '2026-04')[0]['points'], 4)
+
+        undated = copy.deepcopy(payload)
+        undated['scores'][0].pop('month')
+        self.assertEqual(self.sb._month_score_rows(undated, '2026-04'), undated['scores'])
+
+        self.data_paths.invalidate_data_cache()
+        reloaded = self.sb._load_offline_data()
+        self.assertEqual(reloaded['server_version'], saved['server_version'])
+        self.assertEqual(reloaded['scores'], payload['scores'])
+
+
+if __name__ == '__main__':
+    unittest.main()
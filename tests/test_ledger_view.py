@@ -0,0 +1,154 @@
+"""Tests for the copy-on-write ledger view (app.utils.ledger_view)."""
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+from app.utils.ledger_view import LedgerView
+
+
+class LedgerViewTests(unittest.TestCase):
+    def setUp(self):
+        self.base = {
+            'server_version': 4,
+            'scores': [{'id': 1, 'points': 1}, {'id': 2, 'points': 2}],
+            'veto_tracking': {'students': {}},
+            'students': [{'id': 1}],
+        }
+        self.snapshot = copy.deepcopy(self.base)
+
+    def test_mutable_copies_collection_once_and_tracks_it(self):
+        view = LedgerView(self.base)
+        scores = view.mutable('scores')
+        self.assertIsNot(scores, self.base['scores'])
+        self.assertIs(view.mutable('scores'), scores)
+        scores[0] = dict(scores[0], points=9)
+        scores.append({'id': 3})
+        self.assertEqual(self.base, self.snapshot)
+        self.assertIs(view['students'], self.base['students'])
+        self.assertEqual(view.changed_keys(), {'scores'})
+        self.assertEqual(view.base_version, 4)
+
+    def test_top_level_writes_and_removals_are_tracked(self):
+        view = LedgerView(self.base)
+        view['updated_at'] = 'now'
+        view.pop('students')
+        view.pop('missing', None)
+        view.setdefault('notes', [])
+        self.assertEqual(view.changed_keys(), {'updated_at', 'students', 'notes'})
+        self.assertEqual(self.base, self.snapshot)
+
+    def test_assignment_after_mutable_is_copied_again(self):
+        view = LedgerView(self.base)
+        view.mutable('scores')
+        view['scores'] = self.base['scores']
+        self.assertIsNot(view.mutable('scores'), self.base['scores'])
+
+    def test_deepcopy_is_a_conservative_full_change_set(self):
+        view = LedgerView(self.base)
+        view['x'] = 1
+        clone = copy.deepcopy(view)
+        self.assertEqual(clone, view)
+        self.assertEqual(clone.changed_keys(), set(view))
+
+
+class LedgerViewSavePathTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_ledger_view_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+
+        from app import app
+        import app.routes.notebook as notebook
+        import app.routes.scoreboard as sb
+        cls.app = app
+        cls.sb = sb
+        cls.notebook = notebook
+        cls.data_paths = data_paths
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('Ledger path escaped the temp root')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.sb._save_offline_data({
+            'students': [{'id': i, 'name': f'S{i}', 'roll': f'R{i}'} for i in range(5)],
+            'scores': [{'id': 1, 'studentId': 2, 'date': '2026-05-04', 'month': '2026-05',
+                        'points': 1, 'notes': '[NB] old'}],
+        })
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def test_notebook_score_write_leaves_previous_cache_object_untouched(self):
+        before = self.sb._load_offline_data()
+        before_scores = copy.deepcopy(before['scores'])
+        self.notebook._add_score_to_json(2, date(2026, 5, 4), 7, '[NB] updated')
+
+        after = self.sb._load_offline_data()
+        self.assertEqual(before['scores'], before_scores)
+        self.assertEqual(after['scores'][0]['points'], 7)
+        self.assertIs(after['students'], before['students'])
+        self.assertEqual(after['server_version'], before['server_version'] + 1)
+
+    def test_view_save_fingerprints_only_changed_keys(self):
+        from app.utils import ledger_repository
+        view = LedgerView(self.sb._load_offline_data())
+        view.mutable('scores').append({'id': 2, 'studentId': 3, 'date': '2026-05-05', 'month': '2026-05'})
+        calls = []
+        original = ledger_repository._fingerprint
+        ledger_repository._fingerprint = lambda value: calls.append(value) or original(value)
+        try:
+            self.sb._save_offline_data(view)
+        finally:
+            ledger_repository._fingerprint = original
+        self.assertLessEqual(len(calls), 3)  # scores, server_version, updated_at
+
+        self.data_paths.invalidate_data_cache()
+        self.assertEqual(len(self.sb._load_offline_data()['scores']), 2)
+
+    def test_plain_dict_save_reuses_fingerprints_of_shared_collections(self):
+        from app.utils import ledger_repository
+        current = self.sb._load_offline_data()
+        fresh = dict(current)
+        fresh['scores'] = list(current['scores']) + [
+            {'id': 2, 'studentId': 3, 'date': '2026-05-05', 'month': '2026-05', 'points': 2}]
+        calls = []
+        original = ledger_repository._fingerprint
+        ledger_repository._fingerprint = lambda value: calls.append(value) or original(value)
+        try:
+            self.sb._save_offline_data(fresh)
+        finally:
+            ledger_repository._fingerprint = original
+        self.assertNotIn(current['students'], calls)
+        self.assertIn(fresh['scores'], calls)
+
+        # The committed ledger's own dict is edited in place by most routes: always hashed.
+        data = self.sb._load_offline_data()
+        data['students'][0]['name'] = 'Renamed'
+        self.sb._save_offline_data(data)
+        self.data_paths.invalidate_data_cache()
+        reloaded = self.sb._load_offline_data()
+        self.assertEqual(reloaded['students'][0]['name'], 'Renamed')
+        self.assertEqual(len(reloaded['scores']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
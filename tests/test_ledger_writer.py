@@ -0,0 +1,143 @@
+"""Tests for group-commit ledger persistence (app.utils.ledger_writer)."""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from app.utils.ledger_writer import GroupCommitWriter, LedgerWriteError
+
+
+class GroupCommitWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.lock = threading.RLock()
+        self.batches = []
+        self.fail = False
+
+    def _persist(self, payload, contexts):
+        if self.fail:
+            raise OSError('disk full')
+        self.batches.append((payload, list(contexts)))
+
+    def test_saves_queued_behind_a_busy_lock_are_coalesced(self):
+        writer = GroupCommitWriter(self._persist, lock=self.lock)
+        with self.lock:
+            tickets = [writer.submit({'server_version': v}, {'op': v}) for v in (1, 2, 3)]
+        self.assertTrue(writer.wait_durable(tickets[-1], timeout=5))
+        self.assertTrue(writer.wait_durable(tickets[0], timeout=0))
+        self.assertEqual(len(self.batches), 1)
+        self.assertEqual(self.batches[0][0], {'server_version': 3})
+        self.assertEqual(self.batches[0][1], [{'op': 1}, {'op': 2}, {'op': 3}])
+        self.assertEqual(writer.status()['coalesced'], 2)
+
+    def test_failed_batch_raises_at_the_barrier_and_stays_pending(self):
+        writer = GroupCommitWriter(self._persist, lock=self.lock, retry_seconds=0.05)
+        self.fail = True
+        with self.lock:
+            ticket = writer.submit({'server_version': 1})
+        with self.assertRaises(LedgerWriteError):
+            writer.wait_durable(ticket, timeout=5)
+        self.assertEqual(writer.pending_payload(), {'server_version': 1})
+
+        self.fail = False
+        writer.flush()
+        self.assertTrue(writer.wait_durable(ticket, timeout=0))
+        self.assertIsNone(writer.pending_payload())
+
+    def test_flush_persists_inline_for_the_lock_holder(self):
+        writer = GroupCommitWriter(self._persist, lock=self.lock)
+        with self.lock:
+            ticket = writer.submit({'server_version': 7})
+            writer.flush()
+            self.assertTrue(writer.wait_durable(ticket, timeout=0))
+        self.assertEqual(len(self.batches), 1)
+
+
+def _unstamped(rows):
+    """Rows without the HLC stamp the save path assigns (see _stamp_ledger_clocks)."""
+    return [{k: v for k, v in row.items() if k != 'hlc'} for row in rows]
+
+
+class GroupCommitSavePathTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_ledger_writer_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+
+        from app import app
+        import app.routes.scoreboard as sb
+        from app.utils import ledger_repository
+        cls.app = app
+        cls.sb = sb
+        cls.data_paths = data_paths
+        cls.journal = ledger_repository
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('Ledger path escaped the temp root')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        self.ctx = self.app.app_context()
+        self.ctx.push()
+        self.sb._save_offline_data({
+            'students': [{'id': i, 'name': f'S{i}', 'roll': f'R{i}'} for i in range(5)],
+            'scores': [],
+        })
+        # Force a journal baseline so the next saves are appended as diffs.
+        self.sb._save_offline_data(dict(self.sb._load_offline_data()))
+
+    def tearDown(self):
+        self.ctx.pop()
+
+    def _stage_under_lock(self, rows):
+        writer = self.sb._ledger_group_writer()
+        with self.sb._LEDGER_WRITE_LOCK:
+            for row in rows:
+                payload = dict(self.sb._load_offline_data())
+                payload['scores'] = list(payload['scores']) + [row]
+                self.sb._save_offline_data(payload, durable=False)
+            staged = self.sb._load_offline_data()
+        return writer, staged
+
+    def test_coalesced_revisions_replay_from_the_journal(self):
+        rows = [{'id': n, 'studentId': 1, 'date': '2026-05-0%d' % n, 'points': n} for n in (1, 2, 3)]
+        writer, staged = self._stage_under_lock(rows)
+        self.assertEqual(_unstamped(staged['scores']), rows)
+        writer.flush()
+
+        segment = os.path.join(self.journal.journal_dir(), self.journal.journal_status()['segment'])
+        with open(segment, encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        revision = [r for r in records if r.get('type') == 'revision'][-1]
+        self.assertEqual(revision['revision'], staged['server_version'])
+        self.assertEqual(len(revision['coalesced_op_ids']), 2)
+        self.assertEqual(revision['diff_base'], staged['server_version'] - 3)
+
+        self.data_paths.invalidate_data_cache()
+        self.assertEqual(self.sb._load_offline_data()['scores'], staged['scores'])
+
+    def test_cache_miss_serves_the_staged_revision(self):
+        row = {'id': 9, 'studentId': 2, 'date': '2026-05-09', 'points': 1}
+        with self.sb._LEDGER_WRITE_LOCK:
+            writer, _ = self._stage_under_lock([row])
+            self.data_paths.invalidate_data_cache()
+            self.assertEqual(_unstamped(self.sb._load_offline_data()['scores']), [row])
+        writer.flush()
+
+
+if __name__ == '__main__':
+    unittest.main()
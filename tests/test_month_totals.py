@@ -0,0 +1,142 @@
+"""Tests for the materialized per-student month totals (app.utils.month_totals)."""
+import copy
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.utils import month_totals
+from app.utils.file_operations import atomic_write_json
+
+
+def _ledger():
+    students = [{'id': i, 'roll': f'EA24A{i:02d}', 'name': f'Student {i}', 'stars': 5} for i in range(1, 7)]
+    scores = []
+    for n in range(120):
+        month = ['2026-01', '2026-02'][n % 2]
+        scores.append({
+            'id': n + 1, 'studentId': 1 + n % 6, 'month': month, 'date': f'{month}-{1 + n % 20:02d}',
+            'points': n % 7 - 2, 'stars': n % 3 - 1, 'vetos': n % 4 - 2,
+            'updated_at': '2026-02-01T00:00:00Z',
+        })
+    profiles = {'2026-01': [{'studentId': sid, 'roll': f'EA24A{sid:02d}', 'month_star_count': 3,
+                             'month_veto_count': 2} for sid in range(1, 7)]}
+    return {'server_version': 4, 'students': students, 'scores': scores, 'month_roster_profiles': profiles}
+
+
+def _scan(data, month):
+    return month_totals.MonthTotals.build(copy.deepcopy(data)).month(month)
+
+
+class MonthTotalsTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_month_totals_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        self.data_paths = data_paths
+        atomic_write_json(Path(data_paths.get_data_path()), _ledger())
+        self.cached = data_paths.load_json_data_cached()
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _save(self, data):
+        atomic_write_json(Path(self.data_paths.get_data_path()), data)
+        self.data_paths.prime_data_cache(data)
+
+    def test_totals_match_scan_and_feed_balances(self):
+        from app.utils import score_balance
+        table = self.data_paths.month_totals_for(self.cached)
+        self.assertIsNotNone(table)
+        cell = table.get(2, '2026-01')
+        rows = [r for r in self.cached['scores'] if r['studentId'] == 2 and r['month'] == '2026-01']
+        self.assertEqual(cell['rows'], len(rows))
+        self.assertEqual(cell['points'], sum(r['points'] for r in rows))
+        self.assertEqual(cell['stars_used'], sum(-r['stars'] for r in rows if r['stars'] < 0))
+        scanned = copy.deepcopy(self.cached)
+        for sid in range(1, 7):
+            self.assertEqual(score_balance.compute_star_balance(self.cached, sid, '2026-01', '2026-03'),
+                             score_balance.compute_star_balance(scanned, sid, '2026-01', '2026-03'))
+            self.assertEqual(score_balance.compute_veto_balance(self.cached, sid, '2026-01', '2026-03'),
+                             score_balance.compute_veto_balance(scanned, sid, '2026-01', '2026-03'))
+
+    def test_merge_paths_advance_the_table_incrementally(self):
+        import app.routes.scoreboard as sb
+        before = self.data_paths.month_totals_for(self.cached)
+
+        data = copy.deepcopy(self.cached)
+        incoming = [dict(data['scores'][0], points=40, stars=2, updated_at='2026-03-01T00:00:00Z'),
+                    {'studentId': 3, 'date': '2026-02-25', 'points': 9, 'vetos': -1}]
+        data['scores'] = sb._merge_scores_superset(data['scores'], incoming)
+        sb._upsert_score_delta(data, 4, '2026-02-26', '2026-02', delta_points=-3, delta_stars=1)
+        sb._upsert_score_delta(data, 1, data['scores'][1]['date'], '2026-02', delta_points=2)
+        data['server_version'] = 5
+        self._save(data)
+
+        advanced = self.data_paths.month_totals_for(data, build=False)
+        self.assertIsNotNone(advanced)
+        self.assertIsNot(advanced, before)
+        self.assertEqual(advanced.version, 5)
+        for month in ('2026-01', '2026-02'):
+            self.assertEqual(advanced.month(month), _scan(data, month))
+
+        teacher = copy.deepcopy(data)
+        teacher['scores'] = sb._merge_teacher_scores(teacher, {
+            'students': teacher['students'],
+            'scores': [{'studentId': 2, 'date': '2026-02-27', 'points': 12, 'recordedBy': 'teacher'}],
+        })
+        teacher['server_version'] = 6
+        self._save(teacher)
+        table = self.data_paths.month_totals_for(teacher, build=False)
+        self.assertIsNotNone(table)
+        self.assertEqual(table.month('2026-02'), _scan(teacher, '2026-02'))
+
+    def test_untracked_write_drops_table_and_persisted_copy_is_reused(self):
+        import app.routes.scoreboard as sb
+        self.data_paths.month_totals_for(self.cached)
+        data = copy.deepcopy(self.cached)
+        data['scores'].pop()
+        data['server_version'] = 5
+        self._save(data)
+        self.assertIsNone(self.data_paths.month_totals_for(data, build=False))
+
+        table = self.data_paths.month_totals_for(data)
+        sb._persist_month_totals(data)
+        with open(self.data_paths.get_month_totals_path(), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['server_version'], 5)
+        self.data_paths.invalidate_data_cache()
+        reloaded = self.data_paths.load_json_data_cached()
+        self.assertEqual(month_totals.load(self.data_paths.get_month_totals_path(), reloaded).month('2026-02'),
+                         table.month('2026-02'))
+        reloaded['server_version'] = 99
+        self.assertIsNone(month_totals.load(self.data_paths.get_month_totals_path(), reloaded))
+
+    def test_route_enforces_month_access_and_does_not_write(self):
+        from app import app
+        import app.routes.scoreboard as sb
+        view = sb.get_month_totals.__wrapped__  # past login_required
+        with mock.patch.object(sb, '_allowed_months_for_user', return_value={'2026-02'}), \
+                mock.patch.object(sb, 'current_user', object()):
+            with app.test_request_context('/scoreboard/api/month-totals?month=2026-01'):
+                denied = view()
+            with app.test_request_context('/scoreboard/api/month-totals?month=2026-02'):
+                allowed = view()
+        self.assertEqual(denied[1], 403)
+        self.assertEqual({row['studentId'] for row in allowed.get_json()['totals']},
+                         set(_scan(self.cached, '2026-02')))
+        self.assertFalse(os.path.exists(self.data_paths.get_month_totals_path()))
+
+if __name__ == '__main__':
+    unittest.main()
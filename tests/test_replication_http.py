@@ -0,0 +1,124 @@
+"""Tests for the pooled replication HTTP client."""
+import gzip
+import io
+import json
+import os
+import socket
+import threading
+import unittest
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.utils import replication_http
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload, gzip_reply=False):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if gzip_reply:
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        accepts_gzip = 'gzip' in (self.headers.get('Accept-Encoding') or '')
+        status = 409 if self.path == '/conflict' else 200
+        self._reply(status, {'code': 'patch_base_mismatch' if status == 409 else 'ok'}, gzip_reply=accepts_gzip)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        encoding = self.headers.get('Content-Encoding') or ''
+        if encoding == 'gzip':
+            raw = gzip.decompress(raw)
+        self._reply(200, {'encoding': encoding, 'body': json.loads(raw)})
+
+
+class ReplicationHTTPTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        cls.server.connections = set()
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        replication_http.reset()
+
+    def setUp(self):
+        replication_http.reset()
+        self.server.connections.clear()
+
+    def test_connections_are_reused_and_gzip_responses_decoded(self):
+        for _ in range(5):
+            resp = replication_http.get(f'{self.base}/offline-data', timeout=5)
+            self.assertTrue(resp.ok)
+            self.assertEqual(resp.json(), {'code': 'ok'})
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_error_status_is_returned_not_raised(self):
+        resp = replication_http.get(f'{self.base}/conflict', timeout=5)
+        self.assertEqual(resp.status, 409)
+        self.assertEqual(resp.json()['code'], 'patch_base_mismatch')
+        with self.assertRaises(replication_http.ReplicationHTTPError) as ctx:
+            resp.raise_for_status()
+        self.assertEqual(ctx.exception.status, 409)
+
+    def test_request_body_compression(self):
+        old = os.environ.get('EA_HTTP_GZIP_MIN_BYTES')
+        os.environ['EA_HTTP_GZIP_MIN_BYTES'] = '64'
+        try:
+            small = replication_http.post(f'{self.base}/p', json_body={'a': 1}, compress=True, timeout=5).json()
+            big_body = {'rows': list(range(200))}
+            big = replication_http.post(f'{self.base}/p', json_body=big_body, compress=True, timeout=5).json()
+            plain = replication_http.post(f'{self.base}/p', json_body=big_body, timeout=5).json()
+        finally:
+            if old is None:
+                os.environ.pop('EA_HTTP_GZIP_MIN_BYTES', None)
+            else:
+                os.environ['EA_HTTP_GZIP_MIN_BYTES'] = old
+        self.assertEqual(small, {'encoding': '', 'body': {'a': 1}})
+        self.assertEqual(big, {'encoding': 'gzip', 'body': big_body})
+        self.assertEqual(plain['encoding'], '')
+
+    def test_transport_failure_raises_oserror(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        with self.assertRaises(OSError):
+            replication_http.get(f'http://127.0.0.1:{port}/offline-data', timeout=2)
+
+
+class ReadDecodedBodyTests(unittest.TestCase):
+    def test_gzip_and_deflate_round_trip(self):
+        raw = json.dumps({'rows': list(range(5000))}).encode('utf-8')
+        for encoding, body in (('gzip', gzip.compress(raw)), ('deflate', zlib.compress(raw))):
+            self.assertEqual(replication_http.read_decoded_body(io.BytesIO(body), encoding, len(raw), chunk_size=512), raw)
+
+    def test_cap_truncation_and_unknown_encoding(self):
+        bomb = gzip.compress(b'\0' * (4 * 1024 * 1024))
+        with self.assertRaises(replication_http.BodyTooLarge):
+            replication_http.read_decoded_body(io.BytesIO(bomb), 'gzip', 64 * 1024)
+        with self.assertRaises(ValueError):
+            replication_http.read_decoded_body(io.BytesIO(gzip.compress(b'{"a": 1}')[:-12]), 'gzip', 1024)
+        with self.assertRaises(ValueError):
+            replication_http.read_decoded_body(io.BytesIO(b'not gzip'), 'gzip', 1024)
+        with self.assertRaises(ValueError):
+            replication_http.read_decoded_body(io.BytesIO(b''), 'br', 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Tests for the persistent per-peer replication outbox."""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from app.utils.replication_outbox import ReplicationOutbox
+
+PEER = 'http://192.168.1.50:5000'
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class ReplicationOutboxTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.mkdtemp(prefix='ea_replication_outbox_')
+        self.path = os.path.join(self._tmp, 'replication_outbox.json')
+        self.outboxes = []
+
+    def tearDown(self):
+        for outbox in self.outboxes:
+            outbox.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _outbox(self, send, **kwargs):
+        outbox = ReplicationOutbox(self.path, send, **kwargs)
+        self.outboxes.append(outbox)
+        return outbox
+
+    def test_burst_coalesces_to_the_newest_revision(self):
+        gate = threading.Event()
+        started = threading.Event()
+        sent = []
+
+        def _send(peer, payload):
+            started.set()
+            gate.wait(5)
+            sent.append(payload['server_version'])
+            return True, ''
+
+        outbox = self._outbox(_send)
+        outbox.enqueue(PEER, {'server_version': 1})
+        self.assertTrue(started.wait(5))
+        for version in range(2, 31):
+            outbox.enqueue(PEER, {'server_version': version})
+        self.assertEqual(outbox.status()[PEER]['pending_version'], 30)
+        gate.set()
+
+        self.assertTrue(_wait_for(lambda: outbox.acked_version(PEER) == 30))
+        self.assertEqual(sent, [1, 30])
+        status = outbox.status()[PEER]
+        self.assertIsNone(status['pending_version'])
+        self.assertEqual(status['queue_depth'], 0)
+
+        outbox.enqueue(PEER, {'server_version': 30})
+        self.assertIsNone(outbox.status()[PEER]['pending_version'])
+
+    def test_failures_back_off_then_deliver(self):
+        attempts = []
+
+        def _send(peer, payload):
+            attempts.append(time.monotonic())
+            if len(attempts) < 3:
+                return False, 'peer unreachable'
+            return True, ''
+
+        outbox = self._outbox(_send, base_delay=0.05, max_delay=0.5)
+        outbox.enqueue(PEER, {'server_version': 4})
+        self.assertTrue(_wait_for(lambda: outbox.acked_version(PEER) == 4))
+        self.assertEqual(len(attempts), 3)
+        self.assertGreaterEqual(attempts[2] - attempts[1], attempts[1] - attempts[0])
+        status = outbox.status()[PEER]
+        self.assertEqual((status['attempts'], status['last_error']), (0, ''))
+
+    def test_owed_push_survives_restart_and_sends_current_ledger(self):
+        outbox = self._outbox(lambda peer, payload: (False, 'down'), base_delay=60)
+        outbox.enqueue(PEER, {'server_version': 7})
+        self.assertTrue(_wait_for(lambda: outbox.status()[PEER]['attempts'] == 1))
+        outbox.close()
+        with open(self.path, encoding='utf-8') as f:
+            saved = json.load(f)['peers'][PEER]
+        self.assertEqual((saved['pending_version'], saved['last_error']), (7, 'down'))
+
+        sent = []
+        restarted = self._outbox(lambda peer, payload: (sent.append(payload) or True, ''),
+                                 load=lambda: {'server_version': 9})
+        self.assertEqual(restarted.status()[PEER]['pending_version'], 7)
+        restarted.resume()
+        self.assertTrue(_wait_for(lambda: restarted.acked_version(PEER) == 9))
+        self.assertEqual(sent, [{'server_version': 9}])
+        self.assertIsNone(restarted.status()[PEER]['pending_version'])
+
+    def test_restored_lower_version_is_still_delivered(self):
+        sent = []
+        outbox = self._outbox(lambda peer, payload: (sent.append(payload['server_version']) or True, ''))
+        outbox.mark_acked(PEER, 12)
+        outbox.enqueue(PEER, {'server_version': 3})
+        self.assertTrue(_wait_for(lambda: outbox.acked_version(PEER) == 3))
+        self.assertEqual(sent, [3])
+
+
+class ReplicationOutboxOwnershipTests(unittest.TestCase):
+    """Several outboxes over one file, standing in for worker processes."""
+
+    def setUp(self):
+        self._tmp = tempfile.mkdtemp(prefix='ea_replication_outbox_owner_')
+        self.path = os.path.join(self._tmp, 'replication_outbox.json')
+        self.holder = {'name': 'owner'}
+        self.outboxes = []
+
+    def tearDown(self):
+        for outbox in self.outboxes:
+            outbox.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def _outbox(self, name, send, **kwargs):
+        outbox = ReplicationOutbox(self.path, send, owner=lambda: self.holder['name'] == name,
+                                   poll_interval=0.02, **kwargs)
+        self.outboxes.append(outbox)
+        return outbox
+
+    def _saved(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)['peers'][PEER]
+
+    def test_follower_saves_are_pushed_by_the_owner_only(self):
+        owner_sent, follower_sent = [], []
+        ledger = {'server_version': 5}
+        owner = self._outbox('owner', lambda peer, payload: (owner_sent.append(payload) or True, ''),
+                             load=lambda: ledger)
+        follower = self._outbox('worker-2', lambda peer, payload: (follower_sent.append(payload) or True, ''))
+        owner.resume()
+
+        follower.enqueue(PEER, {'server_version': 5})
+        self.assertTrue(_wait_for(lambda: owner.acked_version(PEER) == 5))
+        self.assertEqual(owner_sent, [ledger])
+        self.assertEqual(follower_sent, [])
+        self.assertEqual(follower.acked_version(PEER), 5)
+        self.assertEqual(follower.status()[PEER]['acked_version'], 5)
+
+        follower.mark_acked(PEER, 6)
+        self.assertTrue(_wait_for(lambda: owner.acked_version(PEER) == 6))
+        self.assertEqual(self._saved()['acked_version'], 6)
+
+    def test_follower_takes_over_work_owed_by_a_dead_owner(self):
+        owner = self._outbox('owner', lambda peer, payload: (False, 'down'), base_delay=60)
+        owner.enqueue(PEER, {'server_version': 8})
+        self.assertTrue(_wait_for(lambda: owner.status()[PEER]['attempts'] == 1))
+        owner.close()
+
+        sent = []
+        follower = self._outbox('worker-2', lambda peer, payload: (sent.append(payload) or True, ''),
+                                load=lambda: {'server_version': 9})
+        self.holder['name'] = 'worker-2'
+        follower.resume()
+        self.assertTrue(_wait_for(lambda: follower.acked_version(PEER) == 9))
+        self.assertEqual(sent, [{'server_version': 9}])
+        self.assertIsNone(self._saved()['pending_version'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+"""Tests for change-feed replication patches between peers."""
+import copy
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from app.utils import change_feed
+from app.utils.file_operations import atomic_write_json
+from app.utils.sync_payloads import patch_for_external_replication
+
+
+def _ledger(version=1, stamp='2026-04-01T10:00:00+00:00'):
+    students = [{'id': i, 'roll': f'EA26A{i:02d}', 'name': f'S{i}', 'active': True, 'fees': {'due': 1}}
+                for i in range(1, 31)]
+    scores = [{'id': n, 'studentId': n, 'date': '2026-04-02', 'month': '2026-04', 'points': 1,
+               'created_at': stamp, 'updated_at': stamp} for n in range(1, 11)]
+    return {'server_version': version, 'server_updated_at': stamp, 'updated_at': stamp,
+            'students': students, 'scores': scores, 'fee_records': [{'id': 'f1', 'studentId': 1}]}
+
+
+class PatchHelpersTests(unittest.TestCase):
+    def test_apply_patch_upserts_and_tombstones(self):
+        base = _ledger()
+        out = change_feed.apply_patch(base, {
+            'scores': {'op': 'rows', 'upsert': [dict(base['scores'][0], points=4), {'id': 99, 'points': 2}],
+                       'delete': ['2']},
+            'month_students': {'op': 'keys', 'set': {'2026-04': [1]}, 'delete': []},
+            'fee_records': {'op': 'drop'},
+            'server_version': {'op': 'set', 'value': 2},
+        })
+        self.assertEqual([r['id'] for r in out['scores']], [1] + list(range(3, 11)) + [99])
+        self.assertEqual(out['scores'][0]['points'], 4)
+        self.assertEqual(out['month_students'], {'2026-04': [1]})
+        self.assertNotIn('fee_records', out)
+        self.assertEqual(base['scores'][0]['points'], 1)
+        self.assertEqual(len(base['scores']), 10)
+
+    def test_external_patch_strips_fees(self):
+        changes = {'fee_records': {'op': 'set', 'value': []},
+                   'students': {'op': 'rows', 'upsert': [{'id': 1, 'fees': {}}], 'delete': []}}
+        external = patch_for_external_replication(changes)
+        self.assertNotIn('fee_records', external)
+        self.assertEqual(external['students']['upsert'], [{'id': 1}])
+        self.assertIn('fees', changes['students']['upsert'][0])
+
+
+class ReplicationPatchRouteTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_env = {k: os.environ.get(k) for k in ('EA_STORAGE_ROOT', 'EA_MASTER_MODE', 'SYNC_PEERS', 'SYNC_PEER')}
+        cls._tmp = tempfile.mkdtemp(prefix='ea_replication_patch_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        for key in ('EA_MASTER_MODE', 'SYNC_PEERS', 'SYNC_PEER'):
+            os.environ.pop(key, None)
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        # Dedicated app instance (see test_cache_headers).
+        from app import create_app
+        import app.routes.scoreboard as sb
+        from app.utils.sync_config import resolve_sync_shared_key
+        cls.app = create_app()
+        cls.sb = sb
+        cls.data_paths = data_paths
+        cls.headers = {'X-EA-Replicated': '1', 'X-EA-Sync-Key': resolve_sync_shared_key()}
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('REFUSING TO RUN: ledger path escaped the temp root.')
+
+    @classmethod
+    def tearDownClass(cls):
+        change_feed.reset()  # clears the persisted feed under the temp root
+        for key, value in cls._old_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        atomic_write_json(Path(self.data_paths.get_data_path()), _ledger(1, '2026-03-01T00:00:00+00:00'))
+        self.data_paths.invalidate_data_cache()
+        self.client = self.app.test_client()
+
+    def _post(self, body):
+        return self.client.post('/scoreboard/offline-data', json=body, headers=self.headers)
+
+    def test_receiver_applies_patch_only_on_its_origin_base(self):
+        master = _ledger(10)
+        resp = self._post({'data': master, 'origin': {'node': 'master-a', 'version': 10}})
+        self.assertEqual(resp.status_code, 200, resp.get_data(as_text=True))
+        self.assertEqual(self.data_paths.load_json_data_cached()['replica_origin'],
+                         {'node': 'master-a', 'version': 10})
+
+        stamp = '2026-04-05T10:00:00+00:00'
+        patch = {'since_version': 10, 'server_version': 11, 'changes': {
+            'scores': {'op': 'rows', 'delete': [],
+                       'upsert': [{'id': 500, 'studentId': 3, 'date': '2026-04-05', 'points': 3,
+                                   'created_at': stamp, 'updated_at': stamp}]},
+            'server_updated_at': {'op': 'set', 'value': stamp},
+        }}
+        stale = self._post({'replication_patch': dict(patch, since_version=9),
+                            'origin': {'node': 'master-a', 'version': 11}})
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.get_json()['code'], 'patch_base_mismatch')
+        self.assertEqual(stale.get_json()['origin_version'], 10)
+        other = self._post({'replication_patch': patch, 'origin': {'node': 'master-b', 'version': 11}})
+        self.assertEqual(other.get_json()['code'], 'patch_base_mismatch')
+
+        resp = self._post({'replication_patch': patch, 'origin': {'node': 'master-a', 'version': 11}})
+        self.assertEqual(resp.status_code, 200, resp.get_data(as_text=True))
+        ledger = self.data_paths.load_json_data_cached()
+        self.assertIn(500, [r['id'] for r in ledger['scores']])
+        self.assertEqual(len(ledger['students']), 30)
+        self.assertEqual(ledger['replica_origin'], {'node': 'master-a', 'version': 11})
+
+        unauthenticated = self.client.post('/scoreboard/offline-data', json={'replication_patch': patch})
+        self.assertEqual(unauthenticated.status_code, 401)
+
+    def test_sender_ships_patch_after_ack_and_falls_back_on_mismatch(self):
+        change_feed.reset()
+        v1 = _ledger(1)
+        change_feed.record(v1)
+        v2 = copy.deepcopy(v1)
+        v2['server_version'] = 2
+        v2['scores'][0]['points'] = 8
+        change_feed.record(v2)
+        peer = 'http://192.168.1.50:5000'
+        sent = []
+
+        def _reply(replies):
+            def _post(target, body, key):
+                sent.append(json.loads(body.decode('utf-8')))
+                return replies.pop(0)
+            return _post
+
+        sb = self.sb
+        with mock.patch.object(sb, '_post_replication_body', side_effect=_reply([(200, {})])):
+            sb._forward_offline_data_to_peers(v1, [peer])
+        self.assertIn('data', sent[-1])
+        self.assertEqual(sent[-1]['origin']['version'], 1)
+
+        with mock.patch.object(sb, '_post_replication_body', side_effect=_reply([(200, {})])):
+            sb._forward_offline_data_to_peers(v2, [peer])
+        body = sent[-1]['replication_patch']
+        self.assertEqual((body['since_version'], body['server_version']), (1, 2))
+        self.assertEqual([r['id'] for r in body['changes']['scores']['upsert']], [1])
+        outbox = sb._replication_outbox()
+        self.assertEqual(outbox.acked_version(peer), 2)
+
+        outbox.mark_acked(peer, 1)
+        replies = [(409, {'code': 'patch_base_mismatch'}), (200, {})]
+        with mock.patch.object(sb, '_post_replication_body', side_effect=_reply(replies)):
+            sb._forward_offline_data_to_peers(v2, [peer])
+        self.assertIn('replication_patch', sent[-2])
+        self.assertIn('data', sent[-1])
+        self.assertEqual(outbox.acked_version(peer), 2)
+
+    def test_receiver_inflates_compressed_pushes(self):
+        body = json.dumps({'data': _ledger(20), 'origin': {'node': 'master-a', 'version': 20}}).encode('utf-8')
+        headers = dict(self.headers, **{'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+        resp = self.client.post('/scoreboard/offline-data', data=gzip.compress(body), headers=headers)
+        self.assertEqual(resp.status_code, 200, resp.get_data(as_text=True))
+        self.assertEqual(self.data_paths.load_json_data_cached()['replica_origin']['version'], 20)
+
+        corrupt = self.client.post('/scoreboard/offline-data', data=b'not gzip', headers=headers)
+        self.assertEqual(corrupt.status_code, 400)
+        with mock.patch.dict(os.environ, {'EA_MAX_DECODED_BODY_BYTES': '1024'}):
+            too_large = self.client.post('/scoreboard/offline-data', data=gzip.compress(body), headers=headers)
+        self.assertEqual(too_large.status_code, 413)
+
+    def test_journal_context_reads_the_inflated_body(self):
+        body = json.dumps({'op_id': 'op-gz-1', 'base_version': 7, 'data': {}}).encode('utf-8')
+        headers = dict(self.headers, **{'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+        with self.app.test_request_context('/scoreboard/offline-data', method='POST',
+                                           data=gzip.compress(body), headers=headers):
+            payload, error = self.sb._request_json_payload()
+            self.assertIsNone(error)
+            context = self.sb._ledger_journal_context(8)
+        self.assertEqual((context['op_id'], context['base_version']), ('op-gz-1', 7))
+
+    def test_sender_compresses_unless_disabled(self):
+        reply = self.sb._replication_http.HTTPResponse(200, {}, b'{}', 'peer')
+        with mock.patch.object(self.sb._replication_http, 'post', return_value=reply) as post:
+            self.sb._post_replication_body('http://192.168.1.50:5000', b'{}', 'key')
+            self.assertTrue(post.call_args.kwargs['compress'])
+            with mock.patch.dict(os.environ, {'EA_REPLICATION_GZIP': '0'}):
+                self.sb._post_replication_body('http://192.168.1.50:5000', b'{}', 'key')
+            self.assertFalse(post.call_args.kwargs['compress'])
+
+    def test_gist_mirror_pushes_coalesce_in_the_mirror_outbox(self):
+        sb = self.sb
+        gate, started, sent = threading.Event(), threading.Event(), []
+
+        def _push(payload, reason='snapshot_save', timeout_sec=20):
+            started.set()
+            gate.wait(5)
+            sent.append(payload['server_version'])
+            return True
+
+        with mock.patch.object(sb, '_gist_config', return_value={'enabled_write': True}), \
+                mock.patch.object(sb, '_gist_push_snapshot', side_effect=_push), \
+                mock.patch.object(threading, 'Thread', wraps=threading.Thread) as threads:
+            sb._gist_push_snapshot_async({'server_version': 1})
+            self.assertTrue(started.wait(5))
+            for version in range(2, 11):
+                sb._gist_push_snapshot_async({'server_version': version})
+            gate.set()
+            outbox = sb._mirror_outbox()
+            deadline = time.monotonic() + 5
+            while outbox.acked_version('gist') != 10 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(sent, [1, 10])
+        # One push worker; the owner's follower-request thread is not per save.
+        workers = [c for c in threads.call_args_list if not str(c.kwargs.get('name', '')).endswith(':requests')]
+        self.assertLessEqual(len(workers), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Tests for the per-view serialized GET /offline-data response cache."""
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.utils.file_operations import atomic_write_json
+
+
+def _ledger():
+    students = [{'id': i, 'roll': f'EA26A{i:02d}', 'name': f'S{i}', 'remarks': 'private'}
+                for i in range(1, 31)]
+    return {
+        'server_version': 7,
+        'server_updated_at': '2026-04-01T10:00:00Z',
+        'students': students,
+        'scores': [{'id': 1, 'studentId': 1, 'date': '2026-04-01', 'points': 2,
+                    'created_at': '2026-04-01T09:00:00Z', 'updated_at': '2026-04-01T09:00:00Z'}],
+        'fee_records': [{'studentId': 1, 'amount': 500}],
+    }
+
+
+class ResponseCacheTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_response_cache_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        # Dedicated app instance (see test_cache_headers): serving requests on
+        # the shared package-level app would break later imports of run.py.
+        from app import create_app
+        import app.routes.scoreboard as sb
+        cls.app = create_app()
+        cls.sb = sb
+        cls.data_paths = data_paths
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('REFUSING TO RUN: ledger path escaped the temp root.')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def setUp(self):
+        atomic_write_json(Path(self.data_paths.get_data_path()), _ledger())
+        self.data_paths.invalidate_data_cache()
+
+    def test_views_are_separate_entries_with_lru_eviction(self):
+        dp = self.data_paths
+        old_limit = os.environ.get('EA_RESPONSE_CACHE_ENTRIES')
+        os.environ['EA_RESPONSE_CACHE_ENTRIES'] = '2'
+        try:
+            a = ('member', frozenset({'2026-03'}), False)
+            b = ('member', frozenset({'2026-04'}), False)
+            dp.store_serialized_response(1, 10, 7, b'full', 'W/"7-10"')
+            dp.store_serialized_response(1, 10, 7, b'a', 'etag-a', a)
+            self.assertEqual(dp.get_serialized_response(1, 10, 7), (b'full', 'W/"7-10"'))
+            dp.store_serialized_response(1, 10, 7, b'b', 'etag-b', b)
+            self.assertEqual(dp.get_serialized_response(1, 10, 7, a), (None, None))
+            self.assertEqual(dp.get_serialized_response(1, 10, 7, b), (b'b', 'etag-b'))
+            self.assertEqual(dp.get_serialized_response(1, 10, 7)[0], b'full')
+
+            dp.store_serialized_response(2, 12, 8, b'new', 'W/"8-12"')
+            self.assertEqual(dp.get_serialized_response(1, 10, 7, b), (None, None))
+            dp.invalidate_data_cache()
+            self.assertEqual(dp.get_serialized_response(2, 12, 8), (None, None))
+        finally:
+            if old_limit is None:
+                os.environ.pop('EA_RESPONSE_CACHE_ENTRIES', None)
+            else:
+                os.environ['EA_RESPONSE_CACHE_ENTRIES'] = old_limit
+
+    def test_view_etags(self):
+        key = self.sb._offline_view_cache_key
+        view, etag = key(7, 100, 'full', None, False)
+        self.assertEqual(etag, 'W/"7-100"')
+        self.assertEqual(view, ('full', None, False))
+        _, march = key(7, 100, 'member', {'2026-03'}, False)
+        _, same = key(7, 100, 'member', ['2026-03'], False)
+        _, april = key(7, 100, 'member', {'2026-04'}, False)
+        _, omitted = key(7, 100, 'full', None, True)
+        self.assertEqual(march, same)
+        self.assertEqual(len({etag, march, april, omitted}), 4)
+
+    def test_anonymous_full_sync_is_cached_and_revalidated(self):
+        client = self.app.test_client()
+        first = client.get('/scoreboard/offline-data')
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers.get('ETag')
+        self.assertTrue(etag)
+        self.assertNotEqual(etag, 'W/"7-{}"'.format(os.path.getsize(self.data_paths.get_data_path())))
+        payload = first.get_json()['data']
+        self.assertEqual(payload['sync_scope'], 'anonymous-public')
+        self.assertEqual(payload['fee_records'], [])
+
+        second = client.get('/scoreboard/offline-data')
+        self.assertEqual(second.get_data(), first.get_data())
+        self.assertEqual(second.headers.get('ETag'), etag)
+
+        unchanged = client.get('/scoreboard/offline-data', headers={'If-None-Match': etag})
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.get_data(), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Tests for the compiled roll-history resolver (app.utils.roll_resolver)."""
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.utils.file_operations import atomic_write_json
+from app.utils.roll_resolver import RollResolver
+
+
+def _ledger():
+    students = [{'id': i, 'roll': f'EA25A{i:02d}'} for i in range(1, 7)]
+    students.append({'id': 9, 'roll': 'EA24A03', 'active': False})
+    history = [
+        {'student_id': 1, 'old_roll': 'EA24A01', 'new_roll': 'EA25A01', 'effective_month': '2025-09'},
+        {'student_id': 2, 'old_roll': 'EA23A02', 'new_roll': 'EA24A02', 'effective_month': '2024-09'},
+        {'student_id': 2, 'old_roll': 'EA24A02', 'new_roll': 'EA25A02', 'effective_month': '2025-09'},
+        {'student_id': 3, 'old_roll': 'EA24A03', 'new_roll': 'EA25A03', 'effective_month': '2025-09'},
+        {'student_id': 3, 'old_roll': 'EA24X03', 'new_roll': 'EA25A03', 'effective_month': '2025-09'},
+        {'student_id': 4, 'old_roll': '', 'new_roll': 'EA25A04', 'effective_month': '2025-06'},
+    ]
+    return {'server_version': 3, 'students': students, 'roll_history': history}
+
+
+_MONTHS = ['', '2024-01', '2024-09', '2025-03', '2025-08', '2025-09', '2026-01']
+
+
+class RollResolverTests(unittest.TestCase):
+    def setUp(self):
+        self._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        self._tmp = tempfile.mkdtemp(prefix='ea_roll_resolver_')
+        os.environ['EA_STORAGE_ROOT'] = self._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        self.data_paths = data_paths
+        atomic_write_json(Path(data_paths.get_data_path()), _ledger())
+        self.cached = data_paths.load_json_data_cached()
+
+    def tearDown(self):
+        if self._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = self._old_storage_root
+        self.data_paths.reset_cache()
+        self.data_paths.invalidate_data_cache()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def test_resolver_matches_the_history_walk(self):
+        from app.utils import score_balance
+        self.assertIsNotNone(self.data_paths.roll_resolver_for(self.cached))
+        scanned = copy.deepcopy(self.cached)
+        self.assertIsNone(self.data_paths.roll_resolver_for(scanned))
+        for sid in range(0, 10):
+            for month in _MONTHS:
+                self.assertEqual(score_balance.get_roll_for_month(self.cached, sid, month),
+                                 score_balance.get_roll_for_month(scanned, sid, month))
+        self.assertEqual(score_balance.get_roll_for_month(self.cached, 3, '2025-01'), 'EA24X03')
+
+    def test_roll_to_student_by_month(self):
+        from app.utils import score_balance
+        self.assertEqual(score_balance.get_student_id_for_roll(self.cached, 'ea24a02', '2025-01'), 2)
+        self.assertIsNone(score_balance.get_student_id_for_roll(self.cached, 'EA24A02', '2025-09'))
+        self.assertEqual(score_balance.get_student_id_for_roll(self.cached, 'EA23A02', '2024-08'), 2)
+        self.assertEqual(score_balance.get_student_id_for_roll(self.cached, 'EA24A01', '2025-08'), 1)
+        self.assertEqual(score_balance.get_student_id_for_roll(self.cached, 'EA24A03', '2026-01'), 9)
+        self.assertEqual(score_balance.get_student_id_for_roll(self.cached, 'EA25A05', '2026-01'), 5)
+
+    def test_refresh_after_roll_change_survives_prime(self):
+        resolver = self.data_paths.roll_resolver_for(self.cached)
+        data = self.cached
+        data['roll_history'].append({'student_id': 5, 'old_roll': 'EA25A05', 'new_roll': 'EA26A05',
+                                     'effective_month': '2026-02'})
+        data['students'][4]['roll'] = 'EA26A05'
+        resolver.refresh(data, {5})
+        data['server_version'] = 4
+        atomic_write_json(Path(self.data_paths.get_data_path()), data)
+        self.data_paths.prime_data_cache(data)
+
+        self.assertIs(self.data_paths.roll_resolver_for(data, build=False), resolver)
+        fresh = RollResolver(copy.deepcopy(data))
+        for sid in range(1, 10):
+            for month in _MONTHS + ['2026-02']:
+                self.assertEqual(resolver.roll_for(sid, month), fresh.roll_for(sid, month))
+        self.assertEqual(resolver.student_for('EA25A05', '2026-01'), 5)
+        self.assertIsNone(resolver.student_for('EA25A05', '2026-02'))
+        self.assertEqual(resolver.student_for('EA26A05', '2026-03'), 5)
+
+        data['roll_history'] = []
+        self.assertIsNone(self.data_paths.roll_resolver_for(data, build=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""Tests for compressed ledger snapshots (app.utils.snapshot_codec)."""
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.utils import snapshot_codec
+from app.utils.file_operations import SafeFileReader, atomic_write_json
+
+
+def _ledger(n=200):
+    return {
+        'server_version': 7,
+        'students': [{'id': i, 'name': f'Student {i}', 'roll': f'EA24A{i:02d}'} for i in range(30)],
+        'scores': [{'id': i, 'studentId': i % 30, 'month': '2026-03', 'points': i % 9} for i in range(n)],
+    }
+
+
+class SnapshotCodecTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.mkdtemp(prefix='ea_snapshot_codec_')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    def test_round_trip_and_format_detection(self):
+        data = _ledger()
+        blob = snapshot_codec.dumps(data)
+        self.assertTrue(snapshot_codec.is_framed(blob))
+        self.assertLess(len(blob) * 5, len(json.dumps(data)))
+        self.assertEqual(snapshot_codec.loads(blob), data)
+        self.assertEqual(snapshot_codec.loads(json.dumps(data).encode('utf-8')), data)
+        self.assertEqual(snapshot_codec.loads(gzip.compress(json.dumps(data).encode('utf-8'))), data)
+
+    def test_corrupt_frame_raises_value_error(self):
+        blob = bytearray(snapshot_codec.dumps(_ledger()))
+        blob[-8] ^= 0xFF
+        with self.assertRaises(ValueError):
+            snapshot_codec.loads(bytes(blob))
+        with self.assertRaises(ValueError):
+            snapshot_codec.loads(bytes(blob[:30]))
+
+    def test_safe_reader_reads_compressed_writes_and_verifies_copies(self):
+        path = Path(self._tmp) / 'ledger.json'
+        atomic_write_json(path, _ledger(), codec='zlib')
+        self.assertEqual(SafeFileReader.read_json(path), _ledger())
+
+        plain = Path(self._tmp) / 'plain.json'
+        atomic_write_json(plain, _ledger(), separators=(',', ':'))
+        copy = Path(self._tmp) / 'copy.json'
+        snapshot_codec.frame_file(plain, copy)
+        self.assertTrue(snapshot_codec.verify_file(copy, os.path.getsize(plain)))
+        self.assertFalse(snapshot_codec.verify_file(copy, os.path.getsize(plain) + 1))
+        self.assertEqual(snapshot_codec.read_file(copy), _ledger())
+
+
+class SnapshotCodecBackupTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_snapshot_backup_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+
+        from app import app
+        import app.routes.scoreboard as sb
+        cls.app = app
+        cls.sb = sb
+        cls.data_paths = data_paths
+        if not data_paths.get_data_path().startswith(cls._tmp):
+            raise RuntimeError('Ledger path escaped the temp root')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def _backup(self, payload):
+        path = self.data_paths.get_data_path()
+        atomic_write_json(Path(path), payload, separators=(',', ':'))
+        self.sb._backup_offline_file(path)
+        backups = [entry['path'] for entry in self.sb._backup_catalog.entries('rolling')]
+        # Backups taken within the same second share a name; the newest file wins.
+        return path, max(backups, key=os.path.getmtime)
+
+    def test_backups_are_plain_json_by_default(self):
+        os.environ.pop('EA_LEDGER_BACKUP_CODEC', None)
+        payload = dict(_ledger(), server_version=4)
+        with self.app.app_context():
+            _, backup = self._backup(payload)
+            with open(backup, encoding='utf-8') as f:
+                self.assertEqual(json.load(f), payload)
+
+    def test_backups_are_compressed_and_restorable(self):
+        os.environ['EA_LEDGER_BACKUP_CODEC'] = 'zlib'
+        try:
+            with self.app.app_context():
+                path, backup = self._backup(_ledger())
+                with open(backup, 'rb') as f:
+                    self.assertTrue(snapshot_codec.is_framed(f.read(8)))
+                self.assertLess(os.path.getsize(backup), os.path.getsize(path))
+                self.assertEqual(self.sb._load_latest_offline_backup(), _ledger())
+        finally:
+            os.environ.pop('EA_LEDGER_BACKUP_CODEC', None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Tests for memoized ISO stamp parsing (app.utils.helpers.parse_stamp)."""
+import unittest
+from datetime import datetime, timezone
+
+from app.utils import helpers
+
+
+class StampParsingTests(unittest.TestCase):
+    def setUp(self):
+        helpers._STAMP_CACHE.clear()
+
+    def test_parses_and_memoizes_by_string(self):
+        expected = datetime(2026, 3, 1, 10, 0, tzinfo=timezone.utc).timestamp()
+        self.assertEqual(helpers.parse_stamp('2026-03-01T10:00:00Z'), expected)
+        self.assertEqual(helpers.parse_stamp(' 2026-03-01T15:30:00+05:30 '), expected)
+        self.assertIn('2026-03-01T10:00:00Z', helpers._STAMP_CACHE)
+        helpers._STAMP_CACHE['2026-03-01T10:00:00Z'] = 1.0
+        self.assertEqual(helpers.parse_stamp('2026-03-01T10:00:00Z'), 1.0)
+
+    def test_invalid_and_empty_values_are_zero(self):
+        for value in (None, '', 0, 'not a stamp', '   '):
+            self.assertEqual(helpers.parse_stamp(value), 0.0)
+        self.assertEqual(helpers._STAMP_CACHE.get('not a stamp'), 0.0)
+
+    def test_naive_stamps_are_not_memoized(self):
+        naive = '2026-03-01T10:00:00'
+        self.assertEqual(helpers.parse_stamp(naive), datetime(2026, 3, 1, 10, 0).timestamp())
+        self.assertNotIn(naive, helpers._STAMP_CACHE)
+
+    def test_cache_is_bounded(self):
+        old_limit = helpers._STAMP_CACHE_LIMIT
+        helpers._STAMP_CACHE_LIMIT = 3
+        try:
+            for day in range(1, 8):
+                helpers.parse_stamp(f'2026-01-{day:02d}T00:00:00Z')
+            self.assertLessEqual(len(helpers._STAMP_CACHE), 3)
+        finally:
+            helpers._STAMP_CACHE_LIMIT = old_limit
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Tests for the postholder VETO jurisdiction report and its marker index."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.utils import veto_markers
+
+
+def _ledger():
+    students = [
+        {'id': 1, 'roll': 'EA25A01', 'group': 'A'},
+        {'id': 2, 'roll': 'EA25B02', 'group': 'B'},
+        {'id': 3, 'roll': 'EA25A03', 'group': 'A'},
+    ]
+    scores = [{'id': n, 'studentId': 3, 'date': f'2026-04-{1 + n % 28:02d}', 'notes': f'day {n}'}
+              for n in range(1, 200)]
+    scores += [
+        {'id': 500, 'studentId': 1, 'date': '2026-04-10',
+         'notes': '[VETO-Postholder] Removed penalty for Group A on current day'},
+        {'id': 501, 'studentId': 3, 'date': '2026-04-10', 'notes': '[VETO-Postholder-Penalty-Group A] Penalty removed'},
+        {'id': 502, 'studentId': 1, 'date': '2026-04-11', 'notes': '[VETO-Shield-Group A] Activated VETO shield'},
+    ]
+    return {
+        'students': students,
+        'scores': scores,
+        'group_crs': [{'studentId': 1, 'group': 'A', 'status': 'active',
+                       'veto_shield_active': True, 'veto_shield_used_on': '2026-04-11'}],
+    }
+
+
+class VetoJurisdictionTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_veto_jurisdiction_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        from app import app
+        import app.routes.scoreboard as sb
+        cls.app = app
+        cls.sb = sb
+        cls.data_paths = data_paths
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def test_markers_parse_case_insensitively(self):
+        self.assertEqual(veto_markers.parse_markers('x [veto-shield-group b] y'), (('shield', 'B'),))
+        self.assertEqual(veto_markers.parse_markers('plain note'), ())
+
+    def test_valid_ledger_and_incremental_parsing(self):
+        data = _ledger()
+        with self.app.app_context():
+            report = self.sb._veto_jurisdiction_report(data)
+            self.assertTrue(report['valid'], report['violations'])
+            self.assertEqual(report['marker_rows'], 3)
+
+            merged = dict(data, scores=[dict(row) for row in data['scores']])
+            merged['scores'].append({'id': 600, 'studentId': 2, 'date': '2026-04-12', 'notes': 'new note'})
+            report = self.sb._veto_jurisdiction_report(merged)
+        self.assertTrue(report['valid'])
+        self.assertEqual(report['parsed_rows'], 1)
+
+    def test_report_lists_every_offending_row(self):
+        data = _ledger()
+        data['scores'].append({'id': 700, 'studentId': 2, 'date': '2026-04-13',
+                               'notes': '[VETO-Postholder] Removed penalty for Group B on current day'})
+        data['scores'].append({'id': 701, 'studentId': 3, 'date': '2026-04-14',
+                               'notes': '[VETO-Postholder-Penalty-Group A] Penalty removed'})
+        data['group_crs'][0]['veto_shield_used_on'] = '2026-04-20'
+        with self.app.app_context():
+            report = self.sb._veto_jurisdiction_report(data)
+        self.assertFalse(report['valid'])
+        self.assertEqual(
+            sorted((v['rule'], v.get('score_id')) for v in report['violations']),
+            [('postholder_penalty', 700), ('shield_without_activation', None),
+             ('unauthorized_penalty_removal', 701)],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
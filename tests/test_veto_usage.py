@@ -0,0 +1,80 @@
+"""Tests for the batched VETO usage pass used by the reconcile loops."""
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def _ledger():
+    notes = ['', '[veto shield]', '1V used to select Captain post for EA25A02 | misc', 'plain']
+    scores = []
+    for n in range(90):
+        scores.append({
+            'id': n + 1, 'studentId': 1 + n % 5, 'month': ['2026-03', '2026-04'][n % 2],
+            'date': f"{['2026-03', '2026-04'][n % 2]}-{1 + n % 25:02d}",
+            'points': 1, 'vetos': n % 3 - 1, 'notes': notes[n % 4],
+        })
+    students = [{'id': i, 'roll': f'EA25A{i:02d}', 'name': f'S{i}'} for i in range(1, 7)]
+    return {'server_version': 12, 'students': students, 'scores': scores}
+
+
+class VetoUsageTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._old_storage_root = os.environ.get('EA_STORAGE_ROOT')
+        cls._tmp = tempfile.mkdtemp(prefix='ea_veto_usage_')
+        os.environ['EA_STORAGE_ROOT'] = cls._tmp
+        from app.utils import data_paths
+        data_paths.reset_cache()
+        data_paths.invalidate_data_cache()
+        import app.routes.scoreboard as sb
+        from app import app
+        cls.sb = sb
+        cls.app = app
+        cls.data_paths = data_paths
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls._old_storage_root is None:
+            os.environ.pop('EA_STORAGE_ROOT', None)
+        else:
+            os.environ['EA_STORAGE_ROOT'] = cls._old_storage_root
+        cls.data_paths.reset_cache()
+        cls.data_paths.invalidate_data_cache()
+        shutil.rmtree(cls._tmp, ignore_errors=True)
+
+    def test_batched_usage_matches_per_student_scans(self):
+        data = _ledger()
+        total, by_month = self.sb._veto_usage_from_scores(data)
+        for sid in range(0, 7):
+            self.assertEqual(total.get(sid, 0), self.sb._get_student_total_used_vetos_from_scores(data, sid))
+            for month in ('2026-03', '2026-04'):
+                self.assertEqual(by_month.get((sid, month), 0),
+                                 self.sb._get_student_month_consumed_vetos(data, sid, month))
+
+    def test_usage_is_cached_per_version_and_scores_list(self):
+        data = _ledger()
+        first = self.sb._veto_usage_from_scores(data)
+        self.assertIs(self.sb._veto_usage_from_scores(data), first)
+        data['scores'].append({'id': 500, 'studentId': 1, 'month': '2026-04', 'vetos': -4})
+        second = self.sb._veto_usage_from_scores(data)
+        self.assertEqual(second[0][1], first[0][1] + 4)
+        data['server_version'] = 13
+        self.assertIsNot(self.sb._veto_usage_from_scores(data), second)
+
+    def test_reconcile_uses_batched_usage(self):
+        data = _ledger()
+        expected = copy.deepcopy(data)
+        with self.app.app_context():
+            self.sb._reconcile_veto_counters_from_scores(data, '2026-04')
+        tracked = data['veto_tracking']['students']
+        for student in expected['students']:
+            used = self.sb._get_student_total_used_vetos_from_scores(expected, student['id'])
+            self.assertEqual(tracked[student['roll']]['used_vetos'], used)
+            live = next(s for s in data['students'] if s['id'] == student['id'])
+            self.assertEqual(live.get('used_veto_count', 0), used)
+
+
+if __name__ == '__main__':
+    unittest.main()